@@ -9,6 +9,8 @@ import os
 from datetime import datetime
 import logging
 
+import click
+
 from dotenv import load_dotenv
 load_dotenv()  # garante que .env seja carregado antes de ler as configs
 
@@ -16,11 +18,14 @@ from flask import Flask, request, g
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
-from config import Config, DevelopmentConfig, ProductionConfig
+from config import Config, DevelopmentConfig, ProductionConfig, _normalize_db_url
+
+from app.utils.roteamento_db import SessaoRoteada, configurar_bind_leitura, registrar_roteamento
 
+logger = logging.getLogger(__name__)
 
 # Instâncias globais
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 migrate = Migrate()
 login_manager = LoginManager()
 
@@ -41,8 +46,20 @@ def create_app(config_class=None):
     # Requer que sua Config tenha @staticmethod get_database_url()
     app.config['SQLALCHEMY_DATABASE_URI'] = config_class.get_database_url()
 
+    # Configurar logging (antes de tudo que registra mensagens)
+    configurar_logging(app)
+
+    # Réplica de leitura (DATABASE_READ_URL) para as rotas analíticas
+    if configurar_bind_leitura(app, _normalize_db_url):
+        logger.info("Réplica de leitura configurada (bind 'leitura')")
+
     # Inicializar extensões
     db.init_app(app)
+    registrar_roteamento(app)
+
+    # Classes de carga: statement_timeout e orçamento de conexões por tipo de rota
+    from app.utils.cargas_trabalho import registrar_cargas_trabalho
+    registrar_cargas_trabalho(app)
     migrate.init_app(app, db)
 
     # Configurar Flask-Login
@@ -53,8 +70,9 @@ def create_app(config_class=None):
 
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models.user import User
-        return User.query.get(int(user_id))
+        # Cache de identidade por worker (TTL curto) evita a query em users a cada request
+        from app.services.usuario_cache_service import carregar_usuario
+        return carregar_usuario(user_id)
 
     # Context processors globais
     @app.context_processor
@@ -76,6 +94,10 @@ def create_app(config_class=None):
 
         return base_context
 
+    # Telemetria (latência, queries e tamanho por endpoint, exposta em /metrics)
+    from app.utils.telemetria import registrar_telemetria
+    registrar_telemetria(app)
+
     # Middleware de segurança e integração JWT
     @app.before_request
     def security_headers():
@@ -88,7 +110,7 @@ def create_app(config_class=None):
 
         # Log de acesso para rotas admin
         if request.path.startswith('/admin'):
-            print(f"🔐 Acesso admin: {request.remote_addr} -> {request.path}")
+            logger.info(f"🔐 Acesso admin: {request.remote_addr} -> {request.path}")
 
     @app.after_request
     def after_request(response):
@@ -102,7 +124,7 @@ def create_app(config_class=None):
         if hasattr(g, 'start_time'):
             duration = (datetime.utcnow() - g.start_time).total_seconds()
             if duration > 1.0:  # Log requests lentos
-                print(f"[AVISO] Request lento: {request.path} ({duration:.2f}s)")
+                logger.warning(f"Request lento: {request.path} ({duration:.2f}s)")
 
         return response
 
@@ -112,9 +134,6 @@ def create_app(config_class=None):
     # Comandos CLI customizados
     registrar_comandos_cli(app)
 
-    # Configurar logging
-    configurar_logging(app)
-
     return app
 
 def registrar_blueprints(app):
@@ -173,7 +192,7 @@ def registrar_comandos_cli(app):
     @app.cli.command()
     def init_db():
         """Inicializar banco de dados"""
-        print("🔧 Inicializando banco de dados...")
+        click.echo("🔧 Inicializando banco de dados...")
         db.create_all()
 
         # Criar admin inicial
@@ -181,16 +200,16 @@ def registrar_comandos_cli(app):
         sucesso, resultado = User.criar_admin_inicial()
 
         if sucesso:
-            print("✅ Banco inicializado com sucesso!")
+            click.echo("✅ Banco inicializado com sucesso!")
             if isinstance(resultado, User):
-                print(f"👑 Admin criado: {resultado.username}")
+                click.echo(f"👑 Admin criado: {resultado.username}")
         else:
-            print(f"❌ Erro na inicialização: {resultado}")
+            click.echo(f"❌ Erro na inicialização: {resultado}")
 
     @app.cli.command()
     def criar_admin():
         """Criar usuário administrador"""
-        print("👑 Criando usuário administrador...")
+        click.echo("👑 Criando usuário administrador...")
 
         from app.models.user import User
 
@@ -208,14 +227,14 @@ def registrar_comandos_cli(app):
         )
 
         if sucesso:
-            print(f"✅ Admin criado: {username}")
+            click.echo(f"✅ Admin criado: {username}")
         else:
-            print(f"❌ Erro: {resultado}")
+            click.echo(f"❌ Erro: {resultado}")
 
     @app.cli.command()
     def reset_admin():
         """Reset senha do admin"""
-        print("🔑 Reset de senha do admin...")
+        click.echo("🔑 Reset de senha do admin...")
 
         from app.models.user import User
 
@@ -224,79 +243,156 @@ def registrar_comandos_cli(app):
             admin.set_password('Admin123!')
             admin.reset_security_flags()
             db.session.commit()
-            print("✅ Senha do admin resetada para: Admin123!")
+            click.echo("✅ Senha do admin resetada para: Admin123!")
         else:
-            print("❌ Admin não encontrado")
+            click.echo("❌ Admin não encontrado")
 
     @app.cli.command()
     def stats():
         """Estatísticas do sistema"""
-        print("📊 Estatísticas do Sistema")
-        print("=" * 40)
+        click.echo("📊 Estatísticas do Sistema")
+        click.echo("=" * 40)
 
         from app.models.user import User
         from app.models.cte import CTE
 
         # Estatísticas de usuários
         user_stats = User.estatisticas_usuarios()
-        print(f"👥 Usuários:")
-        print(f"   Total: {user_stats['total']}")
-        print(f"   Ativos: {user_stats['ativos']}")
-        print(f"   Admins: {user_stats['admins']}")
-        print(f"   Bloqueados: {user_stats['bloqueados']}")
+        click.echo(f"👥 Usuários:")
+        click.echo(f"   Total: {user_stats['total']}")
+        click.echo(f"   Ativos: {user_stats['ativos']}")
+        click.echo(f"   Admins: {user_stats['admins']}")
+        click.echo(f"   Bloqueados: {user_stats['bloqueados']}")
 
         # Estatísticas de CTEs
         total_ctes = CTE.query.count()
-        print(f"\n📋 CTEs:")
-        print(f"   Total: {total_ctes}")
+        click.echo(f"\n📋 CTEs:")
+        click.echo(f"   Total: {total_ctes}")
 
         if total_ctes > 0:
             valor_total = db.session.query(db.func.sum(CTE.valor_total)).scalar() or 0
-            print(f"   Valor Total: R$ {valor_total:,.2f}")
+            click.echo(f"   Valor Total: R$ {valor_total:,.2f}")
 
     @app.cli.command()
     def security_check():
         """Verificação de segurança"""
-        print("🔐 Verificação de Segurança")
-        print("=" * 40)
+        click.echo("🔐 Verificação de Segurança")
+        click.echo("=" * 40)
 
         from app.models.user import User
 
         # Usuários bloqueados
         bloqueados = User.query.filter(User.locked_until.isnot(None)).count()
-        print(f"🚨 Usuários bloqueados: {bloqueados}")
+        click.echo(f"🚨 Usuários bloqueados: {bloqueados}")
 
         # Usuários com muitas tentativas
         suspeitos = User.query.filter(User.failed_logins >= 3).count()
-        print(f"⚠️ Usuários com tentativas suspeitas: {suspeitos}")
+        click.echo(f"⚠️ Usuários com tentativas suspeitas: {suspeitos}")
 
         # Admins ativos
         admins = User.query.filter_by(tipo_usuario='admin', ativo=True).count()
-        print(f"👑 Admins ativos: {admins}")
+        click.echo(f"👑 Admins ativos: {admins}")
 
         if admins == 0:
-            print("❌ CRÍTICO: Nenhum admin ativo!")
+            click.echo("❌ CRÍTICO: Nenhum admin ativo!")
         elif admins == 1:
-            print("⚠️ AVISO: Apenas 1 admin ativo")
+            click.echo("⚠️ AVISO: Apenas 1 admin ativo")
+        else:
+            click.echo("✅ Múltiplos admins configurados")
+
+    @app.cli.command()
+    def rebuild_receita_mensal():
+        """Reconstruir rollup mensal de receita por cliente"""
+        click.echo("🔄 Reconstruindo rollup receita_mensal_cliente...")
+
+        from app.services.receita_mensal_service import ReceitaMensalService
+
+        resultado = ReceitaMensalService.reconstruir()
+        click.echo(f"✅ {resultado['linhas']} linhas geradas a partir de {resultado['ctes']} CTEs "
+              f"em {resultado['tempo_segundos']}s")
+
+    @app.cli.command()
+    def rebuild_sketches():
+        """Reconstruir sketches mensais (HyperLogLog / t-digest) dos CTEs"""
+        click.echo("🔄 Reconstruindo sketches mensais...")
+
+        from app.services.sketch_service import SketchService
+
+        resultado = SketchService.reconstruir()
+        click.echo(f"✅ {resultado['linhas']} sketches gerados em {resultado['tempo_segundos']}s")
+
+    @app.cli.command()
+    def manter_sketches():
+        """Recalcular sketches sujos (ou popular a tabela); agendar fora das requisições"""
+        from app.services.sketch_service import SketchService
+        from app.utils.cargas_trabalho import carga_de_trabalho
+
+        # Agendado: statement_timeout de lote, para uma execução travada não acumular
+        with carga_de_trabalho('lote'):
+            resultado = SketchService.manter()
+        if resultado['reconstruido']:
+            click.echo(f"✅ Tabela populada: {resultado['linhas']} sketches em {resultado['tempo_segundos']}s")
         else:
-            print("✅ Múltiplos admins configurados")
+            click.echo(f"✅ {resultado['recalculadas']} linhas sujas recalculadas")
+
+    @app.cli.command()
+    @click.option('--sem-seqscan', is_flag=True,
+                  help='Desligar seq scan (tabelas pequenas de desenvolvimento escondem o índice)')
+    def verificar_indices(sem_seqscan):
+        """Conferir por EXPLAIN se alertas e filtros usam os índices de dashboard_baker"""
+        from app.utils.verificacao_indices import verificar_indices as verificar
+
+        click.echo("🔍 Verificação de índices (EXPLAIN)")
+        click.echo("=" * 40)
+        resultados = verificar(db.engine, sem_seqscan=sem_seqscan)
+        for r in resultados:
+            click.echo(f"{'✅' if r['ok'] else '❌'} {r['origem']}")
+            click.echo(f"   esperado: {r['indice_esperado']}")
+            click.echo(f"   usados: {', '.join(r['indices_usados']) or 'nenhum'}")
+            click.echo(f"   plano: {r['plano']}")
+
+        falhas = sum(1 for r in resultados if not r['ok'])
+        if falhas:
+            click.echo(f"\n❌ {falhas} de {len(resultados)} consultas sem o índice esperado "
+                       f"(rodou 'flask db upgrade'?)")
+            raise SystemExit(1)
+        click.echo(f"\n✅ {len(resultados)} consultas usando os índices esperados")
+
+    @app.cli.command()
+    @click.option('--meses', type=click.IntRange(min=1), default=None,
+                  help='Arquivar CTEs baixados emitidos há mais de N meses (padrão: CTE_ARQUIVO_MESES)')
+    @click.option('--lote', type=click.IntRange(min=1), default=None,
+                  help='CTEs movidos por transação (padrão: CTE_ARQUIVO_LOTE)')
+    @click.option('--simular', is_flag=True, help='Só contar os candidatos, sem mover')
+    def arquivar_ctes(meses, lote, simular):
+        """Mover CTEs baixados antigos para dashboard_baker_arquivo"""
+        from app.services.arquivo_cte_service import (
+            ArquivoCTEService, CTE_ARQUIVO_LOTE, CTE_ARQUIVO_MESES
+        )
+
+        meses = meses or CTE_ARQUIVO_MESES
+        click.echo(f"🗄️ Arquivando CTEs baixados emitidos há mais de {meses} meses"
+                   f"{' (simulação)' if simular else ''}...")
+
+        resultado = ArquivoCTEService.arquivar(meses=meses, lote=lote or CTE_ARQUIVO_LOTE, simular=simular)
+        for ano, total in resultado['por_ano'].items():
+            click.echo(f"   {ano}: {total}")
+        if simular:
+            click.echo(f"✅ {resultado['candidatos']} CTEs emitidos antes de {resultado['corte']:%d/%m/%Y} "
+                       f"seriam arquivados")
+        else:
+            click.echo(f"✅ {resultado['movidos']} CTEs emitidos antes de {resultado['corte']:%d/%m/%Y} "
+                       f"arquivados em {resultado['tempo_segundos']}s")
 
 def configurar_logging(app):
-    """Configurar sistema de logging"""
-    if not app.debug and not app.testing:
-        # Configurar logging para produção
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-
-        file_handler = logging.FileHandler('logs/dashboard_baker.log')
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('Dashboard Baker startup')
+    """Configurar sistema de logging (JSON, não-bloqueante via fila)"""
+    from flask.logging import default_handler
+    from app.utils.logging_estruturado import configurar_logging_estruturado
+
+    # Handler padrão do Flask escreve direto em stderr, na thread da requisição
+    app.logger.removeHandler(default_handler)
+    configurar_logging_estruturado(debug=app.debug, arquivo=not app.debug and not app.testing)
+    logger.info('Dashboard Baker startup')
 
 # Funções de inicialização rápida
 def init_database():
@@ -304,17 +400,17 @@ def init_database():
     from app import db
     from app.models.user import User
 
-    print("🔧 Inicializando banco...")
+    logger.info("🔧 Inicializando banco...")
     db.create_all()
 
     # Criar admin se não existir
     sucesso, resultado = User.criar_admin_inicial()
 
     if sucesso:
-        print("✅ Banco inicializado!")
+        logger.info("✅ Banco inicializado!")
         return True
     else:
-        print(f"❌ Erro: {resultado}")
+        logger.error(f"❌ Erro: {resultado}")
         return False
 
 def verificar_admin():
@@ -324,15 +420,15 @@ def verificar_admin():
     admins = User.query.filter_by(tipo_usuario='admin', ativo=True).count()
 
     if admins == 0:
-        print("⚠️ Nenhum admin encontrado, criando admin padrão...")
+        logger.warning("⚠️ Nenhum admin encontrado, criando admin padrão...")
         sucesso, resultado = User.criar_admin_inicial()
 
         if sucesso:
-            print("✅ Admin padrão criado!")
+            logger.info("✅ Admin padrão criado!")
             return True
         else:
-            print(f"❌ Erro ao criar admin: {resultado}")
+            logger.error(f"❌ Erro ao criar admin: {resultado}")
             return False
     else:
-        print(f"✅ {admins} admin(s) encontrado(s)")
+        logger.info(f"✅ {admins} admin(s) encontrado(s)")
         return True
@@ -3,8 +3,13 @@ from .user import User
 from .cte import CTE
 from .permissions import UserPermission, UserProfile
 from .frotas import Veiculo, Motorista, ChecklistModelo, ChecklistItem, Checklist, ChecklistResposta
+from .estado_derivado import EstadoDerivado
+from .receita_mensal import ReceitaMensalCliente
+from .sketch_mensal import SketchMensal
+from .cte_arquivo import CTEHistorico
 
 __all__ = [
     'User', 'CTE', 'UserPermission', 'UserProfile',
-    'Veiculo', 'Motorista', 'ChecklistModelo', 'ChecklistItem', 'Checklist', 'ChecklistResposta'
+    'Veiculo', 'Motorista', 'ChecklistModelo', 'ChecklistItem', 'Checklist', 'ChecklistResposta',
+    'EstadoDerivado', 'ReceitaMensalCliente', 'SketchMensal', 'CTEHistorico'
 ]
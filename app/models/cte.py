@@ -22,6 +22,33 @@ class CTE(db.Model):
     """
     __tablename__ = 'dashboard_baker'
 
+    # Índices casados com os predicados de alertas, filtros de período e análises
+    # (criados também pela migração migrations/versions/3f9a1c7e2b10; conferir com
+    # "flask verificar-indices")
+    __table_args__ = (
+        db.Index('ix_dashboard_baker_emissao_destinatario', 'data_emissao', 'destinatario_nome',
+                 postgresql_include=['valor_total']),
+        db.Index('ix_dashboard_baker_sem_primeiro_envio', 'data_emissao',
+                 postgresql_where=text('primeiro_envio IS NULL'),
+                 sqlite_where=text('primeiro_envio IS NULL')),
+        db.Index('ix_dashboard_baker_sem_envio_final', 'data_emissao',
+                 postgresql_where=text('envio_final IS NULL'),
+                 sqlite_where=text('envio_final IS NULL')),
+        db.Index('ix_dashboard_baker_em_aberto', 'data_emissao',
+                 postgresql_where=text('data_baixa IS NULL'),
+                 sqlite_where=text('data_baixa IS NULL')),
+        db.Index('ix_dashboard_baker_envio_final_em_aberto', 'envio_final',
+                 postgresql_where=text('data_baixa IS NULL'),
+                 sqlite_where=text('data_baixa IS NULL')),
+        db.Index('ix_dashboard_baker_atesto_sem_fatura', 'data_atesto',
+                 postgresql_where=text("numero_fatura IS NULL OR numero_fatura = ''"),
+                 sqlite_where=text("numero_fatura IS NULL OR numero_fatura = ''")),
+        db.Index('ix_dashboard_baker_data_baixa', 'data_baixa',
+                 postgresql_where=text('data_baixa IS NOT NULL'),
+                 sqlite_where=text('data_baixa IS NOT NULL')),
+        db.Index('ix_dashboard_baker_data_inclusao_fatura', 'data_inclusao_fatura'),
+    )
+
     # ==================== CAMPOS DA TABELA ====================
     
     # Chave primária
@@ -276,13 +303,23 @@ class CTE(db.Model):
     # ==================== MÉTODOS CRUD ====================
     
     @classmethod
-    def buscar_por_numero(cls, numero_cte: int) -> Optional["CTE"]:
-        """Busca CTE por número"""
+    def buscar_por_numero(cls, numero_cte: int, desarquivar: bool = False) -> Optional["CTE"]:
+        """
+        Busca CTE por número na tabela ativa
+        desarquivar: se o CTE estiver no arquivo, devolve-o à tabela ativa (para edição)
+        """
+        from app.services.arquivo_cte_service import ArquivoCTEService
+
         try:
-            return cls.query.filter_by(numero_cte=int(numero_cte)).first()
+            numero = int(numero_cte)
         except (ValueError, TypeError):
             return None
 
+        cte = cls.query.filter_by(numero_cte=numero).first()
+        if cte is None and desarquivar and ArquivoCTEService.desarquivar(numero):
+            cte = cls.query.filter_by(numero_cte=numero).first()
+        return cte
+
     @classmethod
     def criar_cte(cls, dados: Dict) -> Tuple[bool, Union[str, "CTE"]]:
         """
@@ -291,15 +328,19 @@ class CTE(db.Model):
         Returns:
             Tuple[bool, Union[str, CTE]]: (sucesso, mensagem_erro_ou_cte)
         """
+        from app.services.arquivo_cte_service import ArquivoCTEService
+
         try:
             if not dados.get('numero_cte'):
                 return False, "Número do CTE é obrigatório"
 
             numero = int(dados['numero_cte'])
             
-            # Verificar se já existe
+            # Verificar se já existe (tabela ativa ou arquivo)
             if cls.buscar_por_numero(numero):
                 return False, f"CTE {numero} já existe no sistema"
+            if ArquivoCTEService.arquivado(numero):
+                return False, f"CTE {numero} já existe no sistema (arquivado)"
 
             # Criar nova instância
             cte = cls()
@@ -509,6 +550,27 @@ class CTE(db.Model):
             logging.error(f"Erro ao calcular estatísticas: {e}")
             return {'erro': str(e)}
 
+    @classmethod
+    def versao_dados(cls) -> Optional[str]:
+        """
+        Retorna uma assinatura da versão atual dos dados da tabela
+        Muda a cada inserção, atualização (updated_at) ou remoção de CTE
+        """
+        try:
+            from sqlalchemy import func
+
+            total, max_id, max_updated = db.session.query(
+                func.count(cls.id),
+                func.max(cls.id),
+                func.max(cls.updated_at)
+            ).one()
+
+            return f"{total}:{max_id or 0}:{max_updated or ''}"
+
+        except Exception as e:
+            logging.error(f"Erro ao obter versão dos dados: {e}")
+            return None
+
     def calcular_dias_processo(self) -> Dict[str, Optional[int]]:
         """Calcula variações de dias entre etapas do processo"""
         variacoes = {}
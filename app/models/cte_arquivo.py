@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivo de CTEs Baixados
+app/models/cte_arquivo.py
+
+dashboard_baker_arquivo recebe os CTEs já baixados de meses antigos
+(flask arquivar-ctes), tirando-os da tabela ativa. No PostgreSQL é
+particionada por ano de data_emissao (RANGE), com uma partição por ano
+criada sob demanda: consultas com filtro de período só leem os anos do filtro.
+A view dashboard_baker_historico (ativa UNION ALL arquivo) atende as
+leituras que alcançam períodos arquivados. Um trigger em dashboard_baker
+impede reinserir na tabela ativa um numero_cte que está no arquivo.
+"""
+
+from sqlalchemy import column, event, inspect, table, text
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models.cte import CTE
+
+TABELA_ATIVA = CTE.__tablename__
+TABELA_ARQUIVO = 'dashboard_baker_arquivo'
+VIEW_HISTORICO = 'dashboard_baker_historico'
+
+COLUNAS_CTE = [coluna.name for coluna in CTE.__table__.columns]
+
+# Mesmas colunas do CTE; PK inclui a chave de partição (exigência do PostgreSQL)
+tabela_arquivo = db.Table(
+    TABELA_ARQUIVO, db.metadata,
+    *[
+        db.Column(coluna.name, coluna.type,
+                  primary_key=coluna.name in ('id', 'data_emissao'),
+                  autoincrement=False,
+                  nullable=coluna.nullable and coluna.name != 'data_emissao')
+        for coluna in CTE.__table__.columns
+    ],
+    db.Column('arquivado_em', db.DateTime, nullable=False),
+    db.Index('ix_dashboard_baker_arquivo_numero_cte', 'numero_cte'),
+    db.Index('ix_dashboard_baker_arquivo_emissao_destinatario', 'data_emissao', 'destinatario_nome'),
+    postgresql_partition_by='RANGE (data_emissao)',
+)
+
+# Leitura ORM pela view: devolve objetos CTE (somente leitura)
+_view_historico = table(VIEW_HISTORICO, *[column(c.name, c.type) for c in CTE.__table__.columns])
+CTEHistorico = aliased(CTE, _view_historico, name='cte_historico', adapt_on_names=True)
+
+
+def sql_view_historico(dialeto: str) -> str:
+    colunas = ', '.join(COLUNAS_CTE)
+    criar = 'CREATE OR REPLACE VIEW' if dialeto == 'postgresql' else 'CREATE VIEW IF NOT EXISTS'
+    return (f"{criar} {VIEW_HISTORICO} AS "
+            f"SELECT {colunas} FROM {TABELA_ATIVA} "
+            f"UNION ALL SELECT {colunas} FROM {TABELA_ARQUIVO}")
+
+
+def criar_view_historico(conexao) -> None:
+    conexao.execute(text(sql_view_historico(conexao.dialect.name)))
+
+
+TRIGGER_NUMERO_UNICO = 'dashboard_baker_numero_unico'
+
+
+def sql_trigger_numero_unico(dialeto: str) -> list:
+    """DDL do trigger que rejeita numero_cte já arquivado (INSERT ou troca de número)"""
+    if dialeto == 'postgresql':
+        return [
+            f"CREATE OR REPLACE FUNCTION {TRIGGER_NUMERO_UNICO}() RETURNS trigger AS $$ "
+            f"BEGIN "
+            f"IF EXISTS (SELECT 1 FROM {TABELA_ARQUIVO} WHERE numero_cte = NEW.numero_cte) THEN "
+            f"RAISE EXCEPTION USING ERRCODE = 'unique_violation', "
+            f"MESSAGE = 'CTE ' || NEW.numero_cte || ' já existe no arquivo'; "
+            f"END IF; "
+            f"RETURN NEW; "
+            f"END $$ LANGUAGE plpgsql",
+            f"DROP TRIGGER IF EXISTS {TRIGGER_NUMERO_UNICO} ON {TABELA_ATIVA}",
+            f"CREATE TRIGGER {TRIGGER_NUMERO_UNICO} BEFORE INSERT OR UPDATE OF numero_cte ON {TABELA_ATIVA} "
+            f"FOR EACH ROW EXECUTE FUNCTION {TRIGGER_NUMERO_UNICO}()",
+        ]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {TRIGGER_NUMERO_UNICO}_{evento.split()[0].lower()} "
+        f"BEFORE {evento} ON {TABELA_ATIVA} "
+        f"WHEN EXISTS (SELECT 1 FROM {TABELA_ARQUIVO} WHERE numero_cte = NEW.numero_cte) "
+        f"BEGIN SELECT RAISE(ABORT, 'CTE já existe no arquivo'); END"
+        for evento in ('INSERT', 'UPDATE OF numero_cte')
+    ]
+
+
+def criar_trigger_numero_unico(conexao) -> None:
+    if conexao.dialect.name not in ('postgresql', 'sqlite'):
+        return
+    for comando in sql_trigger_numero_unico(conexao.dialect.name):
+        conexao.execute(text(comando))
+
+
+def nome_particao(ano: int) -> str:
+    return f"{TABELA_ARQUIVO}_{int(ano)}"
+
+
+def criar_particoes(conexao, anos) -> None:
+    """Uma partição por ano (PostgreSQL); nos demais bancos o arquivo é uma tabela simples"""
+    if conexao.dialect.name != 'postgresql':
+        return
+    for ano in sorted({int(a) for a in anos}):
+        conexao.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {nome_particao(ano)} PARTITION OF {TABELA_ARQUIVO} "
+            f"FOR VALUES FROM ('{ano}-01-01') TO ('{ano + 1}-01-01')"
+        ))
+
+
+# ==================== VIEW E TRIGGER JUNTO COM db.create_all() ====================
+
+@event.listens_for(db.metadata, 'after_create')
+def _criar_view_apos_create_all(metadata, conexao, **kwargs):
+    inspetor = inspect(conexao)
+    if inspetor.has_table(TABELA_ATIVA) and inspetor.has_table(TABELA_ARQUIVO):
+        criar_view_historico(conexao)
+        criar_trigger_numero_unico(conexao)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _remover_view_antes_drop_all(metadata, conexao, **kwargs):
+    conexao.execute(text(f"DROP VIEW IF EXISTS {VIEW_HISTORICO}"))
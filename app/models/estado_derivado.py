@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modelo de Estado das Tabelas Derivadas
+app/models/estado_derivado.py
+
+Uma linha por tabela derivada de dashboard_baker (rollup de receita,
+sketches mensais), gravada na mesma transação que a reconstrói. Tabela
+existente sem essa linha (ex.: criada vazia por db.create_all()) ou com
+versão diferente não é confiável e precisa ser reconstruída.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import exists, inspect, select
+
+from app import db
+from app.models.cte import CTE
+
+logger = logging.getLogger(__name__)
+
+
+class EstadoDerivado(db.Model):
+    """Marcador de tabela derivada populada"""
+    __tablename__ = 'estado_derivado'
+
+    nome = db.Column(db.String(60), primary_key=True)  # nome da tabela derivada
+    versao = db.Column(db.Integer, nullable=False)
+    populado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f'<EstadoDerivado {self.nome} v{self.versao}>'
+
+
+def derivado_populado(conexao, tabela, versao: int) -> bool:
+    """
+    True se a tabela derivada existe, foi populada na versão esperada e não
+    está vazia enquanto dashboard_baker tem CTEs
+    """
+    try:
+        inspetor = inspect(conexao)
+        if not (inspetor.has_table(tabela.name) and inspetor.has_table(EstadoDerivado.__tablename__)):
+            return False
+
+        estado = EstadoDerivado.__table__
+        versao_gravada = conexao.execute(
+            select(estado.c.versao).where(estado.c.nome == tabela.name)
+        ).scalar()
+        if versao_gravada != versao:
+            return False
+
+        # Marcador sobrevive a DROP + create_all da tabela derivada
+        if not conexao.execute(select(exists().select_from(tabela))).scalar():
+            return not conexao.execute(select(exists().select_from(CTE.__table__))).scalar()
+        return True
+    except Exception as e:
+        logger.warning(f"Estado de {tabela.name}: não foi possível verificar: {e}")
+        return False
+
+
+def marcar_populado(conexao, tabela, versao: int) -> None:
+    """Grava o marcador da tabela derivada na transação corrente"""
+    estado = EstadoDerivado.__table__
+    conexao.execute(estado.delete().where(estado.c.nome == tabela.name))
+    conexao.execute(estado.insert().values(nome=tabela.name, versao=versao, populado_em=datetime.utcnow()))
@@ -149,6 +149,10 @@ class ChecklistItem(db.Model):
 class Checklist(db.Model):
     """Modelo para checklists realizados"""
     __tablename__ = "checklists"
+    __table_args__ = (
+        # Listagem por keyset (ChecklistService.listar)
+        db.Index('ix_checklists_dt_inicio_id', 'dt_inicio', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(50), unique=True, index=True)
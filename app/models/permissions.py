@@ -7,8 +7,19 @@ Gerencia permissões por perfil de usuário e módulos do sistema
 
 from app import db
 from datetime import datetime
+from flask import g, has_request_context
 from flask_login import current_user
+from collections import OrderedDict
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app.models.user import User
+from app.services.cache_service import CacheResultados
 import json
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
 
 class UserPermission(db.Model):
     """Permissões específicas por usuário"""
@@ -61,6 +72,93 @@ class UserProfile(db.Model):
         except:
             return {}
 
+# ==================== PERMISSÕES COMPILADAS (CACHE) ====================
+
+# Usuários com permissões compiladas mantidas por processo
+PERMISSOES_CACHE_MAX = 1024
+
+_CHAVE_VERSAO = 'versao'
+
+# Versão das permissões compartilhada entre os workers
+_versao_compartilhada = CacheResultados('permissoes', max_entradas=1, max_bytes_entrada=1024)
+
+
+class PermissoesCompiladas:
+    """Permissões de um usuário: admin + módulo -> bitmask de ações"""
+
+    __slots__ = ('admin', 'modulos')
+
+    def __init__(self, admin, modulos):
+        self.admin = admin
+        self.modulos = modulos
+
+    def pode(self, module, action):
+        if self.admin:
+            return True
+        bit = PermissionManager.ACTION_BITS.get(action)
+        return bit is not None and bool(self.modulos.get(module, 0) & bit)
+
+
+class CachePermissoes:
+    """
+    Permissões compiladas por usuário, por processo, com carimbo de versão
+    A versão fica no cache compartilhado entre workers (CacheResultados) e
+    é trocada após cada commit que altera permissões ou perfil de usuário;
+    dentro de uma requisição ela é lida uma única vez.
+    """
+
+    def __init__(self, max_entradas=PERMISSOES_CACHE_MAX):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def versao_atual(self):
+        if has_request_context():
+            if 'permissoes_versao' not in g:
+                g.permissoes_versao = self._ler_versao()
+            return g.permissoes_versao
+        return self._ler_versao()
+
+    @staticmethod
+    def _ler_versao():
+        entrada = _versao_compartilhada.obter(_CHAVE_VERSAO)
+        if entrada is not None:
+            return entrada[0]
+        # Primeira leitura (ou cache reiniciado): publica uma versão nova
+        versao = uuid.uuid4().hex
+        return versao if _versao_compartilhada.gravar(_CHAVE_VERSAO, versao) else None
+
+    def obter(self, user_id):
+        versao = self.versao_atual()
+        if versao is not None:
+            with self._lock:
+                entrada = self._entradas.get(user_id)
+                if entrada is not None and entrada[0] == versao:
+                    self._entradas.move_to_end(user_id)
+                    return entrada[1]
+
+        compiladas = PermissionManager.compilar_permissoes(user_id)
+        if versao is not None:  # sem versão compartilhada não há como invalidar: não guarda
+            with self._lock:
+                self._entradas[user_id] = (versao, compiladas)
+                self._entradas.move_to_end(user_id)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return compiladas
+
+    def invalidar(self):
+        """Troca a versão (todos os workers recompilam na próxima verificação)"""
+        with self._lock:
+            self._entradas.clear()
+        versao = uuid.uuid4().hex
+        _versao_compartilhada.gravar(_CHAVE_VERSAO, versao)
+        if has_request_context():
+            g.pop('permissoes_versao', None)
+
+
+permissoes_cache = CachePermissoes()
+
+
 class PermissionManager:
     """Gerenciador central de permissões"""
 
@@ -88,6 +186,7 @@ class PermissionManager:
 
     # Ações disponíveis
     ACTIONS = ['view', 'create', 'edit', 'delete', 'approve']
+    ACTION_BITS = {action: 1 << i for i, action in enumerate(ACTIONS)}
 
     # Perfis pré-definidos
     DEFAULT_PROFILES = {
@@ -143,7 +242,7 @@ class PermissionManager:
             return True
         except Exception as e:
             db.session.rollback()
-            print(f"Erro ao criar perfis padrão: {e}")
+            logger.error(f"Erro ao criar perfis padrão: {e}")
             return False
 
     @classmethod
@@ -159,24 +258,46 @@ class PermissionManager:
         return permissions
 
     @classmethod
-    def user_can(cls, user_id, module, action):
-        """Verifica se usuário tem permissão para uma ação específica"""
-        # Administradores sempre podem
-        from app.models.user import User
-        user = User.query.get(user_id)
-        if user and user.tipo_usuario == 'admin':
-            return True
+    def compilar_permissoes(cls, user_id):
+        """Tipo do usuário + permissões por módulo em uma única query"""
+        users = User.__table__
+        perms = UserPermission.__table__
+        linhas = db.session.execute(
+            select(users.c.tipo_usuario, perms.c.module, perms.c.actions)
+            .select_from(users.outerjoin(perms, perms.c.user_id == users.c.id))
+            .where(users.c.id == user_id)
+        ).all()
+
+        admin = bool(linhas) and linhas[0].tipo_usuario == 'admin'
+        modulos = {}
+        for linha in linhas:
+            if linha.module is None:
+                continue
+            try:
+                actions = json.loads(linha.actions) if linha.actions else []
+            except (TypeError, ValueError):
+                actions = []
+            mascara = 0
+            for action in actions:
+                mascara |= cls.ACTION_BITS.get(action, 0)
+            modulos[linha.module] = mascara
+        return PermissoesCompiladas(admin, modulos)
 
-        # Verificar permissões específicas
-        permission = UserPermission.query.filter_by(
-            user_id=user_id,
-            module=module
-        ).first()
+    @classmethod
+    def permissoes(cls, user_id):
+        """Permissões compiladas do usuário (cache por processo)"""
+        return permissoes_cache.obter(user_id)
 
-        if permission:
-            return permission.has_action(action)
+    @classmethod
+    def invalidar_cache(cls):
+        """Chamar após o commit de qualquer alteração de permissões/perfil"""
+        permissoes_cache.invalidar()
 
-        return False
+    @classmethod
+    def user_can(cls, user_id, module, action):
+        """Verifica se usuário tem permissão para uma ação específica"""
+        # Administradores sempre podem
+        return cls.permissoes(user_id).pode(module, action)
 
     @classmethod
     def assign_profile_to_user(cls, user_id, profile_name):
@@ -195,6 +316,7 @@ class PermissionManager:
 
         try:
             db.session.commit()
+            cls.invalidar_cache()
             return True, "Perfil atribuído com sucesso"
         except Exception as e:
             db.session.rollback()
@@ -203,43 +325,68 @@ class PermissionManager:
     @classmethod
     def get_user_modules(cls, user_id):
         """Retorna módulos que o usuário tem acesso para exibir na interface"""
-        from app.models.user import User
-        user = User.query.get(user_id)
+        permissoes = cls.permissoes(user_id)
 
         # Administradores veem tudo
-        if user and user.tipo_usuario == 'admin':
+        if permissoes.admin:
             return list(cls.MODULES.keys())
 
         # Usuários normais veem apenas módulos com permissão 'view'
-        user_permissions = cls.get_user_permissions(user_id)
-        accessible_modules = []
-
-        for module, actions in user_permissions.items():
-            if 'view' in actions:
-                accessible_modules.append(module)
-
-        return accessible_modules
+        return [module for module, mascara in permissoes.modulos.items()
+                if mascara & cls.ACTION_BITS['view']]
 
     @classmethod
     def get_modules_for_display(cls, user_id):
         """Retorna informações completas dos módulos para exibição"""
-        accessible_modules = cls.get_user_modules(user_id)
+        permissoes = cls.permissoes(user_id)
         modules_info = []
 
-        for module_key in accessible_modules:
+        for module_key in cls.get_user_modules(user_id):
             if module_key in cls.MODULES:
                 module_info = cls.MODULES[module_key].copy()
                 module_info['key'] = module_key
 
                 # Verificar ações específicas
-                module_info['can_create'] = cls.user_can(user_id, module_key, 'create')
-                module_info['can_edit'] = cls.user_can(user_id, module_key, 'edit')
-                module_info['can_delete'] = cls.user_can(user_id, module_key, 'delete')
+                module_info['can_create'] = permissoes.pode(module_key, 'create')
+                module_info['can_edit'] = permissoes.pode(module_key, 'edit')
+                module_info['can_delete'] = permissoes.pode(module_key, 'delete')
 
                 modules_info.append(module_info)
 
         return modules_info
 
+
+# ==================== INVALIDAÇÃO POR ALTERAÇÃO DE USUÁRIO ====================
+
+def _marcar_permissoes_alteradas(target):
+    sessao = object_session(target)
+    if sessao is not None:
+        sessao.info['permissoes_alteradas'] = True
+
+
+@event.listens_for(User, 'after_update')
+def _usuario_alterado(mapper, connection, target):
+    if inspect(target).attrs.tipo_usuario.history.has_changes():
+        _marcar_permissoes_alteradas(target)
+
+
+@event.listens_for(User, 'after_delete')
+def _usuario_excluido(mapper, connection, target):
+    _marcar_permissoes_alteradas(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    # Só depois do commit: outro worker recompilando antes leria dados antigos
+    if session.info.pop('permissoes_alteradas', False):
+        permissoes_cache.invalidar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca_permissoes(session):
+    session.info.pop('permissoes_alteradas', None)
+
+
 # Decorator para verificar permissões
 def requires_permission(module, action):
     """Decorator para verificar permissões antes de executar uma função"""
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modelo de Rollup Mensal de Receita por Cliente
+app/models/receita_mensal.py
+
+Agregado de dashboard_baker por (mês, cliente, base de data), mantido de
+forma incremental a cada flush de CTEs e reconstruível via CLI
+(flask rebuild-receita-mensal).
+"""
+
+import time
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.cte import CTE
+from app.models.estado_derivado import derivado_populado
+
+logger = logging.getLogger(__name__)
+
+# Base de data -> colunas (em ordem de prioridade) que definem o mês do CTE
+BASES_DATA = {
+    'emissao': ('data_emissao',),
+    'inclusao_fatura': ('data_inclusao_fatura',),
+    'envio_final': ('envio_final', 'data_baixa'),  # fallback para baixa, como nas APIs
+    'baixa': ('data_baixa',),
+}
+
+MEDIDAS = (
+    'quantidade', 'valor_total',
+    'quantidade_baixada', 'valor_baixado',
+    'quantidade_faturada', 'valor_faturado',
+    'quantidade_com_fatura', 'valor_com_fatura',
+)
+
+# Campos do CTE que alteram o rollup
+CAMPOS_RELEVANTES = (
+    'destinatario_nome', 'valor_total', 'data_emissao', 'data_baixa',
+    'numero_fatura', 'data_inclusao_fatura', 'envio_final',
+)
+
+
+class ReceitaMensalCliente(db.Model):
+    """Receita agregada por mês, cliente e base de data"""
+    __tablename__ = 'receita_mensal_cliente'
+
+    mes = db.Column(db.Date, primary_key=True)  # primeiro dia do mês
+    cliente = db.Column(db.String(255), primary_key=True)  # '' quando sem destinatário
+    base = db.Column(db.String(20), primary_key=True)
+
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    valor_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    quantidade_baixada = db.Column(db.Integer, nullable=False, default=0)
+    valor_baixado = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    quantidade_faturada = db.Column(db.Integer, nullable=False, default=0)
+    valor_faturado = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    quantidade_com_fatura = db.Column(db.Integer, nullable=False, default=0)
+    valor_com_fatura = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f'<ReceitaMensalCliente {self.mes:%Y-%m} {self.base} {self.cliente!r}>'
+
+    # ==================== CONTRIBUIÇÃO DE UM CTE ====================
+
+    @staticmethod
+    def contribuicoes(valores: Dict) -> Dict[Tuple[date, str, str], list]:
+        """
+        Linhas do rollup afetadas por um CTE e o vetor de medidas de cada uma
+        valores: dict com os CAMPOS_RELEVANTES do CTE
+        """
+        valor = Decimal(str(valores.get('valor_total') or 0))
+        baixado = valores.get('data_baixa') is not None
+        faturado = valores.get('envio_final') is not None or baixado
+        numero_fatura = valores.get('numero_fatura')
+        com_fatura = valores.get('data_inclusao_fatura') is not None or (
+            numero_fatura is not None and numero_fatura != ''
+        )
+
+        vetor = [
+            1, valor,
+            int(baixado), valor if baixado else Decimal('0'),
+            int(faturado), valor if faturado else Decimal('0'),
+            int(com_fatura), valor if com_fatura else Decimal('0'),
+        ]
+
+        cliente = valores.get('destinatario_nome') or ''
+        resultado = {}
+        for base, campos in BASES_DATA.items():
+            data_base = next((valores.get(c) for c in campos if valores.get(c) is not None), None)
+            if data_base is None:
+                continue
+            resultado[(data_base.replace(day=1), cliente, base)] = list(vetor)
+        return resultado
+
+    # ==================== APLICAÇÃO DE DELTAS ====================
+
+    @classmethod
+    def aplicar_deltas(cls, conexao, deltas: Dict[Tuple[date, str, str], list]) -> None:
+        """Soma os deltas nas linhas do rollup (upsert), na transação corrente"""
+        if not deltas:
+            return
+
+        agora = datetime.utcnow()
+        linhas = []
+        for (mes, cliente, base), vetor in deltas.items():
+            linha = {'mes': mes, 'cliente': cliente, 'base': base, 'atualizado_em': agora}
+            linha.update(zip(MEDIDAS, vetor))
+            linhas.append(linha)
+
+        tabela = cls.__table__
+        dialeto = conexao.dialect.name
+        if dialeto in ('postgresql', 'sqlite'):
+            if dialeto == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+
+            stmt = insert(tabela)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['mes', 'cliente', 'base'],
+                set_={
+                    **{m: tabela.c[m] + stmt.excluded[m] for m in MEDIDAS},
+                    'atualizado_em': stmt.excluded.atualizado_em,
+                }
+            )
+            conexao.execute(stmt, linhas)
+            return
+
+        # Demais bancos: UPDATE e, se não houver linha, INSERT
+        for linha in linhas:
+            chave = (tabela.c.mes == linha['mes']) & (tabela.c.cliente == linha['cliente']) & \
+                    (tabela.c.base == linha['base'])
+            resultado = conexao.execute(
+                tabela.update().where(chave).values(
+                    **{m: tabela.c[m] + linha[m] for m in MEDIDAS},
+                    atualizado_em=agora
+                )
+            )
+            if resultado.rowcount == 0:
+                conexao.execute(tabela.insert().values(**linha))
+
+
+# ==================== MANUTENÇÃO INCREMENTAL ====================
+
+# Incrementar ROLLUP_VERSAO quando o cálculo mudar: força a reconstrução
+ROLLUP_VERSAO = 1
+
+_tabela_disponivel: Optional[bool] = None
+_tabela_verificada_em = 0.0
+
+
+def rollup_disponivel(conexao) -> bool:
+    """Verifica (com cache de 60s) se o rollup existe e foi populado"""
+    global _tabela_disponivel, _tabela_verificada_em
+    # Reavaliado periodicamente: tabela pode ser criada vazia, removida ou reconstruída pela CLI
+    if _tabela_disponivel is not None and time.time() - _tabela_verificada_em < 60:
+        return _tabela_disponivel
+    _tabela_disponivel = derivado_populado(conexao, ReceitaMensalCliente.__table__, ROLLUP_VERSAO)
+    _tabela_verificada_em = time.time()
+    return _tabela_disponivel
+
+
+def marcar_rollup_disponivel() -> None:
+    global _tabela_disponivel, _tabela_verificada_em
+    _tabela_disponivel = True
+    _tabela_verificada_em = time.time()
+
+
+def _valores_atuais(cte: CTE) -> Dict:
+    return {campo: getattr(cte, campo) for campo in CAMPOS_RELEVANTES}
+
+
+@event.listens_for(Session, 'before_flush')
+def _rollup_capturar_estado_anterior(session, flush_context, instances):
+    """
+    Lê do banco, com trava de linha, o estado persistido dos CTEs alterados/removidos
+    O estado novo é o persistido com apenas os campos alterados no objeto por
+    cima: campos não alterados de um objeto desatualizado não entram no delta
+    """
+    alterados = [
+        obj for obj in session.dirty
+        if isinstance(obj, CTE) and obj.id is not None and any(
+            inspect(obj).attrs[campo].history.has_changes() for campo in CAMPOS_RELEVANTES
+        )
+    ]
+    removidos = [obj for obj in session.deleted if isinstance(obj, CTE) and obj.id is not None]
+    novos = [obj for obj in session.new if isinstance(obj, CTE)]
+
+    if not (alterados or removidos or novos):
+        return
+
+    conexao = session.connection()
+    if not rollup_disponivel(conexao):
+        return
+
+    anteriores = {}
+    ids = [obj.id for obj in alterados + removidos]
+    if ids:
+        colunas = [CTE.__table__.c.id] + [CTE.__table__.c[campo] for campo in CAMPOS_RELEVANTES]
+        consulta = select(*colunas).where(CTE.__table__.c.id.in_(ids)).with_for_update()
+        for linha in conexao.execute(consulta):
+            anteriores[linha.id] = dict(zip(CAMPOS_RELEVANTES, linha[1:]))
+
+    atualizados = []
+    for obj in alterados:
+        if obj.id not in anteriores or obj in session.deleted:
+            continue
+        estado = inspect(obj)
+        valores = dict(anteriores[obj.id])
+        for campo in CAMPOS_RELEVANTES:
+            if estado.attrs[campo].history.has_changes():
+                valores[campo] = getattr(obj, campo)
+        atualizados.append(valores)
+
+    session.info['rollup_receita_pendente'] = {
+        'anteriores': anteriores,
+        'atualizados': atualizados,
+        'novos': novos,
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_aplicar_deltas(session, flush_context):
+    """Aplica no rollup a diferença entre o estado anterior e o novo"""
+    pendente = session.info.pop('rollup_receita_pendente', None)
+    if not pendente:
+        return
+
+    deltas: Dict[Tuple[date, str, str], list] = {}
+
+    def acumular(contribuicoes, sinal):
+        for chave, vetor in contribuicoes.items():
+            acumulado = deltas.setdefault(chave, [0, Decimal('0')] * 4)
+            for i, v in enumerate(vetor):
+                acumulado[i] += sinal * v
+
+    for valores in pendente['anteriores'].values():
+        acumular(ReceitaMensalCliente.contribuicoes(valores), -1)
+    for valores in pendente['atualizados']:
+        acumular(ReceitaMensalCliente.contribuicoes(valores), 1)
+    for obj in pendente['novos']:
+        if obj in session.deleted:
+            continue
+        acumular(ReceitaMensalCliente.contribuicoes(_valores_atuais(obj)), 1)
+
+    deltas = {chave: vetor for chave, vetor in deltas.items() if any(vetor)}
+    ReceitaMensalCliente.aplicar_deltas(session.connection(), deltas)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modelo de Sketches Mensais de CTEs
+app/models/sketch_mensal.py
+
+Um sketch serializado por (mês de emissão, métrica):
+- clientes / veiculos: HyperLogLog de destinatario_nome / veiculo_placa
+- dias:<codigo>: t-digest dos dias entre as etapas de VARIACOES_CONFIG
+Inserções são somadas ao sketch a cada flush; alterações que um sketch não
+consegue desfazer (remoção, troca de valor) marcam a linha como suja: as
+leituras montam esse mês com os CTEs, e "flask manter-sketches" o regrava.
+"""
+
+import logging
+import time
+from datetime import date, datetime
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.cte import CTE
+from app.models.estado_derivado import derivado_populado
+from app.utils.sketches import HyperLogLog, TDigest
+
+logger = logging.getLogger(__name__)
+
+# Métricas de distintos -> coluna do CTE
+METRICAS_DISTINTOS = {
+    'clientes': 'destinatario_nome',
+    'veiculos': 'veiculo_placa',
+}
+
+PREFIXO_DURACAO = 'dias:'
+
+
+def pares_duracao() -> Dict[str, Tuple[str, str]]:
+    """Código da variação -> (campo_inicio, campo_fim), de VARIACOES_CONFIG"""
+    from app.services.metricas_service import VARIACOES_CONFIG
+    return {c['codigo']: (c['campo_inicio'], c['campo_fim']) for c in VARIACOES_CONFIG}
+
+
+def novo_sketch(metrica: str):
+    return TDigest() if metrica.startswith(PREFIXO_DURACAO) else HyperLogLog()
+
+
+def ler_sketch(metrica: str, dados: Optional[bytes]):
+    if not dados:
+        return novo_sketch(metrica)
+    if metrica.startswith(PREFIXO_DURACAO):
+        return TDigest.desserializar(dados)
+    return HyperLogLog.desserializar(dados)
+
+
+class SketchMensal(db.Model):
+    """Sketch serializado de uma métrica para um mês de emissão"""
+    __tablename__ = 'sketch_mensal'
+
+    mes = db.Column(db.Date, primary_key=True)  # primeiro dia do mês
+    metrica = db.Column(db.String(60), primary_key=True)
+    dados = db.Column(db.LargeBinary)  # NULL = sketch vazio
+    sujo = db.Column(db.Boolean, nullable=False, default=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f'<SketchMensal {self.mes:%Y-%m} {self.metrica}{" (sujo)" if self.sujo else ""}>'
+
+    # ==================== VALORES DE UM CTE ====================
+
+    @staticmethod
+    def valores_cte(valores: Dict) -> Tuple[Optional[date], Dict[str, object]]:
+        """(mês, {metrica: valor}) que um CTE contribui; métricas sem valor ficam de fora"""
+        emissao = valores.get('data_emissao')
+        if emissao is None:
+            return None, {}
+
+        resultado = {}
+        for metrica, campo in METRICAS_DISTINTOS.items():
+            if valores.get(campo) is not None:
+                resultado[metrica] = valores[campo]
+        for codigo, (inicio, fim) in pares_duracao().items():
+            data_inicio, data_fim = valores.get(inicio), valores.get(fim)
+            if data_inicio is not None and data_fim is not None and data_fim >= data_inicio:
+                resultado[PREFIXO_DURACAO + codigo] = (data_fim - data_inicio).days
+        return emissao.replace(day=1), resultado
+
+    # ==================== APLICAÇÃO ====================
+
+    @classmethod
+    def aplicar(cls, conexao, adicoes: Dict[Tuple[date, str], list],
+                sujos: Set[Tuple[date, str]]) -> None:
+        """Soma valores aos sketches e marca linhas sujas, na transação corrente"""
+        tabela = cls.__table__
+        agora = datetime.utcnow()
+        chaves = set(adicoes) | sujos
+        if not chaves:
+            return
+
+        # Garante as linhas (corrida entre workers resolvida pelo ON CONFLICT)
+        _inserir_ignorando(conexao, tabela, [
+            {'mes': mes, 'metrica': metrica, 'dados': None, 'sujo': False, 'atualizado_em': agora}
+            for mes, metrica in chaves
+        ])
+
+        for mes, metrica in sujos:
+            conexao.execute(
+                tabela.update()
+                .where((tabela.c.mes == mes) & (tabela.c.metrica == metrica))
+                .values(sujo=True, atualizado_em=agora)
+            )
+
+        pendentes = {chave: valores for chave, valores in adicoes.items() if chave not in sujos}
+        for (mes, metrica), valores in pendentes.items():
+            linha = conexao.execute(
+                select(tabela.c.dados, tabela.c.sujo)
+                .where((tabela.c.mes == mes) & (tabela.c.metrica == metrica))
+                .with_for_update()
+            ).one()
+            if linha.sujo:
+                continue  # será recalculada por completo (flask manter-sketches)
+            sketch = ler_sketch(metrica, linha.dados)
+            sketch.adicionar_varios(valores)
+            conexao.execute(
+                tabela.update()
+                .where((tabela.c.mes == mes) & (tabela.c.metrica == metrica))
+                .values(dados=sketch.serializar(), atualizado_em=agora)
+            )
+
+
+def _inserir_ignorando(conexao, tabela, linhas) -> None:
+    dialeto = conexao.dialect.name
+    if dialeto in ('postgresql', 'sqlite'):
+        if dialeto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        conexao.execute(insert(tabela).on_conflict_do_nothing(index_elements=['mes', 'metrica']), linhas)
+        return
+
+    for linha in linhas:
+        existe = conexao.execute(
+            select(tabela.c.mes).where((tabela.c.mes == linha['mes']) & (tabela.c.metrica == linha['metrica']))
+        ).first()
+        if existe is None:
+            conexao.execute(tabela.insert().values(**linha))
+
+
+# ==================== MANUTENÇÃO INCREMENTAL ====================
+
+# Incrementar SKETCH_VERSAO quando o formato dos sketches mudar: força a reconstrução
+SKETCH_VERSAO = 1
+
+_tabela_disponivel: Optional[bool] = None
+_tabela_verificada_em = 0.0
+
+
+def sketches_disponiveis(conexao) -> bool:
+    """Verifica (com cache de 60s) se a tabela existe e foi populada"""
+    global _tabela_disponivel, _tabela_verificada_em
+    if _tabela_disponivel is not None and time.time() - _tabela_verificada_em < 60:
+        return _tabela_disponivel
+    _tabela_disponivel = derivado_populado(conexao, SketchMensal.__table__, SKETCH_VERSAO)
+    _tabela_verificada_em = time.time()
+    return _tabela_disponivel
+
+
+def marcar_sketches_disponiveis() -> None:
+    global _tabela_disponivel, _tabela_verificada_em
+    _tabela_disponivel = True
+    _tabela_verificada_em = time.time()
+
+
+def _campos_relevantes() -> Set[str]:
+    campos = {'data_emissao', *METRICAS_DISTINTOS.values()}
+    for inicio, fim in pares_duracao().values():
+        campos.update((inicio, fim))
+    return campos
+
+
+@event.listens_for(Session, 'before_flush')
+def _sketch_capturar_estado_anterior(session, flush_context, instances):
+    """Guarda o estado persistido dos CTEs alterados/removidos antes do flush"""
+    novos = [obj for obj in session.new if isinstance(obj, CTE)]
+    removidos = [obj for obj in session.deleted if isinstance(obj, CTE) and obj.id is not None]
+    candidatos = [obj for obj in session.dirty if isinstance(obj, CTE) and obj.id is not None]
+    if not (novos or removidos or candidatos):
+        return
+
+    campos = sorted(_campos_relevantes())
+    alterados = [
+        obj for obj in candidatos
+        if any(inspect(obj).attrs[campo].history.has_changes() for campo in campos)
+    ]
+    if not (novos or removidos or alterados):
+        return
+
+    conexao = session.connection()
+    if not sketches_disponiveis(conexao):
+        return
+
+    anteriores = {}
+    ids = [obj.id for obj in alterados + removidos]
+    if ids:
+        tabela = CTE.__table__
+        for linha in conexao.execute(select(tabela.c.id, *[tabela.c[c] for c in campos])
+                                     .where(tabela.c.id.in_(ids))):
+            anteriores[linha.id] = dict(zip(campos, linha[1:]))
+
+    session.info['sketch_mensal_pendente'] = {
+        'anteriores': anteriores,
+        'atuais': alterados + novos,
+        'campos': campos,
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _sketch_aplicar(session, flush_context):
+    """Converte as mudanças do flush em adições e linhas sujas"""
+    pendente = session.info.pop('sketch_mensal_pendente', None)
+    if not pendente:
+        return
+
+    adicoes: Dict[Tuple[date, str], list] = {}
+    sujos: Set[Tuple[date, str]] = set()
+
+    atuais = {}
+    for obj in pendente['atuais']:
+        if obj not in session.deleted:
+            atuais[obj.id] = {campo: getattr(obj, campo) for campo in pendente['campos']}
+
+    for id_cte, valores in atuais.items():
+        mes_novo, novos = SketchMensal.valores_cte(valores)
+        mes_antigo, antigos = SketchMensal.valores_cte(pendente['anteriores'].get(id_cte, {}))
+
+        if mes_antigo is not None and mes_antigo != mes_novo:
+            sujos.update((mes_antigo, metrica) for metrica in antigos)
+            antigos = {}
+
+        for metrica, valor in novos.items():
+            anterior = antigos.pop(metrica, None)
+            if anterior == valor:
+                continue
+            if anterior is None:
+                adicoes.setdefault((mes_novo, metrica), []).append(valor)
+            else:
+                sujos.add((mes_novo, metrica))  # valor trocado: sketch não desfaz
+        # Métricas que deixaram de ter valor
+        sujos.update((mes_antigo, metrica) for metrica in antigos)
+
+    for id_cte, valores in pendente['anteriores'].items():
+        if id_cte not in atuais:  # removido
+            mes, antigos = SketchMensal.valores_cte(valores)
+            sujos.update((mes, metrica) for metrica in antigos)
+
+    SketchMensal.aplicar(session.connection(), adicoes, sujos)
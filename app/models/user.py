@@ -1,5 +1,7 @@
 from app import db
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
@@ -261,4 +263,52 @@ class User(UserMixin, db.Model):
         db.session.add(admin)
         db.session.commit()
         
-        return admin
\ No newline at end of file
+        return admin
+
+
+# ==================== INVALIDAÇÃO DE CACHES DO USUÁRIO ====================
+
+# Alterações que invalidam tokens JWT já verificados do usuário
+CAMPOS_REVOGAM_TOKENS = ('password_hash', 'ativo', 'email', 'username', 'tipo_usuario')
+
+
+def _invalidar_identidade(target):
+    """
+    Remove o usuário do cache de identidade no flush e de novo após o commit
+    (uma leitura entre os dois ainda veria a linha antiga)
+    """
+    from app.services.usuario_cache_service import invalidar_usuario
+    invalidar_usuario(target.id)
+    sessao = object_session(target)
+    if sessao is not None:
+        sessao.info.setdefault('usuarios_alterados', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_update')
+def _revogar_tokens_apos_alteracao(mapper, connection, target):
+    _invalidar_identidade(target)
+    estado = inspect(target)
+    if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_REVOGAM_TOKENS):
+        from app.services.jwt_integration import revogar_tokens_usuario
+        revogar_tokens_usuario(target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def _revogar_tokens_apos_exclusao(mapper, connection, target):
+    _invalidar_identidade(target)
+    from app.services.jwt_integration import revogar_tokens_usuario
+    revogar_tokens_usuario(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_identidades_apos_commit(session):
+    alterados = session.info.pop('usuarios_alterados', None)
+    if alterados:
+        from app.services.usuario_cache_service import invalidar_usuario
+        for user_id in alterados:
+            invalidar_usuario(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_usuarios_alterados(session):
+    session.info.pop('usuarios_alterados', None)
@@ -10,6 +10,11 @@ from flask_login import login_required
 from datetime import datetime, timedelta
 from app.models.cte import CTE
 from app import db
+from app.utils.roteamento_db import engine_leitura
+from app.services.receita_mensal_service import ReceitaMensalService
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.services.stress_test_service import StressTestEngine
+from app.services.projecoes_service import ProjecoesService
 from sqlalchemy import func, and_, desc, extract, text
 import logging
 import calendar
@@ -102,61 +107,17 @@ def api_metricas_mes_corrente():
         
         logger.info(f"Calculando métricas. Cliente: {filtro_cliente}, Dias: {filtro_dias}")
         
-        with db.engine.connect() as connection:
-            where_conditions = []
-            params = {}
-            
-            if data_inicio and data_fim:
-                where_conditions.append("data_emissao BETWEEN :data_inicio AND :data_fim")
-                params['data_inicio'] = data_inicio
-                params['data_fim'] = data_fim
-            else:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                where_conditions.append("data_emissao >= :data_limite")
-                params['data_limite'] = data_limite
-            
-            if filtro_cliente:
-                where_conditions.append("destinatario_nome ILIKE :filtro_cliente")
-                params['filtro_cliente'] = f'%{filtro_cliente}%'
-            
-            where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-            
-            sql_main = text(f"""
-                SELECT 
-                    COUNT(*) as total_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_total,
-                    COALESCE(AVG(valor_total), 0) as ticket_medio,
-                    COUNT(CASE WHEN data_baixa IS NOT NULL THEN 1 END) as ctes_com_baixa,
-                    COALESCE(SUM(CASE WHEN data_baixa IS NOT NULL THEN valor_total ELSE 0 END), 0) as valor_baixado,
-                    COUNT(CASE 
-                        WHEN envio_final IS NOT NULL THEN 1 
-                        WHEN envio_final IS NULL AND data_baixa IS NOT NULL THEN 1 
-                        END) as ctes_faturados,
-                    COALESCE(SUM(CASE 
-                        WHEN envio_final IS NOT NULL THEN valor_total 
-                        WHEN envio_final IS NULL AND data_baixa IS NOT NULL THEN valor_total 
-                        ELSE 0 END), 0) as receita_faturada,
-                    COUNT(CASE 
-                        WHEN data_inclusao_fatura IS NOT NULL THEN 1 
-                        WHEN data_inclusao_fatura IS NULL AND numero_fatura IS NOT NULL AND numero_fatura != '' THEN 1 
-                        END) as ctes_com_faturas,
-                    COALESCE(SUM(CASE 
-                        WHEN data_inclusao_fatura IS NOT NULL THEN valor_total 
-                        WHEN data_inclusao_fatura IS NULL AND numero_fatura IS NOT NULL AND numero_fatura != '' THEN valor_total 
-                        ELSE 0 END), 0) as receita_com_faturas
-                FROM dashboard_baker 
-                WHERE {where_clause}
-            """)
-            
-            result = connection.execute(sql_main, params).fetchone()
-            
-        receita_total = float(result.receita_total)
-        receita_faturada = float(result.receita_faturada)
-        receita_com_faturas_valor = float(result.receita_com_faturas)
+        inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        linhas = ReceitaMensalService.consultar_mensal('emissao', inicio, fim, filtro_cliente)
+        totais = ReceitaMensalService.totalizar(linhas)
+        
+        receita_total = totais['valor_total']
+        receita_faturada = totais['valor_faturado']
+        receita_com_faturas_valor = totais['valor_com_fatura']
         
         percentual_faturado = (receita_faturada / receita_total * 100) if receita_total > 0 else 0
         percentual_com_faturas = (receita_com_faturas_valor / receita_total * 100) if receita_total > 0 else 0
-        percentual_baixado = (float(result.valor_baixado) / receita_total * 100) if receita_total > 0 else 0
+        percentual_baixado = (totais['valor_baixado'] / receita_total * 100) if receita_total > 0 else 0
         
         if data_inicio and data_fim:
             periodo_str = f"{data_inicio} a {data_fim}"
@@ -178,29 +139,29 @@ def api_metricas_mes_corrente():
             },
             'metricas_basicas': {
                 'receita_mes_atual': receita_total,
-                'total_ctes': int(result.total_ctes),
-                'ticket_medio': float(result.ticket_medio),
-                'ctes_com_baixa': int(result.ctes_com_baixa),
-                'valor_baixado': float(result.valor_baixado),
+                'total_ctes': totais['quantidade'],
+                'ticket_medio': receita_total / totais['quantidade'] if totais['quantidade'] > 0 else 0,
+                'ctes_com_baixa': totais['quantidade_baixada'],
+                'valor_baixado': totais['valor_baixado'],
                 'percentual_baixado': percentual_baixado
             },
             'receita_faturada': {
                 'receita_total': receita_faturada,
-                'quantidade_ctes': int(result.ctes_faturados),
+                'quantidade_ctes': totais['quantidade_faturada'],
                 'percentual_total': percentual_faturado,
                 'variacao_percentual': 0,
                 'periodo_completo': periodo_str
             },
             'receita_com_faturas': {
                 'receita_total': receita_com_faturas_valor,
-                'quantidade_ctes': int(result.ctes_com_faturas),
-                'ticket_medio': receita_com_faturas_valor / int(result.ctes_com_faturas) if int(result.ctes_com_faturas) > 0 else 0,
+                'quantidade_ctes': totais['quantidade_com_fatura'],
+                'ticket_medio': receita_com_faturas_valor / totais['quantidade_com_fatura'] if totais['quantidade_com_fatura'] > 0 else 0,
                 'percentual_cobertura': percentual_com_faturas,
                 'periodo_completo': periodo_str
             }
         }
         
-        logger.info(f"Métricas calculadas: {result.total_ctes} CTEs, R$ {receita_total:,.2f}")
+        logger.info(f"Métricas calculadas: {totais['quantidade']} CTEs, R$ {receita_total:,.2f}")
         return jsonify(resultado)
         
     except Exception as e:
@@ -223,48 +184,15 @@ def api_receita_faturada():
         if filtro_cliente and filtro_cliente.lower() in ['todos', 'all', '']:
             filtro_cliente = None
         
-        with db.engine.connect() as connection:
-            where_conditions = []
-            params = {}
-            
-            if data_inicio and data_fim:
-                where_conditions.append("data_emissao BETWEEN :data_inicio AND :data_fim")
-                params['data_inicio'] = data_inicio
-                params['data_fim'] = data_fim
-            else:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                where_conditions.append("data_emissao >= :data_limite")
-                params['data_limite'] = data_limite
-            
-            if filtro_cliente:
-                where_conditions.append("destinatario_nome ILIKE :filtro_cliente")
-                params['filtro_cliente'] = f'%{filtro_cliente}%'
-            
-            where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-            
-            sql_receita_faturada = text(f"""
-                SELECT 
-                    COUNT(CASE 
-                        WHEN envio_final IS NOT NULL THEN 1 
-                        WHEN envio_final IS NULL AND data_baixa IS NOT NULL THEN 1 
-                        END) as qtd_faturada,
-                    COALESCE(SUM(CASE 
-                        WHEN envio_final IS NOT NULL THEN valor_total 
-                        WHEN envio_final IS NULL AND data_baixa IS NOT NULL THEN valor_total 
-                        ELSE 0 END), 0) as valor_faturada,
-                    COUNT(*) as total_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_total,
-                    EXTRACT(YEAR FROM COALESCE(envio_final, data_baixa)) as ano,
-                    EXTRACT(MONTH FROM COALESCE(envio_final, data_baixa)) as mes
-                FROM dashboard_baker 
-                WHERE {where_clause}
-                GROUP BY EXTRACT(YEAR FROM COALESCE(envio_final, data_baixa)), EXTRACT(MONTH FROM COALESCE(envio_final, data_baixa))
-                ORDER BY ano DESC, mes DESC
-            """)
-            
-            results = connection.execute(sql_receita_faturada, params).fetchall()
-            
-        if not results:
+        inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        totais = ReceitaMensalService.totalizar(
+            ReceitaMensalService.consultar_mensal('emissao', inicio, fim, filtro_cliente)
+        )
+        # Evolução pelo mês de faturamento (envio final, com fallback para baixa)
+        results = ReceitaMensalService.consultar_mensal('envio_final', inicio, fim, filtro_cliente)
+        results.reverse()
+        
+        if not totais['quantidade']:
             return jsonify({
                 'success': True,
                 'dados': {
@@ -277,9 +205,9 @@ def api_receita_faturada():
                 }
             })
         
-        receita_valor = sum(float(row.valor_faturada or 0) for row in results)
-        quantidade = sum(int(row.qtd_faturada or 0) for row in results)
-        receita_total_geral = sum(float(row.receita_total or 0) for row in results)
+        receita_valor = totais['valor_faturado']
+        quantidade = totais['quantidade_faturada']
+        receita_total_geral = totais['valor_total']
         
         percentual = (receita_valor / receita_total_geral * 100) if receita_total_geral > 0 else 0
         
@@ -289,11 +217,10 @@ def api_receita_faturada():
                       'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         
         for row in results[-12:]:
-            if row.ano and row.mes:
-                mes_nome = meses_nomes[int(row.mes) - 1]
-                label = f"{mes_nome}/{int(row.ano)}"
-                evolucao_labels.append(label)
-                evolucao_valores.append(float(row.valor_faturada or 0))
+            mes_nome = meses_nomes[row['mes_numero'] - 1]
+            label = f"{mes_nome}/{row['ano']}"
+            evolucao_labels.append(label)
+            evolucao_valores.append(row['valor_total'])
         
         if data_inicio and data_fim:
             periodo_str = f"{data_inicio} a {data_fim}"
@@ -346,48 +273,15 @@ def api_receita_com_faturas():
         if filtro_cliente and filtro_cliente.lower() in ['todos', 'all', '']:
             filtro_cliente = None
         
-        with db.engine.connect() as connection:
-            where_conditions = []
-            params = {}
-            
-            if data_inicio and data_fim:
-                where_conditions.append("data_emissao BETWEEN :data_inicio AND :data_fim")
-                params['data_inicio'] = data_inicio
-                params['data_fim'] = data_fim
-            else:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                where_conditions.append("data_emissao >= :data_limite")
-                params['data_limite'] = data_limite
-            
-            if filtro_cliente:
-                where_conditions.append("destinatario_nome ILIKE :filtro_cliente")
-                params['filtro_cliente'] = f'%{filtro_cliente}%'
-            
-            where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-            
-            sql_receita_faturas = text(f"""
-                SELECT 
-                    COUNT(CASE 
-                        WHEN data_inclusao_fatura IS NOT NULL THEN 1 
-                        WHEN data_inclusao_fatura IS NULL AND numero_fatura IS NOT NULL AND numero_fatura != '' THEN 1 
-                        END) as qtd_com_faturas,
-                    COALESCE(SUM(CASE 
-                        WHEN data_inclusao_fatura IS NOT NULL THEN valor_total 
-                        WHEN data_inclusao_fatura IS NULL AND numero_fatura IS NOT NULL AND numero_fatura != '' THEN valor_total 
-                        ELSE 0 END), 0) as valor_com_faturas,
-                    COUNT(*) as total_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_total,
-                    EXTRACT(YEAR FROM COALESCE(data_inclusao_fatura, data_emissao)) as ano,
-                    EXTRACT(MONTH FROM COALESCE(data_inclusao_fatura, data_emissao)) as mes
-                FROM dashboard_baker 
-                WHERE {where_clause}
-                GROUP BY EXTRACT(YEAR FROM COALESCE(data_inclusao_fatura, data_emissao)), EXTRACT(MONTH FROM COALESCE(data_inclusao_fatura, data_emissao))
-                ORDER BY ano DESC, mes DESC
-            """)
-            
-            results = connection.execute(sql_receita_faturas, params).fetchall()
+        inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        totais = ReceitaMensalService.totalizar(
+            ReceitaMensalService.consultar_mensal('emissao', inicio, fim, filtro_cliente)
+        )
+        # Gráfico pelo mês de inclusão da fatura
+        results = ReceitaMensalService.consultar_mensal('inclusao_fatura', inicio, fim, filtro_cliente)
+        results.reverse()
         
-        if not results:
+        if not totais['quantidade']:
             return jsonify({
                 'success': True,
                 'dados': {
@@ -401,9 +295,9 @@ def api_receita_com_faturas():
                 }
             })
         
-        receita_valor = sum(float(row.valor_com_faturas or 0) for row in results)
-        quantidade = sum(int(row.qtd_com_faturas or 0) for row in results)
-        total_ctes_geral = sum(int(row.total_ctes or 0) for row in results)
+        receita_valor = totais['valor_com_fatura']
+        quantidade = totais['quantidade_com_fatura']
+        total_ctes_geral = totais['quantidade']
         
         cobertura = (quantidade / total_ctes_geral * 100) if total_ctes_geral > 0 else 0
         ticket_medio = receita_valor / quantidade if quantidade > 0 else 0
@@ -414,11 +308,10 @@ def api_receita_com_faturas():
                       'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         
         for row in results[-12:]:
-            if row.ano and row.mes:
-                mes_nome = meses_nomes[int(row.mes) - 1]
-                label = f"{mes_nome}/{int(row.ano)}"
-                grafico_labels.append(label)
-                grafico_valores.append(float(row.valor_com_faturas or 0))
+            mes_nome = meses_nomes[row['mes_numero'] - 1]
+            label = f"{mes_nome}/{row['ano']}"
+            grafico_labels.append(label)
+            grafico_valores.append(row['valor_total'])
         
         if data_inicio and data_fim:
             periodo_str = f"{data_inicio} a {data_fim}"
@@ -472,38 +365,9 @@ def api_receita_media_mensal():
         if filtro_cliente and filtro_cliente.lower() in ['todos', 'all', '']:
             filtro_cliente = None
         
-        with db.engine.connect() as connection:
-            where_conditions = []
-            params = {}
-            
-            if data_inicio and data_fim:
-                where_conditions.append("data_emissao BETWEEN :data_inicio AND :data_fim")
-                params['data_inicio'] = data_inicio
-                params['data_fim'] = data_fim
-            else:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                where_conditions.append("data_emissao >= :data_limite")
-                params['data_limite'] = data_limite
-            
-            if filtro_cliente:
-                where_conditions.append("destinatario_nome ILIKE :filtro_cliente")
-                params['filtro_cliente'] = f'%{filtro_cliente}%'
-            
-            where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-            
-            sql_media_mensal = text(f"""
-                SELECT 
-                    EXTRACT(YEAR FROM data_emissao) as ano,
-                    EXTRACT(MONTH FROM data_emissao) as mes,
-                    COUNT(*) as qtd_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_mes
-                FROM dashboard_baker 
-                WHERE {where_clause}
-                GROUP BY EXTRACT(YEAR FROM data_emissao), EXTRACT(MONTH FROM data_emissao)
-                ORDER BY ano DESC, mes DESC
-            """)
-            
-            results = connection.execute(sql_media_mensal, params).fetchall()
+        inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        results = ReceitaMensalService.consultar_mensal('emissao', inicio, fim, filtro_cliente)
+        results.reverse()
         
         if not results:
             return jsonify({
@@ -519,7 +383,7 @@ def api_receita_media_mensal():
                 }
             })
         
-        receitas_mensais = [float(row.receita_mes) for row in results]
+        receitas_mensais = [row['valor_total'] for row in results]
         receita_media = sum(receitas_mensais) / len(receitas_mensais)
         receita_total = sum(receitas_mensais)
         maior_receita = max(receitas_mensais)
@@ -540,11 +404,10 @@ def api_receita_media_mensal():
                       'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         
         for row in reversed(results):
-            if row.ano and row.mes:
-                mes_nome = meses_nomes[int(row.mes) - 1]
-                label = f"{mes_nome}/{int(row.ano)}"
-                evolucao_labels.append(label)
-                evolucao_valores.append(float(row.receita_mes))
+            mes_nome = meses_nomes[row['mes_numero'] - 1]
+            label = f"{mes_nome}/{row['ano']}"
+            evolucao_labels.append(label)
+            evolucao_valores.append(row['valor_total'])
         
         dados = {
             'receita_media_mensal': receita_media,
@@ -592,39 +455,8 @@ def api_evolucao_receita_inclusao_fatura():
         if filtro_cliente and filtro_cliente.lower() in ['todos', 'all', '']:
             filtro_cliente = None
         
-        with db.engine.connect() as connection:
-            where_conditions = ['data_inclusao_fatura IS NOT NULL']
-            params = {}
-            
-            if data_inicio and data_fim:
-                where_conditions.append("data_inclusao_fatura BETWEEN :data_inicio AND :data_fim")
-                params['data_inicio'] = data_inicio
-                params['data_fim'] = data_fim
-            else:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                where_conditions.append("data_inclusao_fatura >= :data_limite")
-                params['data_limite'] = data_limite
-            
-            if filtro_cliente:
-                where_conditions.append("destinatario_nome ILIKE :filtro_cliente")
-                params['filtro_cliente'] = f'%{filtro_cliente}%'
-            
-            where_clause = " AND ".join(where_conditions)
-            
-            sql_evolucao = text(f"""
-                SELECT 
-                    EXTRACT(YEAR FROM data_inclusao_fatura) as ano,
-                    EXTRACT(MONTH FROM data_inclusao_fatura) as mes,
-                    COUNT(*) as qtd_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_mes,
-                    COALESCE(AVG(valor_total), 0) as ticket_medio_mes
-                FROM dashboard_baker 
-                WHERE {where_clause}
-                GROUP BY EXTRACT(YEAR FROM data_inclusao_fatura), EXTRACT(MONTH FROM data_inclusao_fatura)
-                ORDER BY ano, mes
-            """)
-            
-            results = connection.execute(sql_evolucao, params).fetchall()
+        inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        results = ReceitaMensalService.consultar_mensal('inclusao_fatura', inicio, fim, filtro_cliente)
         
         if not results:
             return jsonify({
@@ -652,14 +484,13 @@ def api_evolucao_receita_inclusao_fatura():
                       'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
         
         for row in results:
-            if row.ano and row.mes:
-                mes_nome = meses_nomes[int(row.mes) - 1]
-                label = f"{mes_nome}/{int(row.ano)}"
-                
-                labels.append(label)
-                valores.append(float(row.receita_mes))
-                quantidades.append(int(row.qtd_ctes))
-                ticket_medio_mensal.append(float(row.ticket_medio_mes))
+            mes_nome = meses_nomes[row['mes_numero'] - 1]
+            label = f"{mes_nome}/{row['ano']}"
+            
+            labels.append(label)
+            valores.append(row['valor_total'])
+            quantidades.append(row['quantidade'])
+            ticket_medio_mensal.append(row['valor_total'] / row['quantidade'])
         
         total_periodo = sum(valores)
         media_mensal = total_periodo / len(valores) if valores else 0
@@ -1009,29 +840,34 @@ def exportar_pdf_reportlab_simples(ctes, filtros_dict):
 # APIS AUXILIARES E COMPATIBILIDADE
 # ============================================================================
 
+def consulta_clientes(hoje):
+    """50 maiores clientes por receita nos últimos 180 dias"""
+    data_limite = hoje - timedelta(days=180)
+    tabela = ArquivoCTEService.tabela_periodo(data_limite)
+    return text(f"""
+        SELECT 
+            destinatario_nome,
+            COUNT(*) as total_ctes,
+            COALESCE(SUM(valor_total), 0) as receita_total
+        FROM {tabela} 
+        WHERE data_emissao >= :data_limite
+        AND destinatario_nome IS NOT NULL
+        AND destinatario_nome != ''
+        GROUP BY destinatario_nome
+        ORDER BY receita_total DESC
+        LIMIT 50
+    """).bindparams(data_limite=data_limite)
+
+
 @bp.route('/api/clientes')
 @login_required
 def api_clientes():
     """API para lista de clientes"""
     try:
-        data_limite = datetime.now().date() - timedelta(days=180)
-        
-        with db.engine.connect() as connection:
-            sql = text("""
-                SELECT 
-                    destinatario_nome,
-                    COUNT(*) as total_ctes,
-                    COALESCE(SUM(valor_total), 0) as receita_total
-                FROM dashboard_baker 
-                WHERE data_emissao >= :data_limite
-                AND destinatario_nome IS NOT NULL
-                AND destinatario_nome != ''
-                GROUP BY destinatario_nome
-                ORDER BY receita_total DESC
-                LIMIT 50
-            """)
+        with engine_leitura().connect() as connection:
+            sql = consulta_clientes(datetime.now().date())
             
-            result = connection.execute(sql, {"data_limite": data_limite}).fetchall()
+            result = connection.execute(sql).fetchall()
             
             clientes = []
             for row in result:
@@ -1065,6 +901,108 @@ def api_analise_completa():
             'error': str(e)
         }), 500
 
+@bp.route('/api/projecao-series')
+@login_required
+def api_projecao_series():
+    """
+    API para projeção por série (cliente ou veículo)
+    Parâmetros: dimensao=cliente|veiculo|total, nome (série específica),
+    meses_historico, meses_projecao, limite (maiores séries por receita projetada)
+    """
+    try:
+        dimensao = request.args.get('dimensao', 'cliente')
+        nome = request.args.get('nome', '').strip()
+        limite = int(request.args.get('limite', 50))
+        parametros = {
+            'meses_historico': int(request.args.get('meses_historico', 12)),
+            'meses_projecao': int(request.args.get('meses_projecao', 3))
+        }
+        
+        try:
+            lote = ProjecoesService.projecao_series(dimensao, **parametros)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if not lote.get('success'):
+            return jsonify(lote)
+        
+        series = lote['series']
+        if nome:
+            if dimensao == 'veiculo':
+                nome = nome.upper()
+            if nome not in series:
+                return jsonify({'success': False, 'error': f'Série não encontrada: {nome}'}), 404
+            selecionadas = {nome: series[nome]}
+        else:
+            ordenadas = sorted(series.items(), key=lambda item: item[1]['total_projetado'], reverse=True)
+            selecionadas = dict(ordenadas[:max(1, limite)])
+        
+        return jsonify({**lote, 'series': selecionadas, 'series_retornadas': len(selecionadas)})
+        
+    except Exception as e:
+        logger.error(f"Erro na projeção por séries: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/comparacao-temporal')
+@login_required
+def api_comparacao_temporal():
+    """API para comparativo do período atual vs 2 meses e 1 ano atrás"""
+    try:
+        filtro_dias = int(request.args.get('filtro_dias', 30))
+        resultado = ProjecoesService.analise_comparativa_periodos(filtro_dias)
+        return jsonify(resultado), 200 if resultado.get('success') else 500
+        
+    except Exception as e:
+        logger.error(f"Erro no comparativo temporal: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/api/comparacao-periodos')
+@login_required
+def api_comparacao_periodos():
+    """
+    API para comparação com N janelas em uma única consulta
+    Parâmetros: filtro_dias, comparacoes=wow,mom,2m,qoq,yoy,
+    janela=nome:AAAA-MM-DD:AAAA-MM-DD (pode repetir)
+    """
+    try:
+        filtro_dias = int(request.args.get('filtro_dias', 30))
+        comparacoes = [c.strip().lower() for c in request.args.get('comparacoes', 'mom,yoy').split(',') if c.strip()]
+        
+        personalizadas = []
+        for janela in request.args.getlist('janela'):
+            try:
+                nome, inicio, fim = janela.split(':')
+                personalizadas.append((
+                    nome,
+                    datetime.strptime(inicio, '%Y-%m-%d').date(),
+                    datetime.strptime(fim, '%Y-%m-%d').date()
+                ))
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': f'Janela inválida: {janela} (use nome:AAAA-MM-DD:AAAA-MM-DD)'
+                }), 400
+        
+        try:
+            resultado = ProjecoesService.comparar_janelas(filtro_dias, comparacoes, personalizadas)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify(resultado)
+        
+    except Exception as e:
+        logger.error(f"Erro na comparação de períodos: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/api/diagnostico-completo')
 @login_required
 def api_diagnostico_completo():
@@ -1072,7 +1010,7 @@ def api_diagnostico_completo():
     try:
         diagnostico = {}
         
-        with db.engine.connect() as connection:
+        with engine_leitura().connect() as connection:
             total_ctes = connection.execute(text('SELECT COUNT(*) FROM dashboard_baker')).scalar()
             diagnostico['total_ctes'] = total_ctes
             
@@ -1218,22 +1156,15 @@ def api_metricas_forcadas():
             filtro_cliente = None
         
         # Aplicar filtros usando SQLAlchemy ORM (mais seguro)
-        query = CTE.query
-        
-        if data_inicio and data_fim:
-            try:
-                data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                query = query.filter(CTE.data_emissao.between(data_inicio_obj, data_fim_obj))
-            except:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                query = query.filter(CTE.data_emissao >= data_limite)
-        else:
-            data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-            query = query.filter(CTE.data_emissao >= data_limite)
+        try:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        except ValueError:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias)
+        # Períodos anteriores ao horizonte do arquivo leem a view histórica
+        modelo, query = ArquivoCTEService.consulta_periodo(inicio, fim)
         
         if filtro_cliente:
-            query = query.filter(CTE.destinatario_nome.ilike(f'%{filtro_cliente}%'))
+            query = query.filter(modelo.destinatario_nome.ilike(f'%{filtro_cliente}%'))
         
         # Buscar todos os CTEs que atendem aos filtros
         ctes = query.all()
@@ -1431,25 +1362,18 @@ def api_graficos_simples():
             filtro_cliente = None
         
         # Aplicar filtros
-        query = CTE.query
-        
-        if data_inicio and data_fim:
-            try:
-                data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                query = query.filter(CTE.data_emissao.between(data_inicio_obj, data_fim_obj))
-            except:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                query = query.filter(CTE.data_emissao >= data_limite)
-        else:
-            data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-            query = query.filter(CTE.data_emissao >= data_limite)
+        try:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        except ValueError:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias)
+        # Períodos anteriores ao horizonte do arquivo leem a view histórica
+        modelo, query = ArquivoCTEService.consulta_periodo(inicio, fim)
         
         if filtro_cliente:
-            query = query.filter(CTE.destinatario_nome.ilike(f'%{filtro_cliente}%'))
+            query = query.filter(modelo.destinatario_nome.ilike(f'%{filtro_cliente}%'))
         
         # Filtrar apenas CTEs com valor
-        query = query.filter(CTE.valor_total.isnot(None), CTE.valor_total > 0)
+        query = query.filter(modelo.valor_total.isnot(None), modelo.valor_total > 0)
         ctes = query.all()
         
         if not ctes:
@@ -1615,29 +1539,22 @@ def api_top_clientes():
             filtro_cliente = None
         
         # Aplicar filtros
-        query = CTE.query
-        
-        if data_inicio and data_fim:
-            try:
-                data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                query = query.filter(CTE.data_emissao.between(data_inicio_obj, data_fim_obj))
-            except:
-                data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-                query = query.filter(CTE.data_emissao >= data_limite)
-        else:
-            data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-            query = query.filter(CTE.data_emissao >= data_limite)
+        try:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias, data_inicio, data_fim)
+        except ValueError:
+            inicio, fim = ReceitaMensalService.periodo_filtros(filtro_dias)
+        # Períodos anteriores ao horizonte do arquivo leem a view histórica
+        modelo, query = ArquivoCTEService.consulta_periodo(inicio, fim)
         
         if filtro_cliente:
-            query = query.filter(CTE.destinatario_nome.ilike(f'%{filtro_cliente}%'))
+            query = query.filter(modelo.destinatario_nome.ilike(f'%{filtro_cliente}%'))
         
         # Buscar CTEs com cliente e valor
         query = query.filter(
-            CTE.destinatario_nome.isnot(None),
-            CTE.destinatario_nome != '',
-            CTE.valor_total.isnot(None),
-            CTE.valor_total > 0
+            modelo.destinatario_nome.isnot(None),
+            modelo.destinatario_nome != '',
+            modelo.valor_total.isnot(None),
+            modelo.valor_total > 0
         )
         
         ctes = query.all()
@@ -1706,95 +1623,64 @@ def api_top_clientes():
             'top_clientes': []
         }), 500
 
-@bp.route('/api/stress-test')
+@bp.route('/api/stress-test', methods=['GET', 'POST'])
 @login_required
 def api_stress_test():
-    """API para stress test - VERSÃO SIMPLES"""
+    """
+    API para stress test
+    GET: cenários padrão
+    POST: {"filtro_dias": 180, "filtro_cliente": null, "cenarios": [
+              {"tipo": "top_k", "k": 3},
+              {"tipo": "participacao_acima", "limite_percentual": 10},
+              {"tipo": "clientes", "clientes": ["CLIENTE X"]},
+              {"tipo": "reducao_geral", "percentual": 20},
+              {"tipo": "monte_carlo", "probabilidade_padrao": 0.05,
+               "probabilidades": {"CLIENTE X": 0.3}, "simulacoes": 100000}
+          ]}
+    """
     try:
-        # Buscar top cliente para calcular impacto
-        filtro_dias = int(request.args.get('filtro_dias', 180))
-        data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-        
-        # Buscar receita por cliente
-        query = CTE.query.filter(
-            CTE.data_emissao >= data_limite,
-            CTE.destinatario_nome.isnot(None),
-            CTE.destinatario_nome != '',
-            CTE.valor_total.isnot(None),
-            CTE.valor_total > 0
-        )
+        payload = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        filtro_dias = int(payload.get('filtro_dias', request.args.get('filtro_dias', 180)))
+        filtro_cliente = payload.get('filtro_cliente') or None
         
-        ctes = query.all()
+        engine = StressTestEngine.do_banco(filtro_dias, filtro_cliente)
         
-        if not ctes:
+        if engine.receita_total <= 0:
             return jsonify({
                 'success': True,
                 'cenarios': [],
                 'receita_total': 0
             })
         
-        # Agrupar por cliente
-        clientes_receita = {}
-        receita_total = 0
-        
-        for cte in ctes:
-            nome = cte.destinatario_nome.strip()
-            receita = float(cte.valor_total or 0)
-            receita_total += receita
-            
-            if nome not in clientes_receita:
-                clientes_receita[nome] = 0.0
-            clientes_receita[nome] += receita
-        
-        # Ordenar clientes por receita
-        clientes_ordenados = sorted(clientes_receita.items(), key=lambda x: x[1], reverse=True)
-        
-        # Criar cenários de stress test
-        cenarios = []
-        
-        if len(clientes_ordenados) > 0:
-            # Cenário 1: Perda do top cliente
-            top_cliente_receita = clientes_ordenados[0][1]
-            impacto_top = (top_cliente_receita / receita_total * 100) if receita_total > 0 else 0
-            
-            cenarios.append({
-                'cenario': 'Perda do Top Cliente',
-                'icon': '⚠️',
-                'receita_perdida': top_cliente_receita,
-                'percentual_impacto': impacto_top,
-                'receita_restante': receita_total - top_cliente_receita,
-                'descricao': f'Impacto da perda de {clientes_ordenados[0][0]}'
-            })
-        
-        if len(clientes_ordenados) >= 3:
-            # Cenário 2: Perda dos top 3 clientes
-            top3_receita = sum(cliente[1] for cliente in clientes_ordenados[:3])
-            impacto_top3 = (top3_receita / receita_total * 100) if receita_total > 0 else 0
+        if request.method == 'POST':
+            definicoes = payload.get('cenarios')
+            if not isinstance(definicoes, list) or not definicoes:
+                return jsonify({
+                    'success': False,
+                    'error': 'Informe "cenarios" como lista de definições'
+                }), 400
+            try:
+                cenarios = engine.executar(definicoes)
+            except (ValueError, TypeError) as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        else:
+            definicoes = [{'tipo': 'top_k', 'k': 1, 'nome': 'Perda do Top Cliente', 'icon': '⚠️'}]
+            if len(engine.receitas) >= 3:
+                definicoes.append({'tipo': 'top_k', 'k': 3, 'nome': 'Perda Top 3 Clientes', 'icon': '🚨',
+                                   'descricao': 'Cenário de maior risco'})
+            definicoes.append({'tipo': 'reducao_geral', 'percentual': 20, 'nome': 'Redução Geral 20%',
+                               'icon': '📉', 'descricao': 'Cenário de crise moderada'})
             
-            cenarios.append({
-                'cenario': 'Perda Top 3 Clientes',
-                'icon': '🚨',
-                'receita_perdida': top3_receita,
-                'percentual_impacto': impacto_top3,
-                'receita_restante': receita_total - top3_receita,
-                'descricao': 'Cenário de maior risco'
-            })
-        
-        # Cenário 3: Redução geral de 20%
-        reducao_20 = receita_total * 0.20
-        cenarios.append({
-            'cenario': 'Redução Geral 20%',
-            'icon': '📉',
-            'receita_perdida': reducao_20,
-            'percentual_impacto': 20.0,
-            'receita_restante': receita_total - reducao_20,
-            'descricao': 'Cenário de crise moderada'
-        })
+            cenarios = engine.executar(definicoes)
+            for definicao, cenario in zip(definicoes, cenarios):
+                cenario['icon'] = definicao['icon']
+                cenario['descricao'] = definicao.get('descricao') or f"Impacto da perda de {cenario['clientes'][0]}"
         
         return jsonify({
             'success': True,
             'cenarios': cenarios,
-            'receita_total': receita_total
+            'receita_total': engine.receita_total,
+            'resumo': engine.resumo()
         })
         
     except Exception as e:
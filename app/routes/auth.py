@@ -2,21 +2,24 @@
 # VERSÃO CORRIGIDA - Remove conflito de rotas api_profile
 # Integrado com SSO Transpontual
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models.user import User
 from app import db
 from datetime import datetime
+import logging
 
 # Importar integração SSO
 from app.services.jwt_integration import (
     decode_jwt_token,
     get_cross_system_navigation_links,
     create_user_sso_token,
+    revogar_token_jwt,
     UNIFIED_AUTH_AVAILABLE
 )
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
+logger = logging.getLogger(__name__)
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -56,6 +59,7 @@ def login():
 def logout():
     """Logout do usuário"""
     flash(f'Até logo, {current_user.username}!', 'info')
+    revogar_token_jwt(session.pop('jwt_token', None))
     logout_user()
     return redirect(url_for('auth.login'))
 
@@ -358,7 +362,7 @@ def sso_login():
         return redirect(url_for('dashboard.index'))
 
     except Exception as e:
-        print(f"❌ Erro no SSO login: {e}")
+        logger.error(f"❌ Erro no SSO login: {e}")
         flash('Erro interno no processo de SSO', 'error')
         return redirect(url_for('auth.login'))
 
@@ -378,7 +382,7 @@ def api_sso_links():
         })
 
     except Exception as e:
-        print(f"❌ Erro obtendo links SSO: {e}")
+        logger.error(f"❌ Erro obtendo links SSO: {e}")
         return jsonify({
             'success': False,
             'error': 'Erro interno',
@@ -409,7 +413,7 @@ def api_create_sso_token():
         })
 
     except Exception as e:
-        print(f"❌ Erro criando token SSO: {e}")
+        logger.error(f"❌ Erro criando token SSO: {e}")
         return jsonify({
             'success': False,
             'error': 'Erro interno'
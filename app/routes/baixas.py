@@ -5,7 +5,7 @@ from app import db
 from datetime import datetime, timedelta
 import pandas as pd
 import io
-from sqlalchemy import func
+from sqlalchemy import func, select
 import logging
 from typing import Dict, List, Tuple, Optional
 from werkzeug.utils import secure_filename
@@ -415,22 +415,25 @@ def conciliacao():
         flash(f'Erro ao carregar página de conciliação: {str(e)}', 'error')
         return redirect(url_for('baixas.index'))
 
+def consulta_historico(hoje):
+    """Baixas por dia nos últimos 30 dias, mais recentes primeiro"""
+    return select(
+        func.date(CTE.data_baixa).label('data'),
+        func.count(CTE.id).label('quantidade'),
+        func.sum(CTE.valor_total).label('valor_total')
+    ).where(
+        CTE.data_baixa >= hoje - timedelta(days=30)
+    ).group_by(
+        func.date(CTE.data_baixa)
+    ).order_by(
+        func.date(CTE.data_baixa).desc()
+    )
+
 @bp.route('/historico')
 @login_required
 def historico():
     try:
-        data_limite = datetime.now().date() - timedelta(days=30)
-        historico_baixas = db.session.query(
-            func.date(CTE.data_baixa).label('data'),
-            func.count(CTE.id).label('quantidade'),
-            func.sum(CTE.valor_total).label('valor_total')
-        ).filter(
-            CTE.data_baixa >= data_limite
-        ).group_by(
-            func.date(CTE.data_baixa)
-        ).order_by(
-            func.date(CTE.data_baixa).desc()
-        ).all()
+        historico_baixas = db.session.execute(consulta_historico(datetime.now().date())).all()
         return render_template('baixas/historico.html', historico=historico_baixas)
     except Exception as e:
         flash(f'Erro ao carregar histórico: {str(e)}', 'error')
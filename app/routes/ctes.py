@@ -9,6 +9,7 @@ from datetime import datetime, date, timedelta
 from typing import Optional, Dict, Any, Tuple
 import traceback
 import io
+import time
 import pandas as pd
 from io import BytesIO
 
@@ -22,7 +23,10 @@ from werkzeug.utils import secure_filename
 
 # Imports locais
 from app.models.cte import CTE
+from app.services.arquivo_cte_service import ArquivoCTEService
 from app import db
+from app.utils.roteamento_db import engine_leitura
+from app.services.indice_facetas_service import DIMENSOES, IndiceFacetas
 
 # Decorator customizado para APIs
 from functools import wraps
@@ -311,50 +315,29 @@ def api_listar():
                                f"status_processo='{status_processo}', período='{data_inicio}' a '{data_fim}', "
                                f"page={page}, per_page={per_page}")
 
-        # Construção da query
-        query = CTE.query
+        di = _parse_date_filter(data_inicio)
+        dfim = _parse_date_filter(data_fim)
 
-        # Filtro de busca textual
-        if search:
-            try:
-                if search.isdigit():
-                    numero_cte = int(search)
-                    query = query.filter(CTE.numero_cte == numero_cte)
-                else:
-                    pattern = f"%{search}%"
-                    query = query.filter(or_(
-                        CTE.destinatario_nome.ilike(pattern),
-                        CTE.numero_fatura.ilike(pattern),
-                        CTE.veiculo_placa.ilike(pattern),
-                        CTE.observacao.ilike(pattern),
-                    ))
-            except Exception as e:
-                current_app.logger.warning(f"Erro no filtro de busca: {e}")
-
-        # Filtro por status de baixa
-        if status_baixa == 'com_baixa':
-            query = query.filter(CTE.data_baixa.isnot(None))
-        elif status_baixa == 'sem_baixa':
-            query = query.filter(CTE.data_baixa.is_(None))
-
-        # Filtro por período
-        if data_inicio or data_fim:
-            di = _parse_date_filter(data_inicio)
-            df = _parse_date_filter(data_fim)
-            if di:
-                query = query.filter(CTE.data_emissao >= di)
-            if df:
-                query = query.filter(CTE.data_emissao <= df)
-
-        # Execução e paginação
-        total_registros = query.count()
-        pagination = query.order_by(CTE.numero_cte.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Contagem e página pelo índice de bitmaps em memória
+        try:
+            resultado = IndiceFacetas.atual().consultar(
+                filtros={'status_baixa': [status_baixa], 'status_processo': [status_processo]},
+                data_inicio=di, data_fim=dfim, busca=search,
+                pagina=page, por_pagina=per_page
+            )
+            total_registros = resultado['total']
+            ctes_pagina = _ctes_por_ids(resultado['ids'])
+        except Exception as e:
+            current_app.logger.warning(f"Índice de facetas indisponível, consultando o banco: {e}")
+            total_registros, ctes_pagina = _listar_via_banco(
+                search, status_baixa, status_processo, di, dfim, page, per_page
+            )
+
+        total_paginas = (total_registros + per_page - 1) // per_page
 
         # Serialização dos dados
         items = []
-        for cte in pagination.items:
+        for cte in ctes_pagina:
             try:
                 item_dict = cte.to_dict()
                 items.append(item_dict)
@@ -368,12 +351,12 @@ def api_listar():
             'data': items,
             'ctes': items,
             'pagination': {
-                'total': pagination.total,
-                'pages': pagination.pages,
+                'total': total_registros,
+                'pages': total_paginas,
                 'current_page': page,
                 'per_page': per_page,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev,
+                'has_next': page < total_paginas,
+                'has_prev': page > 1,
             },
             'filters': {
                 'search': search,
@@ -395,14 +378,60 @@ def api_listar():
         current_app.logger.exception("Erro crítico na API de listagem")
         return _error_response(str(e), "Erro interno do servidor", 500)
 
+@bp.route('/api/facetas')
+@api_login_required
+def api_facetas():
+    """
+    Contagens por faceta para uma combinação de filtros (índice em memória)
+    Dimensões: status_baixa, status_processo, etapa, fatura, mes, cliente
+    Valores múltiplos por dimensão (repetindo o parâmetro ou separados por vírgula)
+    são combinados com OR; dimensões diferentes com AND
+    """
+    try:
+        filtros = {}
+        for dimensao in DIMENSOES:
+            valores = []
+            for valor in request.args.getlist(dimensao):
+                valores += [v.strip() for v in valor.split(',')] if dimensao != 'cliente' else [valor.strip()]
+            filtros[dimensao] = [v for v in valores if v]
+
+        limite = request.args.get('limite', type=int)
+        inicio = time.perf_counter()
+        indice = IndiceFacetas.atual()
+        resultado = indice.consultar(
+            filtros=filtros,
+            data_inicio=_parse_date_filter((request.args.get('data_inicio') or '').strip()),
+            data_fim=_parse_date_filter((request.args.get('data_fim') or '').strip()),
+            busca=(request.args.get('search') or '').strip(),
+            por_pagina=0, com_facetas=True, limite_valores=limite
+        )
+
+        return jsonify({
+            'success': True,
+            'total': resultado['total'],
+            'facetas': resultado['facetas'],
+            'filters': {dimensao: valores for dimensao, valores in filtros.items() if valores},
+            'meta': {
+                'total_ctes': indice.total,
+                'tempo_ms': round((time.perf_counter() - inicio) * 1000, 3),
+                'timestamp': datetime.now().isoformat()
+            }
+        })
+
+    except ValueError as e:
+        return _error_response(str(e), "Filtro inválido", 400)
+    except Exception as e:
+        current_app.logger.exception("Erro na API de facetas")
+        return _error_response(str(e), "Erro interno do servidor", 500)
+
 # ==================== APIS ESPECÍFICAS ====================
 
 @bp.route("/api/buscar/<int:numero_cte>")
 @api_login_required
 def api_buscar_cte(numero_cte: int):
-    """Buscar CTE específico por número"""
+    """Buscar CTE específico por número (inclui arquivados)"""
     try:
-        cte = CTE.query.filter_by(numero_cte=numero_cte).first()
+        cte = ArquivoCTEService.buscar(numero_cte)
         if not cte:
             return _error_response(
                 f"CTE {numero_cte} não encontrado", 
@@ -446,9 +475,9 @@ def api_criar_cte():
 @bp.route("/api/atualizar/<int:numero_cte>", methods=["PUT"])
 @api_login_required
 def api_atualizar_cte(numero_cte: int):
-    """Atualizar CTE existente"""
+    """Atualizar CTE existente (arquivado volta à tabela ativa)"""
     try:
-        cte = CTE.query.filter_by(numero_cte=numero_cte).first()
+        cte = CTE.buscar_por_numero(numero_cte, desarquivar=True)
         if not cte:
             return _error_response(f"CTE {numero_cte} não encontrado", "Registro não encontrado", 404)
         
@@ -473,9 +502,9 @@ def api_atualizar_cte(numero_cte: int):
 @bp.route("/api/excluir/<int:numero_cte>", methods=["DELETE"])
 @api_login_required
 def api_excluir_cte(numero_cte: int):
-    """Excluir CTE"""
+    """Excluir CTE (arquivado volta à tabela ativa antes da exclusão)"""
     try:
-        cte = CTE.query.filter_by(numero_cte=numero_cte).first()
+        cte = CTE.buscar_por_numero(numero_cte, desarquivar=True)
         if not cte:
             return _error_response(f"CTE {numero_cte} não encontrado", "Registro não encontrado", 404)
         
@@ -859,6 +888,59 @@ def _extrair_amostra_csv(linhas: list) -> list:
 # ==================== CORREÇÃO FINAL DO ARQUIVO ctes.py ====================
 # SUBSTITUA todo o final do arquivo a partir da função _cte_fallback_dict()
 
+def _ctes_por_ids(ids) -> list:
+    """Carrega os CTEs de uma página preservando a ordem dos ids"""
+    if not ids:
+        return []
+    # O índice de facetas inclui CTEs arquivados
+    por_id = ArquivoCTEService.carregar_por_ids(ids)
+    return [por_id[i] for i in ids if i in por_id]
+
+def _listar_via_banco(search: str, status_baixa: str, status_processo: str, di: Optional[date],
+                      dfim: Optional[date], page: int, per_page: int) -> Tuple[int, list]:
+    """Listagem direto no banco (fallback do índice de facetas)"""
+    query = CTE.query
+
+    # Filtro de busca textual
+    if search:
+        if search.isdigit():
+            query = query.filter(CTE.numero_cte == int(search))
+        else:
+            pattern = f"%{search}%"
+            query = query.filter(or_(
+                CTE.destinatario_nome.ilike(pattern),
+                CTE.numero_fatura.ilike(pattern),
+                CTE.veiculo_placa.ilike(pattern),
+                CTE.observacao.ilike(pattern),
+            ))
+
+    # Filtro por status de baixa
+    if status_baixa == 'com_baixa':
+        query = query.filter(CTE.data_baixa.isnot(None))
+    elif status_baixa == 'sem_baixa':
+        query = query.filter(CTE.data_baixa.is_(None))
+
+    # Filtro por status do processo (todas as etapas preenchidas)
+    completo = and_(
+        CTE.data_emissao.isnot(None), CTE.primeiro_envio.isnot(None),
+        CTE.data_atesto.isnot(None), CTE.envio_final.isnot(None)
+    )
+    if status_processo == 'completo':
+        query = query.filter(completo)
+    elif status_processo == 'incompleto':
+        query = query.filter(~completo)
+
+    # Filtro por período
+    if di:
+        query = query.filter(CTE.data_emissao >= di)
+    if dfim:
+        query = query.filter(CTE.data_emissao <= dfim)
+
+    pagination = query.order_by(CTE.numero_cte.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    return pagination.total, pagination.items
+
 def _cte_fallback_dict(cte) -> Dict[str, Any]:
     """Fallback seguro para serialização de CTE"""
     return {
@@ -1524,7 +1606,7 @@ def api_relatorios_veiculo():
         """
 
         try:
-            df = pd.read_sql_query(sql_query, db.engine)
+            df = pd.read_sql_query(sql_query, engine_leitura())
         except Exception as sql_error:
             current_app.logger.error(f"Erro na consulta SQL: {sql_error}")
             current_app.logger.error(f"SQL: {sql_query}")
@@ -3,19 +3,25 @@ from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
 from app.models.cte import CTE
 from app.models.permissions import PermissionManager
+from app.services.arquivo_cte_service import ArquivoCTEService
 from app import db
-from datetime import datetime, timedelta
+from app.utils.roteamento_db import engine_leitura
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
 import pandas as pd
+import logging
 import sys
 import os
 
+logger = logging.getLogger(__name__)
+
 # Mantido: compat para serviços opcionais
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
 try:
     from app.services.metricas_service import MetricasService
     METRICAS_SERVICE_OK = True
 except Exception as e:
-    print(f"[AVISO] MetricasService nao disponivel: {e}")
+    logger.warning(f"MetricasService nao disponivel: {e}")
     METRICAS_SERVICE_OK = False
 
 bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
@@ -84,21 +90,22 @@ def api_debug():
 def api_metricas():
     """API para métricas do dashboard principal"""
     try:
-        # Obter estatísticas básicas dos CTEs
-        total_ctes = CTE.query.count()
+        # Totais de todo o histórico (tabela ativa + arquivo)
+        modelo = ArquivoCTEService.modelo_periodo()
+        total_ctes = db.session.query(modelo).count()
 
         # Receita total
-        receita_total = db.session.query(db.func.sum(CTE.valor_total)).scalar() or 0
+        receita_total = db.session.query(db.func.sum(modelo.valor_total)).scalar() or 0
 
         # Processos completos (CTEs com envio_final preenchido)
-        processos_completos = CTE.query.filter(CTE.envio_final.isnot(None)).count()
+        processos_completos = db.session.query(modelo).filter(modelo.envio_final.isnot(None)).count()
 
         # Alertas pendentes (CTEs sem primeiro_envio há mais de 30 dias)
         from datetime import datetime, timedelta
         data_limite = datetime.now() - timedelta(days=30)
-        alertas_pendentes = CTE.query.filter(
-            CTE.primeiro_envio.is_(None),
-            CTE.data_emissao < data_limite
+        alertas_pendentes = db.session.query(modelo).filter(
+            modelo.primeiro_envio.is_(None),
+            modelo.data_emissao < data_limite
         ).count()
 
         return jsonify({
@@ -124,7 +131,7 @@ def api_dashboard_metricas():
     try:
         return _calcular_metricas_completas()
     except Exception as e:
-        print(f"[ERROR] Erro na API de métricas: {e}")
+        logger.error(f"Erro na API de métricas: {e}")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -150,7 +157,7 @@ def _carregar_df_cte() -> pd.DataFrame:
         """
         
         # ✅ Usando connection() ao invés de bind para evitar warnings
-        df = pd.read_sql_query(sql_query, db.engine)
+        df = pd.read_sql_query(sql_query, engine_leitura())
         
         # Consertos de tipo
         if 'valor_total' in df.columns:
@@ -164,11 +171,11 @@ def _carregar_df_cte() -> pd.DataFrame:
             if col in df.columns:
                 df[col] = pd.to_datetime(df[col], errors='coerce')
 
-        print(f"[OK] DataFrame carregado: {len(df)} registros")
+        logger.debug(f"DataFrame carregado: {len(df)} registros")
         return df
         
     except Exception as e:
-        print(f"[ERRO] Erro ao carregar DataFrame: {e}")
+        logger.error(f"Erro ao carregar DataFrame: {e}")
         # Fallback: retornar DataFrame vazio com colunas necessárias
         return pd.DataFrame(columns=[
             'numero_cte', 'destinatario_nome', 'veiculo_placa', 'valor_total',
@@ -182,7 +189,7 @@ def _calcular_metricas_completas():
     df = _carregar_df_cte()
 
     if df.empty:
-        print("[WARN] DataFrame vazio - retornando métricas zeradas")
+        logger.warning("DataFrame vazio - retornando métricas zeradas")
         return jsonify({
             'success': True,
             'metricas': _metricas_vazias(),
@@ -193,7 +200,7 @@ def _calcular_metricas_completas():
             'total_registros': 0
         })
 
-    print(f"[CALC] Calculando métricas para {len(df)} registros")
+    logger.debug(f"Calculando métricas para {len(df)} registros")
     metricas = _metricas_basicas(df)
     alertas = calcular_alertas_inteligentes(df)  # ✅ CORRIGIDO!
     variacoes = _variacoes(df)
@@ -272,7 +279,7 @@ def _metricas_basicas(df: pd.DataFrame) -> dict:
                     if len(receita) >= 2 and float(receita.iloc[-2]) > 0:
                         crescimento_mensal = float((receita.iloc[-1] - receita.iloc[-2]) / receita.iloc[-2] * 100)
             except Exception as e:
-                print(f"[WARN] Erro no cálculo de receita mensal: {e}")
+                logger.warning(f"Erro no cálculo de receita mensal: {e}")
 
         return {
             'total_ctes': total_ctes,
@@ -300,7 +307,7 @@ def _metricas_basicas(df: pd.DataFrame) -> dict:
         }
         
     except Exception as e:
-        print(f"[ERROR] Erro no cálculo de métricas básicas: {e}")
+        logger.error(f"Erro no cálculo de métricas básicas: {e}")
         return _metricas_vazias()
 
 def _alertas(df: pd.DataFrame) -> dict:
@@ -336,7 +343,7 @@ def _alertas(df: pd.DataFrame) -> dict:
                     base[extra_field] = None
                 return base
             except Exception as e:
-                print(f"[WARN] Erro ao criar item de alerta: {e}")
+                logger.warning(f"Erro ao criar item de alerta: {e}")
                 return {'numero_cte': 0, 'destinatario_nome': 'Erro', 'valor_total': 0.0, extra_field: None}
 
         # 1) Primeiro envio pendente (>1 dias após emissão)
@@ -396,66 +403,10 @@ def _alertas(df: pd.DataFrame) -> dict:
                 }
 
     except Exception as e:
-        print(f"[WARN] Erro no cálculo de alertas: {e}")
+        logger.warning(f"Erro no cálculo de alertas: {e}")
 
     return alertas
 
-def _variacoes(df: pd.DataFrame) -> dict:
-    """Calcula variações de tempo entre processos"""
-    configs = [
-        ('rq_tmc_primeiro_envio', 'RQ/TMC - 1º Envio', 'data_rq_tmc', 'primeiro_envio', 3),
-        ('primeiro_envio_atesto', '1º Envio - Atesto', 'primeiro_envio', 'data_atesto', 7),
-        ('atesto_envio_final', 'Atesto - Envio Final', 'data_atesto', 'envio_final', 2),
-        ('cte_inclusao_fatura', 'CTE - Inclusão Fatura', 'data_emissao', 'data_inclusao_fatura', 2),
-        ('cte_baixa', 'CTE - Baixa', 'data_emissao', 'data_baixa', 30),
-    ]
-    
-    out = {}
-    if df.empty:
-        return out
-
-    try:
-        for code, nome, inicio, fim, meta in configs:
-            if inicio in df.columns and fim in df.columns:
-                m = df[inicio].notna() & df[fim].notna()
-                if not m.any():
-                    continue
-                
-                _dif = (df.loc[m, fim] - df.loc[m, inicio]).dt.days
-                _dif = _dif[_dif >= 0]  # Apenas diferenças positivas
-                
-                if len(_dif) == 0:
-                    continue
-                
-                media = float(_dif.mean())
-                mediana = float(_dif.median())
-                
-                # Determinar performance
-                if media <= meta:
-                    perf = 'excelente'
-                elif media <= meta * 1.5:
-                    perf = 'bom'
-                elif media <= meta * 2:
-                    perf = 'atencao'
-                else:
-                    perf = 'critico'
-                
-                out[code] = {
-                    'nome': nome,
-                    'media': round(media, 1),
-                    'mediana': round(mediana, 1),
-                    'qtd': int(len(_dif)),
-                    'meta_dias': int(meta),
-                    'performance': perf,
-                    'min': int(_dif.min()),
-                    'max': int(_dif.max())
-                }
-                
-    except Exception as e:
-        print(f"[WARN] Erro no cálculo de variações: {e}")
-
-    return out
-
 def _graficos(df: pd.DataFrame) -> dict:
     """Gera dados para gráficos do dashboard"""
     graficos = {
@@ -492,7 +443,7 @@ def _graficos(df: pd.DataFrame) -> dict:
                             'quantidades': [int(q) for q in receita['qtd']]
                         }
             except Exception as e:
-                print(f"[WARN] Erro na evolução mensal: {e}")
+                logger.warning(f"Erro na evolução mensal: {e}")
 
         # Top clientes
         if 'destinatario_nome' in df.columns:
@@ -506,7 +457,7 @@ def _graficos(df: pd.DataFrame) -> dict:
                         'valores': [float(v) for v in top.values]
                     }
             except Exception as e:
-                print(f"[WARN] Erro no top clientes: {e}")
+                logger.warning(f"Erro no top clientes: {e}")
 
         # Distribuição de status
         try:
@@ -524,7 +475,7 @@ def _graficos(df: pd.DataFrame) -> dict:
                 'processos': {'labels': ['Completos', 'Incompletos'], 'valores': [proc_compl, proc_incompl]}
             }
         except Exception as e:
-            print(f"[WARN] Erro na distribuição de status: {e}")
+            logger.warning(f"Erro na distribuição de status: {e}")
 
         # Performance de veículos
         if 'veiculo_placa' in df.columns:
@@ -543,10 +494,10 @@ def _graficos(df: pd.DataFrame) -> dict:
                         'quantidades': [int(x) for x in v['qtd']]
                     }
             except Exception as e:
-                print(f"[WARN] Erro na performance de veículos: {e}")
+                logger.warning(f"Erro na performance de veículos: {e}")
 
     except Exception as e:
-        print(f"[WARN] Erro geral nos gráficos: {e}")
+        logger.warning(f"Erro geral nos gráficos: {e}")
 
     return graficos
 
@@ -580,6 +531,94 @@ def api_graficos():
     """API de gráficos - retorna mesma estrutura de métricas"""
     return api_metricas()
 
+@bp.route('/api/variacoes')
+@login_required
+def api_variacoes():
+    """
+    Estatísticas de tempo entre etapas (média, mediana, p90, p95, min, max)
+    Parâmetros: agrupar (cliente|mes), data_inicio, data_fim (YYYY-MM-DD), cliente
+    """
+    from app.services.metricas_service import VARIACOES_CONFIG
+    from app.services.variacoes_service import VariacoesService
+
+    try:
+        agrupar = request.args.get('agrupar') or None
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+
+        estatisticas = VariacoesService.calcular(
+            VARIACOES_CONFIG,
+            agrupar_por=agrupar,
+            data_inicio=datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None,
+            data_fim=datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None,
+            cliente=request.args.get('cliente', '').strip() or None
+        )
+
+        metas = {config['codigo']: config for config in VARIACOES_CONFIG}
+
+        def formatar(por_codigo):
+            return {
+                codigo: {
+                    'nome': metas[codigo]['nome'],
+                    'meta_dias': metas[codigo]['meta_dias'],
+                    'performance': VariacoesService.classificar_performance(
+                        stats['media'], metas[codigo]['meta_dias']
+                    ),
+                    **{chave: round(valor, 1) if isinstance(valor, float) else valor
+                       for chave, valor in stats.items()}
+                }
+                for codigo, stats in por_codigo.items()
+            }
+
+        if agrupar:
+            variacoes = {grupo: formatar(por_codigo) for grupo, por_codigo in estatisticas.items()}
+        else:
+            variacoes = formatar(estatisticas)
+
+        return jsonify({
+            'success': True,
+            'agrupar': agrupar,
+            'variacoes': variacoes,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro na API de variações: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/api/resumo-periodo')
+@login_required
+def api_resumo_periodo():
+    """
+    Clientes únicos, veículos ativos e quantis de duração das etapas (aproximados)
+    Parâmetros: data_inicio, data_fim (YYYY-MM-DD, sobre a data de emissão)
+    """
+    from app.services.sketch_service import SketchService
+
+    try:
+        data_inicio = request.args.get('data_inicio')
+        data_fim = request.args.get('data_fim')
+
+        resumo = SketchService.resumo(
+            datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None,
+            datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None
+        )
+
+        return jsonify({
+            'success': True,
+            'resumo': resumo,
+            'periodo': {'data_inicio': data_inicio, 'data_fim': data_fim},
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro no resumo do período: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/relatorios')
 @login_required
 def relatorios():
@@ -627,7 +666,7 @@ def api_relatorio_executivo():
         return jsonify({'success': True, 'relatorio': relatorio})
 
     except Exception as e:
-        print(f"[ERROR] Erro no relatório executivo: {e}")
+        logger.error(f"Erro no relatório executivo: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # ================================
@@ -697,7 +736,7 @@ def api_valores_pendentes():
         })
 
     except Exception as e:
-        print(f"[ERROR] Erro na API valores pendentes: {e}")
+        logger.error(f"Erro na API valores pendentes: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -806,9 +845,7 @@ def exportar_valores_pendentes_excel():
         )
 
     except Exception as e:
-        print(f"[ERROR] Erro ao exportar Excel: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Erro ao exportar Excel: {e}")
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/api/valores-pendentes/exportar/pdf')
@@ -948,9 +985,7 @@ def exportar_valores_pendentes_pdf():
         )
 
     except Exception as e:
-        print(f"[ERROR] Erro ao exportar PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Erro ao exportar PDF: {e}")
         return jsonify({'error': str(e)}), 500
 
 # ================================
@@ -1042,7 +1077,7 @@ def _criar_exportacao_excel_alerta(ctes, titulo, filename_prefix):
         )
 
     except Exception as e:
-        print(f"[ERROR] Erro ao exportar Excel: {e}")
+        logger.error(f"Erro ao exportar Excel: {e}")
         return jsonify({'error': str(e)}), 500
 
 def _criar_exportacao_pdf_alerta(ctes, titulo, filename_prefix):
@@ -1139,29 +1174,31 @@ def _criar_exportacao_pdf_alerta(ctes, titulo, filename_prefix):
         return send_file(buffer, mimetype='application/pdf', as_attachment=True, download_name=filename)
 
     except Exception as e:
-        print(f"[ERROR] Erro ao exportar PDF: {e}")
+        logger.error(f"Erro ao exportar PDF: {e}")
         return jsonify({'error': str(e)}), 500
 
 # ================================
 # 1º ENVIO PENDENTE
 # ================================
 
+def consulta_primeiro_envio_pendente(hoje: date):
+    """CTEs emitidos há mais de 10 dias sem 1º envio"""
+    return select(CTE).where(
+        CTE.data_emissao < hoje - timedelta(days=10),
+        CTE.primeiro_envio.is_(None)
+    ).order_by(CTE.data_emissao.asc())
+
 @bp.route('/api/primeiro-envio-pendente')
 @login_required
 def api_primeiro_envio_pendente():
     """Lista CTEs com 1º envio pendente"""
     try:
         hoje = datetime.now().date()
-        data_limite = hoje - timedelta(days=10)
-
-        query = CTE.query.filter(
-            CTE.data_emissao < data_limite,
-            CTE.primeiro_envio.is_(None)
-        ).order_by(CTE.data_emissao.asc())
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = db.paginate(consulta_primeiro_envio_pendente(hoje), page=page, per_page=per_page,
+                                 error_out=False)
 
         lista = []
         total_valor = 0.0
@@ -1197,24 +1234,24 @@ def api_primeiro_envio_pendente():
 @login_required
 def exportar_primeiro_envio_excel():
     """Exporta 1º envio pendente para Excel"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=10)
-    ctes = CTE.query.filter(CTE.data_emissao < data_limite, CTE.primeiro_envio.is_(None)).all()
+    ctes = db.session.scalars(consulta_primeiro_envio_pendente(datetime.now().date())).all()
     return _criar_exportacao_excel_alerta(ctes, '1º Envio Pendente', 'primeiro_envio_pendente')
 
 @bp.route('/api/primeiro-envio-pendente/exportar/pdf')
 @login_required
 def exportar_primeiro_envio_pdf():
     """Exporta 1º envio pendente para PDF"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=10)
-    ctes = CTE.query.filter(CTE.data_emissao < data_limite, CTE.primeiro_envio.is_(None)).all()
+    ctes = db.session.scalars(consulta_primeiro_envio_pendente(datetime.now().date())).all()
     return _criar_exportacao_pdf_alerta(ctes, 'Relatório: 1º Envio Pendente', 'primeiro_envio_pendente')
 
 # ================================
 # ENVIO FINAL PENDENTE
 # ================================
 
+def consulta_envio_final_pendente():
+    """TODOS os CTEs sem envio final (sem filtro de data)"""
+    return select(CTE).where(CTE.envio_final.is_(None)).order_by(CTE.data_emissao.asc())
+
 @bp.route('/api/envio-final-pendente')
 @login_required
 def api_envio_final_pendente():
@@ -1222,14 +1259,10 @@ def api_envio_final_pendente():
     try:
         hoje = datetime.now().date()
 
-        # Buscar TODOS os CTEs sem envio final (sem filtro de data)
-        query = CTE.query.filter(
-            CTE.envio_final.is_(None)
-        ).order_by(CTE.data_emissao.asc())
-
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = db.paginate(consulta_envio_final_pendente(), page=page, per_page=per_page,
+                                 error_out=False)
 
         lista = []
         total_valor = 0.0
@@ -1266,38 +1299,38 @@ def api_envio_final_pendente():
 @login_required
 def exportar_envio_final_excel():
     """Exporta TODOS os CTEs sem envio final para Excel"""
-    # Buscar TODOS os CTEs sem envio final (sem filtro de data)
-    ctes = CTE.query.filter(CTE.envio_final.is_(None)).order_by(CTE.data_emissao.asc()).all()
+    ctes = db.session.scalars(consulta_envio_final_pendente()).all()
     return _criar_exportacao_excel_alerta(ctes, 'Envio Final Pendente', 'envio_final_pendente')
 
 @bp.route('/api/envio-final-pendente/exportar/pdf')
 @login_required
 def exportar_envio_final_pdf():
     """Exporta TODOS os CTEs sem envio final para PDF"""
-    # Buscar TODOS os CTEs sem envio final (sem filtro de data)
-    ctes = CTE.query.filter(CTE.envio_final.is_(None)).order_by(CTE.data_emissao.asc()).all()
+    ctes = db.session.scalars(consulta_envio_final_pendente()).all()
     return _criar_exportacao_pdf_alerta(ctes, 'Relatório: Envio Final Pendente', 'envio_final_pendente')
 
 # ================================
 # FATURAS VENCIDAS
 # ================================
 
+def consulta_faturas_vencidas(hoje: date):
+    """CTEs sem baixa com envio final há mais de 90 dias"""
+    return select(CTE).where(
+        CTE.envio_final < hoje - timedelta(days=90),
+        CTE.data_baixa.is_(None)
+    ).order_by(CTE.envio_final.asc())
+
 @bp.route('/api/faturas-vencidas')
 @login_required
 def api_faturas_vencidas():
     """Lista faturas vencidas (90+ dias)"""
     try:
         hoje = datetime.now().date()
-        data_limite = hoje - timedelta(days=90)
-
-        query = CTE.query.filter(
-            CTE.envio_final < data_limite,
-            CTE.data_baixa.is_(None)
-        ).order_by(CTE.envio_final.asc())
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = db.paginate(consulta_faturas_vencidas(hoje), page=page, per_page=per_page,
+                                 error_out=False)
 
         lista = []
         total_valor = 0.0
@@ -1333,40 +1366,38 @@ def api_faturas_vencidas():
 @login_required
 def exportar_faturas_vencidas_excel():
     """Exporta faturas vencidas para Excel"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=90)
-    ctes = CTE.query.filter(CTE.envio_final < data_limite, CTE.data_baixa.is_(None)).all()
+    ctes = db.session.scalars(consulta_faturas_vencidas(datetime.now().date())).all()
     return _criar_exportacao_excel_alerta(ctes, 'Faturas Vencidas', 'faturas_vencidas')
 
 @bp.route('/api/faturas-vencidas/exportar/pdf')
 @login_required
 def exportar_faturas_vencidas_pdf():
     """Exporta faturas vencidas para PDF"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=90)
-    ctes = CTE.query.filter(CTE.envio_final < data_limite, CTE.data_baixa.is_(None)).all()
+    ctes = db.session.scalars(consulta_faturas_vencidas(datetime.now().date())).all()
     return _criar_exportacao_pdf_alerta(ctes, 'Relatório: Faturas Vencidas (90+ dias)', 'faturas_vencidas')
 
 # ================================
 # CTES SEM FATURAS
 # ================================
 
+def consulta_ctes_sem_faturas(hoje: date):
+    """CTEs atestados há mais de 3 dias sem número de fatura"""
+    return select(CTE).where(
+        CTE.data_atesto < hoje - timedelta(days=3),
+        db.or_(CTE.numero_fatura.is_(None), CTE.numero_fatura == '')
+    ).order_by(CTE.data_atesto.asc())
+
 @bp.route('/api/ctes-sem-faturas')
 @login_required
 def api_ctes_sem_faturas():
     """Lista CTEs sem número de fatura"""
     try:
         hoje = datetime.now().date()
-        data_limite = hoje - timedelta(days=3)
-
-        query = CTE.query.filter(
-            CTE.data_atesto < data_limite,
-            db.or_(CTE.numero_fatura.is_(None), CTE.numero_fatura == '')
-        ).order_by(CTE.data_atesto.asc())
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        pagination = db.paginate(consulta_ctes_sem_faturas(hoje), page=page, per_page=per_page,
+                                 error_out=False)
 
         lista = []
         total_valor = 0.0
@@ -1402,24 +1433,14 @@ def api_ctes_sem_faturas():
 @login_required
 def exportar_ctes_sem_faturas_excel():
     """Exporta CTEs sem faturas para Excel"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=3)
-    ctes = CTE.query.filter(
-        CTE.data_atesto < data_limite,
-        db.or_(CTE.numero_fatura.is_(None), CTE.numero_fatura == '')
-    ).all()
+    ctes = db.session.scalars(consulta_ctes_sem_faturas(datetime.now().date())).all()
     return _criar_exportacao_excel_alerta(ctes, 'CTEs sem Faturas', 'ctes_sem_faturas')
 
 @bp.route('/api/ctes-sem-faturas/exportar/pdf')
 @login_required
 def exportar_ctes_sem_faturas_pdf():
     """Exporta CTEs sem faturas para PDF"""
-    hoje = datetime.now().date()
-    data_limite = hoje - timedelta(days=3)
-    ctes = CTE.query.filter(
-        CTE.data_atesto < data_limite,
-        db.or_(CTE.numero_fatura.is_(None), CTE.numero_fatura == '')
-    ).all()
+    ctes = db.session.scalars(consulta_ctes_sem_faturas(datetime.now().date())).all()
     return _criar_exportacao_pdf_alerta(ctes, 'Relatório: CTEs sem Faturas', 'ctes_sem_faturas')
 
 # ================================
@@ -1500,7 +1521,7 @@ def api_alertas_resumo():
             }
         })
     except Exception as e:
-        print(f"[ERROR] Erro ao calcular resumo de alertas: {str(e)}")
+        logger.error(f"Erro ao calcular resumo de alertas: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
     # ================================
@@ -1509,7 +1530,7 @@ def api_alertas_resumo():
 
 def calcular_alertas_inteligentes(df):
     """Sistema de alertas inteligentes - VERSÃO CORRIGIDA"""
-    print(f"[ALERT] Iniciando cálculo de alertas para {len(df)} registros")
+    logger.debug(f"Iniciando cálculo de alertas para {len(df)} registros")
     
     alertas = {
         'primeiro_envio_pendente': {'qtd': 0, 'valor': 0.0, 'lista': []},
@@ -1519,14 +1540,14 @@ def calcular_alertas_inteligentes(df):
     }
 
     if df.empty:
-        print("[WARN] DataFrame vazio para alertas")
+        logger.warning("DataFrame vazio para alertas")
         return alertas
 
     hoje = pd.Timestamp.now().normalize()
 
     try:
         # 1. Primeiro envio pendente (10 dias após emissão) - ✅ MANTIDO
-        print("[SEARCH] Calculando primeiro envio pendente...")
+        logger.debug("Calculando primeiro envio pendente...")
         mask_primeiro_envio = (
             df['data_emissao'].notna() & 
             ((hoje - df['data_emissao']).dt.days > 10) &
@@ -1545,7 +1566,7 @@ def calcular_alertas_inteligentes(df):
                     }
                     lista_segura.append(item)
                 except Exception as e:
-                    print(f"[WARN] Erro ao processar CTE: {e}")
+                    logger.warning(f"Erro ao processar CTE: {e}")
                     continue
 
             alertas['primeiro_envio_pendente'] = {
@@ -1553,10 +1574,10 @@ def calcular_alertas_inteligentes(df):
                 'valor': float(ctes_problema['valor_total'].sum()),
                 'lista': lista_segura
             }
-            print(f"[OK] Primeiro envio pendente: {len(ctes_problema)} CTEs")
+            logger.debug(f"Primeiro envio pendente: {len(ctes_problema)} CTEs")
 
         # 2. Envio Final Pendente - 🔧 CORRIGIDO: 1 dia após atesto (era 5)
-        print("[SEARCH] Calculando envio final pendente...")
+        logger.debug("Calculando envio final pendente...")
         mask_envio_final = (
             df['data_atesto'].notna() & 
             ((hoje - df['data_atesto']).dt.days > 1) &  # MUDANÇA: 5 → 1
@@ -1575,7 +1596,7 @@ def calcular_alertas_inteligentes(df):
                     }
                     lista_segura.append(item)
                 except Exception as e:
-                    print(f"[WARN] Erro ao processar CTE: {e}")
+                    logger.warning(f"Erro ao processar CTE: {e}")
                     continue
 
             alertas['envio_final_pendente'] = {
@@ -1583,10 +1604,10 @@ def calcular_alertas_inteligentes(df):
                 'valor': float(ctes_problema['valor_total'].sum()),
                 'lista': lista_segura
             }
-            print(f"[OK] Envio final pendente: {len(ctes_problema)} CTEs")
+            logger.debug(f"Envio final pendente: {len(ctes_problema)} CTEs")
 
         # 3. Faturas vencidas - 🔧 CORRIGIDO: 90 dias após ENVIO FINAL (era após atesto)
-        print("[SEARCH] Calculando faturas vencidas...")
+        logger.debug("Calculando faturas vencidas...")
         mask_vencidas = (
             df['envio_final'].notna() &  # MUDANÇA: data_atesto → envio_final
             ((hoje - df['envio_final']).dt.days > 90) &  # MUDANÇA: data_atesto → envio_final
@@ -1605,7 +1626,7 @@ def calcular_alertas_inteligentes(df):
                     }
                     lista_segura.append(item)
                 except Exception as e:
-                    print(f"[WARN] Erro ao processar CTE: {e}")
+                    logger.warning(f"Erro ao processar CTE: {e}")
                     continue
 
             alertas['faturas_vencidas'] = {
@@ -1613,10 +1634,10 @@ def calcular_alertas_inteligentes(df):
                 'valor': float(ctes_problema['valor_total'].sum()),
                 'lista': lista_segura
             }
-            print(f"[OK] Faturas vencidas: {len(ctes_problema)} CTEs")
+            logger.debug(f"Faturas vencidas: {len(ctes_problema)} CTEs")
 
         # 4. CTEs sem faturas (3 dias após atesto) - ✅ MANTIDO
-        print("[SEARCH] Calculando CTEs sem faturas...")
+        logger.debug("Calculando CTEs sem faturas...")
         mask_sem_faturas = (
             df['data_atesto'].notna() & 
             ((hoje - df['data_atesto']).dt.days > 3) &
@@ -1635,7 +1656,7 @@ def calcular_alertas_inteligentes(df):
                     }
                     lista_segura.append(item)
                 except Exception as e:
-                    print(f"[WARN] Erro ao processar CTE: {e}")
+                    logger.warning(f"Erro ao processar CTE: {e}")
                     continue
 
             alertas['ctes_sem_faturas'] = {
@@ -1643,21 +1664,19 @@ def calcular_alertas_inteligentes(df):
                 'valor': float(ctes_problema['valor_total'].sum()),
                 'lista': lista_segura
             }
-            print(f"[OK] CTEs sem faturas: {len(ctes_problema)} CTEs")
+            logger.debug(f"CTEs sem faturas: {len(ctes_problema)} CTEs")
 
-        print("[OK] Todos os alertas calculados com sucesso!")
+        logger.debug("Todos os alertas calculados com sucesso!")
 
     except Exception as e:
-        print(f"[WARN] Erro no cálculo de alertas: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.warning(f"Erro no cálculo de alertas: {str(e)}", exc_info=True)
 
     return alertas
 
 
 def _variacoes(df):
-    """Calcula variações de tempo entre processos"""
-    print(f"[TIME] Calculando variações para {len(df)} registros")
+    """Calcula variações de tempo entre processos (estatísticas agregadas no banco)"""
+    from app.services.variacoes_service import VariacoesService
     
     configs = [
         ('rq_tmc_primeiro_envio', 'RQ/TMC - 1º Envio', 'data_rq_tmc', 'primeiro_envio', 3),
@@ -1672,52 +1691,39 @@ def _variacoes(df):
         return out
 
     try:
+        estatisticas = VariacoesService.calcular([
+            {'codigo': code, 'campo_inicio': inicio, 'campo_fim': fim}
+            for code, _, inicio, fim, _ in configs
+        ])
+        
         for code, nome, inicio, fim, meta in configs:
-            if inicio in df.columns and fim in df.columns:
-                m = df[inicio].notna() & df[fim].notna()
-                if not m.any():
-                    continue
-                
-                _dif = (df.loc[m, fim] - df.loc[m, inicio]).dt.days
-                _dif = _dif[_dif >= 0]  # Apenas diferenças positivas
-                
-                if len(_dif) == 0:
-                    continue
-                
-                media = float(_dif.mean())
-                mediana = float(_dif.median())
-                
-                # Determinar performance
-                if media <= meta:
-                    perf = 'excelente'
-                elif media <= meta * 1.5:
-                    perf = 'bom'
-                elif media <= meta * 2:
-                    perf = 'atencao'
-                else:
-                    perf = 'critico'
-                
-                out[code] = {
-                    'nome': nome,
-                    'media': round(media, 1),
-                    'mediana': round(mediana, 1),
-                    'qtd': int(len(_dif)),
-                    'meta_dias': int(meta),
-                    'performance': perf,
-                    'min': int(_dif.min()),
-                    'max': int(_dif.max())
-                }
-                print(f"[OK] {nome}: {len(_dif)} registros, média {media:.1f} dias")
+            stats = estatisticas.get(code)
+            if not stats:
+                continue
+            
+            out[code] = {
+                'nome': nome,
+                'media': round(stats['media'], 1),
+                'mediana': round(stats['mediana'], 1),
+                'p90': round(stats['p90'], 1),
+                'p95': round(stats['p95'], 1),
+                'qtd': stats['qtd'],
+                'meta_dias': int(meta),
+                'performance': VariacoesService.classificar_performance(stats['media'], meta),
+                'min': stats['min'],
+                'max': stats['max']
+            }
+            logger.debug(f"{nome}: {stats['qtd']} registros, média {stats['media']:.1f} dias")
                 
     except Exception as e:
-        print(f"[WARN] Erro no cálculo de variações: {e}")
+        logger.warning(f"Erro no cálculo de variações: {e}")
 
     return out
 
 
 def _graficos(df):
     """Gera dados para gráficos do dashboard"""
-    print(f"[GRAPH] Gerando gráficos para {len(df)} registros")
+    logger.debug(f"Gerando gráficos para {len(df)} registros")
     
     graficos = {
         'evolucao_mensal': {'labels': [], 'valores': [], 'quantidades': []},
@@ -1752,9 +1758,9 @@ def _graficos(df):
                             'valores': [float(v) for v in receita['valor_total']],
                             'quantidades': [int(q) for q in receita['qtd']]
                         }
-                        print(f"[OK] Evolução mensal: {len(receita)} períodos")
+                        logger.debug(f"Evolução mensal: {len(receita)} períodos")
             except Exception as e:
-                print(f"[WARN] Erro na evolução mensal: {e}")
+                logger.warning(f"Erro na evolução mensal: {e}")
 
         # Top clientes
         if 'destinatario_nome' in df.columns:
@@ -1767,9 +1773,9 @@ def _graficos(df):
                         'labels': [str(i) for i in top.index],
                         'valores': [float(v) for v in top.values]
                     }
-                    print(f"[OK] Top clientes: {len(top)} clientes")
+                    logger.debug(f"Top clientes: {len(top)} clientes")
             except Exception as e:
-                print(f"[WARN] Erro no top clientes: {e}")
+                logger.warning(f"Erro no top clientes: {e}")
 
         # Distribuição de status
         try:
@@ -1786,9 +1792,9 @@ def _graficos(df):
                 'baixas': {'labels': ['Com Baixa', 'Sem Baixa'], 'valores': [com_baixa, sem_baixa]},
                 'processos': {'labels': ['Completos', 'Incompletos'], 'valores': [proc_compl, proc_incompl]}
             }
-            print(f"[OK] Distribuição: {com_baixa} com baixa, {proc_compl} completos")
+            logger.debug(f"Distribuição: {com_baixa} com baixa, {proc_compl} completos")
         except Exception as e:
-            print(f"[WARN] Erro na distribuição de status: {e}")
+            logger.warning(f"Erro na distribuição de status: {e}")
 
         # Performance de veículos
         if 'veiculo_placa' in df.columns:
@@ -1806,13 +1812,13 @@ def _graficos(df):
                         'valores': [float(x) for x in v['valor_total']],
                         'quantidades': [int(x) for x in v['qtd']]
                     }
-                    print(f"[OK] Performance veículos: {len(v)} veículos")
+                    logger.debug(f"Performance veículos: {len(v)} veículos")
             except Exception as e:
-                print(f"[WARN] Erro na performance de veículos: {e}")
+                logger.warning(f"Erro na performance de veículos: {e}")
 
-        print("[OK] Gráficos gerados com sucesso!")
+        logger.debug("Gráficos gerados com sucesso!")
 
     except Exception as e:
-        print(f"[WARN] Erro geral nos gráficos: {e}")
+        logger.warning(f"Erro geral nos gráficos: {e}")
 
     return graficos
\ No newline at end of file
@@ -10,6 +10,8 @@ from flask_login import login_required, current_user
 from app import db
 from app.models.frotas import Veiculo, Motorista, ChecklistModelo, ChecklistItem, Checklist, ChecklistResposta
 from app.models.user import User
+from app.services.frotas_stats_service import FrotasStatsService
+from app.services.checklist_service import ChecklistService, FILTROS_LISTAGEM, LIMITE_PADRAO
 from datetime import datetime, date
 
 bp = Blueprint('frotas_local', __name__, url_prefix='/frotas')
@@ -18,32 +20,8 @@ bp = Blueprint('frotas_local', __name__, url_prefix='/frotas')
 @login_required
 def index():
     """Dashboard principal de frotas"""
-    # Estatísticas gerais
-    total_veiculos = Veiculo.query.count()
-    veiculos_ativos = Veiculo.query.filter_by(ativo=True).count()
-    veiculos_manutencao = Veiculo.query.filter_by(em_manutencao=True).count()
-
-    total_motoristas = Motorista.query.count()
-    motoristas_ativos = Motorista.query.filter_by(ativo=True).count()
-
-    total_checklists = Checklist.query.count()
-    checklists_pendentes = Checklist.query.filter_by(status='aguardando_aprovacao').count()
-
-    stats = {
-        'veiculos': {
-            'total': total_veiculos,
-            'ativos': veiculos_ativos,
-            'manutencao': veiculos_manutencao
-        },
-        'motoristas': {
-            'total': total_motoristas,
-            'ativos': motoristas_ativos
-        },
-        'checklists': {
-            'total': total_checklists,
-            'pendentes': checklists_pendentes
-        }
-    }
+    # Estatísticas gerais (uma consulta agregada, cacheada)
+    stats = FrotasStatsService.agrupadas(FrotasStatsService.obter())
 
     return render_template('frotas/dashboard.html', stats=stats)
 
@@ -247,19 +225,36 @@ def api_motoristas():
     motoristas = Motorista.query.filter_by(ativo=True).all()
     return jsonify([m.to_dict() for m in motoristas])
 
+@bp.route('/api/checklists')
+@login_required
+def api_checklists():
+    """API: Checklists paginados por cursor (?cursor=...&limite=50)"""
+    filtros = {campo: request.args.get(campo) for campo in FILTROS_LISTAGEM}
+    try:
+        resultado = ChecklistService.listar(
+            filtros,
+            cursor=request.args.get('cursor') or None,
+            limite=request.args.get('limite', LIMITE_PADRAO, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **resultado})
+
+@bp.route('/api/checklists', methods=['POST'])
+@login_required
+def api_checklist_submissao():
+    """API: Checklist completo (cabeçalho + respostas) em uma requisição"""
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({'success': False, 'erros': ['JSON inválido']}), 400
+
+    sucesso, resultado = ChecklistService.registrar_submissao(dados)
+    if not sucesso:
+        return jsonify({'success': False, **resultado}), 400
+    return jsonify({'success': True, **resultado}), 201
+
 @bp.route('/api/stats')
 @login_required
 def api_stats():
     """API: Estatísticas para widgets"""
-    return jsonify({
-        'veiculos_total': Veiculo.query.count(),
-        'veiculos_ativos': Veiculo.query.filter_by(ativo=True).count(),
-        'motoristas_total': Motorista.query.count(),
-        'motoristas_ativos': Motorista.query.filter_by(ativo=True).count(),
-        'checklists_hoje': Checklist.query.filter(
-            Checklist.dt_inicio >= date.today()
-        ).count(),
-        'checklists_pendentes': Checklist.query.filter_by(
-            status='aguardando_aprovacao'
-        ).count()
-    })
\ No newline at end of file
+    return jsonify(FrotasStatsService.obter())
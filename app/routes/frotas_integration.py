@@ -7,6 +7,7 @@ Rotas de integração com o Sistema de Frotas
 from flask import Blueprint, redirect, session, request, jsonify
 from flask_login import login_required
 from app.services.jwt_integration import criar_link_sistema_frotas, verificar_integracao_disponivel
+from app.services.frotas_status_service import MonitorFrotas
 
 bp = Blueprint('frotas', __name__, url_prefix='/frotas')
 
@@ -64,13 +65,20 @@ def ordens_servico():
 def status():
     """API para verificar status da integração"""
     try:
-        disponivel = verificar_integracao_disponivel()
+        status_frotas = MonitorFrotas.status()
         jwt_token = session.get('jwt_token')
         user_data = session.get('jwt_user_data')
 
         return jsonify({
             'success': True,
-            'integration_available': disponivel,
+            'integration_available': bool(status_frotas['disponivel']),
+            'integration_status': {
+                'estado': status_frotas['estado'],
+                'verificado_em': status_frotas.get('verificado_em'),
+                'latencia_ms': status_frotas.get('latencia_ms'),
+                'falhas_consecutivas': status_frotas.get('falhas_consecutivas', 0),
+                'proxima_verificacao_segundos': status_frotas.get('intervalo_segundos'),
+            },
             'jwt_authenticated': bool(jwt_token),
             'user_data': user_data if jwt_token else None,
             'frotas_url': criar_link_sistema_frotas()
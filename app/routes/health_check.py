@@ -1,8 +1,11 @@
 # app/routes/health_check.py
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, Response
+from flask_login import current_user
 from app import db
 from sqlalchemy import text
+import hmac
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -53,4 +56,21 @@ def api_status():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@bp.route('/metrics')
+def metrics():
+    """
+    Métricas agregadas dos workers no formato Prometheus
+    Acesso: administrador logado ou header Authorization: Bearer METRICS_TOKEN
+    """
+    token = os.getenv('METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    token_ok = bool(token) and auth_header.startswith('Bearer ') and \
+        hmac.compare_digest(auth_header[7:], token)
+    admin_ok = current_user.is_authenticated and getattr(current_user, 'tipo_usuario', None) == 'admin'
+    if not (token_ok or admin_ok):
+        return Response('Acesso negado\n', status=403, mimetype='text/plain')
+
+    from app.utils.telemetria import formato_prometheus
+    return Response(formato_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
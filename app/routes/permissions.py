@@ -127,6 +127,7 @@ def api_set_user_permissions(user_id):
                 db.session.add(permission)
 
         db.session.commit()
+        PermissionManager.invalidar_cache()
 
         return jsonify({
             'success': True,
@@ -16,6 +16,8 @@ from typing import Dict, List
 from sqlalchemy import text, func, and_, or_
 from app import db
 from app.models.cte import CTE
+from app.utils.roteamento_db import engine_leitura
+from app.services.arquivo_cte_service import ArquivoCTEService
 
 logger = logging.getLogger(__name__)
 
@@ -65,20 +67,10 @@ class AlertasService:
         🚨 1º Envio Pendente - CTEs que ainda não foram enviados
         """
         try:
-            # Buscar CTEs sem data de primeiro envio
-            query = text("""
-                SELECT 
-                    COUNT(*) as quantidade,
-                    COALESCE(SUM(valor_total), 0) as valor_total
-                FROM dashboard_baker 
-                WHERE primeiro_envio IS NULL 
-                AND data_emissao >= :data_limite
-            """)
-            
-            data_limite = datetime.now() - timedelta(days=90)
+            query = AlertasService.consulta_primeiro_envio_pendente(datetime.now())
             
-            with db.engine.connect() as connection:
-                result = connection.execute(query, {"data_limite": data_limite}).fetchone()
+            with engine_leitura().connect() as connection:
+                result = connection.execute(query).fetchone()
                 
                 quantidade = int(result.quantidade or 0)
                 valor = float(result.valor_total or 0)
@@ -106,20 +98,10 @@ class AlertasService:
         📤 Envio Final Pendente - CTEs que foram enviados mas não finalizados
         """
         try:
-            query = text("""
-                SELECT 
-                    COUNT(*) as quantidade,
-                    COALESCE(SUM(valor_total), 0) as valor_total
-                FROM dashboard_baker 
-                WHERE primeiro_envio IS NOT NULL 
-                AND envio_final IS NULL
-                AND data_emissao >= :data_limite
-            """)
-            
-            data_limite = datetime.now() - timedelta(days=60)
+            query = AlertasService.consulta_envio_final_pendente(datetime.now())
             
-            with db.engine.connect() as connection:
-                result = connection.execute(query, {"data_limite": data_limite}).fetchone()
+            with engine_leitura().connect() as connection:
+                result = connection.execute(query).fetchone()
                 
                 quantidade = int(result.quantidade or 0)
                 valor = float(result.valor_total or 0)
@@ -147,25 +129,10 @@ class AlertasService:
         💸 Faturas Vencidas - Faturas com data de vencimento passada
         """
         try:
-            # Assumindo que faturas vencem 30 dias após emissão se não há campo específico
-            query = text("""
-                SELECT 
-                    COUNT(*) as quantidade,
-                    COALESCE(SUM(valor_total), 0) as valor_total
-                FROM dashboard_baker 
-                WHERE data_baixa IS NULL 
-                AND data_emissao < :data_vencimento
-                AND data_emissao >= :data_limite
-            """)
-            
-            data_vencimento = datetime.now() - timedelta(days=30)  # 30 dias para vencer
-            data_limite = datetime.now() - timedelta(days=120)     # Limite de busca
+            query = AlertasService.consulta_faturas_vencidas(datetime.now())
             
-            with db.engine.connect() as connection:
-                result = connection.execute(query, {
-                    "data_vencimento": data_vencimento,
-                    "data_limite": data_limite
-                }).fetchone()
+            with engine_leitura().connect() as connection:
+                result = connection.execute(query).fetchone()
                 
                 quantidade = int(result.quantidade or 0)
                 valor = float(result.valor_total or 0)
@@ -194,44 +161,10 @@ class AlertasService:
         """
         try:
             # Verificar se há concentração excessiva (>60% em top 3 clientes)
-            query = text("""
-                WITH cliente_totais AS (
-                    SELECT 
-                        destinatario_nome,
-                        SUM(valor_total) as valor_cliente
-                    FROM dashboard_baker 
-                    WHERE data_emissao >= :data_limite
-                    GROUP BY destinatario_nome
-                ),
-                total_geral AS (
-                    SELECT SUM(valor_total) as valor_total_geral
-                    FROM dashboard_baker 
-                    WHERE data_emissao >= :data_limite
-                ),
-                top3_clientes AS (
-                    SELECT SUM(valor_cliente) as valor_top3
-                    FROM (
-                        SELECT valor_cliente 
-                        FROM cliente_totais 
-                        ORDER BY valor_cliente DESC 
-                        LIMIT 3
-                    ) t
-                )
-                SELECT 
-                    t3.valor_top3,
-                    tg.valor_total_geral,
-                    CASE 
-                        WHEN tg.valor_total_geral > 0 
-                        THEN (t3.valor_top3 / tg.valor_total_geral * 100)
-                        ELSE 0 
-                    END as percentual_concentracao
-                FROM top3_clientes t3, total_geral tg
-            """)
+            query = AlertasService.consulta_risco_financeiro(datetime.now())
             
-            data_limite = datetime.now() - timedelta(days=180)
-            
-            with db.engine.connect() as connection:
-                result = connection.execute(query, {"data_limite": data_limite}).fetchone()
+            with engine_leitura().connect() as connection:
+                result = connection.execute(query).fetchone()
                 
                 if result and result.percentual_concentracao > 60:
                     return {
@@ -250,6 +183,88 @@ class AlertasService:
         
         return None
     
+    # ==================== CONSULTAS ====================
+    # Também usadas por flask verificar-indices (EXPLAIN das mesmas consultas)
+
+    @staticmethod
+    def consulta_primeiro_envio_pendente(agora: datetime):
+        """CTEs sem 1º envio emitidos nos últimos 90 dias"""
+        return text("""
+            SELECT 
+                COUNT(*) as quantidade,
+                COALESCE(SUM(valor_total), 0) as valor_total
+            FROM dashboard_baker 
+            WHERE primeiro_envio IS NULL 
+            AND data_emissao >= :data_limite
+        """).bindparams(data_limite=agora - timedelta(days=90))
+
+    @staticmethod
+    def consulta_envio_final_pendente(agora: datetime):
+        """CTEs enviados sem envio final, emitidos nos últimos 60 dias"""
+        return text("""
+            SELECT 
+                COUNT(*) as quantidade,
+                COALESCE(SUM(valor_total), 0) as valor_total
+            FROM dashboard_baker 
+            WHERE primeiro_envio IS NOT NULL 
+            AND envio_final IS NULL
+            AND data_emissao >= :data_limite
+        """).bindparams(data_limite=agora - timedelta(days=60))
+
+    @staticmethod
+    def consulta_faturas_vencidas(agora: datetime):
+        """CTEs sem baixa emitidos entre 120 e 30 dias atrás"""
+        # Assumindo que faturas vencem 30 dias após emissão se não há campo específico
+        return text("""
+            SELECT 
+                COUNT(*) as quantidade,
+                COALESCE(SUM(valor_total), 0) as valor_total
+            FROM dashboard_baker 
+            WHERE data_baixa IS NULL 
+            AND data_emissao < :data_vencimento
+            AND data_emissao >= :data_limite
+        """).bindparams(data_vencimento=agora - timedelta(days=30),  # 30 dias para vencer
+                        data_limite=agora - timedelta(days=120))     # Limite de busca
+
+    @staticmethod
+    def consulta_risco_financeiro(agora: datetime):
+        """Participação dos 3 maiores clientes na receita dos últimos 180 dias"""
+        data_limite = agora - timedelta(days=180)
+        tabela = ArquivoCTEService.tabela_periodo(data_limite.date())
+        return text(f"""
+            WITH cliente_totais AS (
+                SELECT 
+                    destinatario_nome,
+                    SUM(valor_total) as valor_cliente
+                FROM {tabela} 
+                WHERE data_emissao >= :data_limite
+                GROUP BY destinatario_nome
+            ),
+            total_geral AS (
+                SELECT SUM(valor_total) as valor_total_geral
+                FROM {tabela} 
+                WHERE data_emissao >= :data_limite
+            ),
+            top3_clientes AS (
+                SELECT SUM(valor_cliente) as valor_top3
+                FROM (
+                    SELECT valor_cliente 
+                    FROM cliente_totais 
+                    ORDER BY valor_cliente DESC 
+                    LIMIT 3
+                ) t
+            )
+            SELECT 
+                t3.valor_top3,
+                tg.valor_total_geral,
+                CASE 
+                    WHEN tg.valor_total_geral > 0 
+                    THEN (t3.valor_top3 / tg.valor_total_geral * 100)
+                    ELSE 0 
+                END as percentual_concentracao
+            FROM top3_clientes t3, total_geral tg
+        """).bindparams(data_limite=data_limite)
+
     @staticmethod
     def obter_detalhes_alerta(tipo_alerta: str) -> Dict:
         """
@@ -291,7 +306,7 @@ class AlertasService:
             
             data_limite = datetime.now() - timedelta(days=90)
             
-            with db.engine.connect() as connection:
+            with engine_leitura().connect() as connection:
                 result = connection.execute(query, {"data_limite": data_limite})
                 
                 detalhes = []
@@ -8,92 +8,112 @@ ATUALIZADO: Adicionada métrica de Receita por Inclusão Fatura
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from app.models.cte import CTE
 from app import db
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
 from scipy import stats
+from app.services.cache_service import CacheResultados
+from app.services.carregador_colunar_service import carregar_ctes
+from app.services.stress_test_service import StressTestEngine
 import logging
 
+# Cache compartilhado entre workers para as combinações de filtros mais usadas
+_cache_analise = CacheResultados('analise_financeira', max_entradas=64, ttl=300, ttl_stale=3600)
+
 class AnaliseFinanceiraService:
     """Serviço para análises financeiras avançadas"""
     
+    # Colunas lidas pelo carregador colunar para as análises
+    COLUNAS_ANALISE = (
+        'numero_cte', 'destinatario_nome', 'valor_total', 'data_emissao',
+        'data_baixa', 'primeiro_envio', 'data_inclusao_fatura'
+    )
+    
     @staticmethod
     def gerar_analise_completa(filtro_dias: int = 180, filtro_cliente: str = None) -> Dict:
         """
         Gera análise financeira completa com todas as métricas
         ADICIONADO: Receita por Inclusão Fatura
+        Resultado em cache por (filtros normalizados, dia, versão dos dados)
         """
         try:
-            # Calcular data limite
-            data_limite = datetime.now().date() - timedelta(days=filtro_dias)
-            
-            # Buscar dados filtrados
-            query = CTE.query.filter(CTE.data_emissao >= data_limite)
-            
-            if filtro_cliente:
-                query = query.filter(CTE.destinatario_nome.ilike(f'%{filtro_cliente}%'))
-            
-            ctes = query.all()
-            
-            if not ctes:
-                return AnaliseFinanceiraService._analise_vazia()
-            
-            # Converter para DataFrame
-            df = AnaliseFinanceiraService._ctes_para_dataframe(ctes)
-            
-            # Calcular todas as métricas
-            return {
-                'receita_mensal': AnaliseFinanceiraService._calcular_receita_mensal(df),
-                # 🆕 NOVA MÉTRICA ADICIONADA
-                'receita_por_inclusao_fatura': AnaliseFinanceiraService._calcular_receita_por_inclusao_fatura(df, filtro_dias),
-                'ticket_medio': AnaliseFinanceiraService._calcular_ticket_medio(df),
-                'tempo_medio_cobranca': AnaliseFinanceiraService._calcular_tempo_cobranca(df),
-                'tendencia_linear': AnaliseFinanceiraService._calcular_tendencia_linear(df),
-                'concentracao_clientes': AnaliseFinanceiraService._calcular_concentracao_clientes(df),
-                'stress_test_receita': AnaliseFinanceiraService._calcular_stress_test(df),
-                'graficos': AnaliseFinanceiraService._gerar_dados_graficos(df),
-                'resumo_filtro': {
-                    'periodo_dias': filtro_dias,
-                    'cliente_filtro': filtro_cliente,
-                    'total_ctes': len(df),
-                    'data_inicio': data_limite.strftime('%d/%m/%Y'),
-                    'data_fim': datetime.now().date().strftime('%d/%m/%Y')
-                }
-            }
-            
+            filtro_dias = int(filtro_dias)
+        except (TypeError, ValueError):
+            filtro_dias = 180
+
+        filtro_cliente = (filtro_cliente or '').strip() or None
+        if filtro_cliente and filtro_cliente.lower() in ['todos', 'all']:
+            filtro_cliente = None
+
+        # Dia faz parte da chave: a janela de datas é relativa a hoje
+        chave = (filtro_dias, filtro_cliente.lower() if filtro_cliente else None,
+                 datetime.now().date().isoformat())
+
+        try:
+            return _cache_analise.obter_ou_calcular(
+                chave,
+                lambda: AnaliseFinanceiraService._calcular_analise_completa(filtro_dias, filtro_cliente),
+                versao=CTE.versao_dados()
+            )
         except Exception as e:
             logging.error(f"Erro na análise financeira: {str(e)}")
             return AnaliseFinanceiraService._analise_vazia()
-    
+
     @staticmethod
-    def _ctes_para_dataframe(ctes: List[CTE]) -> pd.DataFrame:
-        """Converte lista de CTEs para DataFrame - ATUALIZADO"""
-        dados = []
-        for cte in ctes:
-            dados.append({
-                'numero_cte': cte.numero_cte,
-                'destinatario_nome': cte.destinatario_nome,
-                'valor_total': float(cte.valor_total or 0),
-                'data_emissao': cte.data_emissao,
-                'data_baixa': cte.data_baixa,
-                'primeiro_envio': cte.primeiro_envio,
-                # 🆕 ADICIONADO: data_inclusao_fatura
-                'data_inclusao_fatura': cte.data_inclusao_fatura,
-                'mes_emissao': cte.data_emissao.strftime('%Y-%m') if cte.data_emissao else None,
-                # 🆕 ADICIONADO: mês de inclusão de fatura
-                'mes_inclusao_fatura': cte.data_inclusao_fatura.strftime('%Y-%m') if cte.data_inclusao_fatura else None,
-                'has_baixa': cte.data_baixa is not None
-            })
+    def invalidar_cache_analise():
+        """Descarta todas as análises em cache (ex.: após importações em massa)"""
+        _cache_analise.invalidar()
+
+    @staticmethod
+    def _calcular_analise_completa(filtro_dias: int, filtro_cliente: str = None) -> Dict:
+        """
+        Executa a análise completa sem consultar o cache
+        Exceções são propagadas para que falhas não fiquem gravadas no cache
+        """
+        # Calcular data limite
+        data_limite = datetime.now().date() - timedelta(days=filtro_dias)
         
-        df = pd.DataFrame(dados)
+        # Buscar dados filtrados direto em formato colunar
+        df = carregar_ctes(
+            AnaliseFinanceiraService.COLUNAS_ANALISE,
+            data_inicio=data_limite,
+            cliente=filtro_cliente
+        )
         
-        # Converter datas - ATUALIZADO
-        for col in ['data_emissao', 'data_baixa', 'primeiro_envio', 'data_inclusao_fatura']:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
+        if df.empty:
+            return AnaliseFinanceiraService._analise_vazia()
         
+        df = AnaliseFinanceiraService._preparar_dataframe(df)
+        
+        # Calcular todas as métricas
+        return {
+            'receita_mensal': AnaliseFinanceiraService._calcular_receita_mensal(df),
+            # 🆕 NOVA MÉTRICA ADICIONADA
+            'receita_por_inclusao_fatura': AnaliseFinanceiraService._calcular_receita_por_inclusao_fatura(df, filtro_dias),
+            'ticket_medio': AnaliseFinanceiraService._calcular_ticket_medio(df),
+            'tempo_medio_cobranca': AnaliseFinanceiraService._calcular_tempo_cobranca(df),
+            'tendencia_linear': AnaliseFinanceiraService._calcular_tendencia_linear(df),
+            'concentracao_clientes': AnaliseFinanceiraService._calcular_concentracao_clientes(df),
+            'stress_test_receita': AnaliseFinanceiraService._calcular_stress_test(df),
+            'graficos': AnaliseFinanceiraService._gerar_dados_graficos(df),
+            'resumo_filtro': {
+                'periodo_dias': filtro_dias,
+                'cliente_filtro': filtro_cliente,
+                'total_ctes': len(df),
+                'data_inicio': data_limite.strftime('%d/%m/%Y'),
+                'data_fim': datetime.now().date().strftime('%d/%m/%Y')
+            }
+        }
+    
+    @staticmethod
+    def _preparar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+        """Adiciona colunas derivadas ao DataFrame vindo do carregador colunar"""
+        df['valor_total'] = df['valor_total'].fillna(0.0)
+        df['mes_emissao'] = df['data_emissao'].dt.strftime('%Y-%m')
+        df['mes_inclusao_fatura'] = df['data_inclusao_fatura'].dt.strftime('%Y-%m')
+        df['has_baixa'] = df['data_baixa'].notna()
         return df
     
     # 🆕 NOVA FUNÇÃO: Receita por Inclusão Fatura
@@ -438,9 +458,7 @@ class AnaliseFinanceiraService:
             if df.empty:
                 return {'cenarios': []}
             
-            # Agrupar por cliente
-            receita_cliente = df.groupby('destinatario_nome')['valor_total'].sum().sort_values(ascending=False)
-            receita_total = df['valor_total'].sum()
+            engine = StressTestEngine.do_dataframe(df)
             
             # Cenários de stress test
             cenarios = [
@@ -452,17 +470,14 @@ class AnaliseFinanceiraService:
             resultados = []
             for cenario in cenarios:
                 n_clientes = cenario['clientes']
-                if len(receita_cliente) >= n_clientes:
-                    receita_impactada = receita_cliente.head(n_clientes).sum()
-                    percentual_impacto = (receita_impactada / receita_total * 100) if receita_total > 0 else 0.0
-                    receita_restante = receita_total - receita_impactada
-                    
+                if len(engine.receitas) >= n_clientes:
+                    resultado = engine.perda_top_k(n_clientes)
                     resultados.append({
                         'cenario': cenario['nome'],
-                        'receita_perdida': float(receita_impactada),
-                        'percentual_impacto': round(percentual_impacto, 2),
-                        'receita_restante': float(receita_restante),
-                        'percentual_restante': round(100 - percentual_impacto, 2)
+                        'receita_perdida': resultado['receita_perdida'],
+                        'percentual_impacto': resultado['percentual_impacto'],
+                        'receita_restante': resultado['receita_restante'],
+                        'percentual_restante': resultado['percentual_restante']
                     })
             
             return {'cenarios': resultados}
@@ -616,6 +631,14 @@ class AnaliseFinanceiraService:
             return []
     
     # 🆕 NOVA FUNÇÃO: Faturamento mensal por data_inclusao_fatura com filtros específicos
+    @staticmethod
+    def consulta_faturamento_por_inclusao(data_limite: date):
+        """CTEs com data_inclusao_fatura a partir de data_limite"""
+        return select(CTE).where(
+            CTE.data_inclusao_fatura >= data_limite,
+            CTE.data_inclusao_fatura.isnot(None)
+        )
+
     @staticmethod
     def obter_faturamento_por_inclusao(filtro_dias: int = 30) -> Dict:
         """
@@ -631,10 +654,7 @@ class AnaliseFinanceiraService:
             data_limite = datetime.now().date() - timedelta(days=filtro_dias)
             
             # Buscar CTEs com data_inclusao_fatura no período
-            ctes = CTE.query.filter(
-                CTE.data_inclusao_fatura >= data_limite,
-                CTE.data_inclusao_fatura.isnot(None)
-            ).all()
+            ctes = db.session.scalars(AnaliseFinanceiraService.consulta_faturamento_por_inclusao(data_limite)).all()
             
             if not ctes:
                 return {
@@ -715,16 +735,14 @@ class AnaliseFinanceiraService:
         try:
             data_limite = datetime.now().date() - timedelta(days=filtro_dias)
             
-            # Query base
-            query = CTE.query.filter(CTE.data_emissao >= data_limite)
-            
             # Aplicar filtro de baixa se necessário
-            if not incluir_sem_baixa:
-                query = query.filter(CTE.data_baixa.isnot(None))
-            
-            ctes = query.all()
+            df = carregar_ctes(
+                AnaliseFinanceiraService.COLUNAS_ANALISE,
+                data_inicio=data_limite,
+                nao_nulos=() if incluir_sem_baixa else ('data_baixa',)
+            )
             
-            if not ctes:
+            if df.empty:
                 return {
                     'receita_total': 0.0,
                     'receita_com_baixa': 0.0,
@@ -739,8 +757,7 @@ class AnaliseFinanceiraService:
                     'status': 'Sem dados'
                 }
             
-            # Converter para DataFrame
-            df = AnaliseFinanceiraService._ctes_para_dataframe(ctes)
+            df = AnaliseFinanceiraService._preparar_dataframe(df)
             
             # Separar por status de baixa
             df_com_baixa = df[df['data_baixa'].notna()]
@@ -11,6 +11,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from app.models.cte import CTE
 from app import db
+from app.services.carregador_colunar_service import carregar_ctes
 import logging
 from sqlalchemy import func, desc
 
@@ -31,40 +32,29 @@ class AnaliseVeiculoService:
             # Calcular data limite
             data_limite = datetime.now().date() - timedelta(days=filtro_dias)
             
-            # Query base
-            query = CTE.query.filter(
-                CTE.data_emissao >= data_limite,
-                CTE.veiculo_placa.isnot(None),
-                CTE.valor_total.isnot(None)
+            df = carregar_ctes(
+                ('veiculo_placa', 'numero_cte', 'valor_total', 'data_emissao',
+                 'destinatario_nome', 'data_baixa', 'primeiro_envio',
+                 'data_atesto', 'envio_final'),
+                data_inicio=data_limite,
+                veiculo=filtro_veiculo,
+                nao_nulos=('veiculo_placa', 'valor_total')
             )
             
-            # Aplicar filtro de veículo específico se fornecido
-            if filtro_veiculo:
-                query = query.filter(CTE.veiculo_placa.ilike(f'%{filtro_veiculo}%'))
-            
-            ctes = query.all()
-            
-            if not ctes:
+            if df.empty:
                 return AnaliseVeiculoService._analise_vazia()
             
-            # Preparar dados para análise
-            dados = []
-            for cte in ctes:
-                dados.append({
-                    'veiculo_placa': cte.veiculo_placa.strip().upper() if cte.veiculo_placa else 'SEM_PLACA',
-                    'numero_cte': cte.numero_cte,
-                    'valor_total': float(cte.valor_total or 0),
-                    'data_emissao': cte.data_emissao,
-                    'destinatario_nome': cte.destinatario_nome,
-                    'origem_cidade': cte.origem_cidade,
-                    'destino_cidade': cte.destino_cidade,
-                    'has_baixa': cte.has_baixa,
-                    'data_baixa': cte.data_baixa,
-                    'processo_completo': cte.processo_completo,
-                    'mes_emissao': cte.data_emissao.strftime('%Y-%m') if cte.data_emissao else None
-                })
-            
-            df = pd.DataFrame(dados)
+            # Colunas derivadas (vetorizadas)
+            df['veiculo_placa'] = df['veiculo_placa'].str.strip().str.upper().replace('', 'SEM_PLACA')
+            df['has_baixa'] = df['data_baixa'].notna()
+            df['processo_completo'] = (
+                df['data_emissao'].notna() & df['primeiro_envio'].notna() &
+                df['data_atesto'].notna() & df['envio_final'].notna()
+            )
+            df['mes_emissao'] = df['data_emissao'].dt.strftime('%Y-%m')
+            # A tabela dashboard_baker não registra origem/destino do CTE
+            df['origem_cidade'] = None
+            df['destino_cidade'] = None
             
             # Análises principais
             ranking_veiculos = AnaliseVeiculoService._calcular_ranking_veiculos(df)
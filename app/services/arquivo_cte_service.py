@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivamento de CTEs - Dashboard Baker Flask
+app/services/arquivo_cte_service.py
+
+Move CTEs baixados emitidos há mais de N meses para dashboard_baker_arquivo
+(flask arquivar-ctes), em lotes, cada lote uma transação (DELETE ... RETURNING
+seguido do INSERT no arquivo). A tabela ativa fica só com o período que a
+interface consulta; CTEs arquivados são somente leitura.
+
+Leituras com filtro de período escolhem a fonte pelo horizonte do arquivo
+(maior data_emissao arquivada): período iniciado depois dele lê só a tabela
+ativa; caso contrário, a view histórica (no PostgreSQL, só as partições
+dos anos do filtro).
+
+numero_cte é único nas duas tabelas: criar um CTE já arquivado é recusado;
+editar ou excluir um CTE arquivado o devolve antes à tabela ativa.
+"""
+
+import logging
+import os
+import time
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from sqlalchemy import delete, extract, func, insert, inspect, select
+
+from app import db
+from app.models.cte import CTE
+from app.models.cte_arquivo import (
+    COLUNAS_CTE, CTEHistorico, TABELA_ARQUIVO, TABELA_ATIVA, VIEW_HISTORICO,
+    criar_particoes, criar_trigger_numero_unico, criar_view_historico, tabela_arquivo
+)
+from app.services.cache_service import CacheResultados
+
+logger = logging.getLogger(__name__)
+
+CTE_ARQUIVO_MESES = int(os.getenv("CTE_ARQUIVO_MESES", "24"))
+CTE_ARQUIVO_LOTE = int(os.getenv("CTE_ARQUIVO_LOTE", "5000"))
+CTE_ARQUIVO_HORIZONTE_TTL = int(os.getenv("CTE_ARQUIVO_HORIZONTE_TTL", "60"))
+
+_cache_horizonte = CacheResultados('arquivo_cte', max_entradas=4, max_bytes_entrada=1024,
+                                   ttl=CTE_ARQUIVO_HORIZONTE_TTL, ttl_stale=CTE_ARQUIVO_HORIZONTE_TTL)
+
+# A tabela do arquivo não some em tempo de execução: confirmada uma vez por processo
+_arquivo_existe = False
+
+
+class ArquivoCTEService:
+    """Arquivamento de CTEs baixados e escolha da fonte de leitura por período"""
+
+    # ==================== FONTE POR PERÍODO ====================
+
+    @staticmethod
+    def horizonte() -> Optional[date]:
+        """Maior data_emissao arquivada (None = arquivo vazio ou inexistente)"""
+        entrada = _cache_horizonte.obter('horizonte')
+        if entrada is not None and entrada[2] <= CTE_ARQUIVO_HORIZONTE_TTL:
+            return entrada[0]
+        global _arquivo_existe
+        horizonte = None
+        if not _arquivo_existe:
+            _arquivo_existe = inspect(db.session.connection()).has_table(TABELA_ARQUIVO)
+        if _arquivo_existe:
+            horizonte = db.session.execute(select(func.max(tabela_arquivo.c.data_emissao))).scalar()
+        _cache_horizonte.gravar('horizonte', horizonte)
+        return horizonte
+
+    @staticmethod
+    def precisa_arquivo(inicio: Optional[date] = None) -> bool:
+        """True se CTEs emitidos a partir de 'inicio' (None = todo o histórico) podem estar no arquivo"""
+        horizonte = ArquivoCTEService.horizonte()
+        return horizonte is not None and (inicio is None or inicio <= horizonte)
+
+    @staticmethod
+    def tabela_periodo(inicio: Optional[date] = None) -> str:
+        """Nome da tabela/view para SQL textual com data_emissao >= inicio"""
+        return VIEW_HISTORICO if ArquivoCTEService.precisa_arquivo(inicio) else TABELA_ATIVA
+
+    @staticmethod
+    def modelo_periodo(inicio: Optional[date] = None):
+        """CTE (tabela ativa) ou CTEHistorico (ativa + arquivo), conforme o período"""
+        return CTEHistorico if ArquivoCTEService.precisa_arquivo(inicio) else CTE
+
+    @staticmethod
+    def consulta_periodo(inicio: date, fim: Optional[date] = None):
+        """(modelo, query) dos CTEs emitidos em [inicio, fim]; fim None = sem limite"""
+        modelo = ArquivoCTEService.modelo_periodo(inicio)
+        query = db.session.query(modelo).filter(modelo.data_emissao >= inicio)
+        if fim is not None:
+            query = query.filter(modelo.data_emissao <= fim)
+        return modelo, query
+
+    # ==================== CTE POR NÚMERO ====================
+
+    @staticmethod
+    def arquivado(numero_cte: int) -> bool:
+        """True se o número está no arquivo"""
+        if ArquivoCTEService.horizonte() is None:
+            return False
+        return db.session.execute(
+            select(tabela_arquivo.c.id).where(tabela_arquivo.c.numero_cte == numero_cte).limit(1)
+        ).first() is not None
+
+    @staticmethod
+    def buscar(numero_cte: int) -> Optional[CTE]:
+        """CTE da tabela ativa ou, se arquivado, lido pela view histórica (somente leitura)"""
+        cte = CTE.query.filter_by(numero_cte=numero_cte).first()
+        if cte is None and ArquivoCTEService.horizonte() is not None:
+            cte = db.session.query(CTEHistorico).filter(CTEHistorico.numero_cte == numero_cte).first()
+        return cte
+
+    @staticmethod
+    def carregar_por_ids(ids) -> Dict[int, CTE]:
+        """CTEs por id: tabela ativa e, para os que faltarem, a view histórica"""
+        ids = set(ids)
+        if not ids:
+            return {}
+        por_id = {cte.id: cte for cte in CTE.query.filter(CTE.id.in_(ids)).all()}
+        faltantes = ids - set(por_id)
+        if faltantes and ArquivoCTEService.horizonte() is not None:
+            por_id.update({cte.id: cte for cte in db.session.query(CTEHistorico)
+                           .filter(CTEHistorico.id.in_(faltantes)).all()})
+        return por_id
+
+    @staticmethod
+    def desarquivar(numero_cte: int) -> bool:
+        """Devolve o CTE arquivado à tabela ativa, na transação corrente (sem commit)"""
+        if ArquivoCTEService.horizonte() is None:
+            return False
+        linhas = db.session.execute(
+            delete(tabela_arquivo).where(tabela_arquivo.c.numero_cte == numero_cte)
+            .returning(*[tabela_arquivo.c[c] for c in COLUNAS_CTE])
+        ).mappings().all()
+        if not linhas:
+            return False
+        # Rollup e sketches já contam os CTEs arquivados: a volta não altera os agregados
+        db.session.execute(insert(CTE.__table__), [dict(linha) for linha in linhas])
+        logger.info(f"CTE {numero_cte} devolvido do arquivo para a tabela ativa")
+        return True
+
+    # ==================== ARQUIVAMENTO ====================
+
+    @staticmethod
+    def data_corte(meses: int, hoje: Optional[date] = None) -> date:
+        """Primeiro dia do mês 'meses' meses antes do mês corrente"""
+        hoje = hoje or date.today()
+        indice = hoje.year * 12 + hoje.month - 1 - meses
+        return date(indice // 12, indice % 12 + 1, 1)
+
+    @staticmethod
+    def garantir_estrutura() -> None:
+        """Cria tabela de arquivo, view histórica e trigger de unicidade, se ainda não existirem"""
+        with db.engine.begin() as conexao:
+            tabela_arquivo.create(conexao, checkfirst=True)
+            criar_view_historico(conexao)
+            criar_trigger_numero_unico(conexao)
+
+    @staticmethod
+    def arquivar(meses: int = CTE_ARQUIVO_MESES, lote: int = CTE_ARQUIVO_LOTE,
+                 simular: bool = False) -> Dict:
+        """
+        Move os CTEs com data_baixa preenchida e data_emissao anterior ao corte
+        simular: só conta os candidatos por ano
+        """
+        inicio = time.time()
+        corte = ArquivoCTEService.data_corte(meses)
+        ativa = CTE.__table__
+        condicao = (ativa.c.data_baixa.isnot(None)) & (ativa.c.data_emissao < corte)
+
+        if simular:
+            ano = extract('year', ativa.c.data_emissao)
+            por_ano = db.session.execute(
+                select(ano, func.count()).where(condicao).group_by(ano).order_by(ano)
+            ).all()
+            return {
+                'corte': corte,
+                'movidos': 0,
+                'candidatos': sum(total for _, total in por_ano),
+                'por_ano': {int(a): total for a, total in por_ano},
+                'tempo_segundos': round(time.time() - inicio, 2),
+            }
+
+        ArquivoCTEService.garantir_estrutura()
+
+        movidos = 0
+        por_ano: Dict[int, int] = {}
+        while True:
+            ids = db.session.execute(
+                select(ativa.c.id).where(condicao).order_by(ativa.c.id).limit(lote)
+            ).scalars().all()
+            if not ids:
+                break
+
+            # Condição repetida no DELETE: CTE alterado entre o SELECT e o DELETE fica na ativa
+            linhas = db.session.execute(
+                delete(ativa).where(ativa.c.id.in_(ids), condicao).returning(*ativa.c)
+            ).mappings().all()
+            if linhas:
+                criar_particoes(db.session.connection(), {linha['data_emissao'].year for linha in linhas})
+                agora = datetime.utcnow()
+                db.session.execute(insert(tabela_arquivo), [
+                    {**linha, 'arquivado_em': agora} for linha in linhas
+                ])
+                for linha in linhas:
+                    ano = linha['data_emissao'].year
+                    por_ano[ano] = por_ano.get(ano, 0) + 1
+            db.session.commit()
+
+            movidos += len(linhas)
+            logger.info(f"Arquivamento: {movidos} CTEs movidos (corte {corte})")
+            if len(ids) < lote:
+                break
+
+        _cache_horizonte.invalidar()
+        return {
+            'corte': corte,
+            'movidos': movidos,
+            'candidatos': movidos,
+            'por_ano': dict(sorted(por_ano.items())),
+            'tempo_segundos': round(time.time() - inicio, 2),
+        }
@@ -1,25 +1,22 @@
 # app/services/atualizacao_service.py
 from __future__ import annotations
 
-print("DEBUG: Starting imports...")
+import logging
 from io import BytesIO
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
-print("DEBUG: Basic imports done")
 
 import pandas as pd
-print("DEBUG: pandas imported")
+
+logger = logging.getLogger(__name__)
 
 try:
     from app import db
-    print("DEBUG: app.db imported")
     from app.models.cte import CTE
-    print("DEBUG: CTE imported")
 except ImportError as e:
-    print(f"Import error: {e}")
+    logger.error(f"Import error: {e}")
     raise
 
-print("DEBUG: Defining constants...")
 ALIAS_COLUNAS = {
     # Cabeçalhos "humanos" -> campos do modelo
     "Número CTE": "numero_cte",
@@ -71,8 +68,6 @@ COLUNAS_COMPLETAS = [
 class AtualizacaoService:
     """Importação/atualização em lote de CTEs (CSV + Excel)."""
 
-    print("DEBUG: Inside class definition...")
-
     @staticmethod
     def _read_as_dataframe(file_storage) -> Tuple[bool, str, Optional[pd.DataFrame]]:
         """Lê CSV/Excel para DataFrame."""
@@ -220,7 +215,7 @@ class AtualizacaoService:
                     })
                     continue
 
-                cte = CTE.buscar_por_numero(numero)
+                cte = CTE.buscar_por_numero(numero, desarquivar=True)
 
                 if cte:
                     ok_upd, msg_upd = cte.atualizar(dados)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de Resultados Compartilhado - Dashboard Baker Flask
+app/services/cache_service.py
+
+Cache persistido em SQLite local, compartilhado entre os workers do gunicorn
+da mesma máquina. Suporta:
+- Expiração por TTL e por versão dos dados
+- Eviction LRU (por último acesso)
+- Limite de tamanho por entrada
+- Stale-while-revalidate (serve valor antigo da mesma versão e recalcula em background)
+
+Os valores são pickle: o arquivo fica num diretório da aplicação (instance/cache,
+modo 0700), nunca num diretório compartilhado como o /tmp.
+"""
+
+import contextvars
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_INSTANCE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                              'instance')
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH",
+    os.path.join(_INSTANCE_PATH, 'cache', 'dashboard_baker_cache.sqlite3')
+)
+CACHE_DESABILITADO = os.getenv("CACHE_DESABILITADO", "").lower() in ("1", "true", "sim")
+
+logger = logging.getLogger(__name__)
+
+
+class CacheResultados:
+    """Cache LRU de resultados com backend SQLite compartilhado entre processos"""
+
+    def __init__(self, namespace: str, caminho: str = None, max_entradas: int = 64,
+                 max_bytes_entrada: int = 2 * 1024 * 1024, ttl: int = 300,
+                 ttl_stale: int = 3600):
+        self.namespace = namespace
+        self.caminho = caminho or CACHE_DB_PATH
+        self.max_entradas = max_entradas
+        self.max_bytes_entrada = max_bytes_entrada
+        self.ttl = ttl
+        self.ttl_stale = ttl_stale
+
+        self._lock = threading.Lock()
+        self._revalidando = set()
+        self._schema_ok = False
+        self._local = threading.local()
+
+    # ==================== BACKEND SQLITE ====================
+
+    def _conectar(self) -> sqlite3.Connection:
+        """
+        Conexão por thread, mantida aberta (evita checkpoint do WAL a cada acesso)
+        Reaberta após fork, já que o gunicorn roda com --preload
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and getattr(self._local, 'pid', None) == os.getpid():
+            return conn
+
+        _preparar_diretorio(os.path.dirname(os.path.abspath(self.caminho)))
+        conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._schema_ok:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_resultados (
+                    namespace TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    versao TEXT,
+                    valor BLOB NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    criado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL,
+                    PRIMARY KEY (namespace, chave)
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_cache_resultados_lru
+                ON cache_resultados (namespace, acessado_em)
+            """)
+            self._schema_ok = True
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def normalizar_chave(chave: Hashable) -> str:
+        """Converte tupla/valor de filtros em chave textual estável"""
+        if isinstance(chave, (tuple, list)):
+            return "|".join("" if parte is None else str(parte) for parte in chave)
+        return str(chave)
+
+    # ==================== OPERAÇÕES BÁSICAS ====================
+
+    def obter(self, chave: Hashable) -> Optional[Tuple[Any, Optional[str], float]]:
+        """
+        Retorna (valor, versao, idade_segundos) ou None se ausente
+        Atualiza o instante de acesso para o LRU
+        """
+        if CACHE_DESABILITADO:
+            return None
+
+        chave_txt = self.normalizar_chave(chave)
+        try:
+            conn = self._conectar()
+            row = conn.execute(
+                "SELECT valor, versao, criado_em FROM cache_resultados "
+                "WHERE namespace = ? AND chave = ?",
+                (self.namespace, chave_txt)
+            ).fetchone()
+            if not row:
+                return None
+
+            conn.execute(
+                "UPDATE cache_resultados SET acessado_em = ? "
+                "WHERE namespace = ? AND chave = ?",
+                (time.time(), self.namespace, chave_txt)
+            )
+
+            valor = pickle.loads(row[0])
+            return valor, row[1], time.time() - row[2]
+
+        except Exception as e:
+            logger.warning(f"Cache {self.namespace}: erro ao ler '{chave_txt}': {e}")
+            return None
+
+    def gravar(self, chave: Hashable, valor: Any, versao: str = None) -> bool:
+        """Grava entrada respeitando limite de tamanho e eviction LRU"""
+        if CACHE_DESABILITADO:
+            return False
+
+        chave_txt = self.normalizar_chave(chave)
+        try:
+            dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(dados) > self.max_bytes_entrada:
+                logger.info(
+                    f"Cache {self.namespace}: entrada '{chave_txt}' ignorada "
+                    f"({len(dados)} bytes > limite {self.max_bytes_entrada})"
+                )
+                return False
+
+            agora = time.time()
+            conn = self._conectar()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_resultados "
+                "(namespace, chave, versao, valor, tamanho, criado_em, acessado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, chave_txt, versao, sqlite3.Binary(dados),
+                 len(dados), agora, agora)
+            )
+            # Eviction LRU: mantém apenas as N entradas acessadas mais recentemente
+            conn.execute(
+                "DELETE FROM cache_resultados WHERE namespace = ? AND chave NOT IN ("
+                "  SELECT chave FROM cache_resultados WHERE namespace = ? "
+                "  ORDER BY acessado_em DESC LIMIT ?"
+                ")",
+                (self.namespace, self.namespace, self.max_entradas)
+            )
+            return True
+
+        except Exception as e:
+            logger.warning(f"Cache {self.namespace}: erro ao gravar '{chave_txt}': {e}")
+            return False
+
+    def invalidar(self, chave: Hashable = None) -> None:
+        """Remove uma entrada ou todo o namespace"""
+        try:
+            conn = self._conectar()
+            if chave is None:
+                conn.execute("DELETE FROM cache_resultados WHERE namespace = ?",
+                             (self.namespace,))
+            else:
+                conn.execute(
+                    "DELETE FROM cache_resultados WHERE namespace = ? AND chave = ?",
+                    (self.namespace, self.normalizar_chave(chave))
+                )
+        except Exception as e:
+            logger.warning(f"Cache {self.namespace}: erro ao invalidar: {e}")
+
+    def estatisticas(self) -> Dict:
+        """Resumo de ocupação do namespace"""
+        try:
+            total, tamanho = self._conectar().execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM cache_resultados "
+                "WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+            return {
+                'namespace': self.namespace,
+                'entradas': int(total),
+                'bytes': int(tamanho),
+                'max_entradas': self.max_entradas,
+                'max_bytes_entrada': self.max_bytes_entrada
+            }
+        except Exception as e:
+            return {'namespace': self.namespace, 'erro': str(e)}
+
+    # ==================== STALE-WHILE-REVALIDATE ====================
+
+    def obter_ou_calcular(self, chave: Hashable, calcular: Callable[[], Any],
+                          versao: str = None) -> Any:
+        """
+        Retorna o valor em cache ou calcula e grava
+
+        - Entrada fresca (mesma versão e idade <= ttl): retorna direto
+        - Entrada velha da mesma versão (ttl < idade <= ttl_stale): retorna o
+          valor antigo e agenda recálculo em background
+        - Versão diferente ou sem entrada: calcula de forma síncrona
+        """
+        entrada = self.obter(chave)
+
+        if entrada is not None:
+            valor, versao_cache, idade = entrada
+            if versao is None or versao_cache == versao:
+                if idade <= self.ttl:
+                    return valor
+                if idade <= self.ttl_stale:
+                    self._revalidar_em_background(chave, calcular, versao)
+                    return valor
+
+        valor = calcular()
+        self.gravar(chave, valor, versao)
+        return valor
+
+    def _revalidar_em_background(self, chave: Hashable, calcular: Callable[[], Any],
+                                 versao: str = None) -> None:
+        """Recalcula a entrada numa thread, uma vez por chave por processo"""
+        chave_txt = self.normalizar_chave(chave)
+        with self._lock:
+            if chave_txt in self._revalidando:
+                return
+            self._revalidando.add(chave_txt)
+
+        app = None
+        try:
+            from flask import current_app
+            app = current_app._get_current_object()
+        except RuntimeError:
+            pass
+
+        def _executar():
+            try:
+                if app is not None:
+                    with app.app_context():
+                        valor = calcular()
+                else:
+                    valor = calcular()
+                self.gravar(chave, valor, versao)
+            except Exception as e:
+                logger.warning(f"Cache {self.namespace}: falha ao revalidar '{chave_txt}': {e}")
+            finally:
+                with self._lock:
+                    self._revalidando.discard(chave_txt)
+
+        # Mesmo contexto da requisição (classe de carga e roteamento de leitura)
+        contexto = contextvars.copy_context()
+        threading.Thread(target=contexto.run, args=(_executar,), name=f"cache-{self.namespace}",
+                         daemon=True).start()
+
+
+def _preparar_diretorio(diretorio: str) -> None:
+    """
+    Cria o diretório do cache só para o usuário do processo (0700)
+    Recusa um diretório de outro usuário ou acessível a outros: quem
+    grava no arquivo escolhe o que o pickle.loads executa
+    """
+    os.makedirs(diretorio, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return
+
+    info = os.stat(diretorio)
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"Diretório do cache {diretorio} pertence a outro usuário")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"Diretório do cache {diretorio} acessível a outros usuários (use modo 0700)")
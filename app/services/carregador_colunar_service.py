@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carregador Colunar de CTEs - Dashboard Baker Flask
+app/services/carregador_colunar_service.py
+
+Lê apenas as colunas necessárias direto do cursor DBAPI e monta arrays
+NumPy tipados (datetime64 / float64), sem materializar objetos ORM.
+- PostgreSQL (psycopg2): COPY ... TO STDOUT em CSV, lido pelo parser do pandas
+- Demais bancos: fetchall do cursor e transposição por coluna
+Datas são transferidas como dias desde 1970-01-01 e valores como float.
+Com filtro de período que alcança o arquivo, lê a view histórica.
+"""
+
+import io
+import logging
+from datetime import date
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app import db
+from app.utils.cargas_trabalho import aplicar_statement_timeout, marcar_cancelamento
+from app.utils.roteamento_db import engine_leitura
+
+logger = logging.getLogger(__name__)
+
+TABELA_CTE = 'dashboard_baker'
+
+# Tipo de transferência de cada coluna da tabela
+TIPOS_COLUNAS: Dict[str, str] = {
+    'id': 'inteiro',
+    'numero_cte': 'inteiro',
+    'destinatario_nome': 'texto',
+    'veiculo_placa': 'texto',
+    'valor_total': 'decimal',
+    'data_emissao': 'data',
+    'data_baixa': 'data',
+    'numero_fatura': 'texto',
+    'data_inclusao_fatura': 'data',
+    'data_envio_processo': 'data',
+    'primeiro_envio': 'data',
+    'data_rq_tmc': 'data',
+    'data_atesto': 'data',
+    'envio_final': 'data',
+    'observacao': 'texto',
+    'origem_dados': 'texto',
+}
+
+
+class CarregadorColunar:
+    """Carrega CTEs em DataFrame colunar a partir do cursor DBAPI"""
+
+    @staticmethod
+    def carregar_ctes(colunas: Sequence[str], data_inicio: Optional[date] = None,
+                      data_fim: Optional[date] = None, campo_data: str = 'data_emissao',
+                      cliente: Optional[str] = None, veiculo: Optional[str] = None,
+                      nao_nulos: Iterable[str] = (),
+                      incluir_arquivo: Optional[bool] = None) -> pd.DataFrame:
+        """
+        Retorna DataFrame com as colunas pedidas, já tipadas:
+        - datas como datetime64 (NaT para nulos)
+        - valor_total como float64
+        - textos como object/str (NaN para nulos)
+
+        Filtros equivalentes aos usados nas queries ORM dos serviços:
+        intervalo em campo_data, ILIKE em cliente/placa e colunas NOT NULL
+
+        incluir_arquivo: None = só quando há filtro de período (e ele alcança
+        o arquivo); True = histórico completo, podado por data_emissao
+        """
+        colunas = list(dict.fromkeys(colunas))
+        consulta = CarregadorColunar.montar_consulta(
+            colunas, data_inicio=data_inicio, data_fim=data_fim, campo_data=campo_data,
+            cliente=cliente, veiculo=veiculo, nao_nulos=nao_nulos, incluir_arquivo=incluir_arquivo
+        )
+
+        dialeto = db.engine.dialect.name
+        compilado = consulta.compile(dialect=db.engine.dialect)
+        sql_dbapi = str(compilado)
+        if compilado.positional:
+            params_dbapi = tuple(compilado.params[nome] for nome in compilado.positiontup)
+        else:
+            params_dbapi = compilado.params
+
+        # Usa a conexão da sessão atual (mesma transação das queries ORM);
+        # nas rotas analíticas, a da réplica de leitura
+        conexao_sa = db.session.connection(bind_arguments={'bind': engine_leitura()})
+        aplicar_statement_timeout(conexao_sa)
+        conexao = conexao_sa.connection
+        cursor = conexao.cursor()
+        try:
+            if hasattr(cursor, 'copy_expert') and hasattr(cursor, 'mogrify'):
+                df = CarregadorColunar._ler_via_copy(cursor, sql_dbapi, params_dbapi, colunas)
+            else:
+                df = CarregadorColunar._ler_via_cursor(
+                    cursor, sql_dbapi, params_dbapi, colunas,
+                    datas_em_dias=dialeto in ('postgresql', 'sqlite')
+                )
+        except Exception as e:
+            marcar_cancelamento(e)
+            raise
+        finally:
+            cursor.close()
+
+        logger.debug(f"Carga colunar: {len(df)} linhas x {len(colunas)} colunas")
+        return df
+
+    # ==================== SQL ====================
+
+    @staticmethod
+    def montar_consulta(colunas: Sequence[str], data_inicio: Optional[date] = None,
+                        data_fim: Optional[date] = None, campo_data: str = 'data_emissao',
+                        cliente: Optional[str] = None, veiculo: Optional[str] = None,
+                        nao_nulos: Iterable[str] = (),
+                        incluir_arquivo: Optional[bool] = None):
+        """SELECT textual (parâmetros já vinculados) de carregar_ctes"""
+        colunas = list(dict.fromkeys(colunas))
+        nao_nulos = list(nao_nulos)
+        for coluna in colunas + nao_nulos + [campo_data]:
+            if coluna not in TIPOS_COLUNAS:
+                raise ValueError(f"Coluna desconhecida para carga colunar: {coluna}")
+
+        dialeto = db.engine.dialect.name
+        select = ', '.join(
+            f"{CarregadorColunar._expressao_coluna(coluna, dialeto)} AS {coluna}"
+            for coluna in colunas
+        )
+
+        condicoes = []
+        params = {}
+        if data_inicio is not None:
+            condicoes.append(f"{campo_data} >= :data_inicio")
+            params['data_inicio'] = data_inicio
+        if data_fim is not None:
+            condicoes.append(f"{campo_data} <= :data_fim")
+            params['data_fim'] = data_fim
+        if cliente:
+            condicoes.append(CarregadorColunar._condicao_ilike('destinatario_nome', 'cliente', dialeto))
+            params['cliente'] = f'%{cliente}%'
+        if veiculo:
+            condicoes.append(CarregadorColunar._condicao_ilike('veiculo_placa', 'veiculo', dialeto))
+            params['veiculo'] = f'%{veiculo}%'
+        for coluna in nao_nulos:
+            condicoes.append(f"{coluna} IS NOT NULL")
+
+        if incluir_arquivo is None:
+            incluir_arquivo = data_inicio is not None or data_fim is not None
+        tabela = TABELA_CTE
+        if incluir_arquivo:
+            from app.services.arquivo_cte_service import ArquivoCTEService
+            tabela = ArquivoCTEService.tabela_periodo(data_inicio if campo_data == 'data_emissao' else None)
+
+        sql = f"SELECT {select} FROM {tabela}"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        return text(sql).bindparams(**params)
+
+    @staticmethod
+    def _expressao_coluna(coluna: str, dialeto: str) -> str:
+        """Expressão SQL de transferência conforme o tipo da coluna"""
+        tipo = TIPOS_COLUNAS[coluna]
+        if tipo == 'data':
+            if dialeto == 'postgresql':
+                return f"({coluna} - DATE '1970-01-01')"
+            if dialeto == 'sqlite':
+                return f"CAST(julianday({coluna}) - 2440587.5 AS INTEGER)"
+            return coluna
+        if tipo == 'decimal':
+            if dialeto == 'postgresql':
+                return f"CAST({coluna} AS DOUBLE PRECISION)"
+            return f"CAST({coluna} AS REAL)"
+        return coluna
+
+    @staticmethod
+    def _condicao_ilike(coluna: str, param: str, dialeto: str) -> str:
+        if dialeto == 'postgresql':
+            return f"{coluna} ILIKE :{param}"
+        return f"LOWER({coluna}) LIKE LOWER(:{param})"
+
+    # ==================== LEITURA ====================
+
+    @staticmethod
+    def _ler_via_copy(cursor, sql: str, params, colunas: Sequence[str]) -> pd.DataFrame:
+        """PostgreSQL: COPY em CSV e parser C do pandas, sem tupla Python por linha"""
+        consulta = cursor.mogrify(sql, params)
+        if isinstance(consulta, bytes):
+            consulta = consulta.decode('utf-8')
+
+        buffer = io.StringIO()
+        cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+        buffer.seek(0)
+
+        dtypes = {}
+        for coluna in colunas:
+            tipo = TIPOS_COLUNAS[coluna]
+            if tipo in ('data', 'decimal', 'inteiro'):
+                dtypes[coluna] = 'float64'
+            else:
+                dtypes[coluna] = 'object'
+
+        df = pd.read_csv(buffer, dtype=dtypes, keep_default_na=False,
+                         na_values={c: [''] for c in colunas})
+        return CarregadorColunar._tipar_colunas(
+            {coluna: df[coluna].to_numpy() for coluna in colunas}, colunas
+        )
+
+    @staticmethod
+    def _ler_via_cursor(cursor, sql: str, params, colunas: Sequence[str],
+                        datas_em_dias: bool = True) -> pd.DataFrame:
+        """Fallback genérico: transpõe as linhas do cursor em arrays por coluna"""
+        cursor.execute(sql, params)
+        linhas = cursor.fetchall()
+        transpostas = list(zip(*linhas)) if linhas else [()] * len(colunas)
+
+        brutos = {}
+        for indice, coluna in enumerate(colunas):
+            tipo = TIPOS_COLUNAS[coluna]
+            if tipo in ('decimal', 'inteiro') or (tipo == 'data' and datas_em_dias):
+                # None vira NaN na conversão para float64
+                brutos[coluna] = np.array(transpostas[indice], dtype=np.float64)
+            else:
+                brutos[coluna] = np.array(transpostas[indice], dtype=object)
+
+        return CarregadorColunar._tipar_colunas(brutos, colunas)
+
+    @staticmethod
+    def _tipar_colunas(brutos: Dict[str, np.ndarray], colunas: Sequence[str]) -> pd.DataFrame:
+        """Converte os arrays brutos para os dtypes finais"""
+        dados = {}
+        for coluna in colunas:
+            array = brutos[coluna]
+            tipo = TIPOS_COLUNAS[coluna]
+
+            if tipo == 'data':
+                if array.dtype == np.float64:
+                    dias = array
+                    validos = ~np.isnan(dias)
+                    convertido = np.full(len(dias), np.datetime64('NaT'), dtype='datetime64[ns]')
+                    convertido[validos] = dias[validos].astype('int64').astype('datetime64[D]')
+                    dados[coluna] = convertido
+                else:
+                    dados[coluna] = pd.to_datetime(array, errors='coerce')
+            elif tipo == 'decimal':
+                dados[coluna] = array.astype(np.float64)
+            elif tipo == 'inteiro':
+                array = array.astype(np.float64)
+                dados[coluna] = array.astype(np.int64) if not np.isnan(array).any() else array
+            else:
+                dados[coluna] = array
+
+        return pd.DataFrame(dados, columns=list(colunas))
+
+
+def carregar_ctes(colunas: Sequence[str], **filtros) -> pd.DataFrame:
+    """Atalho para CarregadorColunar.carregar_ctes"""
+    return CarregadorColunar.carregar_ctes(colunas, **filtros)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço de Checklists de Frotas - Dashboard Baker Flask
+app/services/checklist_service.py
+
+Listagem para API em uma única consulta: checklists com veículo, motorista
+(e e-mail do usuário) e modelo via JOIN, projetando apenas as colunas
+usadas. Paginação por keyset em (dt_inicio, id) decrescente: o cursor é a
+posição do último item, sem OFFSET. Veículos, motoristas e modelos aparecem
+uma vez no payload, referenciados por id em cada checklist.
+
+Submissão em lote: cabeçalho + todas as respostas validadas contra os itens
+do modelo (uma consulta), gravadas com um INSERT multi-linha e avaliadas
+quanto a itens que bloqueiam a viagem, tudo na mesma transação.
+"""
+
+import base64
+import binascii
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, insert, or_, select
+
+from app import db
+from app.models.frotas import Veiculo, Motorista, ChecklistModelo, ChecklistItem, Checklist, ChecklistResposta
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+FILTROS_LISTAGEM = ('status', 'tipo', 'veiculo_id', 'motorista_id', 'modelo_id')
+FILTROS_INTEIROS = ('veiculo_id', 'motorista_id', 'modelo_id')
+
+TIPOS_CHECKLIST = ('pre', 'pos', 'extra')
+
+# Valores aceitos por tipo_resposta (texto: qualquer valor não vazio)
+VALORES_RESPOSTA = {
+    'ok_nok': ('ok', 'nao_ok'),
+    'sim_nao': ('sim', 'nao'),
+}
+VALORES_REPROVADOS = ('nao_ok', 'nao')
+
+STATUS_LIBERADO = 'finalizado'
+STATUS_BLOQUEADO = 'aguardando_aprovacao'
+
+
+class ChecklistService:
+    """Consultas e gravações de checklists"""
+
+    # ==================== CURSOR ====================
+
+    @staticmethod
+    def codificar_cursor(dt_inicio: datetime, checklist_id: int) -> str:
+        bruto = f"{dt_inicio.isoformat()}|{checklist_id}".encode()
+        return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+    @staticmethod
+    def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+        try:
+            bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            data, checklist_id = bruto.rsplit('|', 1)
+            return datetime.fromisoformat(data), int(checklist_id)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise ValueError('Cursor inválido')
+
+    # ==================== LISTAGEM ====================
+
+    @staticmethod
+    def consulta_listagem(filtros: Dict = None, cursor: Optional[str] = None, limite: int = LIMITE_PADRAO):
+        """SELECT com os JOINs e a condição de keyset (limite + 1 para saber se há próxima página)"""
+        consulta = (
+            select(
+                Checklist.id, Checklist.codigo, Checklist.tipo, Checklist.status,
+                Checklist.odometro_ini, Checklist.odometro_fim,
+                Checklist.dt_inicio, Checklist.dt_fim, Checklist.observacoes_gerais,
+                Veiculo.id.label('veiculo_id'), Veiculo.placa, Veiculo.marca,
+                Veiculo.modelo.label('veiculo_modelo'), Veiculo.tipo.label('veiculo_tipo'),
+                Motorista.id.label('motorista_id'), Motorista.nome.label('motorista_nome'),
+                Motorista.cnh, Motorista.categoria, User.email,
+                ChecklistModelo.id.label('modelo_id'), ChecklistModelo.nome.label('modelo_nome'),
+                ChecklistModelo.tipo.label('modelo_tipo'), ChecklistModelo.versao,
+            )
+            .join(Veiculo, Veiculo.id == Checklist.veiculo_id)
+            .join(Motorista, Motorista.id == Checklist.motorista_id)
+            .outerjoin(User, User.id == Motorista.user_id)
+            .join(ChecklistModelo, ChecklistModelo.id == Checklist.modelo_id)
+            .where(Checklist.dt_inicio.isnot(None))
+        )
+
+        for campo, valor in (filtros or {}).items():
+            if campo in FILTROS_LISTAGEM and valor not in (None, ''):
+                if campo in FILTROS_INTEIROS:
+                    try:
+                        valor = int(valor)
+                    except (TypeError, ValueError):
+                        raise ValueError(f'Filtro {campo} inválido (inteiro esperado)')
+                consulta = consulta.where(getattr(Checklist, campo) == valor)
+
+        if cursor:
+            dt_cursor, id_cursor = ChecklistService.decodificar_cursor(cursor)
+            consulta = consulta.where(or_(
+                Checklist.dt_inicio < dt_cursor,
+                and_(Checklist.dt_inicio == dt_cursor, Checklist.id < id_cursor)
+            ))
+
+        return consulta.order_by(Checklist.dt_inicio.desc(), Checklist.id.desc()).limit(limite + 1)
+
+    @staticmethod
+    def listar(filtros: Dict = None, cursor: Optional[str] = None, limite: int = LIMITE_PADRAO) -> Dict:
+        """
+        Página de checklists com relacionados deduplicados
+        Retorna checklists, veiculos/motoristas/modelos (por id) e proximo_cursor
+        """
+        limite = max(1, min(int(limite), LIMITE_MAXIMO))
+        linhas = db.session.execute(ChecklistService.consulta_listagem(filtros, cursor, limite)).all()
+
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+
+        checklists, veiculos, motoristas, modelos = [], {}, {}, {}
+        for linha in linhas:
+            checklists.append({
+                'id': linha.id,
+                'codigo': linha.codigo,
+                'tipo': linha.tipo,
+                'status': linha.status,
+                'odometro_ini': linha.odometro_ini,
+                'odometro_fim': linha.odometro_fim,
+                'dt_inicio': linha.dt_inicio.isoformat() if linha.dt_inicio else None,
+                'dt_fim': linha.dt_fim.isoformat() if linha.dt_fim else None,
+                'observacoes_gerais': linha.observacoes_gerais,
+                'veiculo_id': linha.veiculo_id,
+                'motorista_id': linha.motorista_id,
+                'modelo_id': linha.modelo_id,
+            })
+            if linha.veiculo_id not in veiculos:
+                veiculos[linha.veiculo_id] = {
+                    'id': linha.veiculo_id,
+                    'placa': linha.placa,
+                    'marca': linha.marca,
+                    'modelo': linha.veiculo_modelo,
+                    'tipo': linha.veiculo_tipo,
+                }
+            if linha.motorista_id not in motoristas:
+                motoristas[linha.motorista_id] = {
+                    'id': linha.motorista_id,
+                    'nome': linha.motorista_nome,
+                    'cnh': linha.cnh,
+                    'categoria': linha.categoria,
+                    'email': linha.email,
+                }
+            if linha.modelo_id not in modelos:
+                modelos[linha.modelo_id] = {
+                    'id': linha.modelo_id,
+                    'nome': linha.modelo_nome,
+                    'tipo': linha.modelo_tipo,
+                    'versao': linha.versao,
+                }
+
+        ultimo = linhas[-1] if linhas else None
+        return {
+            'checklists': checklists,
+            'veiculos': {str(k): v for k, v in veiculos.items()},
+            'motoristas': {str(k): v for k, v in motoristas.items()},
+            'modelos': {str(k): v for k, v in modelos.items()},
+            'proximo_cursor': ChecklistService.codificar_cursor(ultimo.dt_inicio, ultimo.id)
+            if tem_mais else None,
+            'limite': limite,
+        }
+
+    # ==================== SUBMISSÃO EM LOTE ====================
+
+    @staticmethod
+    def registrar_submissao(dados: Dict) -> Tuple[bool, Dict]:
+        """
+        Grava checklist + respostas em uma transação
+        Retorna (True, {checklist, bloqueios, viagem_liberada}) ou (False, {erros})
+        """
+        erros: List[str] = []
+        try:
+            veiculo_id = int(dados['veiculo_id'])
+            motorista_id = int(dados['motorista_id'])
+            modelo_id = int(dados['modelo_id'])
+        except (KeyError, TypeError, ValueError):
+            return False, {'erros': ['veiculo_id, motorista_id e modelo_id são obrigatórios (inteiros)']}
+
+        tipo = dados.get('tipo')
+        if tipo not in TIPOS_CHECKLIST:
+            erros.append(f"tipo deve ser um de: {', '.join(TIPOS_CHECKLIST)}")
+
+        respostas = dados.get('respostas')
+        if not isinstance(respostas, list) or not respostas:
+            return False, {'erros': erros + ['respostas deve ser uma lista não vazia']}
+
+        dt_inicio = datetime.utcnow()
+        if dados.get('dt_inicio'):
+            try:
+                dt_inicio = datetime.fromisoformat(dados['dt_inicio'])
+                # Coluna em UTC sem fuso: converte offsets informados pelo cliente
+                if dt_inicio.tzinfo is not None:
+                    dt_inicio = dt_inicio.astimezone(timezone.utc).replace(tzinfo=None)
+            except (TypeError, ValueError):
+                erros.append('dt_inicio inválida (ISO 8601)')
+
+        odometros = {}
+        for campo in ('odometro_ini', 'odometro_fim'):
+            valor = dados.get(campo)
+            if valor in (None, ''):
+                odometros[campo] = None
+                continue
+            try:
+                odometros[campo] = int(str(valor).strip())
+            except ValueError:
+                erros.append(f'{campo} deve ser um inteiro')
+                continue
+            if odometros[campo] < 0:
+                erros.append(f'{campo} não pode ser negativo')
+
+        # Veículo, motorista e itens do modelo em uma consulta
+        itens, veiculo_ok, motorista_ok = ChecklistService._carregar_referencias(veiculo_id, motorista_id, modelo_id)
+        if not veiculo_ok:
+            erros.append(f'Veículo {veiculo_id} não encontrado ou inativo')
+        if not motorista_ok:
+            erros.append(f'Motorista {motorista_id} não encontrado ou inativo')
+        if not itens:
+            erros.append(f'Modelo {modelo_id} sem itens ou inexistente')
+
+        linhas, respondidos, bloqueios = [], set(), []
+        agora = datetime.utcnow()
+        for posicao, resposta in enumerate(respostas):
+            if not isinstance(resposta, dict):
+                erros.append(f'respostas[{posicao}]: objeto esperado')
+                continue
+            try:
+                item_id = int(resposta.get('item_id'))
+            except (TypeError, ValueError):
+                item_id = resposta.get('item_id')
+            item = itens.get(item_id)
+            if item is None:
+                erros.append(f'respostas[{posicao}]: item {item_id} não pertence ao modelo {modelo_id}')
+                continue
+            if item_id in respondidos:
+                erros.append(f'respostas[{posicao}]: item {item_id} respondido mais de uma vez')
+                continue
+            respondidos.add(item_id)
+
+            valor = str(resposta.get('valor') or '').strip()
+            aceitos = VALORES_RESPOSTA.get(item.tipo_resposta)
+            if not valor or (aceitos and valor not in aceitos):
+                erros.append(f"respostas[{posicao}]: valor inválido para item {item_id}"
+                             + (f" (use {', '.join(aceitos)})" if aceitos else ''))
+                continue
+            if item.exige_foto and not resposta.get('foto_url'):
+                erros.append(f'respostas[{posicao}]: item {item_id} exige foto')
+                continue
+
+            if item.bloqueia_viagem and valor in VALORES_REPROVADOS:
+                bloqueios.append({'item_id': item_id, 'descricao': item.descricao,
+                                  'severidade': item.severidade, 'valor': valor})
+            linhas.append({
+                'item_id': item_id,
+                'valor': valor[:100],
+                'observacao': resposta.get('observacao'),
+                'foto_url': resposta.get('foto_url'),
+                'dt_resposta': agora,
+            })
+
+        faltantes = sorted(set(itens) - respondidos)
+        if itens and faltantes:
+            erros.append(f"Itens sem resposta: {', '.join(map(str, faltantes))}")
+
+        if erros:
+            return False, {'erros': erros}
+
+        try:
+            checklist = Checklist(
+                codigo=dados.get('codigo') or None,
+                veiculo_id=veiculo_id,
+                motorista_id=motorista_id,
+                modelo_id=modelo_id,
+                tipo=tipo,
+                status=STATUS_BLOQUEADO if bloqueios else STATUS_LIBERADO,
+                odometro_ini=odometros['odometro_ini'] or 0,
+                odometro_fim=odometros['odometro_fim'],
+                dt_inicio=dt_inicio,
+                dt_fim=agora,
+                observacoes_gerais=dados.get('observacoes_gerais'),
+            )
+            db.session.add(checklist)
+            db.session.flush()
+
+            for linha in linhas:
+                linha['checklist_id'] = checklist.id
+            # INSERT multi-linha (executemany/insertmanyvalues), sem objetos ORM por resposta
+            db.session.execute(insert(ChecklistResposta), linhas)
+            # Lido antes do commit (que expira o objeto e forçaria um novo SELECT)
+            resumo = {
+                'id': checklist.id,
+                'codigo': checklist.codigo,
+                'status': checklist.status,
+                'respostas': len(linhas),
+            }
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar checklist: {e}")
+            return False, {'erros': ['Erro ao gravar checklist']}
+
+        return True, {
+            'checklist': resumo,
+            'viagem_liberada': not bloqueios,
+            'bloqueios': bloqueios,
+        }
+
+    @staticmethod
+    def _carregar_referencias(veiculo_id: int, motorista_id: int, modelo_id: int):
+        """Itens do modelo (por id) e se veículo/motorista existem e estão ativos"""
+        veiculo_ok = select(Veiculo.id).where(Veiculo.id == veiculo_id, Veiculo.ativo.is_(True)).exists()
+        motorista_ok = select(Motorista.id).where(Motorista.id == motorista_id, Motorista.ativo.is_(True)).exists()
+        consulta = (
+            select(veiculo_ok.label('veiculo_ok'), motorista_ok.label('motorista_ok'),
+                   ChecklistItem.id, ChecklistItem.descricao, ChecklistItem.tipo_resposta,
+                   ChecklistItem.severidade, ChecklistItem.exige_foto, ChecklistItem.bloqueia_viagem)
+            .select_from(ChecklistModelo)
+            .outerjoin(ChecklistItem, ChecklistItem.modelo_id == ChecklistModelo.id)
+            .where(ChecklistModelo.id == modelo_id, ChecklistModelo.ativo.is_(True))
+        )
+        linhas = db.session.execute(consulta).all()
+        if not linhas:
+            # Modelo inexistente: ainda assim informa veículo/motorista
+            flags = db.session.execute(select(veiculo_ok, motorista_ok)).one()
+            return {}, bool(flags[0]), bool(flags[1])
+        itens = {linha.id: linha for linha in linhas if linha.id is not None}
+        return itens, bool(linhas[0].veiculo_ok), bool(linhas[0].motorista_ok)
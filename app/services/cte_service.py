@@ -6,22 +6,30 @@ Serviço para operações com CTEs - Dashboard Baker Flask
 
 from app.models.cte import CTE
 from app import db
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.services.variacoes_service import VariacoesService
 from datetime import datetime, timedelta
 import pandas as pd
 from typing import Tuple, Dict
 from sqlalchemy import func, and_, or_
+import logging
+
+logger = logging.getLogger(__name__)
 
 class CTEService:
     """Serviço para operações com CTEs"""
 
     @staticmethod
     def buscar_cte(numero_cte: int):
-        """Busca CTE por número"""
-        return CTE.query.filter_by(numero_cte=numero_cte).first()
+        """Busca CTE por número (tabela ativa ou arquivo, este somente leitura)"""
+        return ArquivoCTEService.buscar(numero_cte)
 
     @staticmethod
     def criar_cte(dados: Dict) -> Tuple[bool, any]:
         """Cria novo CTE"""
+        numero = dados.get('numero_cte')
+        if numero is not None and (CTE.buscar_por_numero(numero) or ArquivoCTEService.arquivado(numero)):
+            return False, f"CTE {numero} já existe no sistema"
         try:
             cte = CTE(**dados)
             db.session.add(cte)
@@ -35,7 +43,7 @@ class CTEService:
     def atualizar_cte(numero_cte: int, dados: Dict) -> Tuple[bool, str]:
         """Atualiza CTE existente"""
         try:
-            cte = CTE.query.filter_by(numero_cte=numero_cte).first()
+            cte = CTE.buscar_por_numero(numero_cte, desarquivar=True)
             if not cte:
                 return False, "CTE não encontrado"
             
@@ -98,47 +106,29 @@ class CTEService:
                 }
             ]
             
+            # Todos os pares em uma única query agregada no banco
+            estatisticas = VariacoesService.calcular(configs_variacoes)
+            
             for config in configs_variacoes:
-                # Query para calcular diferenças
-                query = f"""
-                SELECT 
-                    EXTRACT(DAY FROM ({config['campo_fim']} - {config['campo_inicio']})) as dias
-                FROM dashboard_baker 
-                WHERE {config['campo_inicio']} IS NOT NULL 
-                AND {config['campo_fim']} IS NOT NULL
-                AND {config['campo_fim']} >= {config['campo_inicio']}
-                """
+                stats = estatisticas.get(config['codigo'])
+                if not stats:
+                    continue
                 
-                result = db.session.execute(query).fetchall()
-                
-                if result:
-                    dias = [row[0] for row in result if row[0] is not None]
-                    
-                    if dias:
-                        media = sum(dias) / len(dias)
-                        
-                        # Classificar performance
-                        if media <= config['meta_dias']:
-                            performance = 'excelente'
-                        elif media <= config['meta_dias'] * 1.5:
-                            performance = 'bom'
-                        elif media <= config['meta_dias'] * 2:
-                            performance = 'atencao'
-                        else:
-                            performance = 'critico'
-                        
-                        variacoes[config['codigo']] = {
-                            'nome': config['nome'],
-                            'media': media,
-                            'qtd': len(dias),
-                            'meta_dias': config['meta_dias'],
-                            'performance': performance,
-                            'min': min(dias),
-                            'max': max(dias)
-                        }
+                variacoes[config['codigo']] = {
+                    'nome': config['nome'],
+                    'media': stats['media'],
+                    'mediana': stats['mediana'],
+                    'p90': stats['p90'],
+                    'p95': stats['p95'],
+                    'qtd': stats['qtd'],
+                    'meta_dias': config['meta_dias'],
+                    'performance': VariacoesService.classificar_performance(stats['media'], config['meta_dias']),
+                    'min': stats['min'],
+                    'max': stats['max']
+                }
         
         except Exception as e:
-            print(f"Erro ao calcular variações: {str(e)}")
+            logger.error(f"Erro ao calcular variações: {str(e)}")
         
         return variacoes
 
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas de Frotas - Dashboard Baker Flask
+app/services/frotas_stats_service.py
+
+Todas as contagens de veículos, motoristas e checklists em uma única
+consulta (um agregado com COUNT(*) FILTER por tabela, unidos por CROSS JOIN),
+cacheadas no cache compartilhado com TTL curto e invalidadas após o commit
+de qualquer alteração em Veiculo, Motorista ou Checklist.
+"""
+
+import logging
+import os
+from datetime import date
+from typing import Dict
+
+from sqlalchemy import event, func, select, true
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models.frotas import Veiculo, Motorista, Checklist
+from app.services.cache_service import CacheResultados
+
+logger = logging.getLogger(__name__)
+
+FROTAS_STATS_TTL = int(os.getenv("FROTAS_STATS_TTL", "30"))
+
+STATUS_PENDENTE = 'aguardando_aprovacao'
+
+_cache_stats = CacheResultados('frotas_stats', max_entradas=8, max_bytes_entrada=16 * 1024,
+                               ttl=FROTAS_STATS_TTL, ttl_stale=FROTAS_STATS_TTL)
+
+
+class FrotasStatsService:
+    """Contagens agregadas para o dashboard e os widgets de frotas"""
+
+    @staticmethod
+    def consulta_stats(hoje: date):
+        """SELECT único: um agregado por tabela com COUNT(*) FILTER (WHERE ...)"""
+        veiculos = select(
+            func.count().label('veiculos_total'),
+            func.count().filter(Veiculo.ativo.is_(True)).label('veiculos_ativos'),
+            func.count().filter(Veiculo.em_manutencao.is_(True)).label('veiculos_manutencao'),
+        ).select_from(Veiculo).subquery('v')
+
+        motoristas = select(
+            func.count().label('motoristas_total'),
+            func.count().filter(Motorista.ativo.is_(True)).label('motoristas_ativos'),
+        ).select_from(Motorista).subquery('m')
+
+        checklists = select(
+            func.count().label('checklists_total'),
+            func.count().filter(Checklist.status == STATUS_PENDENTE).label('checklists_pendentes'),
+            func.count().filter(Checklist.dt_inicio >= hoje).label('checklists_hoje'),
+        ).select_from(Checklist).subquery('c')
+
+        return select(veiculos, motoristas, checklists).select_from(
+            veiculos.join(motoristas, true()).join(checklists, true())
+        )
+
+    @staticmethod
+    def calcular(hoje: date = None) -> Dict[str, int]:
+        linha = db.session.execute(FrotasStatsService.consulta_stats(hoje or date.today())).mappings().one()
+        return {chave: int(valor or 0) for chave, valor in linha.items()}
+
+    @staticmethod
+    def obter() -> Dict[str, int]:
+        """Estatísticas do cache (TTL FROTAS_STATS_TTL) ou uma consulta"""
+        hoje = date.today()
+        entrada = _cache_stats.obter(hoje.isoformat())
+        if entrada is not None:
+            return entrada[0]
+        stats = FrotasStatsService.calcular(hoje)
+        _cache_stats.gravar(hoje.isoformat(), stats)
+        return stats
+
+    @staticmethod
+    def invalidar_cache() -> None:
+        _cache_stats.invalidar()
+
+    @staticmethod
+    def agrupadas(stats: Dict[str, int]) -> Dict[str, Dict[str, int]]:
+        """Formato usado pelo template frotas/dashboard.html"""
+        return {
+            'veiculos': {
+                'total': stats['veiculos_total'],
+                'ativos': stats['veiculos_ativos'],
+                'manutencao': stats['veiculos_manutencao']
+            },
+            'motoristas': {
+                'total': stats['motoristas_total'],
+                'ativos': stats['motoristas_ativos']
+            },
+            'checklists': {
+                'total': stats['checklists_total'],
+                'pendentes': stats['checklists_pendentes']
+            }
+        }
+
+
+# ==================== INVALIDAÇÃO POR ALTERAÇÃO ====================
+
+def _marcar_frotas_alteradas(mapper, connection, target):
+    sessao = object_session(target)
+    if sessao is not None:
+        sessao.info['frotas_stats_alteradas'] = True
+
+
+for _modelo in (Veiculo, Motorista, Checklist):
+    for _evento in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_modelo, _evento, _marcar_frotas_alteradas)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_stats_apos_commit(session):
+    if session.info.pop('frotas_stats_alteradas', False):
+        FrotasStatsService.invalidar_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca_frotas(session):
+    session.info.pop('frotas_stats_alteradas', None)
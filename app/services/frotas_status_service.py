@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Status da Integração com o Sistema de Frotas - Dashboard Baker Flask
+app/services/frotas_status_service.py
+
+Uma thread em background por worker sonda FROTAS_API_URL periodicamente e
+publica o resultado no cache compartilhado (CacheResultados), com TTL:
+- Sucesso: próxima sonda em FROTAS_STATUS_INTERVALO segundos
+- Falha: intervalo dobra a cada falha consecutiva até FROTAS_STATUS_INTERVALO_MAX
+- Status publicado mais antigo que FROTAS_STATUS_TTL é tratado como indisponível
+O context processor e /frotas/status apenas leem o valor publicado; nenhuma
+renderização de página espera por HTTP.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from app.services.cache_service import CacheResultados
+
+logger = logging.getLogger(__name__)
+
+FROTAS_STATUS_INTERVALO = int(os.getenv("FROTAS_STATUS_INTERVALO", "30"))
+FROTAS_STATUS_INTERVALO_MAX = int(os.getenv("FROTAS_STATUS_INTERVALO_MAX", "300"))
+FROTAS_STATUS_TIMEOUT = float(os.getenv("FROTAS_STATUS_TIMEOUT", "2"))
+FROTAS_STATUS_TTL = int(os.getenv("FROTAS_STATUS_TTL", str(2 * FROTAS_STATUS_INTERVALO_MAX)))
+
+# Releitura do cache compartilhado no máximo a cada N segundos por processo
+_RELEITURA_SEGUNDOS = 2
+
+_CHAVE = 'frotas_api'
+
+_cache_status = CacheResultados('frotas_status', max_entradas=4, max_bytes_entrada=16 * 1024,
+                                ttl=FROTAS_STATUS_TTL, ttl_stale=FROTAS_STATUS_TTL)
+
+
+def sondar_frotas(base_url: str, timeout: float = FROTAS_STATUS_TIMEOUT) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Testa as rotas do sistema de frotas em ordem
+    Retorna (disponivel, url_respondeu, erro)
+    """
+    import requests
+
+    url = base_url.rstrip('/')
+    erro = None
+    with requests.Session() as sessao:
+        for url_teste in (f"{url}/docs", f"{url}/health", f"{url}/"):
+            try:
+                resposta = sessao.get(url_teste, timeout=timeout)
+                if resposta.status_code in (200, 404):  # 404 também indica que o serviço está rodando
+                    return True, url_teste, None
+                erro = f"{url_teste} -> HTTP {resposta.status_code}"
+            except requests.ConnectionError as e:
+                # Host recusando conexão: as outras rotas também falhariam
+                return False, None, f"{url_teste}: {e.__class__.__name__}"
+            except Exception as e:
+                erro = f"{url_teste}: {e.__class__.__name__}"
+    return False, None, erro
+
+
+class MonitorFrotas:
+    """Sonda em background + leitura do status publicado"""
+
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _pid: Optional[int] = None
+    _parar = threading.Event()
+
+    _ultimo: Optional[Dict] = None  # último status conhecido neste processo
+    _lido_em = 0.0
+
+    # ==================== LEITURA ====================
+
+    @classmethod
+    def status(cls) -> Dict:
+        """Status publicado (nunca faz HTTP); inicia o monitor se necessário"""
+        cls.iniciar()
+
+        agora = time.time()
+        if cls._ultimo is None or agora - cls._lido_em >= _RELEITURA_SEGUNDOS:
+            entrada = _cache_status.obter(_CHAVE)
+            if entrada is not None:
+                cls._ultimo = entrada[0]
+            cls._lido_em = agora
+
+        status = cls._ultimo
+        if status is None:
+            return {'disponivel': False, 'estado': 'desconhecido', 'verificado_em': None}
+
+        idade = agora - status['verificado_em_ts']
+        if idade > FROTAS_STATUS_TTL:
+            return {**status, 'disponivel': False, 'estado': 'expirado'}
+        return status
+
+    @classmethod
+    def disponivel(cls) -> bool:
+        return bool(cls.status()['disponivel'])
+
+    # ==================== SONDA ====================
+
+    @classmethod
+    def verificar_agora(cls) -> Dict:
+        """Sonda o sistema de frotas e publica o resultado com o próximo intervalo"""
+        from app.services.jwt_integration import FROTAS_API_URL
+
+        anterior = cls._ultimo or {}
+        inicio = time.perf_counter()
+        disponivel, url_ok, erro = sondar_frotas(FROTAS_API_URL)
+        latencia_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+        falhas = 0 if disponivel else anterior.get('falhas_consecutivas', 0) + 1
+        intervalo = min(FROTAS_STATUS_INTERVALO * (2 ** max(falhas - 1, 0)), FROTAS_STATUS_INTERVALO_MAX) \
+            if falhas else FROTAS_STATUS_INTERVALO
+
+        agora = time.time()
+        status = {
+            'disponivel': disponivel,
+            'estado': 'disponivel' if disponivel else 'indisponivel',
+            'url': url_ok,
+            'erro': erro,
+            'latencia_ms': latencia_ms,
+            'falhas_consecutivas': falhas,
+            'intervalo_segundos': intervalo,
+            'verificado_em': datetime.fromtimestamp(agora).isoformat(timespec='seconds'),
+            'verificado_em_ts': agora,
+        }
+
+        if disponivel != anterior.get('disponivel'):
+            nivel = logging.INFO if disponivel else logging.WARNING
+            logger.log(nivel, f"Sistema de frotas {status['estado']} ({url_ok or erro})")
+
+        cls._ultimo, cls._lido_em = status, agora
+        _cache_status.gravar(_CHAVE, status)
+        return status
+
+    @classmethod
+    def iniciar(cls) -> None:
+        """Inicia a thread do monitor uma vez por processo (seguro após fork do gunicorn)"""
+        pid = os.getpid()
+        if cls._pid == pid and cls._thread is not None and cls._thread.is_alive():
+            return
+        with cls._lock:
+            if cls._pid == pid and cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._parar = threading.Event()
+            cls._thread = threading.Thread(target=cls._executar, name='monitor-frotas', daemon=True)
+            cls._pid = pid
+            cls._thread.start()
+
+    @classmethod
+    def parar(cls) -> None:
+        cls._parar.set()
+
+    @classmethod
+    def _executar(cls) -> None:
+        parar = cls._parar
+        while not parar.is_set():
+            try:
+                espera = cls._segundos_ate_proxima()
+                if espera <= 0:
+                    espera = cls.verificar_agora()['intervalo_segundos']
+            except Exception as e:
+                logger.warning(f"Monitor de frotas: erro na verificação: {e}")
+                espera = FROTAS_STATUS_INTERVALO
+            parar.wait(espera)
+
+    @classmethod
+    def _segundos_ate_proxima(cls) -> float:
+        """
+        Tempo até a próxima sonda considerando o status publicado por qualquer
+        worker: se outro processo sondou há pouco, este apenas adota o resultado
+        """
+        entrada = _cache_status.obter(_CHAVE)
+        if entrada is None:
+            return 0
+        status = entrada[0]
+        cls._ultimo, cls._lido_em = status, time.time()
+        return status['verificado_em_ts'] + status['intervalo_segundos'] - time.time()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de Facetas de CTEs (bitmaps em memória) - Dashboard Baker Flask
+app/services/indice_facetas_service.py
+
+Construído a partir do snapshot colunar do histórico completo (tabela
+ativa + arquivo) e mantido por processo enquanto a versão dos dados
+(CTE.versao_dados) não muda:
+- Cada dimensão guarda um array de códigos + rótulos
+- Dimensões de baixa cardinalidade têm um bitmap (array bool) por valor
+- Filtros: OR entre valores da mesma dimensão, AND entre dimensões
+- Facetas: contagem por valor de cada dimensão sob os filtros das demais
+  (np.bincount sobre a máscara), sem queries COUNT adicionais
+"""
+
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.models.cte import CTE
+
+logger = logging.getLogger(__name__)
+
+DIMENSOES = ('status_baixa', 'status_processo', 'etapa', 'fatura', 'mes', 'cliente')
+
+# Dimensões com bitmap pré-calculado por valor
+DIMENSOES_BITMAP = ('status_baixa', 'status_processo', 'etapa', 'fatura', 'mes')
+
+# Valores de CTE.status_processo, na ordem de precedência
+ETAPAS = ('Finalizado', 'Completo', 'Envio Final', 'Atestado', 'Enviado', 'Emitido', 'Pendente')
+
+COLUNAS_INDICE = (
+    'id', 'numero_cte', 'destinatario_nome', 'veiculo_placa', 'numero_fatura', 'observacao',
+    'data_emissao', 'data_baixa', 'primeiro_envio', 'data_atesto', 'envio_final',
+)
+
+SEM_DATA = 'sem_data'
+
+
+class IndiceFacetas:
+    """Bitmaps e códigos por dimensão sobre todos os CTEs, ordenados por número desc"""
+
+    def __init__(self, df: pd.DataFrame, versao: Optional[str] = None):
+        inicio = time.perf_counter()
+        df = df.sort_values('numero_cte', ascending=False, kind='stable').reset_index(drop=True)
+
+        self.versao = versao
+        self.total = len(df)
+        self.ids = df['id'].to_numpy()
+        self.numeros = df['numero_cte'].to_numpy()
+        self.emissao = df['data_emissao'].to_numpy(dtype='datetime64[D]')
+        self._df_busca = df[['destinatario_nome', 'numero_fatura', 'veiculo_placa', 'observacao']]
+        self._texto_busca = None
+
+        tem_baixa = df['data_baixa'].notna().to_numpy()
+        tem_emissao = df['data_emissao'].notna().to_numpy()
+        tem_primeiro = df['primeiro_envio'].notna().to_numpy()
+        tem_atesto = df['data_atesto'].notna().to_numpy()
+        tem_envio_final = df['envio_final'].notna().to_numpy()
+        completo = tem_emissao & tem_primeiro & tem_atesto & tem_envio_final
+        # Mesma precedência de CTE.status_processo
+        etapa = np.select(
+            [completo & tem_baixa, completo, tem_envio_final, tem_atesto, tem_primeiro, tem_emissao],
+            list(ETAPAS[:-1]), default=ETAPAS[-1]
+        )
+        tem_fatura = (df['numero_fatura'].notna() & (df['numero_fatura'] != '')).to_numpy()
+
+        self.dimensoes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            'status_baixa': _codificar(np.where(tem_baixa, 'com_baixa', 'sem_baixa')),
+            'status_processo': _codificar(np.where(completo, 'completo', 'incompleto')),
+            'etapa': _codificar(etapa),
+            'fatura': _codificar(np.where(tem_fatura, 'com_fatura', 'sem_fatura')),
+            'mes': _codificar(df['data_emissao'].dt.strftime('%Y-%m').fillna(SEM_DATA).to_numpy()),
+            'cliente': _codificar(df['destinatario_nome'].fillna('').to_numpy()),
+        }
+
+        self.bitmaps: Dict[Tuple[str, str], np.ndarray] = {}
+        for dimensao in DIMENSOES_BITMAP:
+            rotulos, codigos = self.dimensoes[dimensao]
+            for i, rotulo in enumerate(rotulos):
+                self.bitmaps[(dimensao, rotulo)] = codigos == i
+
+        self.tempo_construcao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    # ==================== CONSTRUÇÃO / CACHE ====================
+
+    @classmethod
+    def construir(cls, versao: Optional[str] = None) -> 'IndiceFacetas':
+        from app.services.carregador_colunar_service import carregar_ctes
+        return cls(carregar_ctes(COLUNAS_INDICE, incluir_arquivo=True), versao)
+
+    @classmethod
+    def atual(cls) -> 'IndiceFacetas':
+        """Índice do processo; reconstruído quando a versão dos dados muda"""
+        global _indice
+        versao = CTE.versao_dados()
+        indice = _indice
+        if indice is not None and versao is not None and indice.versao == versao:
+            return indice
+
+        with _lock:
+            indice = _indice
+            if indice is None or versao is None or indice.versao != versao:
+                indice = cls.construir(versao)
+                _indice = indice
+                logger.info(f"Índice de facetas construído: {indice.total} CTEs "
+                            f"em {indice.tempo_construcao_ms} ms")
+        return indice
+
+    # ==================== FILTROS ====================
+
+    def mascara_dimensao(self, dimensao: str, valores: Iterable[str]) -> Optional[np.ndarray]:
+        """OR dos bitmaps dos valores; None = dimensão sem filtro"""
+        valores = [v for v in valores if v is not None and v != '']
+        if not valores:
+            return None
+        if dimensao not in self.dimensoes:
+            raise ValueError(f"Dimensão inválida: {dimensao}. Use uma de {', '.join(DIMENSOES)}")
+
+        if dimensao in DIMENSOES_BITMAP:
+            mascara = np.zeros(self.total, dtype=bool)
+            for valor in valores:
+                bitmap = self.bitmaps.get((dimensao, valor))
+                if bitmap is not None:
+                    mascara |= bitmap
+            return mascara
+
+        rotulos, codigos = self.dimensoes[dimensao]
+        selecionados = np.flatnonzero(np.isin(rotulos, valores))
+        return np.isin(codigos, selecionados)
+
+    def mascara_base(self, data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                     busca: str = '') -> np.ndarray:
+        """Filtros fora das facetas: período de emissão e busca textual"""
+        mascara = np.ones(self.total, dtype=bool)
+        if data_inicio is not None:
+            mascara &= self.emissao >= np.datetime64(data_inicio, 'D')
+        if data_fim is not None:
+            mascara &= self.emissao <= np.datetime64(data_fim, 'D')
+        busca = (busca or '').strip()
+        if busca:
+            if busca.isdigit():
+                mascara &= self.numeros == int(busca)
+            else:
+                mascara &= self.texto_busca.str.contains(busca.lower(), regex=False).to_numpy()
+        return mascara
+
+    @property
+    def texto_busca(self) -> pd.Series:
+        """Campos da busca textual concatenados em minúsculas (montado sob demanda)"""
+        if self._texto_busca is None:
+            partes = [self._df_busca[c].fillna('').astype(str).str.lower() for c in self._df_busca.columns]
+            texto = partes[0]
+            for parte in partes[1:]:
+                texto = texto + '\x00' + parte
+            self._texto_busca = texto
+        return self._texto_busca
+
+    # ==================== CONSULTA ====================
+
+    def consultar(self, filtros: Dict[str, List[str]] = None, data_inicio: Optional[date] = None,
+                  data_fim: Optional[date] = None, busca: str = '', pagina: int = 1,
+                  por_pagina: int = 50, com_facetas: bool = False,
+                  limite_valores: Optional[int] = None) -> Dict:
+        """
+        Total, ids da página (ordem numero_cte desc) e, opcionalmente, as
+        facetas de todas as dimensões para a combinação de filtros
+        """
+        filtros = filtros or {}
+        base = self.mascara_base(data_inicio, data_fim, busca)
+        por_dimensao = {
+            dimensao: self.mascara_dimensao(dimensao, filtros.get(dimensao) or [])
+            for dimensao in DIMENSOES
+        }
+
+        mascara = base.copy()
+        for parcial in por_dimensao.values():
+            if parcial is not None:
+                mascara &= parcial
+
+        posicoes = np.flatnonzero(mascara)
+        inicio = max(pagina - 1, 0) * por_pagina
+        resultado = {
+            'total': int(len(posicoes)),
+            'ids': self.ids[posicoes[inicio:inicio + por_pagina]].tolist(),
+        }
+
+        if com_facetas:
+            resultado['facetas'] = self.facetas(base, por_dimensao, limite_valores)
+        return resultado
+
+    def facetas(self, base: np.ndarray, por_dimensao: Dict[str, Optional[np.ndarray]],
+                limite_valores: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """
+        Contagem por valor de cada dimensão, aplicando os filtros das outras
+        Lista ordenada por mês (dimensão mes) ou por quantidade decrescente;
+        limite_valores restringe os clientes aos N maiores
+        """
+        resultado = {}
+        for dimensao in DIMENSOES:
+            mascara = base.copy()
+            for outra, parcial in por_dimensao.items():
+                if outra != dimensao and parcial is not None:
+                    mascara &= parcial
+
+            rotulos, codigos = self.dimensoes[dimensao]
+            contagens = np.bincount(codigos[mascara], minlength=len(rotulos))
+            presentes = np.flatnonzero(contagens)
+
+            if dimensao == 'mes':
+                ordem = presentes[np.argsort(rotulos[presentes], kind='stable')]
+            else:
+                ordem = presentes[np.argsort(-contagens[presentes], kind='stable')]
+            if dimensao == 'cliente' and limite_valores:
+                ordem = ordem[:limite_valores]
+            resultado[dimensao] = [{'valor': str(rotulos[i]), 'qtd': int(contagens[i])} for i in ordem]
+        return resultado
+
+
+def _codificar(valores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(rótulos únicos, código de cada linha)"""
+    rotulos, codigos = np.unique(valores.astype(object).astype(str), return_inverse=True)
+    return rotulos.astype(object), codigos.astype(np.int32)
+
+
+_indice: Optional[IndiceFacetas] = None
+_lock = threading.Lock()
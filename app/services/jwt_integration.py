@@ -7,12 +7,19 @@ Permite autenticação compartilhada entre os sistemas Transpontual
 
 import os
 import jwt
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from flask import request, session, redirect, url_for, g
 from flask_login import login_user
 from functools import wraps
 from typing import Optional, Dict, Any, List
 
+logger = logging.getLogger(__name__)
+
 # Tentar importar sistema unificado
 try:
     from transpontual_auth import (
@@ -26,16 +33,110 @@ try:
     )
     from transpontual_auth.utils import create_sso_url, get_system_urls
     UNIFIED_AUTH_AVAILABLE = True
-    print("[OK] Sistema unificado transpontual_auth disponivel")
+    logger.info("Sistema unificado transpontual_auth disponivel")
 except ImportError:
     UNIFIED_AUTH_AVAILABLE = False
-    print("Warning: transpontual_auth not available, using legacy system")
+    logger.warning("transpontual_auth not available, using legacy system")
 
 # Configurações JWT (mesmo secret do sistema de frotas)
-JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
+JWT_SECRET_PADRAO = "dev-secret"
+JWT_SECRET = os.getenv("JWT_SECRET", JWT_SECRET_PADRAO)
 FROTAS_API_URL = os.getenv("FROTAS_API_URL", "http://localhost:8005")  # FastAPI
 FROTAS_DASHBOARD_URL = os.getenv("FROTAS_DASHBOARD_URL", "http://localhost:8050")  # Flask Dashboard
 
+# Cache de tokens verificados (por processo)
+JWT_CACHE_MAX = int(os.getenv("JWT_CACHE_MAX", "1024"))
+# Validade máxima de uma entrada, mesmo que o exp do token seja maior:
+# limita o atraso de revogações feitas em outros workers
+JWT_CACHE_TTL_MAX = int(os.getenv("JWT_CACHE_TTL_MAX", "300"))
+
+
+class CacheTokensVerificados:
+    """
+    LRU de tokens JWT já verificados -> usuário resolvido
+    Chave = SHA-256 do token (o token em si não fica em memória);
+    entrada válida até o exp do token (limitado a JWT_CACHE_TTL_MAX)
+    """
+
+    def __init__(self, max_entradas: int = JWT_CACHE_MAX, ttl_max: int = JWT_CACHE_TTL_MAX):
+        self.max_entradas = max_entradas
+        self.ttl_max = ttl_max
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def obter(self, token: str) -> Optional[Dict[str, Any]]:
+        chave = self.digest(token)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            if entrada['expira_em'] <= time.time():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada
+
+    def gravar(self, token: str, user_id: int, user_data: Dict, auth_source: str) -> None:
+        agora = time.time()
+        expira_em = agora + self.ttl_max
+        try:
+            # Assinatura já verificada; aqui só interessa o exp
+            exp = jwt.decode(token, options={"verify_signature": False}).get('exp')
+            if exp is not None:
+                expira_em = min(expira_em, float(exp))
+        except Exception:
+            pass
+        if expira_em <= agora:
+            return
+
+        with self._lock:
+            self._entradas[self.digest(token)] = {
+                'user_id': user_id,
+                'user_data': user_data,
+                'auth_source': auth_source,
+                'expira_em': expira_em,
+            }
+            self._entradas.move_to_end(self.digest(token))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    # ==================== REVOGAÇÃO ====================
+
+    def revogar_token(self, token: str) -> bool:
+        with self._lock:
+            return self._entradas.pop(self.digest(token), None) is not None
+
+    def revogar_usuario(self, user_id: int) -> int:
+        with self._lock:
+            chaves = [c for c, e in self._entradas.items() if e['user_id'] == user_id]
+            for chave in chaves:
+                del self._entradas[chave]
+            return len(chaves)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+tokens_verificados = CacheTokensVerificados()
+
+
+def revogar_token_jwt(token: str) -> bool:
+    """Remove um token do cache de verificação (ex.: logout)"""
+    return bool(token) and tokens_verificados.revogar_token(token)
+
+
+def revogar_tokens_usuario(user_id: int) -> int:
+    """Remove todos os tokens de um usuário do cache (senha, perfil ou status alterados)"""
+    return tokens_verificados.revogar_usuario(user_id)
+
 
 def decode_jwt_token(token: str) -> Optional[Dict[Any, Any]]:
     """
@@ -49,17 +150,17 @@ def decode_jwt_token(token: str) -> Optional[Dict[Any, Any]]:
             if payload:
                 return extract_user_from_payload(payload)
         except Exception as e:
-            print(f"[WARNING] Erro no sistema unificado, tentando legado: {e}")
+            logger.warning(f"Erro no sistema unificado, tentando legado: {e}")
 
     # Sistema legado
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         return payload
     except jwt.ExpiredSignatureError:
-        print("[WARNING] Token expirado")
+        logger.info("Token expirado")
         return None
     except jwt.InvalidTokenError:
-        print("[WARNING] Token invalido")
+        logger.info("Token invalido")
         return None
 
 
@@ -86,13 +187,22 @@ def extract_jwt_from_request() -> Optional[str]:
     return None
 
 
+def segredo_jwt_configurado() -> bool:
+    """True se JWT_SECRET foi definido e não é o valor de desenvolvimento"""
+    return bool(JWT_SECRET) and JWT_SECRET != JWT_SECRET_PADRAO
+
+
 def verificar_autenticacao_jwt():
     """
     Middleware que verifica autenticação JWT antes de cada requisição
     """
-    # Pular verificação para rotas públicas
-    rotas_publicas = ['/auth/login', '/static/', '/health', '/']
-    if any(request.path.startswith(rota) for rota in rotas_publicas):
+    # Sem segredo configurado qualquer um forjaria um token: login automático desligado
+    if not segredo_jwt_configurado():
+        return
+
+    # Pular verificação para rotas públicas ('/' só a raiz, não como prefixo)
+    prefixos_publicos = ['/auth/login', '/static/', '/health']
+    if request.path == '/' or any(request.path.startswith(rota) for rota in prefixos_publicos):
         return
 
     # Verificar se já está logado no Flask
@@ -105,6 +215,21 @@ def verificar_autenticacao_jwt():
     if not token:
         return  # Prosseguir sem JWT
 
+    # Token já verificado: sem nova checagem de assinatura nem busca por email/username
+    entrada = tokens_verificados.obter(token)
+    if entrada is not None:
+        try:
+            from app.services.usuario_cache_service import carregar_usuario
+
+            user = carregar_usuario(entrada['user_id'])
+            if user and user.ativo:
+                _efetivar_login_jwt(user, token, entrada['user_data'], entrada['auth_source'])
+                return
+            tokens_verificados.revogar_usuario(entrada['user_id'])
+        except Exception as e:
+            logger.error(f"❌ Erro na autenticação JWT (cache): {e}")
+        return
+
     # Decodificar token
     payload = decode_jwt_token(token)
     if not payload:
@@ -145,22 +270,27 @@ def verificar_autenticacao_jwt():
             user = User.query.filter_by(username=user_data['username']).first()
 
         if user and user.ativo:
-            # Fazer login automático
-            login_user(user, remember=True)
+            _efetivar_login_jwt(user, token, user_data, auth_source)
+            tokens_verificados.gravar(token, user.id, user_data, auth_source)
 
-            # Salvar informações do JWT na sessão
-            session['jwt_token'] = token
-            session['jwt_user_data'] = user_data
-            session['auth_source'] = auth_source
+            logger.info(f"Usuario autenticado via {auth_source}: {user.username}")
 
-            # Salvar no g para uso durante a requisição
-            g.jwt_authenticated = True
-            g.jwt_user_data = user_data
+    except Exception as e:
+        logger.error(f"❌ Erro na autenticação JWT: {e}")
 
-            print(f"[OK] Usuario autenticado via {auth_source}: {user.username}")
 
-    except Exception as e:
-        print(f"❌ Erro na autenticação JWT: {e}")
+def _efetivar_login_jwt(user, token: str, user_data: Dict, auth_source: str) -> None:
+    """Login automático + dados do JWT na sessão e no g"""
+    login_user(user, remember=True)
+
+    # Salvar informações do JWT na sessão
+    session['jwt_token'] = token
+    session['jwt_user_data'] = user_data
+    session['auth_source'] = auth_source
+
+    # Salvar no g para uso durante a requisição
+    g.jwt_authenticated = True
+    g.jwt_user_data = user_data
 
 
 def requires_frotas_access(f):
@@ -256,7 +386,7 @@ def create_user_sso_token(user, target_system: str = "baker") -> Optional[str]:
         )
 
     except Exception as e:
-        print(f"❌ Erro criando token SSO: {e}")
+        logger.error(f"❌ Erro criando token SSO: {e}")
         return None
 
 
@@ -324,40 +454,20 @@ def get_cross_system_navigation_links(current_user) -> List[Dict[str, str]]:
         return links
 
     except Exception as e:
-        print(f"❌ Erro gerando links de navegação: {e}")
+        logger.error(f"❌ Erro gerando links de navegação: {e}")
         return []
 
 
 def verificar_integracao_disponivel() -> bool:
     """
     Verifica se a integração com o sistema de frotas está disponível
+    Lê o status publicado pelo monitor em background (sem chamadas HTTP)
     """
     try:
-        import requests
-
-        # URL do sistema de frotas (garantir que não tenha barra no final)
-        url = FROTAS_API_URL.rstrip('/')
-
-        # Testar primeiro a rota de documentação (mais confiável)
-        test_urls = [
-            f"{url}/docs",
-            f"{url}/health",
-            f"{url}/"
-        ]
-
-        for test_url in test_urls:
-            try:
-                response = requests.get(test_url, timeout=3)
-                if response.status_code in [200, 404]:  # 404 também indica que o serviço está rodando
-                    print(f"[OK] Sistema de frotas disponível: {test_url} -> {response.status_code}")
-                    return True
-            except Exception as e:
-                print(f"[ERRO] Erro testando {test_url}: {e}")
-                continue
-
-        return False
+        from app.services.frotas_status_service import MonitorFrotas
+        return MonitorFrotas.disponivel()
     except Exception as e:
-        print(f"[ERRO] Erro geral na verificação: {e}")
+        logger.error(f"Erro lendo status do sistema de frotas: {e}")
         return False
 
 
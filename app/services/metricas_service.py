@@ -6,23 +6,30 @@ Sistema completo de análise financeira e produtividade
 VERSÃO SEM PANDAS - Deploy Básico
 """
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 # 🔄 IMPORTS MODIFICADOS - SEM PANDAS/NUMPY
 try:
     import pandas as pd
     import numpy as np
     PANDAS_AVAILABLE = True
-    print("[OK] Pandas disponivel - funcionalidades completas")
+    logger.debug("Pandas disponivel - funcionalidades completas")
 except ImportError:
     pd = None
     np = None
     PANDAS_AVAILABLE = False
-    print("[AVISO] Pandas nao disponivel - modo basico ativado")
+    logger.warning("Pandas nao disponivel - modo basico ativado")
 
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from app.models.cte import CTE
+from app.services.arquivo_cte_service import ArquivoCTEService
 from app import db
-from sqlalchemy import func, and_, or_
+from flask import g, has_app_context
+from sqlalchemy import event, func, and_, or_
+from sqlalchemy.orm import Session
 import statistics
 
 # Configurações de Alertas Inteligentes - ATUALIZADAS
@@ -119,6 +126,99 @@ VARIACOES_CONFIG = [
     }
 ]
 
+class SnapshotCTE:
+    """
+    Snapshot colunar do histórico de CTEs (tabela ativa + arquivo)
+    compartilhado dentro de uma requisição
+    Carrega as colunas uma única vez e guarda, sob demanda, os derivados
+    (máscaras, agrupamento mensal, dias corridos) usados pelas métricas
+    """
+    
+    COLUNAS = (
+        'id', 'numero_cte', 'destinatario_nome', 'veiculo_placa', 'valor_total',
+        'data_emissao', 'data_baixa', 'numero_fatura', 'data_inclusao_fatura',
+        'data_envio_processo', 'primeiro_envio', 'data_rq_tmc', 'data_atesto',
+        'envio_final'
+    )
+    
+    def __init__(self):
+        self._df = None
+        self._derivados = {}
+    
+    @staticmethod
+    def atual() -> 'SnapshotCTE':
+        """Snapshot da requisição corrente (flask.g); fora de contexto, um novo"""
+        if not has_app_context():
+            return SnapshotCTE()
+        snapshot = g.get('snapshot_cte')
+        if snapshot is None:
+            snapshot = g.snapshot_cte = SnapshotCTE()
+        return snapshot
+    
+    @staticmethod
+    def descartar() -> None:
+        if has_app_context():
+            g.pop('snapshot_cte', None)
+    
+    @property
+    def df(self):
+        if self._df is None:
+            from app.services.carregador_colunar_service import carregar_ctes
+            df = carregar_ctes(self.COLUNAS, incluir_arquivo=True)
+            df['valor_total'] = df['valor_total'].fillna(0.0)
+            df['has_baixa'] = df['data_baixa'].notna()
+            df['processo_completo'] = (
+                df['data_emissao'].notna() & df['primeiro_envio'].notna() &
+                df['data_atesto'].notna() & df['envio_final'].notna()
+            )
+            df['mes_emissao'] = df['data_emissao'].dt.strftime('%Y-%m')
+            self._df = df
+        return self._df
+    
+    @property
+    def vazio(self) -> bool:
+        return self.df.empty
+    
+    def _derivado(self, chave, calcular):
+        if chave not in self._derivados:
+            self._derivados[chave] = calcular()
+        return self._derivados[chave]
+    
+    def mascara(self, nome: str):
+        """Máscaras booleanas reutilizáveis"""
+        df = self.df
+        calculos = {
+            'has_baixa': lambda: df['has_baixa'],
+            'processo_completo': lambda: df['processo_completo'],
+            'tem_fatura': lambda: df['numero_fatura'].notna() & (df['numero_fatura'] != ''),
+            'tem_envio_final': lambda: df['envio_final'].notna(),
+            'tem_emissao': lambda: df['data_emissao'].notna(),
+        }
+        return self._derivado(('mascara', nome), calculos[nome])
+    
+    def receita_mensal(self):
+        """Receita e quantidade por mês de emissão (ordenado)"""
+        return self._derivado('receita_mensal', lambda: self.df[self.mascara('tem_emissao')].groupby(
+            'mes_emissao').agg(valor_total=('valor_total', 'sum'), quantidade=('numero_cte', 'count')))
+    
+    def dias_desde(self, campo: str):
+        """Dias corridos desde a data do campo até hoje"""
+        def calcular():
+            hoje = pd.Timestamp(datetime.now().date())
+            return (hoje - self.df[campo]).dt.days
+        return self._derivado(('dias_desde', campo), calcular)
+
+
+def _descartar_snapshot_apos_escrita(session, flush_context):
+    """CTE gravado na requisição invalida o snapshot (evita leitura defasada)"""
+    if any(isinstance(obj, CTE) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        SnapshotCTE.descartar()
+
+
+if PANDAS_AVAILABLE:
+    event.listen(Session, 'after_flush', _descartar_snapshot_apos_escrita)
+
+
 class MetricasService:
     """Serviço completo de métricas financeiras e produtividade"""
     
@@ -126,21 +226,26 @@ class MetricasService:
     def gerar_metricas_expandidas() -> Dict:
         """Gera métricas expandidas com análises avançadas"""
         try:
-            # Buscar todos os CTEs
-            ctes = CTE.query.all()
+            if PANDAS_AVAILABLE:
+                # Usar versão com pandas sobre o snapshot da requisição
+                snapshot = SnapshotCTE.atual()
+                
+                if snapshot.vazio:
+                    return MetricasService._metricas_vazias()
+                
+                return MetricasService._calcular_metricas_pandas(snapshot)
+            
+            # Buscar todos os CTEs (inclusive arquivados)
+            ctes = db.session.query(ArquivoCTEService.modelo_periodo()).all()
             
             if not ctes:
                 return MetricasService._metricas_vazias()
             
-            if PANDAS_AVAILABLE:
-                # Usar versão com pandas se disponível
-                return MetricasService._calcular_metricas_pandas(ctes)
-            else:
-                # Usar versão nativa Python
-                return MetricasService._calcular_metricas_nativas(ctes)
+            # Usar versão nativa Python
+            return MetricasService._calcular_metricas_nativas(ctes)
             
         except Exception as e:
-            print(f"Erro ao gerar métricas: {e}")
+            logger.error(f"Erro ao gerar métricas: {e}")
             return MetricasService._metricas_vazias()
     
     @staticmethod
@@ -226,32 +331,10 @@ class MetricasService:
         }
     
     @staticmethod
-    def _calcular_metricas_pandas(ctes: List) -> Dict:
-        """Calcula métricas usando pandas (se disponível)"""
-        # Converter para DataFrame para análise
-        dados = []
-        for cte in ctes:
-            dados.append({
-                'numero_cte': cte.numero_cte,
-                'destinatario_nome': cte.destinatario_nome,
-                'veiculo_placa': cte.veiculo_placa,
-                'valor_total': float(cte.valor_total or 0),
-                'data_emissao': cte.data_emissao,
-                'data_baixa': cte.data_baixa,
-                'numero_fatura': cte.numero_fatura,
-                'data_inclusao_fatura': cte.data_inclusao_fatura,
-                'data_envio_processo': cte.data_envio_processo,
-                'primeiro_envio': cte.primeiro_envio,
-                'data_rq_tmc': cte.data_rq_tmc,
-                'data_atesto': cte.data_atesto,
-                'envio_final': cte.envio_final,
-                'has_baixa': cte.has_baixa,
-                'processo_completo': cte.processo_completo
-            })
-        
-        df = pd.DataFrame(dados)
+    def _calcular_metricas_pandas(snapshot: SnapshotCTE) -> Dict:
+        """Calcula métricas usando pandas sobre o snapshot da requisição"""
+        df = snapshot.df
         
-        # Calcular métricas com pandas (código original)
         total_ctes = len(df)
         
         # Métricas básicas
@@ -260,27 +343,28 @@ class MetricasService:
         veiculos_ativos = df['veiculo_placa'].nunique()
         
         # Métricas de faturamento
-        faturas_pagas = len(df[df['has_baixa'] == True])
-        faturas_pendentes = len(df[df['has_baixa'] == False])
-        valor_pago = df[df['has_baixa'] == True]['valor_total'].sum()
-        valor_pendente = df[df['has_baixa'] == False]['valor_total'].sum()
+        has_baixa = snapshot.mascara('has_baixa')
+        faturas_pagas = int(has_baixa.sum())
+        faturas_pendentes = total_ctes - faturas_pagas
+        valor_pago = df.loc[has_baixa, 'valor_total'].sum()
+        valor_pendente = df.loc[~has_baixa, 'valor_total'].sum()
         
         # Métricas de fatura
-        tem_fatura = df['numero_fatura'].notna() & (df['numero_fatura'] != '')
-        ctes_com_fatura = len(df[tem_fatura])
-        ctes_sem_fatura = len(df[~tem_fatura])
-        valor_com_fatura = df[tem_fatura]['valor_total'].sum()
-        valor_sem_fatura = df[~tem_fatura]['valor_total'].sum()
+        tem_fatura = snapshot.mascara('tem_fatura')
+        ctes_com_fatura = int(tem_fatura.sum())
+        ctes_sem_fatura = total_ctes - ctes_com_fatura
+        valor_com_fatura = df.loc[tem_fatura, 'valor_total'].sum()
+        valor_sem_fatura = df.loc[~tem_fatura, 'valor_total'].sum()
         
         # Métricas de envio final
-        tem_envio_final = df['envio_final'].notna()
-        ctes_com_envio_final = len(df[tem_envio_final])
-        ctes_sem_envio_final = len(df[~tem_envio_final])
-        valor_com_envio_final = df[tem_envio_final]['valor_total'].sum()
-        valor_sem_envio_final = df[~tem_envio_final]['valor_total'].sum()
+        tem_envio_final = snapshot.mascara('tem_envio_final')
+        ctes_com_envio_final = int(tem_envio_final.sum())
+        ctes_sem_envio_final = total_ctes - ctes_com_envio_final
+        valor_com_envio_final = df.loc[tem_envio_final, 'valor_total'].sum()
+        valor_sem_envio_final = df.loc[~tem_envio_final, 'valor_total'].sum()
         
         # Processos completos
-        processos_completos = len(df[df['processo_completo'] == True])
+        processos_completos = int(snapshot.mascara('processo_completo').sum())
         processos_incompletos = total_ctes - processos_completos
         
         # Métricas financeiras avançadas
@@ -289,7 +373,7 @@ class MetricasService:
         menor_valor = df['valor_total'].min() if total_ctes > 0 else 0.0
         
         # Análise temporal
-        receita_mensal_media, crescimento_mensal = MetricasService._calcular_crescimento_mensal(df)
+        receita_mensal_media, crescimento_mensal = MetricasService._calcular_crescimento_mensal(snapshot)
         
         resultado = {
             'total_ctes': total_ctes,
@@ -359,25 +443,17 @@ class MetricasService:
             return receita_media, crescimento
             
         except Exception as e:
-            print(f"Erro no cálculo de crescimento nativo: {e}")
+            logger.error(f"Erro no cálculo de crescimento nativo: {e}")
             return 0.0, 0.0
     
     @staticmethod
-    def _calcular_crescimento_mensal(df) -> Tuple[float, float]:
+    def _calcular_crescimento_mensal(snapshot: SnapshotCTE) -> Tuple[float, float]:
         """Calcula receita mensal média e crescimento (versão pandas)"""
         try:
-            df_temp = df[df['data_emissao'].notna()].copy()
-            if df_temp.empty:
+            receita_mensal = snapshot.receita_mensal()['valor_total']
+            if receita_mensal.empty:
                 return 0.0, 0.0
             
-            # Converter para datetime se necessário
-            if not pd.api.types.is_datetime64_any_dtype(df_temp['data_emissao']):
-                df_temp['data_emissao'] = pd.to_datetime(df_temp['data_emissao'])
-            
-            # Agrupar por mês
-            df_temp['mes_ano'] = df_temp['data_emissao'].dt.to_period('M')
-            receita_mensal = df_temp.groupby('mes_ano')['valor_total'].sum()
-            
             receita_media = receita_mensal.mean() if len(receita_mensal) > 0 else 0.0
             
             # Crescimento (últimos 2 meses)
@@ -391,7 +467,7 @@ class MetricasService:
             return receita_media, crescimento
             
         except Exception as e:
-            print(f"Erro no cálculo de crescimento: {e}")
+            logger.error(f"Erro no cálculo de crescimento: {e}")
             return 0.0, 0.0
     
     @staticmethod
@@ -405,15 +481,23 @@ class MetricasService:
             'envio_final_pendente': {'qtd': 0, 'valor': 0.0, 'lista': []}
         }
         
+        if PANDAS_AVAILABLE:
+            try:
+                return MetricasService._calcular_alertas_snapshot(SnapshotCTE.atual(), alertas)
+            except Exception as e:
+                logger.error(f"Erro ao calcular alertas: {e}")
+                return alertas
+        
         try:
             hoje = datetime.now().date()
+            modelo = ArquivoCTEService.modelo_periodo()
             
             # 1. CTEs sem aprovação (7 dias após emissão)
-            ctes_sem_aprovacao = CTE.query.filter(
+            ctes_sem_aprovacao = db.session.query(modelo).filter(
                 and_(
-                    CTE.data_emissao.isnot(None),
-                    CTE.data_atesto.is_(None),
-                    func.date_part('day', func.now() - CTE.data_emissao) > ALERTAS_CONFIG['ctes_sem_aprovacao']['dias_limite']
+                    modelo.data_emissao.isnot(None),
+                    modelo.data_atesto.is_(None),
+                    func.date_part('day', func.now() - modelo.data_emissao) > ALERTAS_CONFIG['ctes_sem_aprovacao']['dias_limite']
                 )
             ).all()
             
@@ -425,11 +509,11 @@ class MetricasService:
                 }
             
             # 2. CTEs sem faturas (3 dias após atesto)
-            ctes_sem_faturas = CTE.query.filter(
+            ctes_sem_faturas = db.session.query(modelo).filter(
                 and_(
-                    CTE.data_atesto.isnot(None),
-                    or_(CTE.numero_fatura.is_(None), CTE.numero_fatura == ''),
-                    func.date_part('day', func.now() - CTE.data_atesto) > ALERTAS_CONFIG['ctes_sem_faturas']['dias_limite']
+                    modelo.data_atesto.isnot(None),
+                    or_(modelo.numero_fatura.is_(None), modelo.numero_fatura == ''),
+                    func.date_part('day', func.now() - modelo.data_atesto) > ALERTAS_CONFIG['ctes_sem_faturas']['dias_limite']
                 )
             ).all()
             
@@ -441,11 +525,11 @@ class MetricasService:
                 }
             
             # 3. Faturas vencidas (90 dias após ENVIO FINAL, sem baixa) - LÓGICA CORRIGIDA
-            faturas_vencidas = CTE.query.filter(
+            faturas_vencidas = db.session.query(modelo).filter(
                 and_(
-                    CTE.envio_final.isnot(None),  # MUDANÇA: após envio final
-                    CTE.data_baixa.is_(None),
-                    func.date_part('day', func.now() - CTE.envio_final) > ALERTAS_CONFIG['faturas_vencidas']['dias_limite']
+                    modelo.envio_final.isnot(None),  # MUDANÇA: após envio final
+                    modelo.data_baixa.is_(None),
+                    func.date_part('day', func.now() - modelo.envio_final) > ALERTAS_CONFIG['faturas_vencidas']['dias_limite']
                 )
             ).all()
             
@@ -457,11 +541,11 @@ class MetricasService:
                 }
             
             # 4. Primeiro envio pendente (10 dias após emissão)
-            primeiro_envio_pendente = CTE.query.filter(
+            primeiro_envio_pendente = db.session.query(modelo).filter(
                 and_(
-                    CTE.data_emissao.isnot(None),
-                    CTE.primeiro_envio.is_(None),
-                    func.date_part('day', func.now() - CTE.data_emissao) > ALERTAS_CONFIG['primeiro_envio_pendente']['dias_limite']
+                    modelo.data_emissao.isnot(None),
+                    modelo.primeiro_envio.is_(None),
+                    func.date_part('day', func.now() - modelo.data_emissao) > ALERTAS_CONFIG['primeiro_envio_pendente']['dias_limite']
                 )
             ).all()
             
@@ -473,11 +557,11 @@ class MetricasService:
                 }
             
             # 5. Envio Final Pendente (1 dia após ATESTO) - LÓGICA CORRIGIDA
-            envio_final_pendente = CTE.query.filter(
+            envio_final_pendente = db.session.query(modelo).filter(
                 and_(
-                    CTE.data_atesto.isnot(None),  # Tem atesto
-                    or_(CTE.envio_final.is_(None), CTE.envio_final == ''),  # Sem envio final
-                    func.date_part('day', func.now() - CTE.data_atesto) > ALERTAS_CONFIG['envio_final_pendente']['dias_limite']  # 1 dia após atesto
+                    modelo.data_atesto.isnot(None),  # Tem atesto
+                    or_(modelo.envio_final.is_(None), modelo.envio_final == ''),  # Sem envio final
+                    func.date_part('day', func.now() - modelo.data_atesto) > ALERTAS_CONFIG['envio_final_pendente']['dias_limite']  # 1 dia após atesto
                 )
             ).all()
             
@@ -491,95 +575,89 @@ class MetricasService:
             return alertas
             
         except Exception as e:
-            print(f"Erro ao calcular alertas: {e}")
+            logger.error(f"Erro ao calcular alertas: {e}")
             return alertas
     
+    @staticmethod
+    def _calcular_alertas_snapshot(snapshot: SnapshotCTE, alertas: Dict) -> Dict:
+        """Mesmos critérios dos alertas, avaliados em máscaras sobre o snapshot"""
+        if snapshot.vazio:
+            return alertas
+        
+        df = snapshot.df
+        criterios = {
+            # 1. CTEs sem aprovação (7 dias após emissão)
+            'ctes_sem_aprovacao': df['data_atesto'].isna() &
+                (snapshot.dias_desde('data_emissao') > ALERTAS_CONFIG['ctes_sem_aprovacao']['dias_limite']),
+            # 2. CTEs sem faturas (3 dias após atesto)
+            'ctes_sem_faturas': ~snapshot.mascara('tem_fatura') &
+                (snapshot.dias_desde('data_atesto') > ALERTAS_CONFIG['ctes_sem_faturas']['dias_limite']),
+            # 3. Faturas vencidas (90 dias após ENVIO FINAL, sem baixa)
+            'faturas_vencidas': ~snapshot.mascara('has_baixa') &
+                (snapshot.dias_desde('envio_final') > ALERTAS_CONFIG['faturas_vencidas']['dias_limite']),
+            # 4. Primeiro envio pendente (10 dias após emissão)
+            'primeiro_envio_pendente': df['primeiro_envio'].isna() &
+                (snapshot.dias_desde('data_emissao') > ALERTAS_CONFIG['primeiro_envio_pendente']['dias_limite']),
+            # 5. Envio Final Pendente (1 dia após ATESTO)
+            'envio_final_pendente': ~snapshot.mascara('tem_envio_final') &
+                (snapshot.dias_desde('data_atesto') > ALERTAS_CONFIG['envio_final_pendente']['dias_limite']),
+        }
+        
+        # Listas detalhadas: até 10 CTEs por alerta, buscados em uma única query
+        ids_por_alerta = {
+            tipo: df.loc[mascara, 'id'].head(10).tolist() for tipo, mascara in criterios.items()
+        }
+        todos_ids = {i for ids in ids_por_alerta.values() for i in ids}
+        ctes_por_id = ArquivoCTEService.carregar_por_ids(todos_ids)
+        
+        for tipo, mascara in criterios.items():
+            qtd = int(mascara.sum())
+            if qtd:
+                alertas[tipo] = {
+                    'qtd': qtd,
+                    'valor': float(df.loc[mascara, 'valor_total'].sum()),
+                    'lista': [ctes_por_id[i].to_dict() for i in ids_por_alerta[tipo] if i in ctes_por_id]
+                }
+        
+        return alertas
+    
     @staticmethod
     def calcular_variacoes_tempo_expandidas() -> Dict:
-        """Sistema de análise de variações temporais expandido"""
-        if not PANDAS_AVAILABLE:
-            return {'erro': 'Análise de variações temporais requer pandas - funcionalidade temporariamente indisponível'}
-            
+        """Sistema de análise de variações temporais expandido (agregado no banco)"""
+        from app.services.variacoes_service import VariacoesService
+        
         variacoes = {}
         
         try:
-            # Buscar todos os CTEs
-            ctes = CTE.query.all()
+            estatisticas = VariacoesService.calcular(VARIACOES_CONFIG)
             
-            if not ctes:
-                return {}
-            
-            # Converter para DataFrame
-            dados = []
-            for cte in ctes:
-                dados.append({
-                    'data_emissao': cte.data_emissao,
-                    'data_inclusao_fatura': cte.data_inclusao_fatura,
-                    'primeiro_envio': cte.primeiro_envio,
-                    'data_rq_tmc': cte.data_rq_tmc,
-                    'data_atesto': cte.data_atesto,
-                    'envio_final': cte.envio_final,
-                    'data_baixa': cte.data_baixa,
-                    'valor_total': float(cte.valor_total or 0)
-                })
-            
-            df = pd.DataFrame(dados)
-            
-            # Calcular variações para cada configuração
             for config in VARIACOES_CONFIG:
-                campo_inicio = config['campo_inicio']
-                campo_fim = config['campo_fim']
-                codigo = config['codigo']
+                stats = estatisticas.get(config['codigo'])
+                if not stats:
+                    continue
+                
+                media = stats['media']
                 meta_dias = config['meta_dias']
                 
-                if campo_inicio in df.columns and campo_fim in df.columns:
-                    # Filtrar registros válidos
-                    mask = df[campo_inicio].notna() & df[campo_fim].notna()
-                    
-                    if mask.any():
-                        # Converter para datetime se necessário
-                        inicio = pd.to_datetime(df.loc[mask, campo_inicio])
-                        fim = pd.to_datetime(df.loc[mask, campo_fim])
-                        
-                        # Calcular diferença em dias
-                        dias = (fim - inicio).dt.days
-                        
-                        # Filtrar dias válidos (não negativos)
-                        dias_validos = dias[dias >= 0]
-                        
-                        if len(dias_validos) > 0:
-                            media = dias_validos.mean()
-                            mediana = dias_validos.median()
-                            percentil_90 = dias_validos.quantile(0.9)
-                            
-                            # Classificar performance
-                            if media <= meta_dias:
-                                performance = 'excelente'
-                            elif media <= meta_dias * 1.5:
-                                performance = 'bom'
-                            elif media <= meta_dias * 2:
-                                performance = 'atencao'
-                            else:
-                                performance = 'critico'
-                            
-                            variacoes[codigo] = {
-                                'nome': config['nome'],
-                                'media': round(media, 1),
-                                'mediana': round(mediana, 1),
-                                'percentil_90': round(percentil_90, 1),
-                                'qtd': len(dias_validos),
-                                'meta_dias': meta_dias,
-                                'performance': performance,
-                                'categoria': config['categoria'],
-                                'desvio_meta': round(((media - meta_dias) / meta_dias * 100), 1) if meta_dias > 0 else 0,
-                                'min_dias': int(dias_validos.min()),
-                                'max_dias': int(dias_validos.max())
-                            }
+                variacoes[config['codigo']] = {
+                    'nome': config['nome'],
+                    'media': round(media, 1),
+                    'mediana': round(stats['mediana'], 1),
+                    'percentil_90': round(stats['p90'], 1),
+                    'percentil_95': round(stats['p95'], 1),
+                    'qtd': stats['qtd'],
+                    'meta_dias': meta_dias,
+                    'performance': VariacoesService.classificar_performance(media, meta_dias),
+                    'categoria': config['categoria'],
+                    'desvio_meta': round(((media - meta_dias) / meta_dias * 100), 1) if meta_dias > 0 else 0,
+                    'min_dias': stats['min'],
+                    'max_dias': stats['max']
+                }
             
             return variacoes
             
         except Exception as e:
-            print(f"Erro ao calcular variações temporais: {e}")
+            logger.error(f"Erro ao calcular variações temporais: {e}")
             return {}
     
     @staticmethod
@@ -612,30 +690,15 @@ class MetricasService:
             }
             
         try:
-            ctes = CTE.query.all()
+            snapshot = SnapshotCTE.atual()
             
-            if not ctes:
+            if snapshot.vazio:
                 return {'erro': 'Nenhum dado encontrado'}
             
-            # Preparar dados
-            dados = []
-            for cte in ctes:
-                dados.append({
-                    'numero_cte': cte.numero_cte,
-                    'destinatario_nome': cte.destinatario_nome,
-                    'veiculo_placa': cte.veiculo_placa,
-                    'valor_total': float(cte.valor_total or 0),
-                    'data_emissao': cte.data_emissao,
-                    'data_baixa': cte.data_baixa,
-                    'has_baixa': cte.has_baixa,
-                    'processo_completo': cte.processo_completo,
-                    'mes_emissao': cte.data_emissao.strftime('%Y-%m') if cte.data_emissao else None
-                })
-            
-            df = pd.DataFrame(dados)
+            df = snapshot.df
             
             # 1. Evolução da receita mensal
-            evolucao_mensal = MetricasService._calcular_evolucao_mensal(df)
+            evolucao_mensal = MetricasService._calcular_evolucao_mensal(snapshot)
             
             # 2. Top clientes por receita
             top_clientes = MetricasService._calcular_top_clientes(df)
@@ -654,30 +717,24 @@ class MetricasService:
             }
             
         except Exception as e:
-            print(f"Erro ao gerar dados de gráficos: {e}")
+            logger.error(f"Erro ao gerar dados de gráficos: {e}")
             return {'erro': str(e)}
     
     @staticmethod
-    def _calcular_evolucao_mensal(df) -> Dict:
+    def _calcular_evolucao_mensal(snapshot: SnapshotCTE) -> Dict:
         """Calcula evolução da receita mensal"""
         try:
-            df_temp = df[df['data_emissao'].notna()].copy()
-            if df_temp.empty:
+            evolucao = snapshot.receita_mensal()
+            if evolucao.empty:
                 return {'labels': [], 'valores': [], 'quantidades': []}
             
-            # Agrupar por mês
-            evolucao = df_temp.groupby('mes_emissao').agg({
-                'valor_total': 'sum',
-                'numero_cte': 'count'
-            }).reset_index()
-            
             return {
-                'labels': evolucao['mes_emissao'].tolist(),
+                'labels': evolucao.index.tolist(),
                 'valores': evolucao['valor_total'].tolist(),
-                'quantidades': evolucao['numero_cte'].tolist()
+                'quantidades': evolucao['quantidade'].tolist()
             }
         except Exception as e:
-            print(f"Erro na evolução mensal: {e}")
+            logger.error(f"Erro na evolução mensal: {e}")
             return {'labels': [], 'valores': [], 'quantidades': []}
     
     @staticmethod
@@ -691,7 +748,7 @@ class MetricasService:
                 'valores': top_clientes.values.tolist()
             }
         except Exception as e:
-            print(f"Erro no top clientes: {e}")
+            logger.error(f"Erro no top clientes: {e}")
             return {'labels': [], 'valores': []}
     
     @staticmethod
@@ -714,7 +771,7 @@ class MetricasService:
                 }
             }
         except Exception as e:
-            print(f"Erro na distribuição de status: {e}")
+            logger.error(f"Erro na distribuição de status: {e}")
             return {'baixas': {'labels': [], 'valores': []}, 'processos': {'labels': [], 'valores': []}}
     
     @staticmethod
@@ -737,5 +794,5 @@ class MetricasService:
                 'quantidades': performance['numero_cte'].tolist()
             }
         except Exception as e:
-            print(f"Erro na performance de veículos: {e}")
+            logger.error(f"Erro na performance de veículos: {e}")
             return {'labels': [], 'valores': [], 'quantidades': []}
\ No newline at end of file
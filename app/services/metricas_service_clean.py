@@ -12,13 +12,11 @@ from app.models.cte import CTE
 from app import db
 from sqlalchemy import func, and_, or_
 
-# DESABILITAR LOGS EXCESSIVOS EM PRODUÇÃO
+# Níveis de log por ambiente/módulo: LOG_LEVEL e LOG_NIVEIS (app/utils/logging_estruturado.py)
 import logging
 import os
 
-# Configurar nível de log baseado no ambiente
-if os.environ.get('FLASK_ENV') == 'production':
-    logging.getLogger().setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
 
 class MetricasService:
     '''Serviço de métricas SEM debug excessivo'''
@@ -80,7 +78,7 @@ class MetricasService:
         except Exception as e:
             # Log apenas erros críticos
             if os.environ.get('FLASK_ENV') != 'production':
-                print(f"Erro métricas: {e}")
+                logger.error(f"Erro métricas: {e}")
             
             return {
                 'success': False,
@@ -11,12 +11,35 @@ from datetime import datetime, timedelta, date
 from typing import Dict, List, Tuple, Optional
 from app.models.cte import CTE
 from app import db
+from sqlalchemy import case, distinct, func, or_
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.services.cache_service import CacheResultados
+from app.services.carregador_colunar_service import carregar_ctes
 import logging
 from dateutil.relativedelta import relativedelta
-from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+# Dimensão -> coluna que identifica a série
+DIMENSOES_PROJECAO = {
+    'total': None,
+    'cliente': 'destinatario_nome',
+    'veiculo': 'veiculo_placa',
+}
+
+# Código de comparação -> deslocamento da janela em relação à atual
+DESLOCAMENTOS_COMPARACAO = {
+    'wow': relativedelta(weeks=1),
+    'mom': relativedelta(months=1),
+    '2m': relativedelta(months=2),
+    'qoq': relativedelta(months=3),
+    'yoy': relativedelta(years=1),
+}
+
+# Projeções em lote compartilhadas entre workers, invalidadas pela versão dos dados
+_cache_projecoes = CacheResultados('projecoes', max_entradas=32, max_bytes_entrada=8 * 1024 * 1024,
+                                   ttl=3600, ttl_stale=6 * 3600)
+
 class ProjecoesService:
     """Serviço para projeções financeiras e análises temporais avançadas"""
     
@@ -25,99 +48,179 @@ class ProjecoesService:
         """
         Gera projeção de recebimentos para os próximos 3 meses
         baseada em tendências históricas e sazonalidade
+        Usa a série total do ajuste em lote (mesmo modelo das séries por cliente)
         """
         try:
-            # Buscar dados históricos (último ano)
-            data_limite = datetime.now().date() - timedelta(days=365)
+            lote = ProjecoesService.projecao_series('total')
+            serie = lote['series'].get('TOTAL') if lote.get('success') else None
             
-            ctes = CTE.query.filter(
-                CTE.data_emissao >= data_limite,
-                CTE.valor_total.isnot(None)
-            ).all()
-            
-            if not ctes:
+            if not serie or lote['meses_analisados'] < 3:
                 return ProjecoesService._projecao_vazia()
             
-            # Preparar DataFrame
-            dados = []
-            for cte in ctes:
-                dados.append({
-                    'data_emissao': cte.data_emissao,
-                    'valor_total': float(cte.valor_total or 0),
-                    'mes_ano': cte.data_emissao.strftime('%Y-%m') if cte.data_emissao else None,
-                    'has_baixa': cte.has_baixa,
-                    'data_baixa': cte.data_baixa
-                })
-            
-            df = pd.DataFrame(dados)
-            df['data_emissao'] = pd.to_datetime(df['data_emissao'])
-            
-            # Análise de receita mensal histórica
-            receita_mensal = df.groupby('mes_ano')['valor_total'].sum().sort_index()
-            
-            # Calcular tendência linear
-            if len(receita_mensal) >= 3:
-                x = np.arange(len(receita_mensal))
-                slope, intercept, r_value, p_value, std_err = stats.linregress(x, receita_mensal.values)
-                
-                # Projetar próximos 3 meses
-                projecoes = []
-                data_atual = datetime.now().date()
-                
-                for i in range(1, 4):  # Próximos 3 meses
-                    data_projecao = data_atual + relativedelta(months=i)
-                    mes_projecao = data_projecao.strftime('%Y-%m')
-                    
-                    # Valor base da tendência
-                    valor_tendencia = slope * (len(receita_mensal) + i - 1) + intercept
-                    
-                    # Aplicar sazonalidade (média dos últimos 2 anos do mesmo mês)
-                    fator_sazonalidade = ProjecoesService._calcular_sazonalidade(
-                        df, data_projecao.month
-                    )
-                    
-                    # Valor final projetado
-                    valor_projetado = max(0, valor_tendencia * fator_sazonalidade)
-                    
-                    # Calcular confiança baseada no R²
-                    confianca = max(0.3, min(0.95, r_value ** 2))
-                    
-                    # Margem de erro
-                    margem_erro = valor_projetado * (1 - confianca) * 0.5
-                    
-                    projecoes.append({
-                        'mes': mes_projecao,
-                        'mes_nome': data_projecao.strftime('%B/%Y'),
-                        'valor_projetado': round(valor_projetado, 2),
-                        'valor_minimo': round(valor_projetado - margem_erro, 2),
-                        'valor_maximo': round(valor_projetado + margem_erro, 2),
-                        'confianca_percentual': round(confianca * 100, 1),
-                        'tendencia_percentual': round(slope / receita_mensal.mean() * 100, 2)
-                    })
-                
-                # Análise de histórico para comparação
-                receita_ultimo_mes = receita_mensal.iloc[-1] if len(receita_mensal) > 0 else 0
-                receita_3_meses_atras = receita_mensal.iloc[-3] if len(receita_mensal) >= 3 else 0
-                
-                return {
-                    'success': True,
-                    'projecoes_mensais': projecoes,
-                    'total_projetado_3_meses': sum(p['valor_projetado'] for p in projecoes),
-                    'media_mensal_historica': round(receita_mensal.mean(), 2),
-                    'receita_ultimo_mes': round(receita_ultimo_mes, 2),
-                    'tendencia_geral': 'Crescimento' if slope > 0 else 'Declínio' if slope < 0 else 'Estável',
-                    'r_squared': round(r_value ** 2, 3),
-                    'meses_analisados': len(receita_mensal),
-                    'data_base_projecao': datetime.now().strftime('%d/%m/%Y %H:%M'),
-                    'metodologia': 'Regressão linear + Sazonalidade histórica'
-                }
-            else:
-                return ProjecoesService._projecao_vazia()
+            projecoes = serie['projecoes']
+            return {
+                'success': True,
+                'projecoes_mensais': projecoes,
+                'total_projetado_3_meses': round(sum(p['valor_projetado'] for p in projecoes), 2),
+                'media_mensal_historica': serie['media_mensal_historica'],
+                'receita_ultimo_mes': serie['receita_ultimo_mes'],
+                'tendencia_geral': serie['tendencia_geral'],
+                'r_squared': serie['r_squared'],
+                'meses_analisados': lote['meses_analisados'],
+                'data_base_projecao': datetime.now().strftime('%d/%m/%Y %H:%M'),
+                'metodologia': lote['metodologia']
+            }
                 
         except Exception as e:
             logging.error(f"Erro na projeção de recebimentos: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    # ==================== PROJEÇÃO EM LOTE (MULTI-SÉRIES) ====================
+    
+    @staticmethod
+    def projecao_series(dimensao: str = 'cliente', meses_historico: int = 12,
+                        meses_projecao: int = 3) -> Dict:
+        """
+        Projeção de tendência + sazonalidade para todas as séries de uma dimensão
+        ('cliente', 'veiculo' ou 'total') em um único ajuste de mínimos quadrados
+        Resultado em cache por (parâmetros, dia, versão dos dados)
+        """
+        if dimensao not in DIMENSOES_PROJECAO:
+            raise ValueError(f"Dimensão inválida: {dimensao}. Use: {', '.join(DIMENSOES_PROJECAO)}")
+        
+        meses_historico = max(3, min(int(meses_historico), 60))
+        meses_projecao = max(1, min(int(meses_projecao), 12))
+        chave = (dimensao, meses_historico, meses_projecao, datetime.now().date().isoformat())
+        
+        return _cache_projecoes.obter_ou_calcular(
+            chave,
+            lambda: ProjecoesService._calcular_projecao_series(dimensao, meses_historico, meses_projecao),
+            versao=CTE.versao_dados()
+        )
+    
+    @staticmethod
+    def projecao_serie(dimensao: str, nome: str, **parametros) -> Optional[Dict]:
+        """Projeção de uma série (cliente/placa), lida do lote em cache"""
+        lote = ProjecoesService.projecao_series(dimensao, **parametros)
+        return lote.get('series', {}).get(nome)
+    
+    @staticmethod
+    def _calcular_projecao_series(dimensao: str, meses_historico: int, meses_projecao: int) -> Dict:
+        """
+        Monta a matriz meses x séries e resolve todas as regressões de uma vez:
+        Y (T x S) ≈ X (T x p) · B (p x S), com X = [1, t, harmônicos sazonais]
+        """
+        hoje = datetime.now().date()
+        mes_atual = hoje.replace(day=1)
+        inicio = mes_atual - relativedelta(months=meses_historico)
+        
+        # Apenas meses completos entram no ajuste
+        colunas = ['data_emissao', 'valor_total'] + (
+            [DIMENSOES_PROJECAO[dimensao]] if DIMENSOES_PROJECAO[dimensao] else []
+        )
+        df = carregar_ctes(colunas, data_inicio=inicio, data_fim=mes_atual - timedelta(days=1),
+                           nao_nulos=('valor_total',))
+        
+        if df.empty:
+            return {'success': False, 'series': {}, 'meses_analisados': 0,
+                    'error': 'Dados insuficientes para projeção'}
+        
+        # Índice do mês (0..T-1) e código da série de cada CTE
+        datas = df['data_emissao'].dt
+        indice_mes = ((datas.year - inicio.year) * 12 + (datas.month - inicio.month)).to_numpy()
+        if dimensao == 'total':
+            codigos, nomes = np.zeros(len(df), dtype=np.int64), np.array(['TOTAL'], dtype=object)
+        else:
+            chaves = df[DIMENSOES_PROJECAO[dimensao]].fillna('').astype(str).str.strip()
+            if dimensao == 'veiculo':
+                chaves = chaves.str.upper()
+            validos = (chaves != '').to_numpy()
+            indice_mes, chaves = indice_mes[validos], chaves[validos]
+            df = df[validos]
+            codigos, nomes = pd.factorize(chaves, sort=True)
+            nomes = np.asarray(nomes, dtype=object)
+        
+        T, S = meses_historico, len(nomes)
+        Y = np.zeros((T, S), dtype=np.float64)
+        np.add.at(Y, (indice_mes, codigos), df['valor_total'].to_numpy(dtype=np.float64))
+        
+        # Matriz de desenho compartilhada por todas as séries
+        meses_calendario = np.array([(inicio + relativedelta(months=k)).month for k in range(T)])
+        harmonicos = 2 if T >= 24 else 1 if T >= 12 else 0
+        X = ProjecoesService._matriz_desenho(np.arange(T), meses_calendario, harmonicos)
+        
+        B, _, posto, _ = np.linalg.lstsq(X, Y, rcond=None)
+        ajustado = X @ B
+        
+        residuos = ((Y - ajustado) ** 2).sum(axis=0)
+        total = ((Y - Y.mean(axis=0)) ** 2).sum(axis=0)
+        r2 = np.where(total > 0, 1 - residuos / np.where(total > 0, total, 1), 0.0)
+        r2 = np.clip(r2, 0.0, 1.0)
+        
+        # Passos futuros: mês corrente é t = T; projeção a partir do mês seguinte
+        passos = np.arange(T + 1, T + 1 + meses_projecao)
+        meses_futuros = [mes_atual + relativedelta(months=k) for k in range(1, meses_projecao + 1)]
+        X_futuro = ProjecoesService._matriz_desenho(
+            passos, np.array([m.month for m in meses_futuros]), harmonicos
+        )
+        previsto = np.maximum(X_futuro @ B, 0.0)  # (h x S)
+        
+        confianca = np.clip(r2, 0.3, 0.95)
+        margem = previsto * (1 - confianca) * 0.5
+        media = Y.mean(axis=0)
+        inclinacao = B[1]
+        meses_ativos = (Y > 0).sum(axis=0)
+        # Meses da janela com algum CTE (a janela tem sempre T meses)
+        meses_com_dados = int(len(np.unique(indice_mes)))
+        
+        series = {}
+        for s in range(S):
+            series[nomes[s]] = {
+                'projecoes': [
+                    {
+                        'mes': meses_futuros[h].strftime('%Y-%m'),
+                        'mes_nome': meses_futuros[h].strftime('%B/%Y'),
+                        'valor_projetado': round(float(previsto[h, s]), 2),
+                        'valor_minimo': round(float(previsto[h, s] - margem[h, s]), 2),
+                        'valor_maximo': round(float(previsto[h, s] + margem[h, s]), 2),
+                        'confianca_percentual': round(float(confianca[s]) * 100, 1),
+                        'tendencia_percentual': round(float(inclinacao[s] / media[s] * 100), 2) if media[s] > 0 else 0.0
+                    }
+                    for h in range(meses_projecao)
+                ],
+                'total_projetado': round(float(previsto[:, s].sum()), 2),
+                'media_mensal_historica': round(float(media[s]), 2),
+                'receita_ultimo_mes': round(float(Y[-1, s]), 2),
+                'tendencia_geral': 'Crescimento' if inclinacao[s] > 0 else 'Declínio' if inclinacao[s] < 0 else 'Estável',
+                'r_squared': round(float(r2[s]), 3),
+                'meses_com_receita': int(meses_ativos[s]),
+                'dados_suficientes': bool(meses_ativos[s] >= 3)
+            }
+        
+        return {
+            'success': True,
+            'dimensao': dimensao,
+            'series': series,
+            'total_series': S,
+            'meses_analisados': meses_com_dados,
+            'meses_janela': T,
+            'periodo_historico': {
+                'inicio': inicio.strftime('%m/%Y'),
+                'fim': (mes_atual - relativedelta(months=1)).strftime('%m/%Y')
+            },
+            'metodologia': f'Mínimos quadrados em lote: tendência linear + {harmonicos} harmônico(s) sazonal(is)',
+            'posto_matriz': int(posto)
+        }
+    
+    @staticmethod
+    def _matriz_desenho(t: np.ndarray, meses: np.ndarray, harmonicos: int) -> np.ndarray:
+        """Colunas: intercepto, tendência e pares seno/cosseno do mês do ano"""
+        colunas = [np.ones(len(t)), t.astype(np.float64)]
+        for k in range(1, harmonicos + 1):
+            angulo = 2 * np.pi * k * meses / 12.0
+            colunas.extend([np.sin(angulo), np.cos(angulo)])
+        return np.column_stack(colunas)
+    
     @staticmethod
     def analise_comparativa_periodos(filtro_dias: int) -> Dict:
         """
@@ -138,10 +241,13 @@ class ProjecoesService:
             data_inicio_1a = data_atual - relativedelta(years=1) - timedelta(days=filtro_dias)
             data_fim_1a = data_atual - relativedelta(years=1)
             
-            # Buscar dados para cada período
-            periodo_atual = ProjecoesService._buscar_dados_periodo(data_inicio_atual, data_atual)
-            periodo_2m = ProjecoesService._buscar_dados_periodo(data_inicio_2m, data_fim_2m)
-            periodo_1a = ProjecoesService._buscar_dados_periodo(data_inicio_1a, data_fim_1a)
+            # Buscar dados de todos os períodos em uma única consulta
+            periodos = ProjecoesService.agregar_janelas([
+                ('atual', data_inicio_atual, data_atual),
+                ('2m', data_inicio_2m, data_fim_2m),
+                ('1a', data_inicio_1a, data_fim_1a),
+            ])
+            periodo_atual, periodo_2m, periodo_1a = periodos['atual'], periodos['2m'], periodos['1a']
             
             # Calcular métricas comparativas
             comparacao = {
@@ -198,63 +304,99 @@ class ProjecoesService:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def _calcular_sazonalidade(df: pd.DataFrame, mes_target: int) -> float:
-        """Calcula fator de sazonalidade baseado no histórico do mês"""
-        try:
-            df['mes'] = df['data_emissao'].dt.month
-            
-            # Receita média geral
-            receita_media_geral = df['valor_total'].mean()
-            
-            # Receita média do mês específico
-            receita_mes_especifico = df[df['mes'] == mes_target]['valor_total'].mean()
-            
-            if receita_media_geral > 0 and not pd.isna(receita_mes_especifico):
-                return receita_mes_especifico / receita_media_geral
-            else:
-                return 1.0  # Fator neutro
-                
-        except Exception:
-            return 1.0
+    def janelas_comparacao(filtro_dias: int, comparacoes: List[str] = None,
+                           data_fim: date = None) -> List[Tuple[str, date, date]]:
+        """
+        Janela atual (últimos filtro_dias dias) e as janelas deslocadas pedidas
+        Códigos: wow (semana), mom (mês), 2m, qoq (trimestre), yoy (ano)
+        """
+        data_fim = data_fim or datetime.now().date()
+        janelas = [('atual', data_fim - timedelta(days=filtro_dias), data_fim)]
+        for codigo in comparacoes or ['mom', 'yoy']:
+            if codigo not in DESLOCAMENTOS_COMPARACAO:
+                raise ValueError(
+                    f"Comparação inválida: {codigo}. Use: {', '.join(DESLOCAMENTOS_COMPARACAO)}"
+                )
+            fim = data_fim - DESLOCAMENTOS_COMPARACAO[codigo]
+            janelas.append((codigo, fim - timedelta(days=filtro_dias), fim))
+        return janelas
     
     @staticmethod
-    def _buscar_dados_periodo(data_inicio: date, data_fim: date) -> Dict:
-        """Busca dados financeiros para um período específico"""
+    def agregar_janelas(janelas: List[Tuple[str, date, date]]) -> Dict[str, Dict]:
+        """
+        Receita, quantidade, ticket médio e clientes únicos de N janelas em uma
+        única consulta: agregação condicional por janela sobre a união dos intervalos
+        """
+        vazio = {'receita_total': 0.0, 'quantidade_ctes': 0, 'ticket_medio': 0.0, 'clientes_unicos': 0}
+        if not janelas:
+            return {}
+        
+        # Resultado é indexado pelo nome: repetidos se sobrescreveriam
+        nomes = [nome for nome, _, _ in janelas]
+        repetidos = sorted({nome for nome in nomes if nomes.count(nome) > 1})
+        if repetidos:
+            raise ValueError(f"Nomes de janela repetidos: {', '.join(repetidos)}")
+        
         try:
-            ctes = CTE.query.filter(
-                CTE.data_emissao >= data_inicio,
-                CTE.data_emissao <= data_fim,
-                CTE.valor_total.isnot(None)
-            ).all()
-            
-            if not ctes:
-                return {
-                    'receita_total': 0.0,
-                    'quantidade_ctes': 0,
-                    'ticket_medio': 0.0,
-                    'clientes_unicos': 0
-                }
+            # Janela mais antiga (ex.: yoy) pode alcançar CTEs arquivados
+            modelo = ArquivoCTEService.modelo_periodo(min(inicio for _, inicio, _ in janelas))
+            colunas = []
+            for i, (_, inicio, fim) in enumerate(janelas):
+                na_janela = modelo.data_emissao.between(inicio, fim)
+                colunas.extend([
+                    func.coalesce(func.sum(case((na_janela, modelo.valor_total), else_=0)), 0).label(f'receita_{i}'),
+                    func.count(case((na_janela, 1))).label(f'quantidade_{i}'),
+                    func.count(distinct(case((na_janela, modelo.destinatario_nome)))).label(f'clientes_{i}'),
+                ])
             
-            receita_total = sum(float(cte.valor_total or 0) for cte in ctes)
-            quantidade_ctes = len(ctes)
-            ticket_medio = receita_total / quantidade_ctes if quantidade_ctes > 0 else 0.0
-            clientes_unicos = len(set(cte.destinatario_nome for cte in ctes if cte.destinatario_nome))
+            linha = db.session.query(*colunas).filter(
+                or_(*[modelo.data_emissao.between(inicio, fim) for _, inicio, fim in janelas]),
+                modelo.valor_total.isnot(None)
+            ).one()
             
-            return {
-                'receita_total': round(receita_total, 2),
-                'quantidade_ctes': quantidade_ctes,
-                'ticket_medio': round(ticket_medio, 2),
-                'clientes_unicos': clientes_unicos
-            }
+            resultado = {}
+            for i, (nome, _, _) in enumerate(janelas):
+                receita_total = float(getattr(linha, f'receita_{i}') or 0)
+                quantidade_ctes = int(getattr(linha, f'quantidade_{i}') or 0)
+                resultado[nome] = {
+                    'receita_total': round(receita_total, 2),
+                    'quantidade_ctes': quantidade_ctes,
+                    'ticket_medio': round(receita_total / quantidade_ctes, 2) if quantidade_ctes > 0 else 0.0,
+                    'clientes_unicos': int(getattr(linha, f'clientes_{i}') or 0)
+                }
+            return resultado
             
         except Exception as e:
-            logging.error(f"Erro ao buscar dados do período: {str(e)}")
-            return {
-                'receita_total': 0.0,
-                'quantidade_ctes': 0,
-                'ticket_medio': 0.0,
-                'clientes_unicos': 0
+            logging.error(f"Erro ao agregar janelas de comparação: {str(e)}")
+            return {nome: dict(vazio) for nome, _, _ in janelas}
+    
+    @staticmethod
+    def comparar_janelas(filtro_dias: int, comparacoes: List[str] = None,
+                         janelas_personalizadas: List[Tuple[str, date, date]] = None) -> Dict:
+        """Compara a janela atual com N janelas (padrão e personalizadas) em uma consulta"""
+        janelas = ProjecoesService.janelas_comparacao(filtro_dias, comparacoes)
+        janelas += list(janelas_personalizadas or [])
+        dados = ProjecoesService.agregar_janelas(janelas)
+        
+        atual = dados['atual']
+        periodos = []
+        for nome, inicio, fim in janelas:
+            periodo = {
+                'janela': nome,
+                'data_inicio': inicio.strftime('%d/%m/%Y'),
+                'data_fim': fim.strftime('%d/%m/%Y'),
+                **dados[nome]
             }
+            if nome != 'atual':
+                periodo['variacao'] = ProjecoesService._calcular_variacao(atual, dados[nome])
+            periodos.append(periodo)
+        
+        return {
+            'success': True,
+            'filtro_dias': filtro_dias,
+            'periodos': periodos,
+            'data_analise': datetime.now().strftime('%d/%m/%Y %H:%M')
+        }
     
     @staticmethod
     def _calcular_variacao(periodo_atual: Dict, periodo_comparacao: Dict) -> Dict:
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço de Receita Mensal (Rollup) - Dashboard Baker Flask
+app/services/receita_mensal_service.py
+
+Consulta o rollup receita_mensal_cliente no lugar de varrer dashboard_baker:
+- Meses inteiramente dentro do período vêm do rollup
+- Meses parcialmente cobertos (bordas do período) são agregados direto da
+  tabela de CTEs, restritos ao intervalo de datas (varredura pequena)
+Consultas não gravam: com o rollup ausente ou não populado, o período é
+agregado por mês direto dos CTEs até "flask rebuild-receita-mensal" rodar.
+"""
+
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert, select
+
+from app import db
+from app.models.estado_derivado import EstadoDerivado, marcar_populado
+from app.models.receita_mensal import (
+    BASES_DATA, MEDIDAS, ROLLUP_VERSAO, ReceitaMensalCliente, marcar_rollup_disponivel,
+    rollup_disponivel
+)
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.utils.roteamento_db import modo_leitura
+
+logger = logging.getLogger(__name__)
+
+
+class ReceitaMensalService:
+    """Leitura e reconstrução do rollup mensal de receita por cliente"""
+
+    # ==================== CONSULTA ====================
+
+    @staticmethod
+    def periodo_filtros(filtro_dias: int, data_inicio: str = None,
+                        data_fim: str = None) -> Tuple[date, Optional[date]]:
+        """Converte os parâmetros das APIs em (inicio, fim); fim None = sem limite"""
+        if data_inicio and data_fim:
+            return (datetime.strptime(data_inicio, '%Y-%m-%d').date(),
+                    datetime.strptime(data_fim, '%Y-%m-%d').date())
+        return datetime.now().date() - timedelta(days=int(filtro_dias)), None
+
+    @staticmethod
+    def consultar_mensal(base: str, inicio: date, fim: Optional[date] = None,
+                         cliente: Optional[str] = None) -> List[Dict]:
+        """
+        Medidas por mês (ordem crescente) para CTEs cuja data da base está em
+        [inicio, fim], somando todos os clientes que casam com o filtro
+        """
+        if base not in BASES_DATA:
+            raise ValueError(f"Base de data inválida: {base}")
+
+        if not rollup_disponivel(db.session.connection()):
+            logger.warning("Rollup receita_mensal_cliente não populado - rode 'flask rebuild-receita-mensal'; "
+                           "período agregado direto dos CTEs")
+            por_mes = ReceitaMensalService._agregar_fato_por_mes(base, inicio, fim, cliente)
+            return ReceitaMensalService._formatar(por_mes)
+
+        # Meses completos: do primeiro mês iniciado em/após 'inicio'
+        # até o último mês terminado em/antes de 'fim'
+        mes_completo_inicio = inicio if inicio.day == 1 else _proximo_mes(inicio.replace(day=1))
+        mes_completo_fim = None
+        if fim is not None:
+            ultimo_dia = calendar.monthrange(fim.year, fim.month)[1]
+            mes_completo_fim = fim.replace(day=1) if fim.day == ultimo_dia \
+                else _mes_anterior(fim.replace(day=1))
+
+        por_mes: Dict[date, Dict] = {}
+
+        if mes_completo_fim is None or mes_completo_inicio <= mes_completo_fim:
+            rollup = ReceitaMensalCliente
+            query = db.session.query(
+                rollup.mes, *[func.sum(getattr(rollup, m)).label(m) for m in MEDIDAS]
+            ).filter(rollup.base == base, rollup.mes >= mes_completo_inicio)
+            if mes_completo_fim is not None:
+                query = query.filter(rollup.mes <= mes_completo_fim)
+            if cliente:
+                query = query.filter(rollup.cliente.ilike(f'%{cliente}%'))
+            for linha in query.group_by(rollup.mes):
+                por_mes[linha.mes] = {m: getattr(linha, m) for m in MEDIDAS}
+
+        # Bordas parciais, agregadas direto da tabela de CTEs
+        bordas = []
+        if inicio.day != 1:
+            fim_borda = min(_proximo_mes(inicio.replace(day=1)) - timedelta(days=1),
+                            fim or date.max)
+            bordas.append((inicio, fim_borda))
+        if fim is not None and mes_completo_fim != fim.replace(day=1):
+            inicio_borda = max(fim.replace(day=1), inicio)
+            if not bordas or inicio_borda > bordas[0][1]:
+                bordas.append((inicio_borda, fim))
+
+        for inicio_borda, fim_borda in bordas:
+            medidas = ReceitaMensalService._agregar_fato(base, inicio_borda, fim_borda, cliente)
+            if medidas['quantidade']:
+                por_mes[inicio_borda.replace(day=1)] = medidas
+
+        return ReceitaMensalService._formatar(por_mes)
+
+    @staticmethod
+    def _formatar(por_mes: Dict[date, Dict]) -> List[Dict]:
+        resultado = []
+        for mes in sorted(por_mes):
+            medidas = por_mes[mes]
+            if not medidas['quantidade']:
+                continue
+            linha = {'mes': mes, 'ano': mes.year, 'mes_numero': mes.month}
+            for m in MEDIDAS:
+                valor = medidas[m] or 0
+                linha[m] = int(valor) if m.startswith('quantidade') else float(valor)
+            resultado.append(linha)
+        return resultado
+
+    @staticmethod
+    def totalizar(linhas: List[Dict]) -> Dict:
+        """Soma as medidas de uma lista de meses"""
+        totais = {m: 0 for m in MEDIDAS}
+        for linha in linhas:
+            for m in MEDIDAS:
+                totais[m] += linha[m]
+        return totais
+
+    @staticmethod
+    def _agregar_fato(base: str, inicio: date, fim: date, cliente: Optional[str]) -> Dict:
+        """Mesmas medidas do rollup, calculadas na tabela de CTEs para um intervalo"""
+        stmt, _ = ReceitaMensalService._consulta_fato(base, inicio, fim, cliente)
+        linha = db.session.execute(stmt).one()
+        return {m: getattr(linha, m) for m in MEDIDAS}
+
+    @staticmethod
+    def _agregar_fato_por_mes(base: str, inicio: date, fim: Optional[date],
+                              cliente: Optional[str]) -> Dict[date, Dict]:
+        """Medidas por mês da tabela de CTEs (rollup indisponível), em uma consulta"""
+        stmt, data_base = ReceitaMensalService._consulta_fato(base, inicio, fim, cliente)
+        dialeto = db.engine.dialect.name
+        if dialeto == 'postgresql':
+            mes = func.to_char(data_base, 'YYYY-MM')
+        elif dialeto == 'mysql':
+            mes = func.date_format(data_base, '%Y-%m')
+        else:
+            mes = func.strftime('%Y-%m', data_base)
+
+        por_mes = {}
+        for linha in db.session.execute(stmt.add_columns(mes.label('mes')).group_by(mes)):
+            primeiro_dia = datetime.strptime(linha.mes, '%Y-%m').date()
+            por_mes[primeiro_dia] = {m: getattr(linha, m) for m in MEDIDAS}
+        return por_mes
+
+    @staticmethod
+    def _consulta_fato(base: str, inicio: date, fim: Optional[date], cliente: Optional[str]):
+        """SELECT das medidas do rollup sobre os CTEs do intervalo e a expressão da data base"""
+        # Períodos antigos podem cair em CTEs arquivados
+        modelo = ArquivoCTEService.modelo_periodo(inicio if base == 'emissao' else None)
+        colunas = [getattr(modelo, c) for c in BASES_DATA[base]]
+        data_base = colunas[0] if len(colunas) == 1 else func.coalesce(*colunas)
+
+        baixado = modelo.data_baixa.isnot(None)
+        faturado = modelo.envio_final.isnot(None) | baixado
+        com_fatura = modelo.data_inclusao_fatura.isnot(None) | (
+            modelo.numero_fatura.isnot(None) & (modelo.numero_fatura != '')
+        )
+
+        def contar(condicao):
+            return func.coalesce(func.sum(case((condicao, 1), else_=0)), 0)
+
+        def somar(condicao):
+            return func.coalesce(func.sum(case((condicao, modelo.valor_total), else_=0)), 0)
+
+        stmt = select(
+            func.count().label('quantidade'),
+            func.coalesce(func.sum(modelo.valor_total), 0).label('valor_total'),
+            contar(baixado).label('quantidade_baixada'),
+            somar(baixado).label('valor_baixado'),
+            contar(faturado).label('quantidade_faturada'),
+            somar(faturado).label('valor_faturado'),
+            contar(com_fatura).label('quantidade_com_fatura'),
+            somar(com_fatura).label('valor_com_fatura'),
+        ).where(data_base >= inicio)
+        if fim is not None:
+            stmt = stmt.where(data_base <= fim)
+        if cliente:
+            stmt = stmt.where(modelo.destinatario_nome.ilike(f'%{cliente}%'))
+        return stmt, data_base
+
+    # ==================== RECONSTRUÇÃO ====================
+
+    @staticmethod
+    def reconstruir() -> Dict:
+        """
+        Recalcula todo o rollup a partir de dashboard_baker e do arquivo (uma transação)
+        Fora das requisições: flask rebuild-receita-mensal
+        """
+        # Leitura dos CTEs e gravação no primário, mesmo se chamado numa requisição
+        with modo_leitura(False):
+            return ReceitaMensalService._reconstruir()
+
+    @staticmethod
+    def _reconstruir() -> Dict:
+        from app.services.carregador_colunar_service import carregar_ctes
+
+        inicio = datetime.now()
+        ReceitaMensalCliente.__table__.create(db.engine, checkfirst=True)
+        EstadoDerivado.__table__.create(db.engine, checkfirst=True)
+
+        df = carregar_ctes(
+            ('destinatario_nome', 'valor_total', 'data_emissao', 'data_baixa',
+             'numero_fatura', 'data_inclusao_fatura', 'envio_final'),
+            incluir_arquivo=True
+        )
+
+        linhas = []
+        if not df.empty:
+            df['cliente'] = df['destinatario_nome'].fillna('').astype(str)
+            df['valor_total'] = df['valor_total'].fillna(0.0)
+            baixado = df['data_baixa'].notna()
+            faturado = df['envio_final'].notna() | baixado
+            com_fatura = df['data_inclusao_fatura'].notna() | (
+                df['numero_fatura'].notna() & (df['numero_fatura'] != '')
+            )
+            df['quantidade'] = 1
+            df['quantidade_baixada'] = baixado.astype(int)
+            df['valor_baixado'] = df['valor_total'].where(baixado, 0.0)
+            df['quantidade_faturada'] = faturado.astype(int)
+            df['valor_faturado'] = df['valor_total'].where(faturado, 0.0)
+            df['quantidade_com_fatura'] = com_fatura.astype(int)
+            df['valor_com_fatura'] = df['valor_total'].where(com_fatura, 0.0)
+
+            agora = datetime.utcnow()
+            for base, campos in BASES_DATA.items():
+                data_base = df[campos[0]]
+                for campo in campos[1:]:
+                    data_base = data_base.fillna(df[campo])
+                parcial = df[data_base.notna()].assign(
+                    mes=data_base[data_base.notna()].dt.to_period('M').dt.start_time.dt.date
+                )
+                agregado = parcial.groupby(['mes', 'cliente'])[list(MEDIDAS)].sum()
+                for (mes, cliente), medidas in agregado.iterrows():
+                    linha = {'mes': mes, 'cliente': cliente, 'base': base, 'atualizado_em': agora}
+                    for m in MEDIDAS:
+                        linha[m] = int(medidas[m]) if m.startswith('quantidade') \
+                            else Decimal(str(round(float(medidas[m]), 2)))
+                    linhas.append(linha)
+
+        try:
+            db.session.execute(ReceitaMensalCliente.__table__.delete())
+            if linhas:
+                db.session.execute(insert(ReceitaMensalCliente.__table__), linhas)
+            marcar_populado(db.session.connection(), ReceitaMensalCliente.__table__, ROLLUP_VERSAO)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        marcar_rollup_disponivel()
+
+        tempo = (datetime.now() - inicio).total_seconds()
+        logger.info(f"Rollup receita reconstruído: {len(linhas)} linhas em {tempo:.2f}s")
+        return {'linhas': len(linhas), 'ctes': len(df), 'tempo_segundos': round(tempo, 2)}
+
+
+def _proximo_mes(primeiro_dia: date) -> date:
+    return (primeiro_dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _mes_anterior(primeiro_dia: date) -> date:
+    return (primeiro_dia - timedelta(days=1)).replace(day=1)
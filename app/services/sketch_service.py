@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serviço de Sketches Mensais - Dashboard Baker Flask
+app/services/sketch_service.py
+
+Distintos (clientes, veículos) e quantis de duração das etapas para um
+período qualquer, mesclando os sketches mensais em vez de varrer a tabela:
+- Meses inteiros do período: sketches da tabela sketch_mensal
+- Meses parciais (bordas): sketches montados na hora com os CTEs do intervalo
+O custo da consulta é proporcional ao número de meses, não de CTEs.
+Consultas não gravam: linhas sujas são recalculadas e a tabela populada
+por "flask manter-sketches" (agendado fora das requisições).
+"""
+
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+
+from app import db
+from app.models.estado_derivado import EstadoDerivado, marcar_populado
+from app.models.sketch_mensal import (
+    METRICAS_DISTINTOS, PREFIXO_DURACAO, SKETCH_VERSAO, SketchMensal, ler_sketch,
+    marcar_sketches_disponiveis, novo_sketch, pares_duracao, sketches_disponiveis
+)
+from app.utils.roteamento_db import modo_leitura
+
+logger = logging.getLogger(__name__)
+
+QUANTIS_PADRAO = {'mediana': 0.5, 'p90': 0.9, 'p95': 0.95}
+
+
+class SketchService:
+    """Consulta, recálculo e reconstrução dos sketches mensais"""
+
+    # ==================== CONSULTA ====================
+
+    @staticmethod
+    def resumo(inicio: Optional[date] = None, fim: Optional[date] = None) -> Dict:
+        """
+        Clientes únicos, veículos ativos e estatísticas de duração por etapa
+        para CTEs emitidos em [inicio, fim] (None = sem limite)
+        """
+        sketches = SketchService.sketches_periodo(inicio, fim)
+
+        duracoes = {}
+        for codigo in pares_duracao():
+            digest = sketches[PREFIXO_DURACAO + codigo]
+            if not digest.contagem:
+                continue
+            estatisticas = {
+                'qtd': digest.contagem,
+                'media': round(digest.media(), 1),
+                'min': int(digest.minimo),
+                'max': int(digest.maximo),
+            }
+            for nome, q in QUANTIS_PADRAO.items():
+                estatisticas[nome] = round(digest.quantil(q), 1)
+            duracoes[codigo] = estatisticas
+
+        return {
+            'clientes_unicos': sketches['clientes'].estimativa(),
+            'veiculos_ativos': sketches['veiculos'].estimativa(),
+            'duracoes': duracoes,
+            'aproximado': True,
+        }
+
+    @staticmethod
+    def distintos(metrica: str, inicio: Optional[date] = None, fim: Optional[date] = None) -> int:
+        if metrica not in METRICAS_DISTINTOS:
+            raise ValueError(f"Métrica de distintos inválida: {metrica}")
+        return SketchService.sketches_periodo(inicio, fim, [metrica])[metrica].estimativa()
+
+    @staticmethod
+    def sketches_periodo(inicio: Optional[date] = None, fim: Optional[date] = None,
+                         metricas: Iterable[str] = None) -> Dict:
+        """
+        Sketch mesclado de cada métrica para o período (somente leitura)
+        Linhas sujas e tabela não populada são supridas com os CTEs na hora;
+        a gravação fica com "flask manter-sketches"
+        """
+        metricas = list(metricas or SketchService.metricas())
+        resultado = {metrica: novo_sketch(metrica) for metrica in metricas}
+
+        def mesclar(construidos, filtro=None):
+            for (mes, metrica), sketch in construidos.items():
+                if metrica in resultado and (filtro is None or (mes, metrica) in filtro):
+                    resultado[metrica].mesclar(sketch)
+
+        if not sketches_disponiveis(db.session.connection()):
+            logger.warning("Tabela sketch_mensal não populada - rode 'flask manter-sketches'; "
+                           "período montado direto dos CTEs")
+            mesclar(SketchService._construir(inicio, fim))
+            return resultado
+
+        mes_completo_inicio, mes_completo_fim, bordas = _dividir_periodo(inicio, fim)
+
+        sujos = set()
+        if mes_completo_inicio is None or mes_completo_fim is None or mes_completo_inicio <= mes_completo_fim:
+            query = db.session.query(SketchMensal.mes, SketchMensal.metrica, SketchMensal.dados,
+                                     SketchMensal.sujo).filter(SketchMensal.metrica.in_(metricas))
+            if mes_completo_inicio is not None:
+                query = query.filter(SketchMensal.mes >= mes_completo_inicio)
+            if mes_completo_fim is not None:
+                query = query.filter(SketchMensal.mes <= mes_completo_fim)
+            for mes, metrica, dados, sujo in query:
+                if sujo:
+                    sujos.add((mes, metrica))
+                elif dados is not None:
+                    resultado[metrica].mesclar(ler_sketch(metrica, dados))
+
+        # Meses com linha suja: recalculados na hora, sem gravar
+        for mes in sorted({mes for mes, _ in sujos}):
+            ultimo_dia = mes.replace(day=calendar.monthrange(mes.year, mes.month)[1])
+            mesclar(SketchService._construir(mes, ultimo_dia), sujos)
+
+        for inicio_borda, fim_borda in bordas:
+            mesclar(SketchService._construir(inicio_borda, fim_borda))
+
+        return resultado
+
+    @staticmethod
+    def metricas() -> List[str]:
+        return list(METRICAS_DISTINTOS) + [PREFIXO_DURACAO + codigo for codigo in pares_duracao()]
+
+    # ==================== MANUTENÇÃO ====================
+
+    @staticmethod
+    def manter() -> Dict:
+        """
+        Manutenção fora das requisições (flask manter-sketches):
+        reconstrói a tabela se não estiver populada, senão recalcula as linhas sujas
+        """
+        # Travas, leitura dos CTEs e gravação no primário, mesmo se chamado numa requisição
+        with modo_leitura(False):
+            if not sketches_disponiveis(db.session.connection()):
+                logger.warning("Tabela sketch_mensal ausente ou não populada - reconstruindo")
+                return {'reconstruido': True, **SketchService.reconstruir()}
+            return {'reconstruido': False, 'recalculadas': SketchService.recalcular_sujos()}
+
+    @staticmethod
+    def recalcular_sujos(mes_inicio: Optional[date] = None, mes_fim: Optional[date] = None) -> int:
+        """Recalcula a partir dos CTEs do mês as linhas marcadas como sujas"""
+        tabela = SketchMensal.__table__
+        stmt = select(tabela.c.mes, tabela.c.metrica).where(tabela.c.sujo.is_(True))
+        if mes_inicio is not None:
+            stmt = stmt.where(tabela.c.mes >= mes_inicio)
+        if mes_fim is not None:
+            stmt = stmt.where(tabela.c.mes <= mes_fim)
+
+        # Bloqueia as linhas antes de ler os CTEs: adições concorrentes
+        # esperam o recálculo terminar e são aplicadas sobre o resultado
+        sujos = db.session.execute(stmt.with_for_update()).all()
+        if not sujos:
+            return 0
+
+        por_mes: Dict[date, List[str]] = {}
+        for mes, metrica in sujos:
+            por_mes.setdefault(mes, []).append(metrica)
+
+        try:
+            agora = datetime.utcnow()
+            for mes, metricas in por_mes.items():
+                ultimo_dia = mes.replace(day=calendar.monthrange(mes.year, mes.month)[1])
+                construidos = SketchService._construir(mes, ultimo_dia)
+                for metrica in metricas:
+                    sketch = construidos.get((mes, metrica))
+                    db.session.execute(
+                        tabela.update()
+                        .where((tabela.c.mes == mes) & (tabela.c.metrica == metrica))
+                        .values(dados=sketch.serializar() if sketch is not None else None,
+                                sujo=False, atualizado_em=agora)
+                    )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        logger.info(f"Sketches mensais: {len(sujos)} linhas sujas recalculadas")
+        return len(sujos)
+
+    @staticmethod
+    def reconstruir() -> Dict:
+        """Recalcula todos os sketches a partir de dashboard_baker (uma transação)"""
+        inicio = datetime.now()
+        SketchMensal.__table__.create(db.engine, checkfirst=True)
+        EstadoDerivado.__table__.create(db.engine, checkfirst=True)
+
+        construidos = SketchService._construir()
+        agora = datetime.utcnow()
+        linhas = [
+            {'mes': mes, 'metrica': metrica, 'dados': sketch.serializar(),
+             'sujo': False, 'atualizado_em': agora}
+            for (mes, metrica), sketch in construidos.items()
+        ]
+
+        try:
+            db.session.execute(SketchMensal.__table__.delete())
+            if linhas:
+                db.session.execute(insert(SketchMensal.__table__), linhas)
+            marcar_populado(db.session.connection(), SketchMensal.__table__, SKETCH_VERSAO)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        marcar_sketches_disponiveis()
+
+        tempo = (datetime.now() - inicio).total_seconds()
+        logger.info(f"Sketches mensais reconstruídos: {len(linhas)} linhas em {tempo:.2f}s")
+        return {'linhas': len(linhas), 'tempo_segundos': round(tempo, 2)}
+
+    @staticmethod
+    def _construir(inicio: Optional[date] = None, fim: Optional[date] = None) -> Dict[Tuple[date, str], object]:
+        """Sketches por (mês, métrica) dos CTEs emitidos em [inicio, fim]"""
+        from app.services.carregador_colunar_service import carregar_ctes
+
+        pares = pares_duracao()
+        colunas = ['data_emissao', *METRICAS_DISTINTOS.values()]
+        for campo_inicio, campo_fim in pares.values():
+            colunas += [campo_inicio, campo_fim]
+
+        df = carregar_ctes(colunas, data_inicio=inicio, data_fim=fim, nao_nulos=['data_emissao'],
+                           incluir_arquivo=True)
+        if df.empty:
+            return {}
+
+        meses = df['data_emissao'].dt.to_period('M').dt.start_time.dt.date
+        resultado = {}
+
+        for metrica, campo in METRICAS_DISTINTOS.items():
+            for mes, valores in df[campo].groupby(meses).unique().items():
+                valores = [v for v in valores if v is not None and v == v]
+                if valores:
+                    sketch = resultado[(mes, metrica)] = novo_sketch(metrica)
+                    sketch.adicionar_varios(valores)
+
+        for codigo, (campo_inicio, campo_fim) in pares.items():
+            metrica = PREFIXO_DURACAO + codigo
+            dias = (df[campo_fim] - df[campo_inicio]).dt.days
+            validos = dias.notna() & (dias >= 0)
+            for mes, valores in dias[validos].groupby(meses[validos]):
+                sketch = resultado[(mes, metrica)] = novo_sketch(metrica)
+                sketch.adicionar_varios(valores.to_numpy())
+
+        return resultado
+
+
+def _dividir_periodo(inicio: Optional[date], fim: Optional[date]):
+    """
+    (primeiro mês inteiro, último mês inteiro, bordas parciais) do período
+    Meses inteiros None = sem limite naquele lado
+    """
+    mes_completo_inicio = None
+    if inicio is not None:
+        mes_completo_inicio = inicio.replace(day=1)
+        if inicio.day != 1:
+            mes_completo_inicio = (mes_completo_inicio + timedelta(days=32)).replace(day=1)
+
+    mes_completo_fim = None
+    if fim is not None:
+        mes_completo_fim = fim.replace(day=1)
+        if fim.day != calendar.monthrange(fim.year, fim.month)[1]:
+            mes_completo_fim = (mes_completo_fim - timedelta(days=1)).replace(day=1)
+
+    bordas = []
+    if inicio is not None and inicio.day != 1:
+        ultimo_dia = inicio.replace(day=calendar.monthrange(inicio.year, inicio.month)[1])
+        bordas.append((inicio, min(ultimo_dia, fim) if fim is not None else ultimo_dia))
+    if fim is not None and mes_completo_fim != fim.replace(day=1):
+        inicio_borda = max(fim.replace(day=1), inicio) if inicio is not None else fim.replace(day=1)
+        if not bordas or inicio_borda > bordas[0][1]:
+            bordas.append((inicio_borda, fim))
+
+    return mes_completo_inicio, mes_completo_fim, bordas
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de Stress Test de Receita - Dashboard Baker Flask
+app/services/stress_test_service.py
+
+Trabalha sobre o array de receita por cliente ordenado (decrescente) e sua
+soma acumulada; todos os cenários são resolvidos de forma vetorizada:
+- top_k: perda dos k maiores clientes
+- participacao_acima: perda dos clientes com participação >= X%
+- clientes: perda de clientes nomeados
+- reducao_geral: corte percentual sobre toda a receita
+- monte_carlo: probabilidade de inadimplência por cliente, N sorteios
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func
+
+from app import db
+from app.services.arquivo_cte_service import ArquivoCTEService
+
+logger = logging.getLogger(__name__)
+
+MAX_SIMULACOES = 1_000_000
+LOTE_SIMULACOES = 20_000  # limita a matriz sorteios x clientes em memória
+
+TIPOS_CENARIO = ('top_k', 'participacao_acima', 'clientes', 'reducao_geral', 'monte_carlo')
+
+
+class StressTestEngine:
+    """Cenários de stress sobre a distribuição de receita por cliente"""
+
+    def __init__(self, clientes, receitas):
+        receitas = np.asarray(receitas, dtype=np.float64)
+        ordem = np.argsort(-receitas, kind='stable')
+        self.clientes = np.asarray(clientes, dtype=object)[ordem]
+        self.receitas = receitas[ordem]
+        self.acumulado = np.cumsum(self.receitas)
+        self.receita_total = float(self.acumulado[-1]) if len(self.acumulado) else 0.0
+        self.participacao = self.receitas / self.receita_total if self.receita_total > 0 \
+            else np.zeros_like(self.receitas)
+        self._indice = {nome: i for i, nome in enumerate(self.clientes)}
+
+    # ==================== CONSTRUÇÃO ====================
+
+    @classmethod
+    def do_banco(cls, filtro_dias: int = 180, filtro_cliente: Optional[str] = None) -> 'StressTestEngine':
+        """Receita por cliente agregada no banco (sem carregar CTEs)"""
+        data_limite = datetime.now().date() - timedelta(days=int(filtro_dias))
+        modelo = ArquivoCTEService.modelo_periodo(data_limite)
+        nome = func.trim(modelo.destinatario_nome)
+
+        query = db.session.query(nome.label('cliente'), func.sum(modelo.valor_total).label('receita')).filter(
+            modelo.data_emissao >= data_limite,
+            modelo.destinatario_nome.isnot(None),
+            modelo.destinatario_nome != '',
+            modelo.valor_total.isnot(None),
+            modelo.valor_total > 0
+        )
+        if filtro_cliente:
+            query = query.filter(modelo.destinatario_nome.ilike(f'%{filtro_cliente}%'))
+
+        linhas = query.group_by(nome).all()
+        return cls([l.cliente for l in linhas], [float(l.receita or 0) for l in linhas])
+
+    @classmethod
+    def do_dataframe(cls, df, coluna_cliente: str = 'destinatario_nome',
+                     coluna_valor: str = 'valor_total') -> 'StressTestEngine':
+        receita_cliente = df.groupby(coluna_cliente)[coluna_valor].sum()
+        return cls(receita_cliente.index.to_numpy(), receita_cliente.to_numpy())
+
+    # ==================== CENÁRIOS ====================
+
+    def executar(self, cenarios: List[Dict]) -> List[Dict]:
+        """Executa uma lista de definições de cenário (formato JSON da API)"""
+        return [self.executar_cenario(cenario) for cenario in cenarios]
+
+    def executar_cenario(self, cenario: Dict) -> Dict:
+        if not isinstance(cenario, dict):
+            raise ValueError("Cada cenário deve ser um objeto JSON")
+
+        tipo = cenario.get('tipo')
+        if tipo == 'top_k':
+            resultado = self.perda_top_k(int(cenario.get('k', 1)))
+        elif tipo == 'participacao_acima':
+            resultado = self.perda_participacao_acima(float(cenario.get('limite_percentual', 10)))
+        elif tipo == 'clientes':
+            resultado = self.perda_clientes(cenario.get('clientes') or [])
+        elif tipo == 'reducao_geral':
+            resultado = self.reducao_geral(float(cenario.get('percentual', 20)))
+        elif tipo == 'monte_carlo':
+            resultado = self.monte_carlo(
+                probabilidade_padrao=float(cenario.get('probabilidade_padrao', 0.05)),
+                probabilidades=cenario.get('probabilidades') or {},
+                simulacoes=int(cenario.get('simulacoes', 100_000)),
+                percentis=cenario.get('percentis') or [50, 90, 95, 99],
+                semente=cenario.get('semente')
+            )
+        else:
+            raise ValueError(f"Tipo de cenário inválido: {tipo!r}. Use um de {', '.join(TIPOS_CENARIO)}")
+
+        resultado['tipo'] = tipo
+        resultado['cenario'] = cenario.get('nome') or resultado.pop('nome_padrao')
+        resultado.pop('nome_padrao', None)
+        return resultado
+
+    def perda_top_k(self, k: int) -> Dict:
+        if k < 0:
+            raise ValueError("k deve ser >= 0")
+        k = min(k, len(self.receitas))
+        perdida = float(self.acumulado[k - 1]) if k > 0 else 0.0
+        return self._resultado(f'Perda Top {k} Clientes', perdida, self.clientes[:k])
+
+    def perda_participacao_acima(self, limite_percentual: float) -> Dict:
+        # Participação é decrescente: os afetados formam um prefixo do array
+        k = int(np.searchsorted(-self.participacao, -limite_percentual / 100.0, side='right'))
+        perdida = float(self.acumulado[k - 1]) if k > 0 else 0.0
+        return self._resultado(
+            f'Perda de Clientes com Participação >= {limite_percentual:g}%',
+            perdida, self.clientes[:k]
+        )
+
+    def perda_clientes(self, clientes: List[str]) -> Dict:
+        indices = np.array(sorted({self._indice[c] for c in clientes if c in self._indice}), dtype=np.int64)
+        perdida = float(self.receitas[indices].sum()) if len(indices) else 0.0
+        resultado = self._resultado('Perda de Clientes Selecionados', perdida, self.clientes[indices])
+        resultado['clientes_nao_encontrados'] = [c for c in clientes if c not in self._indice]
+        return resultado
+
+    def reducao_geral(self, percentual: float) -> Dict:
+        if not 0 <= percentual <= 100:
+            raise ValueError("percentual deve estar entre 0 e 100")
+        resultado = self._resultado(f'Redução Geral {percentual:g}%',
+                                    self.receita_total * percentual / 100.0, [])
+        resultado['clientes_afetados'] = len(self.receitas)
+        return resultado
+
+    def monte_carlo(self, probabilidade_padrao: float = 0.05, probabilidades: Dict = None,
+                    simulacoes: int = 100_000, percentis: List[float] = None,
+                    semente: Optional[int] = None) -> Dict:
+        """
+        Perda simulada com inadimplência independente por cliente
+        Cada sorteio é uma linha da matriz (sorteios x clientes); a perda de cada
+        sorteio é o produto da máscara de inadimplência pelo vetor de receitas
+        """
+        if not 1 <= simulacoes <= MAX_SIMULACOES:
+            raise ValueError(f"simulacoes deve estar entre 1 e {MAX_SIMULACOES}")
+
+        probabilidades = probabilidades or {}
+        if not isinstance(probabilidades, dict):
+            raise ValueError("probabilidades deve ser um objeto {cliente: probabilidade}")
+        if not 0 <= probabilidade_padrao <= 1:  # também rejeita NaN
+            raise ValueError("probabilidade_padrao deve estar entre 0 e 1")
+
+        p = np.full(len(self.receitas), probabilidade_padrao, dtype=np.float64)
+        for nome, prob in probabilidades.items():
+            if isinstance(prob, bool) or not isinstance(prob, (int, float)) or not 0 <= prob <= 1:
+                raise ValueError(f"Probabilidade de {nome!r} deve ser um número entre 0 e 1")
+            if nome in self._indice:
+                p[self._indice[nome]] = float(prob)
+
+        percentis = [float(x) for x in (percentis or [50, 90, 95, 99])]
+        rng = np.random.default_rng(semente)
+        limiares = p.astype(np.float32)
+        receitas = self.receitas.astype(np.float32)
+
+        perdas = np.empty(simulacoes, dtype=np.float64)
+        for inicio in range(0, simulacoes, LOTE_SIMULACOES):
+            fim = min(inicio + LOTE_SIMULACOES, simulacoes)
+            sorteios = rng.random((fim - inicio, len(receitas)), dtype=np.float32)
+            perdas[inicio:fim] = (sorteios < limiares) @ receitas
+
+        valores_percentis = np.percentile(perdas, percentis) if simulacoes else []
+        var_95 = float(np.percentile(perdas, 95))
+        cauda = perdas[perdas >= var_95]
+        esperada = float(np.dot(p, self.receitas))
+
+        resultado = self._resultado('Monte Carlo de Inadimplência', esperada, [])
+        resultado.update({
+            'simulacoes': simulacoes,
+            'perda_esperada_analitica': round(esperada, 2),
+            'perda_media_simulada': round(float(perdas.mean()), 2),
+            'desvio_padrao': round(float(perdas.std()), 2),
+            'percentis': {f'p{x:g}': round(float(v), 2) for x, v in zip(percentis, valores_percentis)},
+            'var_95': round(var_95, 2),
+            'expected_shortfall_95': round(float(cauda.mean()), 2) if len(cauda) else round(var_95, 2),
+            'perda_maxima_simulada': round(float(perdas.max()), 2),
+            'clientes_afetados': int(np.count_nonzero(p)),
+        })
+        return resultado
+
+    # ==================== AUXILIARES ====================
+
+    def _resultado(self, nome: str, perdida: float, clientes) -> Dict:
+        impacto = (perdida / self.receita_total * 100) if self.receita_total > 0 else 0.0
+        clientes = list(clientes)
+        return {
+            'nome_padrao': nome,
+            'receita_perdida': round(perdida, 2),
+            'percentual_impacto': round(impacto, 2),
+            'receita_restante': round(self.receita_total - perdida, 2),
+            'percentual_restante': round(100 - impacto, 2),
+            'clientes_afetados': len(clientes),
+            'clientes': clientes[:20],
+        }
+
+    def resumo(self) -> Dict:
+        return {
+            'receita_total': round(self.receita_total, 2),
+            'total_clientes': len(self.receitas),
+            'maior_participacao': round(float(self.participacao[0]) * 100, 2) if len(self.receitas) else 0.0,
+        }
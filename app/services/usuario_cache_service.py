@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de Identidade de Usuários - Dashboard Baker Flask
+app/services/usuario_cache_service.py
+
+Mapa por worker de user_id -> registro imutável com as colunas do usuário
+(sem password_hash), com TTL curto. O load_user do Flask-Login e o
+middleware JWT remontam o User a partir do registro sem consultar a tabela
+users: o objeto entra na sessão como persistente (merge load=False), então
+alterações e acesso a colunas fora do registro continuam funcionando.
+Invalidado por alterações de User no ORM (edição, senha, perfil, status,
+exclusão) - ver listeners em app/models/user.py.
+"""
+
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Optional
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from app import db
+
+USUARIO_CACHE_TTL = int(os.getenv("USUARIO_CACHE_TTL", "30"))
+USUARIO_CACHE_MAX = int(os.getenv("USUARIO_CACHE_MAX", "1024"))
+
+# Colunas que não ficam em memória (carregadas sob demanda se acessadas)
+COLUNAS_EXCLUIDAS = ('password_hash',)
+
+
+class CacheUsuarios:
+    """Registros de usuário por id, com expiração"""
+
+    def __init__(self, ttl: int = USUARIO_CACHE_TTL, max_entradas: int = USUARIO_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def obter(self, user_id: int) -> Optional[MappingProxyType]:
+        entrada = self._entradas.get(user_id)
+        if entrada is None:
+            return None
+        expira_em, registro = entrada
+        if expira_em <= time.monotonic():
+            self.invalidar(user_id)
+            return None
+        return registro
+
+    def gravar(self, user_id: int, registro: Dict) -> None:
+        with self._lock:
+            if len(self._entradas) >= self.max_entradas:
+                self._remover_expirados()
+                if len(self._entradas) >= self.max_entradas:
+                    self._entradas.pop(next(iter(self._entradas)))
+            self._entradas[user_id] = (time.monotonic() + self.ttl, MappingProxyType(dict(registro)))
+
+    def invalidar(self, user_id: int = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(user_id, None)
+
+    def _remover_expirados(self) -> None:
+        agora = time.monotonic()
+        for chave in [c for c, (expira_em, _) in self._entradas.items() if expira_em <= agora]:
+            del self._entradas[chave]
+
+
+usuarios_cache = CacheUsuarios()
+
+
+def registro_usuario(user) -> Dict:
+    """Colunas do usuário que vão para o cache"""
+    return {
+        coluna.key: getattr(user, coluna.key)
+        for coluna in user.__table__.columns
+        if coluna.key not in COLUNAS_EXCLUIDAS
+    }
+
+
+def carregar_usuario(user_id):
+    """
+    User pelo id: identity map da sessão, depois cache do worker, depois banco
+    Retorna None se o usuário não existe
+    """
+    from app.models.user import User
+
+    user_id = int(user_id)
+    existente = db.session.identity_map.get(identity_key(User, user_id))
+    if existente is not None:
+        return existente
+
+    registro = usuarios_cache.obter(user_id)
+    if registro is not None:
+        user = User(**registro)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        usuarios_cache.gravar(user_id, registro_usuario(user))
+    return user
+
+
+def invalidar_usuario(user_id: int = None) -> None:
+    """Remove um usuário (ou todos) do cache deste worker"""
+    usuarios_cache.invalidar(user_id)
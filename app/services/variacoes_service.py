@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de Variações Temporais - Dashboard Baker Flask
+app/services/variacoes_service.py
+
+Calcula, direto no banco, as estatísticas de dias entre etapas do processo
+para todos os pares de VARIACOES_CONFIG em uma única query:
+- PostgreSQL: avg/min/max e percentile_cont (mediana, p90, p95) por par
+- Demais bancos: dias calculados no SQL, percentis calculados em Python
+Opcionalmente agrupado por cliente ou por mês de emissão.
+"""
+
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, case, cast, func, select
+
+from app import db
+from app.models.cte import CTE
+from app.services.arquivo_cte_service import ArquivoCTEService
+
+logger = logging.getLogger(__name__)
+
+AGRUPAMENTOS = ('cliente', 'mes')
+
+# Nome da estatística -> fração do percentile_cont
+PERCENTIS = {'mediana': 0.5, 'p90': 0.9, 'p95': 0.95}
+
+
+class VariacoesService:
+    """Estatísticas de tempo entre etapas agregadas no banco"""
+
+    # ==================== CONSULTA ====================
+
+    @staticmethod
+    def calcular(configs: List[Dict] = None, agrupar_por: Optional[str] = None,
+                 data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                 cliente: Optional[str] = None) -> Dict:
+        """
+        Estatísticas (qtd, media, mediana, p90, p95, min, max) por código de variação
+        Sem agrupamento: {codigo: stats}; agrupado: {grupo: {codigo: stats}}
+        Considera apenas pares com as duas datas preenchidas e fim >= início
+        """
+        if configs is None:
+            from app.services.metricas_service import VARIACOES_CONFIG
+            configs = VARIACOES_CONFIG
+        if agrupar_por is not None and agrupar_por not in AGRUPAMENTOS:
+            raise ValueError(f"Agrupamento inválido: {agrupar_por!r}. Use um de {', '.join(AGRUPAMENTOS)}")
+
+        dialeto = db.engine.dialect.name
+        # Períodos antigos (ou sem início) podem alcançar CTEs arquivados
+        modelo = ArquivoCTEService.modelo_periodo(data_inicio)
+        dias = {
+            config['codigo']: VariacoesService._expressao_dias(
+                config['campo_inicio'], config['campo_fim'], dialeto, modelo
+            )
+            for config in configs
+        }
+        grupo = VariacoesService._expressao_grupo(agrupar_por, dialeto, modelo)
+
+        if dialeto == 'postgresql':
+            colunas = []
+            for codigo, expr in dias.items():
+                colunas += [
+                    func.count(expr).label(f'{codigo}__qtd'),
+                    func.avg(expr).label(f'{codigo}__media'),
+                    func.min(expr).label(f'{codigo}__min'),
+                    func.max(expr).label(f'{codigo}__max'),
+                ]
+                colunas += [
+                    func.percentile_cont(fracao).within_group(expr).label(f'{codigo}__{nome}')
+                    for nome, fracao in PERCENTIS.items()
+                ]
+            stmt = select(*([grupo.label('grupo')] if grupo is not None else []), *colunas)
+            if grupo is not None:
+                stmt = stmt.group_by(grupo)
+        else:
+            stmt = select(*([grupo.label('grupo')] if grupo is not None else []),
+                          *[expr.label(codigo) for codigo, expr in dias.items()])
+
+        stmt = VariacoesService._aplicar_filtros(stmt, modelo, grupo, data_inicio, data_fim, cliente)
+        linhas = db.session.execute(stmt).all()
+
+        if dialeto == 'postgresql':
+            por_grupo = {
+                (linha.grupo if grupo is not None else None): VariacoesService._estatisticas_linha(linha, dias)
+                for linha in linhas
+            }
+        else:
+            por_grupo = VariacoesService._estatisticas_python(linhas, dias, grupo is not None)
+
+        if grupo is None:
+            return por_grupo.get(None, {})
+        return {chave: stats for chave, stats in por_grupo.items() if stats}
+
+    @staticmethod
+    def classificar_performance(media: float, meta_dias: float) -> str:
+        if media <= meta_dias:
+            return 'excelente'
+        elif media <= meta_dias * 1.5:
+            return 'bom'
+        elif media <= meta_dias * 2:
+            return 'atencao'
+        return 'critico'
+
+    # ==================== SQL ====================
+
+    @staticmethod
+    def _expressao_dias(campo_inicio: str, campo_fim: str, dialeto: str, modelo=CTE):
+        """Dias entre as etapas; NULL quando alguma data falta ou fim < início"""
+        inicio = getattr(modelo, campo_inicio)
+        fim = getattr(modelo, campo_fim)
+        if dialeto == 'postgresql':
+            diferenca = fim - inicio  # date - date = integer
+        elif dialeto == 'mysql':
+            diferenca = func.datediff(fim, inicio)
+        else:
+            diferenca = cast(func.julianday(fim) - func.julianday(inicio), Integer)
+        return case((fim >= inicio, diferenca))
+
+    @staticmethod
+    def _expressao_grupo(agrupar_por: Optional[str], dialeto: str, modelo=CTE):
+        if agrupar_por == 'cliente':
+            return modelo.destinatario_nome
+        if agrupar_por == 'mes':
+            if dialeto == 'postgresql':
+                return func.to_char(modelo.data_emissao, 'YYYY-MM')
+            if dialeto == 'mysql':
+                return func.date_format(modelo.data_emissao, '%Y-%m')
+            return func.strftime('%Y-%m', modelo.data_emissao)
+        return None
+
+    @staticmethod
+    def _aplicar_filtros(stmt, modelo, grupo, data_inicio, data_fim, cliente):
+        stmt = stmt.select_from(modelo)
+        if grupo is not None:
+            stmt = stmt.where(grupo.isnot(None))
+        if data_inicio is not None:
+            stmt = stmt.where(modelo.data_emissao >= data_inicio)
+        if data_fim is not None:
+            stmt = stmt.where(modelo.data_emissao <= data_fim)
+        if cliente:
+            stmt = stmt.where(modelo.destinatario_nome.ilike(f'%{cliente}%'))
+        return stmt
+
+    # ==================== RESULTADOS ====================
+
+    @staticmethod
+    def _estatisticas_linha(linha, dias: Dict) -> Dict:
+        """Converte a linha agregada do PostgreSQL em {codigo: stats}"""
+        resultado = {}
+        for codigo in dias:
+            qtd = int(getattr(linha, f'{codigo}__qtd') or 0)
+            if not qtd:
+                continue
+            stats = {
+                'qtd': qtd,
+                'media': float(getattr(linha, f'{codigo}__media')),
+                'min': int(getattr(linha, f'{codigo}__min')),
+                'max': int(getattr(linha, f'{codigo}__max')),
+            }
+            for nome in PERCENTIS:
+                stats[nome] = float(getattr(linha, f'{codigo}__{nome}'))
+            resultado[codigo] = stats
+        return resultado
+
+    @staticmethod
+    def _estatisticas_python(linhas, dias: Dict, agrupado: bool) -> Dict:
+        """Agrega em Python os dias já calculados pelo banco (sem percentile_cont)"""
+        valores: Dict = {}
+        for linha in linhas:
+            chave = linha.grupo if agrupado else None
+            por_codigo = valores.setdefault(chave, {codigo: [] for codigo in dias})
+            for codigo in dias:
+                valor = getattr(linha, codigo)
+                if valor is not None:
+                    por_codigo[codigo].append(int(valor))
+
+        resultado = {}
+        for chave, por_codigo in valores.items():
+            resultado[chave] = {}
+            for codigo, lista in por_codigo.items():
+                if not lista:
+                    continue
+                lista.sort()
+                stats = {
+                    'qtd': len(lista),
+                    'media': sum(lista) / len(lista),
+                    'min': lista[0],
+                    'max': lista[-1],
+                }
+                for nome, fracao in PERCENTIS.items():
+                    stats[nome] = _percentil_continuo(lista, fracao)
+                resultado[chave][codigo] = stats
+        return resultado
+
+
+def _percentil_continuo(ordenados: List[int], fracao: float) -> float:
+    """Mesma interpolação linear do percentile_cont"""
+    posicao = fracao * (len(ordenados) - 1)
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
@@ -10,6 +10,8 @@ import logging
 import traceback
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 def api_response_handler(f):
     """
     Decorator para garantir que todas as APIs sempre retornem JSON válido
@@ -380,27 +382,25 @@ def testar_apis():
     
     base_url = "http://localhost:5000"
     
-    print("🧪 TESTANDO APIs...")
-    print("=" * 50)
+    logger.info("🧪 TESTANDO APIs...")
     
     # Teste 1: Listar CTEs
     try:
         response = requests.get(f"{base_url}/ctes/api/listar")
-        print(f"✅ GET /ctes/api/listar: {response.status_code}")
+        logger.info(f"✅ GET /ctes/api/listar: {response.status_code}")
         
         if response.headers.get('content-type', '').startswith('application/json'):
-            print("   ✅ Content-Type correto")
+            logger.info("   ✅ Content-Type correto")
             data = response.json()
-            print(f"   ✅ JSON válido: success={data.get('success')}")
+            logger.info(f"   ✅ JSON válido: success={data.get('success')}")
         else:
-            print(f"   ❌ Content-Type incorreto: {response.headers.get('content-type')}")
-            print(f"   ❌ Response (100 chars): {response.text[:100]}")
+            logger.error(f"   ❌ Content-Type incorreto: {response.headers.get('content-type')}")
+            logger.error(f"   ❌ Response (100 chars): {response.text[:100]}")
             
     except Exception as e:
-        print(f"   ❌ Erro: {e}")
+        logger.error(f"   ❌ Erro: {e}")
     
-    print("=" * 50)
-    print("🏁 Teste concluído")
+    logger.info("🏁 Teste concluído")
 
 # ============================================================================
 # INSTRUÇÕES DE IMPLEMENTAÇÃO
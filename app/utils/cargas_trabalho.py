@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classes de Carga de Trabalho - Dashboard Baker Flask
+app/utils/cargas_trabalho.py
+
+Cada requisição pertence a uma classe (interativa, analitica, lote):
+- statement_timeout próprio, aplicado com SET LOCAL na primeira query de
+  cada transação (PostgreSQL), então uma varredura analítica é cancelada
+  pelo banco em vez de segurar a conexão até o timeout do gunicorn
+- Orçamento de conexões por máquina: no máximo N requisições da classe
+  usando o banco ao mesmo tempo, somando todos os workers do gunicorn
+  (N arquivos de vaga com flock em CARGA_LOCK_DIR; o kernel libera a vaga
+  se o worker morrer); excedido o tempo de espera, 503. Entre máquinas o
+  limite fica com o banco (CONNECTION LIMIT por papel / pools do pgbouncer)
+- Query cancelada (SQLSTATE 57014) ou orçamento esgotado: 503 JSON com
+  Retry-After, mesmo que a rota capture a exceção e responda 500
+Fora de requisição (CLI, scripts, threads) não há classe nem statement_timeout:
+um comando opta por um com "with carga_de_trabalho('lote'):", que também
+troca a classe de um bloco dentro de uma requisição.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from sqlalchemy.exc import DBAPIError
+
+try:
+    import fcntl
+except ImportError:  # Windows: orçamento fica por processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CARGA_LOCK_DIR = os.getenv("CARGA_LOCK_DIR", os.path.join(tempfile.gettempdir(), "dashboard_baker_carga"))
+CARGA_ESPERA_SEGUNDOS = float(os.getenv("CARGA_ESPERA_SEGUNDOS", "2"))
+CARGA_RETRY_AFTER = int(os.getenv("CARGA_RETRY_AFTER", "5"))
+
+SQLSTATE_CANCELADA = '57014'  # query_canceled (statement_timeout ou pg_cancel_backend)
+
+
+@dataclass
+class ClasseCarga:
+    nome: str
+    timeout_ms: int
+    conexoes: int
+    _local: threading.BoundedSemaphore = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._local = threading.BoundedSemaphore(max(self.conexoes, 1))
+
+    def reservar(self, espera: float = CARGA_ESPERA_SEGUNDOS):
+        """Ocupa uma vaga do orçamento; devolve a vaga (para liberar) ou None se esgotado"""
+        if fcntl is None:
+            return self._local if self._local.acquire(timeout=espera) else None
+
+        os.makedirs(CARGA_LOCK_DIR, exist_ok=True)
+        limite = time.monotonic() + espera
+        while True:
+            for i in range(max(self.conexoes, 1)):
+                vaga = open(os.path.join(CARGA_LOCK_DIR, f"{self.nome}.{i}.lock"), 'a')
+                try:
+                    fcntl.flock(vaga, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return vaga
+                except OSError:
+                    vaga.close()
+            if time.monotonic() >= limite:
+                return None
+            time.sleep(0.02)
+
+    def liberar(self, vaga) -> None:
+        if vaga is self._local:
+            try:
+                self._local.release()
+            except ValueError:
+                pass
+        elif vaga is not None:
+            vaga.close()  # fechar o arquivo solta o flock
+
+
+def _classe(nome: str, timeout_padrao: int, conexoes_padrao: int) -> ClasseCarga:
+    prefixo = f"CARGA_{nome.upper()}"
+    return ClasseCarga(
+        nome,
+        timeout_ms=int(os.getenv(f"{prefixo}_TIMEOUT_MS", str(timeout_padrao))),
+        conexoes=int(os.getenv(f"{prefixo}_CONEXOES", str(conexoes_padrao))),
+    )
+
+
+# Padrões para os 4 workers síncronos do Procfile (uma requisição por worker):
+# análises e lotes nunca ocupam todos os workers ao mesmo tempo
+CLASSES_CARGA: Dict[str, ClasseCarga] = {
+    'interativa': _classe('interativa', 5000, 4),
+    'analitica': _classe('analitica', 30000, 2),
+    'lote': _classe('lote', 300000, 1),
+}
+
+CLASSE_PADRAO_REQUISICAO = 'interativa'
+# None: sem statement_timeout fora de requisição (rebuilds e arquivamento podem levar mais)
+CLASSE_PADRAO_FORA_REQUISICAO: Optional[str] = None
+
+BLUEPRINTS_ANALITICOS = ('analise_financeira', 'dashboard', 'alertas')
+ENDPOINTS_ANALITICOS = (
+    'ctes.api_download_excel',
+    'ctes.api_download_csv',
+    'ctes.relatorios_veiculo',
+    'ctes.api_relatorios_veiculo',
+    'baixas.api_exportar',
+)
+BLUEPRINTS_LOTE = ('atualizar',)
+ENDPOINTS_LOTE = (
+    'ctes.api_atualizar_lote',
+    'baixas.api_baixa_lote',
+)
+
+_classe_atual: ContextVar[Optional[str]] = ContextVar('classe_carga', default=None)
+
+
+def classe_da_requisicao() -> str:
+    if request.blueprint in BLUEPRINTS_LOTE or request.endpoint in ENDPOINTS_LOTE:
+        return 'lote'
+    if request.blueprint in BLUEPRINTS_ANALITICOS or request.endpoint in ENDPOINTS_ANALITICOS:
+        return 'analitica'
+    return CLASSE_PADRAO_REQUISICAO
+
+
+def classe_atual() -> Optional[ClasseCarga]:
+    """Classe do bloco/requisição; None fora de requisição sem carga_de_trabalho"""
+    nome = _classe_atual.get()
+    if nome is None:
+        nome = CLASSE_PADRAO_REQUISICAO if has_request_context() else CLASSE_PADRAO_FORA_REQUISICAO
+    return CLASSES_CARGA[nome] if nome is not None else None
+
+
+@contextmanager
+def carga_de_trabalho(nome: str):
+    """Executa o bloco com o statement_timeout da classe (sem reservar orçamento)"""
+    if nome not in CLASSES_CARGA:
+        raise ValueError(f"Classe de carga inválida: {nome}. Use uma de {', '.join(CLASSES_CARGA)}")
+    token = _classe_atual.set(nome)
+    try:
+        yield CLASSES_CARGA[nome]
+    finally:
+        _classe_atual.reset(token)
+
+
+def resposta_sobrecarga(motivo: str, classe: ClasseCarga):
+    resposta = jsonify({
+        'success': False,
+        'error': motivo,
+        'classe_carga': classe.nome,
+        'timeout_ms': classe.timeout_ms,
+    })
+    resposta.status_code = 503
+    resposta.headers['Retry-After'] = str(CARGA_RETRY_AFTER)
+    return resposta
+
+
+def registrar_cargas_trabalho(app) -> None:
+    """Classifica cada requisição, reserva o orçamento e converte cancelamentos em 503"""
+
+    @app.before_request
+    def _reservar_carga():
+        if request.endpoint is None or request.endpoint == 'static':
+            return None
+        classe = CLASSES_CARGA[classe_da_requisicao()]
+        request.environ['carga.token'] = _classe_atual.set(classe.nome)
+        vaga = classe.reservar()
+        if vaga is None:
+            logger.warning(f"Orçamento de conexões esgotado: classe {classe.nome} ({request.path})")
+            return resposta_sobrecarga('Servidor ocupado, tente novamente em instantes', classe)
+        request.environ['carga.reservada'] = (classe, vaga)
+        return None
+
+    @app.after_request
+    def _converter_cancelamento(response):
+        # Rotas que capturam a exceção e respondem 500 também viram 503
+        if g.get('consulta_cancelada') and response.status_code >= 500:
+            return resposta_sobrecarga('Consulta cancelada por exceder o tempo limite', classe_atual())
+        return response
+
+    @app.teardown_request
+    def _liberar_carga(exc=None):
+        reservada = request.environ.pop('carga.reservada', None)
+        if reservada is not None:
+            classe, vaga = reservada
+            classe.liberar(vaga)
+        token = request.environ.pop('carga.token', None)
+        if token is not None:
+            try:
+                _classe_atual.reset(token)
+            except ValueError:
+                _classe_atual.set(None)
+
+    @app.errorhandler(DBAPIError)
+    def _consulta_cancelada(erro):
+        if not consulta_foi_cancelada(erro):
+            raise erro
+        from app import db
+        db.session.rollback()
+        return resposta_sobrecarga('Consulta cancelada por exceder o tempo limite', classe_atual())
+
+
+def consulta_foi_cancelada(erro: BaseException) -> bool:
+    orig = getattr(erro, 'orig', erro)
+    return getattr(orig, 'pgcode', None) == SQLSTATE_CANCELADA \
+        or getattr(getattr(orig, 'diag', None), 'sqlstate', None) == SQLSTATE_CANCELADA
+
+
+# ==================== STATEMENT_TIMEOUT POR TRANSAÇÃO ====================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _aplicar_statement_timeout(conn, cursor, statement, parameters, context, executemany):
+    _definir_timeout(conn, cursor)
+
+
+def aplicar_statement_timeout(conexao) -> None:
+    """Para leituras pelo cursor DBAPI, que não passam pelos eventos do Engine"""
+    if conexao.dialect.name != 'postgresql':
+        return
+    cursor = conexao.connection.cursor()
+    try:
+        _definir_timeout(conexao, cursor)
+    finally:
+        cursor.close()
+
+
+def _definir_timeout(conn, cursor) -> None:
+    if conn.dialect.name != 'postgresql':
+        return
+    classe = classe_atual()
+    if classe is None:
+        return
+    timeout = classe.timeout_ms
+    if conn.info.get('carga_timeout_ms') == timeout:
+        return
+    # Mesma conexão, mesma transação: vale até o COMMIT/ROLLBACK
+    cursor.execute(f"SET LOCAL statement_timeout = {int(timeout)}")
+    conn.info['carga_timeout_ms'] = timeout
+
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def _fim_transacao(conn):
+    conn.info.pop('carga_timeout_ms', None)
+
+
+@event.listens_for(Pool, 'checkin')
+def _limpar_ao_devolver(dbapi_connection, connection_record):
+    connection_record.info.pop('carga_timeout_ms', None)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _marcar_cancelamento(contexto):
+    marcar_cancelamento(contexto.original_exception)
+
+
+def marcar_cancelamento(erro: BaseException) -> None:
+    """Registra na requisição que uma query foi cancelada (resposta vira 503)"""
+    if consulta_foi_cancelada(erro) and has_request_context():
+        g.consulta_cancelada = True
+        logger.warning(f"Consulta cancelada por statement_timeout ({classe_atual().nome}, "
+                       f"{classe_atual().timeout_ms} ms): {request.path}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging Estruturado Não-Bloqueante - Dashboard Baker Flask
+app/utils/logging_estruturado.py
+
+- Threads de requisição só enfileiram (QueueHandler com fila limitada);
+  fila cheia descarta o registro em vez de bloquear
+- Um QueueListener por processo (recriado após fork do gunicorn) escreve
+  em stdout e no arquivo de log
+- Registros em JSON (LOG_FORMATO=texto para leitura local)
+- Contexto da requisição (método, path, usuário) capturado na thread da
+  requisição, antes de enfileirar
+- Amostragem de DEBUG: 1 a cada LOG_AMOSTRAGEM_DEBUG por (logger, mensagem)
+- Níveis por módulo: LOG_NIVEIS="app.routes.dashboard=DEBUG,werkzeug=WARNING"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "")
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))
+LOG_AMOSTRAGEM_DEBUG = int(os.getenv("LOG_AMOSTRAGEM_DEBUG", "10"))
+LOG_ARQUIVO = os.getenv("LOG_ARQUIVO", os.path.join("logs", "dashboard_baker.log"))
+
+NIVEIS_PADRAO = {
+    'sqlalchemy.engine': logging.WARNING,
+    'urllib3': logging.WARNING,
+    'werkzeug': logging.INFO,
+}
+
+# Atributos padrão do LogRecord (o resto veio de extra= e vai para o JSON)
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'contexto', 'amostragem'}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'modulo': record.module,
+            'linha': record.lineno,
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        contexto = getattr(record, 'contexto', None)
+        if contexto:
+            dados.update(contexto)
+        if getattr(record, 'amostragem', None):
+            dados['amostragem'] = record.amostragem
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                dados[chave] = valor
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['exc'] = record.exc_text
+        if record.stack_info:
+            dados['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Mantém 1 a cada N registros DEBUG por (logger, mensagem-modelo)"""
+
+    def __init__(self, taxa: int = LOG_AMOSTRAGEM_DEBUG):
+        super().__init__()
+        self.taxa = max(int(taxa), 1)
+        self._contagens: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        taxa = getattr(record, 'amostragem', None) or self.taxa
+        if taxa <= 1:
+            return True
+        chave = (record.name, str(record.msg)[:80])
+        with self._lock:
+            contagem = self._contagens.get(chave, 0)
+            if len(self._contagens) > 10000:
+                self._contagens.clear()
+            self._contagens[chave] = contagem + 1
+        record.amostragem = taxa
+        return contagem % taxa == 0
+
+
+class FiltroContextoRequisicao(logging.Filter):
+    """Anexa método, path, IP e usuário enquanto ainda na thread da requisição"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        try:
+            from flask import has_request_context, request, g
+            if has_request_context():
+                contexto = {'metodo': request.method, 'path': request.path, 'ip': request.remote_addr}
+                usuario = g.get('_login_user')
+                if usuario is not None and getattr(usuario, 'is_authenticated', False):
+                    contexto['user_id'] = usuario.get_id()
+                record.contexto = contexto
+        except Exception:
+            pass
+        return True
+
+
+class QueueHandlerNaoBloqueante(logging.handlers.QueueHandler):
+    """
+    Enfileira sem bloquear; fila cheia = registro descartado (contado)
+    O listener é por processo: após fork, cria fila e listener novos
+    """
+
+    def __init__(self, destinos: List[logging.Handler], tamanho_fila: int = LOG_FILA_MAX):
+        self.destinos = destinos
+        self.tamanho_fila = tamanho_fila
+        self.descartados = 0
+        self._pid = None
+        self.listener = None
+        super().__init__(queue.Queue(tamanho_fila))
+        self._iniciar_listener()
+
+    def _iniciar_listener(self) -> None:
+        self.queue = queue.Queue(self.tamanho_fila)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.destinos, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def parar(self) -> None:
+        if self.listener is not None and self._pid == os.getpid():
+            try:
+                self.listener.stop()  # drena a fila antes de sair
+            except Exception:
+                pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Mensagem e traceback resolvidos aqui (args podem não ser serializáveis/mutáveis)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self._pid != os.getpid():
+            self._iniciar_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_handler_fila: QueueHandlerNaoBloqueante = None
+
+
+def configurar_logging_estruturado(debug: bool = False, arquivo: bool = True) -> QueueHandlerNaoBloqueante:
+    """Instala o pipeline no logger raiz (idempotente)"""
+    global _handler_fila
+    if _handler_fila is not None:
+        return _handler_fila
+
+    formato = (LOG_FORMATO or ('texto' if debug else 'json')).lower()
+    if formato == 'texto':
+        formatador = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    else:
+        formatador = FormatadorJSON()
+
+    destinos = []
+    saida = logging.StreamHandler()
+    saida.setFormatter(formatador)
+    destinos.append(saida)
+
+    if arquivo:
+        try:
+            os.makedirs(os.path.dirname(LOG_ARQUIVO) or '.', exist_ok=True)
+            handler_arquivo = logging.FileHandler(LOG_ARQUIVO, encoding='utf-8')
+            handler_arquivo.setLevel(logging.INFO)
+            handler_arquivo.setFormatter(FormatadorJSON())
+            destinos.append(handler_arquivo)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Arquivo de log indisponível ({LOG_ARQUIVO}): {e}")
+
+    handler = QueueHandlerNaoBloqueante(destinos)
+    handler.addFilter(FiltroAmostragem())
+    handler.addFilter(FiltroContextoRequisicao())
+
+    raiz = logging.getLogger()
+    for existente in list(raiz.handlers):
+        raiz.removeHandler(existente)
+    raiz.addHandler(handler)
+    raiz.setLevel(_nivel(LOG_LEVEL) if LOG_LEVEL else (logging.DEBUG if debug else logging.INFO))
+
+    for nome, nivel in {**NIVEIS_PADRAO, **niveis_por_modulo()}.items():
+        logging.getLogger(nome).setLevel(nivel)
+
+    atexit.register(handler.parar)
+    _handler_fila = handler
+    return handler
+
+
+def niveis_por_modulo(valor: str = None) -> Dict[str, int]:
+    """Interpreta LOG_NIVEIS ("modulo=NIVEL,outro=NIVEL")"""
+    valor = os.getenv("LOG_NIVEIS", "") if valor is None else valor
+    niveis = {}
+    for parte in valor.split(','):
+        if '=' in parte:
+            nome, nivel = parte.split('=', 1)
+            if nome.strip():
+                niveis[nome.strip()] = _nivel(nivel)
+    return niveis
+
+
+def estatisticas_logging() -> Dict:
+    if _handler_fila is None:
+        return {'ativo': False}
+    return {
+        'ativo': True,
+        'fila': _handler_fila.queue.qsize(),
+        'fila_max': _handler_fila.tamanho_fila,
+        'descartados': _handler_fila.descartados,
+    }
+
+
+def _nivel(nome: str) -> int:
+    nivel = logging.getLevelName(nome.strip().upper())
+    return nivel if isinstance(nivel, int) else logging.INFO
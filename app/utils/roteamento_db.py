@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Roteamento de Leituras para Réplica - Dashboard Baker Flask
+app/utils/roteamento_db.py
+
+Com DATABASE_READ_URL definida, existe um segundo engine (bind 'leitura')
+com pool próprio. Leituras de blueprints/endpoints analíticos (GET) vão
+para a réplica; escritas (flush, INSERT/UPDATE/DELETE) sempre para o primário.
+- Réplica com atraso > DB_REPLICA_LAG_MAX segundos (ou fora do ar): primário
+- Read-your-writes: depois de um commit com escrita, as leituras daquela
+  sessão de usuário ficam no primário por DB_LEITURA_PINAGEM_SEGUNDOS
+- Fora de requisição (serviços, CLI): "with modo_leitura():"
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import has_request_context, request, session as sessao_flask
+from flask_sqlalchemy.session import Session as SessaoFlaskSQLAlchemy
+from sqlalchemy import event, inspect as sa_inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+DB_REPLICA_LAG_MAX = float(os.getenv("DB_REPLICA_LAG_MAX", "10"))
+DB_REPLICA_LAG_VERIFICACAO = float(os.getenv("DB_REPLICA_LAG_VERIFICACAO", "5"))
+DB_LEITURA_PINAGEM_SEGUNDOS = int(os.getenv("DB_LEITURA_PINAGEM_SEGUNDOS", "30"))
+
+BIND_LEITURA = 'leitura'
+
+# Rotas analíticas servidas pela réplica (somente GET/HEAD)
+BLUEPRINTS_LEITURA = ('analise_financeira', 'dashboard', 'alertas')
+ENDPOINTS_LEITURA = (
+    'ctes.api_download_excel',
+    'ctes.api_download_csv',
+    'ctes.relatorios_veiculo',
+    'ctes.api_relatorios_veiculo',
+)
+
+_CHAVE_PINAGEM = '_db_primario_ate'
+
+_modo_leitura: ContextVar[bool] = ContextVar('modo_leitura', default=False)
+
+
+class MonitorReplica:
+    """Atraso da réplica medido no máximo a cada DB_REPLICA_LAG_VERIFICACAO s por processo"""
+
+    _lock = threading.Lock()
+    _atraso = None
+    _disponivel = None  # None = ainda não medido
+    _verificado_em = 0.0
+
+    # Atraso em segundos; 0 se a réplica já aplicou tudo o que recebeu
+    SQL_ATRASO_POSTGRES = text("""
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """)
+
+    @classmethod
+    def disponivel(cls, engine) -> bool:
+        if time.monotonic() - cls._verificado_em >= DB_REPLICA_LAG_VERIFICACAO:
+            # Só uma thread mede; as demais usam o último valor
+            if cls._lock.acquire(blocking=False):
+                try:
+                    cls._medir(engine)
+                finally:
+                    cls._lock.release()
+        return bool(cls._disponivel)
+
+    @classmethod
+    def _medir(cls, engine) -> None:
+        anterior = cls._disponivel
+        try:
+            with engine.connect() as conexao:
+                if engine.dialect.name == 'postgresql':
+                    cls._atraso = float(conexao.execute(cls.SQL_ATRASO_POSTGRES).scalar() or 0)
+                else:
+                    conexao.execute(text("SELECT 1"))
+                    cls._atraso = 0.0
+            cls._disponivel = cls._atraso <= DB_REPLICA_LAG_MAX
+            motivo = f"atraso {cls._atraso:.1f}s"
+        except Exception as e:
+            cls._atraso, cls._disponivel = None, False
+            motivo = f"erro: {e.__class__.__name__}"
+        cls._verificado_em = time.monotonic()
+
+        if cls._disponivel != anterior:
+            nivel = logging.INFO if cls._disponivel else logging.WARNING
+            logger.log(nivel, f"Réplica de leitura {'ativa' if cls._disponivel else 'desativada'} ({motivo})")
+
+    @classmethod
+    def estado(cls) -> dict:
+        return {'disponivel': bool(cls._disponivel), 'atraso_segundos': cls._atraso}
+
+
+class SessaoRoteada(SessaoFlaskSQLAlchemy):
+    """db.session que envia leituras para o bind 'leitura' quando o roteamento está ativo"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._usar_replica(mapper, clause):
+            return self._db.engines[BIND_LEITURA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _usar_replica(self, mapper, clause) -> bool:
+        if not _modo_leitura.get() or self._flushing or self.info.get('escreveu'):
+            return False
+        if not _e_leitura(clause):
+            return False
+        if mapper is not None and sa_inspect(mapper).local_table.metadata.info.get('bind_key'):
+            return False  # modelos com bind próprio seguem o bind deles
+        return _replica_utilizavel(self._db)
+
+
+_RE_TRAVA = re.compile(r'\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b')
+_RE_ESCRITA = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE)\b')
+
+
+def _e_leitura(clause) -> bool:
+    if clause is None:
+        return False
+    if isinstance(clause, TextClause):
+        texto = clause.text.upper()
+        comando = texto.split(None, 1)[0] if texto.strip() else ''
+        # SELECT ... FOR UPDATE/SHARE trava linhas e WITH pode conter
+        # DELETE/UPDATE ... RETURNING: só no primário
+        if comando == 'WITH' and _RE_ESCRITA.search(texto):
+            return False
+        return comando in ('SELECT', 'WITH') and not _RE_TRAVA.search(texto)
+    if getattr(clause, '_for_update_arg', None) is not None:
+        return False
+    return bool(getattr(clause, 'is_select', False))
+
+
+def _pinado_no_primario() -> bool:
+    return has_request_context() and sessao_flask.get(_CHAVE_PINAGEM, 0) > time.time()
+
+
+def _replica_utilizavel(db) -> bool:
+    engine = db.engines.get(BIND_LEITURA)
+    return engine is not None and not _pinado_no_primario() and MonitorReplica.disponivel(engine)
+
+
+def engine_leitura():
+    """Engine para leituras feitas fora do ORM (pd.read_sql, engine.connect, cursor DBAPI)"""
+    from app import db
+    if _modo_leitura.get() and _replica_utilizavel(db):
+        return db.engines[BIND_LEITURA]
+    return db.engine
+
+
+@contextmanager
+def modo_leitura(ativo: bool = True):
+    """Roteia as leituras do bloco para a réplica (quando configurada e em dia)"""
+    token = _modo_leitura.set(ativo)
+    try:
+        yield
+    finally:
+        _modo_leitura.reset(token)
+
+
+def rota_de_leitura() -> bool:
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    return request.blueprint in BLUEPRINTS_LEITURA or request.endpoint in ENDPOINTS_LEITURA
+
+
+def configurar_bind_leitura(app, normalizar_url) -> bool:
+    """Acrescenta o bind 'leitura' a SQLALCHEMY_BINDS (antes de db.init_app)"""
+    url = app.config.get('DATABASE_READ_URL') or DATABASE_READ_URL
+    if not url:
+        return False
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[BIND_LEITURA] = normalizar_url(url)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    return True
+
+
+def registrar_roteamento(app) -> None:
+    """Ativa o modo leitura nas rotas analíticas"""
+
+    @app.before_request
+    def _ativar_modo_leitura():
+        if BIND_LEITURA in (app.config.get('SQLALCHEMY_BINDS') or {}) and rota_de_leitura():
+            request.environ['db.modo_leitura'] = _modo_leitura.set(True)
+
+    @app.teardown_request
+    def _desativar_modo_leitura(exc=None):
+        token = request.environ.pop('db.modo_leitura', None)
+        if token is not None:
+            try:
+                _modo_leitura.reset(token)
+            except ValueError:  # teardown em outro contexto
+                _modo_leitura.set(False)
+
+
+# ==================== READ-YOUR-WRITES ====================
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_escrita_flush(session, flush_context):
+    session.info['escreveu'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _marcar_escrita_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['escreveu'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _pinar_no_primario(session):
+    # Só com réplica configurada (evita reescrever o cookie de sessão à toa)
+    db = getattr(session, '_db', None)
+    if session.info.pop('escreveu', False) and has_request_context() \
+            and db is not None and BIND_LEITURA in db.engines:
+        sessao_flask[_CHAVE_PINAGEM] = time.time() + DB_LEITURA_PINAGEM_SEGUNDOS
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_marca_escrita(session):
+    session.info.pop('escreveu', None)
+
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sketches Probabilísticos - Dashboard Baker Flask
+app/utils/sketches.py
+
+Estruturas compactas e mescláveis usadas pelos agregados mensais:
+- HyperLogLog: contagem de distintos (exata até 512 valores, depois erro ~1,6% com p=12)
+- TDigest: quantis aproximados de uma distribuição (merging t-digest)
+Ambas serializam para bytes e podem ser mescladas em qualquer ordem.
+"""
+
+import hashlib
+import math
+import struct
+from typing import Iterable, Optional
+
+import numpy as np
+
+# ==================== HYPERLOGLOG ====================
+
+HLL_PRECISAO_PADRAO = 12
+HLL_LIMITE_ESPARSO = 512  # até aqui guarda os hashes (contagem exata, mesmo tamanho dos registradores)
+
+_HLL_ESPARSO, _HLL_DENSO = 0, 1
+
+
+class HyperLogLog:
+    """
+    Contador de distintos com 2^p registradores de 1 byte
+    Conjuntos pequenos ficam em modo esparso (hashes de 64 bits), como no HLL++
+    """
+
+    def __init__(self, p: int = HLL_PRECISAO_PADRAO, registradores: Optional[np.ndarray] = None,
+                 hashes: Optional[set] = None):
+        if not 4 <= p <= 16:
+            raise ValueError("Precisão do HyperLogLog deve estar entre 4 e 16")
+        self.p = p
+        self.m = 1 << p
+        self.registradores = registradores
+        self.hashes = hashes if registradores is None else None
+        if self.registradores is None and self.hashes is None:
+            self.hashes = set()
+
+    @staticmethod
+    def _hash(valor) -> int:
+        """Hash estável entre processos (hash() do Python usa semente aleatória)"""
+        return int.from_bytes(
+            hashlib.blake2b(str(valor).encode('utf-8'), digest_size=8).digest(), 'big'
+        )
+
+    @property
+    def esparso(self) -> bool:
+        return self.hashes is not None
+
+    def _registrar(self, h: int) -> None:
+        bits_restantes = 64 - self.p
+        indice = h >> bits_restantes
+        resto = h & ((1 << bits_restantes) - 1)
+        rho = bits_restantes - resto.bit_length() + 1
+        if rho > self.registradores[indice]:
+            self.registradores[indice] = rho
+
+    def _densificar(self) -> None:
+        if not self.esparso:
+            return
+        hashes, self.hashes = self.hashes, None
+        self.registradores = np.zeros(self.m, dtype=np.uint8)
+        for h in hashes:
+            self._registrar(h)
+
+    def adicionar(self, valor) -> None:
+        if valor is None:
+            return
+        h = self._hash(valor)
+        if self.esparso:
+            self.hashes.add(h)
+            if len(self.hashes) > HLL_LIMITE_ESPARSO:
+                self._densificar()
+        else:
+            self._registrar(h)
+
+    def adicionar_varios(self, valores: Iterable) -> None:
+        for valor in valores:
+            self.adicionar(valor)
+
+    def mesclar(self, outro: 'HyperLogLog') -> 'HyperLogLog':
+        if outro.p != self.p:
+            raise ValueError("Não é possível mesclar HyperLogLog de precisões diferentes")
+        if self.esparso and outro.esparso:
+            self.hashes |= outro.hashes
+            if len(self.hashes) > HLL_LIMITE_ESPARSO:
+                self._densificar()
+            return self
+
+        self._densificar()
+        if outro.esparso:
+            for h in outro.hashes:
+                self._registrar(h)
+        else:
+            np.maximum(self.registradores, outro.registradores, out=self.registradores)
+        return self
+
+    def estimativa(self) -> int:
+        if self.esparso:
+            return len(self.hashes)
+
+        alfa = 0.7213 / (1 + 1.079 / self.m)
+        soma = float(np.sum(np.ldexp(1.0, -self.registradores.astype(np.int64))))
+        estimado = alfa * self.m * self.m / soma
+        zeros = int(np.count_nonzero(self.registradores == 0))
+        # Faixa pequena: contagem linear é mais precisa
+        if estimado <= 2.5 * self.m and zeros:
+            estimado = self.m * math.log(self.m / zeros)
+        return int(round(estimado))
+
+    def serializar(self) -> bytes:
+        if self.esparso:
+            return bytes([self.p, _HLL_ESPARSO]) + np.array(sorted(self.hashes), dtype='<u8').tobytes()
+        return bytes([self.p, _HLL_DENSO]) + self.registradores.tobytes()
+
+    @classmethod
+    def desserializar(cls, dados: bytes) -> 'HyperLogLog':
+        p, modo = dados[0], dados[1]
+        if modo == _HLL_ESPARSO:
+            return cls(p, hashes=set(np.frombuffer(dados, dtype='<u8', offset=2).tolist()))
+        return cls(p, np.frombuffer(dados, dtype=np.uint8, offset=2).copy())
+
+
+# ==================== T-DIGEST ====================
+
+TDIGEST_COMPRESSAO_PADRAO = 100
+_TDIGEST_CABECALHO = struct.Struct('<dddI')  # compressao, minimo, maximo, centroides
+
+
+class TDigest:
+    """Quantis aproximados com centroides (média, peso) de tamanho limitado"""
+
+    def __init__(self, compressao: float = TDIGEST_COMPRESSAO_PADRAO):
+        self.compressao = float(compressao)
+        self.medias = np.empty(0, dtype=np.float64)
+        self.pesos = np.empty(0, dtype=np.float64)
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self._buffer = []
+
+    @property
+    def contagem(self) -> int:
+        self._comprimir()
+        return int(round(self.pesos.sum()))
+
+    def media(self) -> Optional[float]:
+        self._comprimir()
+        total = self.pesos.sum()
+        return float(np.dot(self.medias, self.pesos) / total) if total else None
+
+    def adicionar(self, valor: float) -> None:
+        if valor is None:
+            return
+        self._buffer.append(float(valor))
+        if len(self._buffer) >= 10 * self.compressao:
+            self._comprimir()
+
+    def adicionar_varios(self, valores: Iterable[float]) -> None:
+        for valor in valores:
+            self.adicionar(valor)
+
+    def mesclar(self, outro: 'TDigest') -> 'TDigest':
+        outro._comprimir()
+        if len(outro.pesos):
+            self._comprimir()
+            self._comprimir(np.concatenate([self.medias, outro.medias]),
+                            np.concatenate([self.pesos, outro.pesos]))
+            self.minimo = min(self.minimo, outro.minimo)
+            self.maximo = max(self.maximo, outro.maximo)
+        return self
+
+    def _limite_q(self, q: float) -> float:
+        """Maior quantil acumulado que o centroide iniciado em q pode alcançar (escala k1)"""
+        delta = self.compressao
+        k = delta / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= delta / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / delta) + 1) / 2
+
+    def _comprimir(self, medias: np.ndarray = None, pesos: np.ndarray = None) -> None:
+        if medias is None:
+            if not self._buffer:
+                return
+            buffer = np.asarray(self._buffer, dtype=np.float64)
+            self._buffer = []
+            self.minimo = min(self.minimo, float(buffer.min()))
+            self.maximo = max(self.maximo, float(buffer.max()))
+            medias = np.concatenate([self.medias, buffer])
+            pesos = np.concatenate([self.pesos, np.ones(len(buffer))])
+
+        ordem = np.argsort(medias, kind='mergesort')
+        medias, pesos = medias[ordem], pesos[ordem]
+        total = pesos.sum()
+
+        novas_medias, novos_pesos = [], []
+        media_atual, peso_atual = medias[0], pesos[0]
+        acumulado = 0.0
+        limite = self._limite_q(0.0)
+        for media, peso in zip(medias[1:], pesos[1:]):
+            if (acumulado + peso_atual + peso) / total <= limite:
+                peso_atual += peso
+                media_atual += (media - media_atual) * peso / peso_atual
+            else:
+                novas_medias.append(media_atual)
+                novos_pesos.append(peso_atual)
+                acumulado += peso_atual
+                limite = self._limite_q(acumulado / total)
+                media_atual, peso_atual = media, peso
+        novas_medias.append(media_atual)
+        novos_pesos.append(peso_atual)
+
+        self.medias = np.asarray(novas_medias, dtype=np.float64)
+        self.pesos = np.asarray(novos_pesos, dtype=np.float64)
+
+    def quantil(self, q: float) -> Optional[float]:
+        """Quantil q em [0, 1] por interpolação entre os centros dos centroides"""
+        self._comprimir()
+        if not len(self.pesos):
+            return None
+        if len(self.pesos) == 1:
+            return float(self.medias[0])
+
+        total = self.pesos.sum()
+        alvo = q * total
+        centros = np.cumsum(self.pesos) - self.pesos / 2
+
+        if alvo <= centros[0]:
+            if self.pesos[0] <= 1:
+                return float(self.medias[0])
+            fracao = alvo / centros[0]
+            return float(self.minimo + (self.medias[0] - self.minimo) * fracao)
+        if alvo >= centros[-1]:
+            if self.pesos[-1] <= 1:
+                return float(self.medias[-1])
+            fracao = (alvo - centros[-1]) / (total - centros[-1])
+            return float(self.medias[-1] + (self.maximo - self.medias[-1]) * fracao)
+
+        i = int(np.searchsorted(centros, alvo, side='right')) - 1
+        fracao = (alvo - centros[i]) / (centros[i + 1] - centros[i])
+        return float(self.medias[i] + (self.medias[i + 1] - self.medias[i]) * fracao)
+
+    def serializar(self) -> bytes:
+        self._comprimir()
+        return _TDIGEST_CABECALHO.pack(self.compressao, self.minimo, self.maximo, len(self.medias)) + \
+            self.medias.tobytes() + self.pesos.tobytes()
+
+    @classmethod
+    def desserializar(cls, dados: bytes) -> 'TDigest':
+        compressao, minimo, maximo, n = _TDIGEST_CABECALHO.unpack_from(dados)
+        digest = cls(compressao)
+        inicio = _TDIGEST_CABECALHO.size
+        digest.medias = np.frombuffer(dados, dtype=np.float64, count=n, offset=inicio).copy()
+        digest.pesos = np.frombuffer(dados, dtype=np.float64, count=n, offset=inicio + 8 * n).copy()
+        digest.minimo, digest.maximo = minimo, maximo
+        return digest
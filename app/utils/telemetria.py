@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telemetria HTTP/DB - Dashboard Baker Flask
+app/utils/telemetria.py
+
+Métricas coletadas por worker e agregadas entre os workers do gunicorn:
+- Latência por endpoint (histograma), tamanho de resposta, queries por request
+- Quantidade e tempo de queries SQL por endpoint (eventos do Engine)
+- Memória residente (RSS) de cada worker
+- Impressão digital das queries por requisição: padrões N+1 (mesma query
+  repetida >= N1_LIMIAR vezes) e orçamentos de queries por endpoint vão
+  para o log; em modo debug também para headers da resposta
+Cada worker acumula em memória e grava um snapshot JSON por pid em
+METRICS_DIR a cada METRICS_FLUSH_SEGUNDOS; /metrics soma os snapshots e
+responde no formato texto do Prometheus. Snapshots de workers encerrados vão,
+depois da retenção, para METRICS_DIR/acumulado.json, somado a cada /metrics.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: exclusão só entre threads do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "dashboard_baker_metrics"))
+METRICS_FLUSH_SEGUNDOS = float(os.getenv("METRICS_FLUSH_SEGUNDOS", "5"))
+METRICS_HABILITADO = os.getenv("METRICS_DESABILITADO", "").lower() not in ("1", "true", "sim")
+# Snapshots de workers encerrados são somados a METRICS_ACUMULADO e removidos após este tempo
+METRICS_RETENCAO_SEGUNDOS = int(os.getenv("METRICS_RETENCAO_SEGUNDOS", "3600"))
+METRICS_ACUMULADO = os.path.join(METRICS_DIR, "acumulado.json")
+
+# Mesma query (impressão digital) repetida a partir desta quantidade = suspeita de N+1
+N1_LIMIAR = int(os.getenv("N1_LIMIAR", "10"))
+
+# Máximo de queries esperado por endpoint (acima disso: aviso no log)
+ORCAMENTO_QUERIES = {
+    'dashboard.index': 4,
+    'dashboard.api_metricas': 6,
+    'dashboard.api_graficos': 6,
+    'ctes.api_listar': 4,
+    'ctes.api_facetas': 3,
+    'alertas.api_alertas_ativos': 6,
+    'alertas.api_resumo_alertas': 6,
+    'permissions.api_user_permissions': 4,
+}
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+BUCKETS_QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# nome -> (tipo, descrição, rótulos, buckets)
+METRICAS = {
+    'dashboard_http_request_duration_seconds': (
+        'histogram', 'Latência das requisições HTTP por endpoint',
+        ('endpoint', 'method', 'status'), BUCKETS_LATENCIA),
+    'dashboard_http_response_size_bytes': (
+        'histogram', 'Tamanho do corpo das respostas HTTP por endpoint',
+        ('endpoint',), BUCKETS_TAMANHO),
+    'dashboard_db_queries_per_request': (
+        'histogram', 'Queries SQL executadas por requisição',
+        ('endpoint',), BUCKETS_QUERIES),
+    'dashboard_db_queries_total': (
+        'counter', 'Total de queries SQL executadas por endpoint',
+        ('endpoint',), None),
+    'dashboard_db_query_duration_seconds_total': (
+        'counter', 'Tempo total gasto em queries SQL por endpoint',
+        ('endpoint',), None),
+    'dashboard_db_n1_suspeitas_total': (
+        'counter', 'Requisições com query repetida acima de N1_LIMIAR',
+        ('endpoint',), None),
+    'dashboard_worker_rss_bytes': (
+        'gauge', 'Memória residente de cada worker ativo',
+        ('pid',), None),
+}
+
+SEM_ROTA = '<sem_rota>'
+
+
+# ==================== REGISTRO EM MEMÓRIA (POR WORKER) ====================
+
+class RegistroMetricas:
+    """Acumuladores do worker; histogramas guardam contagens não cumulativas por bucket"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+        self.histogramas: Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+        self.contadores: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        self._gravado_em = 0.0
+
+    def observar(self, nome: str, rotulos: Tuple[str, ...], valor: float) -> None:
+        buckets = METRICAS[nome][3]
+        with self._lock:
+            serie = self.histogramas.get((nome, rotulos))
+            if serie is None:
+                # [bucket_0..bucket_n, +Inf, soma, contagem]
+                serie = self.histogramas[(nome, rotulos)] = [0] * (len(buckets) + 3)
+            serie[_indice_bucket(buckets, valor)] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def incrementar(self, nome: str, rotulos: Tuple[str, ...], valor: float = 1) -> None:
+        with self._lock:
+            self.contadores[(nome, rotulos)] = self.contadores.get((nome, rotulos), 0) + valor
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'atualizado_em': time.time(),
+                'histogramas': [[n, list(r), list(v)] for (n, r), v in self.histogramas.items()],
+                'contadores': [[n, list(r), v] for (n, r), v in self.contadores.items()],
+                'rss_bytes': rss_atual(),
+            }
+
+    def gravar(self, forcar: bool = False) -> None:
+        """Grava o snapshot do worker (no máximo a cada METRICS_FLUSH_SEGUNDOS)"""
+        agora = time.monotonic()
+        if not forcar and agora - self._gravado_em < METRICS_FLUSH_SEGUNDOS:
+            return
+        self._gravado_em = agora
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            caminho = os.path.join(METRICS_DIR, f"metricas_{self.pid}.json")
+            temporario = f"{caminho}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump(self.snapshot(), arquivo)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            logger.warning(f"Telemetria: erro ao gravar snapshot: {e}")
+
+
+_registro: Optional[RegistroMetricas] = None
+_registro_lock = threading.Lock()
+_acumulado_lock = threading.Lock()
+
+
+def registro() -> RegistroMetricas:
+    """Registro do processo atual (recriado após fork: cada worker conta só o seu)"""
+    global _registro
+    if _registro is None or _registro.pid != os.getpid():
+        with _registro_lock:
+            if _registro is None or _registro.pid != os.getpid():
+                _registro = RegistroMetricas()
+    return _registro
+
+
+def _indice_bucket(buckets: Iterable[float], valor: float) -> int:
+    for i, limite in enumerate(buckets):
+        if valor <= limite:
+            return i
+    return len(buckets)
+
+
+def rss_atual() -> Optional[int]:
+    """Memória residente do processo em bytes"""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # pico, sem /proc
+        except Exception:
+            return None
+
+
+# ==================== CONTAGEM DE QUERIES / N+1 ====================
+
+_RE_PARAMETRO = re.compile(r"%\(\w+\)s|:\w+|\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+
+
+def impressao_digital(statement: str) -> str:
+    """SQL normalizado: parâmetros/literais viram ?, listas IN viram (?+)"""
+    sql = _RE_ESPACOS.sub(' ', statement).strip()
+    sql = _RE_PARAMETRO.sub('?', sql)
+    return _RE_LISTA.sub('(?+)', sql)
+
+
+class ContadorQueries:
+    """Queries executadas em um escopo (requisição ou bloco de teste)"""
+
+    def __init__(self):
+        self.total = 0
+        self.tempo = 0.0
+        self.por_impressao: Counter = Counter()
+
+    def registrar(self, statement: str, duracao: float) -> None:
+        self.total += 1
+        self.tempo += duracao
+        self.por_impressao[impressao_digital(statement)] += 1
+
+    def suspeitas_n1(self, limiar: int = N1_LIMIAR) -> List[Tuple[str, int]]:
+        """(impressão digital, repetições) das queries repetidas >= limiar vezes"""
+        return [(sql, n) for sql, n in self.por_impressao.most_common() if n >= limiar]
+
+    def resumo(self, limite: int = 5) -> str:
+        return "; ".join(f"{n}x {sql[:160]}" for sql, n in self.por_impressao.most_common(limite))
+
+
+_contadores_ativos = threading.local()
+
+
+def _contadores_teste() -> List[ContadorQueries]:
+    pilha = getattr(_contadores_ativos, 'pilha', None)
+    if pilha is None:
+        pilha = _contadores_ativos.pilha = []
+    return pilha
+
+
+@contextmanager
+def contar_queries():
+    """Conta as queries executadas no bloco (nesta thread), dentro ou fora de requisição"""
+    contador = ContadorQueries()
+    pilha = _contadores_teste()
+    pilha.append(contador)
+    try:
+        yield contador
+    finally:
+        pilha.remove(contador)
+
+
+@contextmanager
+def orcamento_queries(maximo: Optional[int] = None, endpoint: str = None, limiar_n1: Optional[int] = N1_LIMIAR):
+    """
+    Helper de teste: falha (AssertionError) se o bloco passar do orçamento
+    maximo explícito ou ORCAMENTO_QUERIES[endpoint], ou tiver padrão N+1
+
+        with orcamento_queries(endpoint='ctes.api_listar'):
+            client.get('/ctes/api/listar')
+    """
+    if maximo is None:
+        if endpoint not in ORCAMENTO_QUERIES:
+            raise ValueError(f"Endpoint sem orçamento de queries: {endpoint}")
+        maximo = ORCAMENTO_QUERIES[endpoint]
+
+    with contar_queries() as contador:
+        yield contador
+
+    if contador.total > maximo:
+        raise AssertionError(
+            f"{endpoint or 'bloco'}: {contador.total} queries (orçamento {maximo}). {contador.resumo()}"
+        )
+    suspeitas = contador.suspeitas_n1(limiar_n1) if limiar_n1 else []
+    if suspeitas:
+        raise AssertionError(
+            f"{endpoint or 'bloco'}: padrão N+1 - " +
+            "; ".join(f"{n}x {sql[:160]}" for sql, n in suspeitas)
+        )
+
+
+# ==================== COLETA (HOOKS FLASK / SQLALCHEMY) ====================
+
+def registrar_telemetria(app) -> None:
+    """Registra os hooks de coleta na aplicação"""
+    if not METRICS_HABILITADO:
+        return
+
+    @app.before_request
+    def _telemetria_inicio():
+        g.telemetria_inicio = time.perf_counter()
+        g.telemetria_db = ContadorQueries()
+
+    @app.after_request
+    def _telemetria_fim(response):
+        inicio = g.pop('telemetria_inicio', None)
+        if inicio is None:
+            return response
+        try:
+            duracao = time.perf_counter() - inicio
+            endpoint = request.endpoint or SEM_ROTA
+            contador = g.pop('telemetria_db', None) or ContadorQueries()
+
+            reg = registro()
+            reg.observar('dashboard_http_request_duration_seconds',
+                         (endpoint, request.method, str(response.status_code)), duracao)
+            tamanho = response.calculate_content_length()
+            if tamanho is not None:
+                reg.observar('dashboard_http_response_size_bytes', (endpoint,), tamanho)
+            reg.observar('dashboard_db_queries_per_request', (endpoint,), contador.total)
+            if contador.total:
+                reg.incrementar('dashboard_db_queries_total', (endpoint,), contador.total)
+                reg.incrementar('dashboard_db_query_duration_seconds_total', (endpoint,), contador.tempo)
+
+            suspeitas = contador.suspeitas_n1()
+            if suspeitas:
+                reg.incrementar('dashboard_db_n1_suspeitas_total', (endpoint,))
+                logger.warning(
+                    f"N+1 em {request.method} {request.path} ({endpoint}): {contador.total} queries; " +
+                    "; ".join(f"{n}x {sql[:200]}" for sql, n in suspeitas)
+                )
+            orcamento = ORCAMENTO_QUERIES.get(endpoint)
+            if orcamento is not None and contador.total > orcamento:
+                logger.warning(f"Orçamento de queries excedido em {endpoint}: "
+                               f"{contador.total} > {orcamento}. {contador.resumo(3)}")
+
+            if current_app.debug:
+                response.headers['X-Query-Count'] = str(contador.total)
+                response.headers['X-Query-Time-Ms'] = f"{contador.tempo * 1000:.1f}"
+                if suspeitas:
+                    response.headers['X-Query-N1'] = "; ".join(
+                        f"{n}x {sql[:120]}" for sql, n in suspeitas[:3])
+            reg.gravar()
+        except Exception as e:
+            logger.warning(f"Telemetria: erro ao registrar requisição: {e}")
+        return response
+
+
+def _contadores_do_escopo() -> List[ContadorQueries]:
+    contadores = list(_contadores_teste())
+    if has_request_context():
+        contador = g.get('telemetria_db')
+        if contador is not None:
+            contadores.append(contador)
+    return contadores
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _telemetria_antes_query(conn, cursor, statement, parameters, context, executemany):
+    if _contadores_do_escopo():
+        conn.info.setdefault('telemetria_inicio_query', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _telemetria_depois_query(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('telemetria_inicio_query')
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    for contador in _contadores_do_escopo():
+        contador.registrar(statement, duracao)
+
+
+# ==================== AGREGAÇÃO / EXPOSIÇÃO ====================
+
+def _pid_ativo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+@contextmanager
+def _trava_acumulado():
+    """Exclusão mútua entre workers ao incorporar snapshots ao acumulado"""
+    with _acumulado_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(os.path.join(METRICS_DIR, 'acumulado.lock'), 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            yield  # fechar o arquivo solta o flock
+
+
+def _ler_acumulado() -> Dict:
+    try:
+        with open(METRICS_ACUMULADO, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Telemetria: acumulado ilegível, recomeçando: {e}")
+    return {'histogramas': [], 'contadores': [], 'incorporados': []}
+
+
+def _gravar_acumulado(acumulado: Dict) -> None:
+    temporario = f"{METRICS_ACUMULADO}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(acumulado, arquivo)
+    os.replace(temporario, METRICS_ACUMULADO)
+
+
+def _somar(histogramas: Dict, contadores: Dict, snapshot: Dict) -> None:
+    for nome, rotulos, valores in snapshot['histogramas']:
+        chave = (nome, tuple(rotulos))
+        atual = histogramas.get(chave)
+        if atual is None or len(atual) != len(valores):
+            histogramas[chave] = list(valores)
+        else:
+            histogramas[chave] = [a + b for a, b in zip(atual, valores)]
+    for nome, rotulos, valor in snapshot['contadores']:
+        chave = (nome, tuple(rotulos))
+        contadores[chave] = contadores.get(chave, 0) + valor
+
+
+def agregar() -> Dict:
+    """
+    Soma os snapshots de todos os workers (grava antes o do worker atual)
+    Snapshots de workers encerrados há mais de METRICS_RETENCAO_SEGUNDOS são
+    somados ao acumulado e removidos: contadores e histogramas não zeram
+    """
+    registro().gravar(forcar=True)
+
+    gauges: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+
+    with _trava_acumulado():
+        acumulado = _ler_acumulado()
+        hist_acumulados: Dict[Tuple[str, Tuple[str, ...]], List[float]] = {}
+        cont_acumulados: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        _somar(hist_acumulados, cont_acumulados, acumulado)
+        # pid:atualizado_em dos snapshots já somados ao acumulado (remoção pode ter falhado)
+        incorporados = set(acumulado.get('incorporados', []))
+
+        try:
+            arquivos = [a for a in os.listdir(METRICS_DIR) if a.startswith('metricas_') and a.endswith('.json')]
+        except FileNotFoundError:
+            arquivos = []
+
+        agora = time.time()
+        ativos = []
+        a_remover = []
+        existentes = set()
+        for nome_arquivo in arquivos:
+            caminho = os.path.join(METRICS_DIR, nome_arquivo)
+            try:
+                with open(caminho, encoding='utf-8') as arquivo:
+                    snapshot = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+
+            marca = f"{snapshot['pid']}:{snapshot['atualizado_em']}"
+            existentes.add(marca)
+            if marca in incorporados:
+                a_remover.append(caminho)
+                continue
+
+            ativo = _pid_ativo(snapshot['pid'])
+            if not ativo and agora - snapshot['atualizado_em'] > METRICS_RETENCAO_SEGUNDOS:
+                _somar(hist_acumulados, cont_acumulados, snapshot)
+                incorporados.add(marca)
+                a_remover.append(caminho)
+                continue
+
+            # Contadores e histogramas de workers encerrados continuam somando (monotônicos)
+            ativos.append(snapshot)
+            if ativo and snapshot.get('rss_bytes') is not None:
+                gauges[('dashboard_worker_rss_bytes', (str(snapshot['pid']),))] = snapshot['rss_bytes']
+
+        # Acumulado gravado antes de remover: uma falha no meio não perde nem duplica
+        incorporados &= existentes
+        gravado = True
+        if incorporados != set(acumulado.get('incorporados', [])):
+            try:
+                _gravar_acumulado({
+                    'histogramas': [[n, list(r), v] for (n, r), v in hist_acumulados.items()],
+                    'contadores': [[n, list(r), v] for (n, r), v in cont_acumulados.items()],
+                    'incorporados': sorted(incorporados),
+                })
+            except Exception as e:
+                gravado = False
+                logger.warning(f"Telemetria: erro ao gravar acumulado: {e}")
+        for caminho in a_remover if gravado else []:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    histogramas = dict(hist_acumulados)
+    contadores = dict(cont_acumulados)
+    for snapshot in ativos:
+        _somar(histogramas, contadores, snapshot)
+
+    return {'histogramas': histogramas, 'contadores': contadores, 'gauges': gauges}
+
+
+def formato_prometheus(agregado: Dict = None) -> str:
+    """Texto no formato de exposição do Prometheus (0.0.4)"""
+    agregado = agregado if agregado is not None else agregar()
+    linhas = []
+
+    for nome, (tipo, descricao, nomes_rotulos, buckets) in METRICAS.items():
+        linhas.append(f"# HELP {nome} {descricao}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+
+        if tipo == 'histogram':
+            series = sorted((r, v) for (n, r), v in agregado['histogramas'].items() if n == nome)
+            for rotulos, valores in series:
+                base = _rotulos(nomes_rotulos, rotulos)
+                acumulado = 0
+                for limite, contagem in zip(list(buckets) + ['+Inf'], valores[:-2]):
+                    acumulado += contagem
+                    le = limite if limite == '+Inf' else _numero(limite)
+                    linhas.append(f'{nome}_bucket{{{base}{"," if base else ""}le="{le}"}} {_numero(acumulado)}')
+                linhas.append(f"{nome}_sum{{{base}}} {_numero(valores[-2])}")
+                linhas.append(f"{nome}_count{{{base}}} {_numero(valores[-1])}")
+        else:
+            origem = agregado['contadores'] if tipo == 'counter' else agregado['gauges']
+            for rotulos, valor in sorted((r, v) for (n, r), v in origem.items() if n == nome):
+                linhas.append(f"{nome}{{{_rotulos(nomes_rotulos, rotulos)}}} {_numero(valor)}")
+
+    return "\n".join(linhas) + "\n"
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Tuple[str, ...]) -> str:
+    return ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores))
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação de Índices por EXPLAIN - Dashboard Baker Flask
+app/utils/verificacao_indices.py
+
+Monta as consultas de alertas, dashboard, análise financeira e baixas pelos
+mesmos métodos que as executam e confere no plano (EXPLAIN (FORMAT JSON) no
+PostgreSQL, EXPLAIN QUERY PLAN no SQLite) se cada uma usa o índice criado
+para ela.
+Uso: flask verificar-indices
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConsultaVerificada:
+    origem: str
+    indice: str
+    construir: Callable[[datetime], object]
+
+
+def consultas_verificadas() -> List[ConsultaVerificada]:
+    """Consultas montadas pelos próprios serviços e rotas (sem cópia do SQL)"""
+    from app.routes import analise_financeira, baixas, dashboard
+    from app.services.alertas_service import AlertasService
+    from app.services.analise_financeira_service import AnaliseFinanceiraService
+    from app.services.carregador_colunar_service import CarregadorColunar
+
+    return [
+        ConsultaVerificada(
+            'AlertasService.consulta_primeiro_envio_pendente',
+            'ix_dashboard_baker_sem_primeiro_envio',
+            AlertasService.consulta_primeiro_envio_pendente),
+        ConsultaVerificada(
+            'AlertasService.consulta_envio_final_pendente',
+            'ix_dashboard_baker_sem_envio_final',
+            AlertasService.consulta_envio_final_pendente),
+        ConsultaVerificada(
+            'AlertasService.consulta_faturas_vencidas',
+            'ix_dashboard_baker_em_aberto',
+            AlertasService.consulta_faturas_vencidas),
+        ConsultaVerificada(
+            'AlertasService.consulta_risco_financeiro',
+            'ix_dashboard_baker_emissao_destinatario',
+            AlertasService.consulta_risco_financeiro),
+        ConsultaVerificada(
+            'dashboard.consulta_primeiro_envio_pendente',
+            'ix_dashboard_baker_sem_primeiro_envio',
+            lambda agora: dashboard.consulta_primeiro_envio_pendente(agora.date())),
+        ConsultaVerificada(
+            'dashboard.consulta_envio_final_pendente',
+            'ix_dashboard_baker_sem_envio_final',
+            lambda agora: dashboard.consulta_envio_final_pendente()),
+        ConsultaVerificada(
+            'dashboard.consulta_faturas_vencidas',
+            'ix_dashboard_baker_envio_final_em_aberto',
+            lambda agora: dashboard.consulta_faturas_vencidas(agora.date())),
+        ConsultaVerificada(
+            'dashboard.consulta_ctes_sem_faturas',
+            'ix_dashboard_baker_atesto_sem_fatura',
+            lambda agora: dashboard.consulta_ctes_sem_faturas(agora.date())),
+        ConsultaVerificada(
+            'CarregadorColunar.montar_consulta (filtro de período)',
+            'ix_dashboard_baker_emissao_destinatario',
+            lambda agora: CarregadorColunar.montar_consulta(
+                ['data_emissao', 'destinatario_nome'],
+                data_inicio=agora.date() - timedelta(days=30), data_fim=agora.date())),
+        ConsultaVerificada(
+            'analise_financeira.consulta_clientes',
+            'ix_dashboard_baker_emissao_destinatario',
+            lambda agora: analise_financeira.consulta_clientes(agora.date())),
+        ConsultaVerificada(
+            'AnaliseFinanceiraService.consulta_faturamento_por_inclusao',
+            'ix_dashboard_baker_data_inclusao_fatura',
+            lambda agora: AnaliseFinanceiraService.consulta_faturamento_por_inclusao(
+                agora.date() - timedelta(days=30))),
+        ConsultaVerificada(
+            'baixas.consulta_historico',
+            'ix_dashboard_baker_data_baixa',
+            lambda agora: baixas.consulta_historico(agora.date())),
+    ]
+
+
+# ==================== EXPLAIN ====================
+
+def _indices_postgres(plano: Dict) -> List[str]:
+    encontrados = []
+    pilha = [plano['Plan']]
+    while pilha:
+        no = pilha.pop()
+        if 'Index Name' in no:
+            encontrados.append(no['Index Name'])
+        pilha.extend(no.get('Plans', []))
+    return encontrados
+
+
+def _explicar(conexao, sql: str) -> Dict:
+    if conexao.dialect.name == 'postgresql':
+        bruto = conexao.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        plano = (json.loads(bruto) if isinstance(bruto, str) else bruto)[0]
+        return {'indices': _indices_postgres(plano),
+                'plano': f"{plano['Plan']['Node Type']} (custo {plano['Plan']['Total Cost']})"}
+
+    linhas = conexao.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    detalhes = [linha[-1] for linha in linhas]
+    indices = [parte.split(' INDEX ', 1)[1].split(' ')[0]
+               for parte in detalhes if ' INDEX ' in parte]
+    return {'indices': indices, 'plano': '; '.join(detalhes)}
+
+
+def verificar_indices(engine, sem_seqscan: bool = False, agora: Optional[datetime] = None) -> List[Dict]:
+    """
+    EXPLAIN de cada consulta; ok = o índice esperado aparece no plano.
+    Por padrão o plano é o natural do planejador. sem_seqscan: no PostgreSQL
+    desliga seq scan na transação, para que tabelas pequenas (desenvolvimento)
+    não escondam um índice inutilizável.
+    Parâmetros vão como literais, como o psycopg2 os envia ao servidor.
+    """
+    agora = agora or datetime.now()
+    resultados = []
+    with engine.connect() as conexao:
+        postgres = conexao.dialect.name == 'postgresql'
+        for consulta in consultas_verificadas():
+            sql = str(consulta.construir(agora).compile(
+                dialect=conexao.dialect, compile_kwargs={'literal_binds': True}))
+            with conexao.begin():
+                if postgres and sem_seqscan:
+                    conexao.execute(text("SET LOCAL enable_seqscan = off"))
+                try:
+                    explicado = _explicar(conexao, sql)
+                except Exception as e:
+                    logger.error(f"EXPLAIN falhou para {consulta.origem}: {e}")
+                    explicado = {'indices': [], 'plano': f"erro: {e.__class__.__name__}"}
+            resultados.append({
+                'origem': consulta.origem,
+                'indice_esperado': consulta.indice,
+                'indices_usados': explicado['indices'],
+                'plano': explicado['plano'],
+                'ok': consulta.indice in explicado['indices'],
+            })
+    return resultados
@@ -0,0 +1,61 @@
+"""Índices compostos e parciais de dashboard_baker
+
+As tabelas já existem (init-db / db.create_all); esta revisão só acrescenta
+os índices usados por alertas, filtros de período e análise financeira.
+PostgreSQL: CREATE INDEX CONCURRENTLY, fora de transação (não trava escritas).
+
+Revision ID: 3f9a1c7e2b10
+Revises:
+Create Date: 2026-10-19 09:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7e2b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+TABELA = 'dashboard_baker'
+
+# (nome, colunas, predicado do índice parcial, colunas INCLUDE no PostgreSQL)
+INDICES = [
+    # Filtros de período + agrupamento por cliente (top 3 clientes, lista de clientes)
+    ('ix_dashboard_baker_emissao_destinatario', ['data_emissao', 'destinatario_nome'], None, ['valor_total']),
+    # 1º envio pendente (alertas e dashboard)
+    ('ix_dashboard_baker_sem_primeiro_envio', ['data_emissao'], 'primeiro_envio IS NULL', None),
+    # Envio final pendente
+    ('ix_dashboard_baker_sem_envio_final', ['data_emissao'], 'envio_final IS NULL', None),
+    # Faturas em aberto por data de emissão
+    ('ix_dashboard_baker_em_aberto', ['data_emissao'], 'data_baixa IS NULL', None),
+    # Faturas vencidas (envio final há 90+ dias sem baixa)
+    ('ix_dashboard_baker_envio_final_em_aberto', ['envio_final'], 'data_baixa IS NULL', None),
+    # CTEs atestados sem número de fatura
+    ('ix_dashboard_baker_atesto_sem_fatura', ['data_atesto'], "numero_fatura IS NULL OR numero_fatura = ''", None),
+    # Histórico de baixas (só baixados: não disputa "data_baixa IS NULL" com os parciais acima)
+    ('ix_dashboard_baker_data_baixa', ['data_baixa'], 'data_baixa IS NOT NULL', None),
+    # Faturamento por data de inclusão da fatura
+    ('ix_dashboard_baker_data_inclusao_fatura', ['data_inclusao_fatura'], None, None),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nome, colunas, predicado, incluir in INDICES:
+            opcoes = {}
+            if predicado:
+                opcoes['postgresql_where'] = sa.text(predicado)
+                opcoes['sqlite_where'] = sa.text(predicado)
+            if incluir:
+                opcoes['postgresql_include'] = incluir
+            op.create_index(nome, TABELA, colunas, if_not_exists=True,
+                            postgresql_concurrently=True, **opcoes)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, _, _, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=TABELA, if_exists=True, postgresql_concurrently=True)
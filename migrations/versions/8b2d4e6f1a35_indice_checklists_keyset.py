@@ -0,0 +1,27 @@
+"""Índice (dt_inicio, id) de checklists para a listagem por keyset
+
+Revision ID: 8b2d4e6f1a35
+Revises: 3f9a1c7e2b10
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a35'
+down_revision = '3f9a1c7e2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_checklists_dt_inicio_id', 'checklists', ['dt_inicio', 'id'],
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_checklists_dt_inicio_id', table_name='checklists',
+                      if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,81 @@
+"""Arquivo de CTEs baixados (particionado por ano) e view histórica
+
+dashboard_baker_arquivo: mesmas colunas de dashboard_baker + arquivado_em;
+no PostgreSQL, PARTITION BY RANGE (data_emissao), partições anuais criadas
+por "flask arquivar-ctes". dashboard_baker_historico: ativa UNION ALL arquivo.
+
+Revision ID: c5e7a9b1d3f2
+Revises: 8b2d4e6f1a35
+Create Date: 2026-10-19 14:05:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9b1d3f2'
+down_revision = '8b2d4e6f1a35'
+branch_labels = None
+depends_on = None
+
+COLUNAS = (
+    'id, numero_cte, destinatario_nome, veiculo_placa, valor_total, data_emissao, data_baixa, '
+    'numero_fatura, data_inclusao_fatura, data_envio_processo, primeiro_envio, data_rq_tmc, '
+    'data_atesto, envio_final, observacao, origem_dados, created_at, updated_at'
+)
+
+
+def upgrade():
+    # Bancos criados por db.create_all() já têm a tabela
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table('dashboard_baker_arquivo'):
+        _criar_indices_e_view()
+        return
+
+    op.create_table(
+        'dashboard_baker_arquivo',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('numero_cte', sa.Integer(), nullable=False),
+        sa.Column('destinatario_nome', sa.String(length=255), nullable=True),
+        sa.Column('veiculo_placa', sa.String(length=20), nullable=True),
+        sa.Column('valor_total', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('data_emissao', sa.Date(), nullable=False),
+        sa.Column('data_baixa', sa.Date(), nullable=True),
+        sa.Column('numero_fatura', sa.String(length=100), nullable=True),
+        sa.Column('data_inclusao_fatura', sa.Date(), nullable=True),
+        sa.Column('data_envio_processo', sa.Date(), nullable=True),
+        sa.Column('primeiro_envio', sa.Date(), nullable=True),
+        sa.Column('data_rq_tmc', sa.Date(), nullable=True),
+        sa.Column('data_atesto', sa.Date(), nullable=True),
+        sa.Column('envio_final', sa.Date(), nullable=True),
+        sa.Column('observacao', sa.Text(), nullable=True),
+        sa.Column('origem_dados', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('arquivado_em', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'data_emissao'),
+        postgresql_partition_by='RANGE (data_emissao)',
+    )
+    _criar_indices_e_view()
+
+
+def _criar_indices_e_view():
+    op.create_index('ix_dashboard_baker_arquivo_numero_cte', 'dashboard_baker_arquivo',
+                    ['numero_cte'], if_not_exists=True)
+    op.create_index('ix_dashboard_baker_arquivo_emissao_destinatario', 'dashboard_baker_arquivo',
+                    ['data_emissao', 'destinatario_nome'], if_not_exists=True)
+
+    criar = 'CREATE OR REPLACE VIEW' if op.get_context().dialect.name == 'postgresql' \
+        else 'CREATE VIEW IF NOT EXISTS'
+    op.execute(
+        f"{criar} dashboard_baker_historico AS "
+        f"SELECT {COLUNAS} FROM dashboard_baker "
+        f"UNION ALL SELECT {COLUNAS} FROM dashboard_baker_arquivo"
+    )
+
+
+def downgrade():
+    # Devolve os CTEs arquivados para a tabela ativa antes de remover o arquivo
+    op.execute("DROP VIEW IF EXISTS dashboard_baker_historico")
+    op.execute(f"INSERT INTO dashboard_baker ({COLUNAS}) SELECT {COLUNAS} FROM dashboard_baker_arquivo")
+    op.drop_table('dashboard_baker_arquivo')
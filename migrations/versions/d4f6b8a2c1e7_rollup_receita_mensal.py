@@ -0,0 +1,62 @@
+"""Rollup receita_mensal_cliente e marcador estado_derivado
+
+receita_mensal_cliente: receita agregada por (mês, cliente, base de data).
+estado_derivado: uma linha por tabela derivada populada; a tabela nasce
+vazia e sem marcador, e a primeira leitura (ou "flask rebuild-receita-mensal")
+a popula.
+
+Revision ID: d4f6b8a2c1e7
+Revises: c5e7a9b1d3f2
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8a2c1e7'
+down_revision = 'c5e7a9b1d3f2'
+branch_labels = None
+depends_on = None
+
+MEDIDAS = (
+    'quantidade', 'valor_total',
+    'quantidade_baixada', 'valor_baixado',
+    'quantidade_faturada', 'valor_faturado',
+    'quantidade_com_fatura', 'valor_com_fatura',
+)
+
+
+def _existe(tabela: str) -> bool:
+    # Bancos criados por db.create_all() já têm as tabelas
+    return not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table(tabela)
+
+
+def upgrade():
+    if not _existe('estado_derivado'):
+        op.create_table(
+            'estado_derivado',
+            sa.Column('nome', sa.String(length=60), nullable=False),
+            sa.Column('versao', sa.Integer(), nullable=False),
+            sa.Column('populado_em', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('nome'),
+        )
+
+    if not _existe('receita_mensal_cliente'):
+        op.create_table(
+            'receita_mensal_cliente',
+            sa.Column('mes', sa.Date(), nullable=False),
+            sa.Column('cliente', sa.String(length=255), nullable=False),
+            sa.Column('base', sa.String(length=20), nullable=False),
+            *[sa.Column(m, sa.Integer() if m.startswith('quantidade') else sa.Numeric(precision=15, scale=2),
+                        nullable=False)
+              for m in MEDIDAS],
+            sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('mes', 'cliente', 'base'),
+        )
+
+
+def downgrade():
+    op.drop_table('receita_mensal_cliente')
+    op.drop_table('estado_derivado')
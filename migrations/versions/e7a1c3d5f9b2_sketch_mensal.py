@@ -0,0 +1,41 @@
+"""Sketches mensais (sketch_mensal)
+
+Um sketch serializado (HyperLogLog / t-digest) por (mês de emissão, métrica).
+A tabela nasce vazia e sem marcador em estado_derivado; "flask manter-sketches"
+(ou "flask rebuild-sketches") a popula.
+
+Revision ID: e7a1c3d5f9b2
+Revises: d4f6b8a2c1e7
+Create Date: 2026-10-19 16:40:00.000000
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a1c3d5f9b2'
+down_revision = 'd4f6b8a2c1e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bancos criados por db.create_all() já têm a tabela
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table('sketch_mensal'):
+        return
+
+    op.create_table(
+        'sketch_mensal',
+        sa.Column('mes', sa.Date(), nullable=False),
+        sa.Column('metrica', sa.String(length=60), nullable=False),
+        sa.Column('dados', sa.LargeBinary(), nullable=True),
+        sa.Column('sujo', sa.Boolean(), nullable=False),
+        sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('mes', 'metrica'),
+    )
+
+
+def downgrade():
+    op.drop_table('sketch_mensal')
+    op.execute("DELETE FROM estado_derivado WHERE nome = 'sketch_mensal'")
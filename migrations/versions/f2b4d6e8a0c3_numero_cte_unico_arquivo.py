@@ -0,0 +1,59 @@
+"""numero_cte único entre dashboard_baker e dashboard_baker_arquivo
+
+Trigger em dashboard_baker (INSERT e troca de numero_cte) que rejeita um
+número já presente no arquivo. O índice único da tabela ativa não enxerga
+o arquivo, e o arquivo particionado não aceita índice único só em numero_cte.
+
+Revision ID: f2b4d6e8a0c3
+Revises: e7a1c3d5f9b2
+Create Date: 2026-10-19 17:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b4d6e8a0c3'
+down_revision = 'e7a1c3d5f9b2'
+branch_labels = None
+depends_on = None
+
+TRIGGER = 'dashboard_baker_numero_unico'
+
+
+def upgrade():
+    dialeto = op.get_context().dialect.name
+    if dialeto == 'postgresql':
+        op.execute(
+            f"CREATE OR REPLACE FUNCTION {TRIGGER}() RETURNS trigger AS $$ "
+            f"BEGIN "
+            f"IF EXISTS (SELECT 1 FROM dashboard_baker_arquivo WHERE numero_cte = NEW.numero_cte) THEN "
+            f"RAISE EXCEPTION USING ERRCODE = 'unique_violation', "
+            f"MESSAGE = 'CTE ' || NEW.numero_cte || ' já existe no arquivo'; "
+            f"END IF; "
+            f"RETURN NEW; "
+            f"END $$ LANGUAGE plpgsql"
+        )
+        op.execute(f"DROP TRIGGER IF EXISTS {TRIGGER} ON dashboard_baker")
+        op.execute(
+            f"CREATE TRIGGER {TRIGGER} BEFORE INSERT OR UPDATE OF numero_cte ON dashboard_baker "
+            f"FOR EACH ROW EXECUTE FUNCTION {TRIGGER}()"
+        )
+    elif dialeto == 'sqlite':
+        for evento in ('INSERT', 'UPDATE OF numero_cte'):
+            op.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {TRIGGER}_{evento.split()[0].lower()} "
+                f"BEFORE {evento} ON dashboard_baker "
+                f"WHEN EXISTS (SELECT 1 FROM dashboard_baker_arquivo WHERE numero_cte = NEW.numero_cte) "
+                f"BEGIN SELECT RAISE(ABORT, 'CTE já existe no arquivo'); END"
+            )
+
+
+def downgrade():
+    dialeto = op.get_context().dialect.name
+    if dialeto == 'postgresql':
+        op.execute(f"DROP TRIGGER IF EXISTS {TRIGGER} ON dashboard_baker")
+        op.execute(f"DROP FUNCTION IF EXISTS {TRIGGER}()")
+    elif dialeto == 'sqlite':
+        op.execute(f"DROP TRIGGER IF EXISTS {TRIGGER}_insert")
+        op.execute(f"DROP TRIGGER IF EXISTS {TRIGGER}_update")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures dos testes - Dashboard Baker Flask
+tests/conftest.py
+
+Banco SQLite temporário, recriado e populado com a mesma massa de dados
+(determinística) antes de cada teste; cache, métricas e vagas de carga em
+diretório temporário, para não tocar nos arquivos do servidor local.
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+
+# Antes de importar o app: constantes dos módulos são lidas no import
+_DIRETORIO = tempfile.mkdtemp(prefix='dashboard_baker_testes_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DIRETORIO, 'teste.db')}"
+os.environ.pop('SQLALCHEMY_DATABASE_URI', None)
+os.environ.pop('DATABASE_READ_URL', None)
+os.environ['CACHE_DB_PATH'] = os.path.join(_DIRETORIO, 'cache.sqlite3')
+os.environ['METRICS_DIR'] = os.path.join(_DIRETORIO, 'metricas')
+os.environ['CARGA_LOCK_DIR'] = os.path.join(_DIRETORIO, 'carga')
+os.environ['JWT_SECRET'] = ''
+
+import pytest
+
+from app import create_app, db
+from config import DevelopmentConfig
+
+TOTAL_CTES = 300
+TOTAL_CHECKLISTS = 25
+
+
+class ConfigTeste(DevelopmentConfig):
+    TESTING = True
+    DEBUG = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+
+@pytest.fixture(scope='session')
+def app():
+    aplicacao = create_app(ConfigTeste)
+    with aplicacao.app_context():
+        from app.services.arquivo_cte_service import ArquivoCTEService
+
+        # Verificação de esquema feita uma vez por processo, fora dos orçamentos
+        db.create_all()
+        ArquivoCTEService.horizonte()
+    return aplicacao
+
+
+@pytest.fixture(autouse=True)
+def banco(app):
+    """Banco recriado e populado; caches de processo e compartilhado zerados"""
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        _limpar_caches()
+        popular(db.session)
+        db.session.commit()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = '1'
+        sessao['_fresh'] = True
+    return cliente
+
+
+def popular(sessao) -> None:
+    """Usuário admin, CTEs dos últimos ~13 meses e checklists de frotas"""
+    from app.models.cte import CTE
+    from app.models.frotas import Checklist, ChecklistItem, ChecklistModelo, Motorista, Veiculo
+    from app.models.user import User
+
+    admin = User(username='admin', email='admin@teste.local', nome_completo='Admin', tipo_usuario='admin')
+    admin.set_password('senha-teste')
+    sessao.add(admin)
+
+    aleatorio = random.Random(1)
+    hoje = date.today()
+    for i in range(TOTAL_CTES):
+        emissao = hoje - timedelta(days=aleatorio.randint(0, 400))
+
+        def etapa(dias):
+            return emissao + timedelta(days=dias) if aleatorio.random() < 0.7 else None
+
+        sessao.add(CTE(
+            numero_cte=i + 1,
+            destinatario_nome=f'CLIENTE {i % 17}',
+            veiculo_placa=f'ABC{i % 9}',
+            valor_total=aleatorio.randint(100, 9000),
+            data_emissao=emissao,
+            data_baixa=etapa(40),
+            data_inclusao_fatura=etapa(2),
+            primeiro_envio=etapa(3),
+            data_rq_tmc=etapa(1),
+            data_atesto=etapa(10),
+            envio_final=etapa(12),
+            numero_fatura=f'F{i}' if aleatorio.random() < 0.6 else None,
+        ))
+
+    veiculo = Veiculo(placa='FRT1A23')
+    motorista = Motorista(nome='Motorista Teste')
+    modelo = ChecklistModelo(nome='Pré-viagem', tipo='pre')
+    sessao.add_all([veiculo, motorista, modelo])
+    sessao.flush()
+    sessao.add_all([
+        ChecklistItem(modelo_id=modelo.id, ordem=1, descricao='Freios', bloqueia_viagem=True),
+        ChecklistItem(modelo_id=modelo.id, ordem=2, descricao='Pneus'),
+    ])
+    inicio = hoje - timedelta(days=10)
+    for i in range(TOTAL_CHECKLISTS):
+        # Pares com o mesmo dt_inicio: o desempate por id precisa funcionar
+        sessao.add(Checklist(
+            veiculo_id=veiculo.id, motorista_id=motorista.id, modelo_id=modelo.id, tipo='pre',
+            status='finalizado', dt_inicio=datetime_do_dia(inicio + timedelta(days=i // 2)),
+        ))
+
+
+def datetime_do_dia(dia: date):
+    from datetime import datetime
+    return datetime(dia.year, dia.month, dia.day, 8, 0)
+
+
+def _limpar_caches() -> None:
+    from app.models import receita_mensal, sketch_mensal
+
+    receita_mensal._tabela_disponivel = None
+    sketch_mensal._tabela_disponivel = None
+
+    caminho = os.environ['CACHE_DB_PATH']
+    if os.path.exists(caminho):
+        with sqlite3.connect(caminho) as conexao:
+            conexao.execute('DELETE FROM cache_resultados')
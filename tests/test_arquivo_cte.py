@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivo de CTEs: leituras inalteradas, busca, unicidade e desarquivamento
+tests/test_arquivo_cte.py
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.cte import CTE
+from app.models.cte_arquivo import CTEHistorico, tabela_arquivo
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.services.receita_mensal_service import ReceitaMensalService
+
+MESES = 6
+
+URLS = [
+    '/analise-financeira/api/clientes',
+    '/analise-financeira/api/metricas-forcadas?filtro_dias=365',
+    '/analise-financeira/api/graficos-simples?filtro_dias=365',
+    '/analise-financeira/api/top-clientes?filtro_dias=365',
+    '/analise-financeira/api/comparacao-periodos?filtro_dias=60&comparacoes=mom,yoy',
+    '/analise-financeira/api/comparacao-periodos?janela=antiga:2025-09-01:2026-01-31',
+    '/analise-financeira/api/stress-test?filtro_dias=400',
+    '/alertas/api/alertas-ativos',
+    '/dashboard/api/resumo-periodo',
+    '/dashboard/api/metricas',
+    '/dashboard/api/variacoes',
+    '/dashboard/api/variacoes?agrupar=mes',
+    '/ctes/api/facetas',
+    '/ctes/api/listar?per_page=200&page=2',
+]
+
+CAMPOS_VOLATEIS = {'timestamp', 'ultima_atualizacao', 'data_analise', 'tempo_ms'}
+
+
+def _sem_volateis(valor):
+    if isinstance(valor, dict):
+        return {k: _sem_volateis(v) for k, v in valor.items() if k not in CAMPOS_VOLATEIS}
+    if isinstance(valor, list):
+        return [_sem_volateis(v) for v in valor]
+    return valor
+
+
+def _candidatos():
+    corte = ArquivoCTEService.data_corte(MESES)
+    return [numero for (numero,) in db.session.query(CTE.numero_cte).filter(
+        CTE.data_baixa.isnot(None), CTE.data_emissao < corte).order_by(CTE.numero_cte)]
+
+
+@pytest.fixture
+def arquivados():
+    numeros = _candidatos()
+    assert numeros
+    resultado = ArquivoCTEService.arquivar(meses=MESES, lote=7)
+    assert resultado['movidos'] == len(numeros)
+    return numeros
+
+
+def test_arquivar_move_sem_perder_nem_duplicar(arquivados):
+    ativos = CTE.query.count()
+    no_arquivo = db.session.execute(select(func.count()).select_from(tabela_arquivo)).scalar()
+    historicos = db.session.query(func.count(func.distinct(CTEHistorico.numero_cte))).scalar()
+
+    assert no_arquivo == len(arquivados)
+    assert ativos + no_arquivo == historicos == 300
+    assert ArquivoCTEService.horizonte() < ArquivoCTEService.data_corte(MESES)
+
+
+def test_simular_nao_move():
+    resultado = ArquivoCTEService.arquivar(meses=MESES, simular=True)
+
+    assert resultado['movidos'] == 0
+    assert resultado['candidatos'] == len(_candidatos())
+    assert CTE.query.count() == 300
+
+
+def test_respostas_iguais_antes_e_depois_de_arquivar(client):
+    antes = {url: _sem_volateis(client.get(url).get_json()) for url in URLS}
+    ArquivoCTEService.arquivar(meses=MESES)
+
+    divergentes = [url for url in URLS if _sem_volateis(client.get(url).get_json()) != antes[url]]
+    assert divergentes == []
+
+
+def test_rollup_inclui_ctes_arquivados():
+    inicio = ArquivoCTEService.data_corte(MESES + 6)
+    antes = ReceitaMensalService.consultar_mensal('emissao', inicio)
+    ArquivoCTEService.arquivar(meses=MESES)
+
+    assert ReceitaMensalService.consultar_mensal('emissao', inicio) == antes
+    ReceitaMensalService.reconstruir()
+    assert ReceitaMensalService.consultar_mensal('emissao', inicio) == antes
+
+
+def test_detalhe_de_cte_arquivado(client, arquivados):
+    numero = arquivados[0]
+    resposta = client.get(f'/ctes/api/buscar/{numero}')
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()['cte']['numero_cte'] == numero
+    assert not ArquivoCTEService.arquivado(_ativo())
+    assert ArquivoCTEService.arquivado(numero)
+
+
+def test_criar_cte_com_numero_arquivado_e_recusado(arquivados):
+    sucesso, mensagem = CTE.criar_cte({
+        'numero_cte': arquivados[0], 'valor_total': 10, 'data_emissao': date.today(),
+    })
+
+    assert not sucesso
+    assert 'arquivado' in mensagem
+    assert CTE.query.count() + len(arquivados) == 300
+
+
+def test_trigger_recusa_insercao_direta_de_numero_arquivado(arquivados):
+    with pytest.raises(IntegrityError):
+        db.session.execute(insert(CTE.__table__).values(
+            numero_cte=arquivados[0], valor_total=10, data_emissao=date.today()))
+    db.session.rollback()
+
+
+def test_editar_cte_arquivado_o_devolve_a_tabela_ativa(arquivados):
+    numero = arquivados[0]
+    cte = CTE.buscar_por_numero(numero, desarquivar=True)
+    cte.observacao = 'editado'
+    db.session.commit()
+
+    assert not ArquivoCTEService.arquivado(numero)
+    assert CTE.query.filter_by(numero_cte=numero).one().observacao == 'editado'
+    assert db.session.query(CTEHistorico).filter(CTEHistorico.numero_cte == numero).count() == 1
+
+
+def _ativo() -> int:
+    return db.session.query(CTE.numero_cte).order_by(CTE.numero_cte).first()[0]
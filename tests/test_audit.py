@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sink de auditoria em lote: fila limitada, lotes, backpressure e fallback
+tests/test_audit.py
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pydantic')  # transpontual_auth é opcional no app
+
+from transpontual_auth.audit import (  # noqa: E402
+    ArquivoAuditSink, AuditSink, BancoAuditSink, LogAuditSink, criar_sink
+)
+
+
+class SinkMemoria(AuditSink):
+    nome = 'memoria'
+
+    def __init__(self, falhar=False, **kwargs):
+        super().__init__(**kwargs)
+        self.lotes = []
+        self.falhar = falhar
+
+    def _gravar_lote(self, eventos):
+        if self.falhar:
+            raise OSError('destino indisponível')
+        self.lotes.append(list(eventos))
+
+
+def _evento(i=0):
+    return {'evento': 'login', 'usuario_id': i, 'email': f'u{i}@teste.local',
+            'timestamp': datetime(2026, 1, 1, 12, 0), 'sucesso': True}
+
+
+def _aguardar(condicao, limite=5.0):
+    fim = time.monotonic() + limite
+    while not condicao() and time.monotonic() < fim:
+        time.sleep(0.01)
+    return condicao()
+
+
+def test_flush_grava_em_lotes():
+    sink = SinkMemoria(lote=2, intervalo=60)
+    for i in range(5):
+        sink.registrar(_evento(i))
+
+    sink.fechar()
+
+    assert sum(len(lote) for lote in sink.lotes) == 5
+    assert all(len(lote) <= 2 for lote in sink.lotes)
+    assert sink.estatisticas()['gravados'] == 5
+
+
+def test_fila_cheia_descarta_e_conta_sem_bloquear():
+    sink = SinkMemoria(tamanho_fila=2, lote=100, intervalo=60)
+
+    aceitos = [sink.registrar(_evento(i)) for i in range(5)]
+
+    assert aceitos == [True, True, False, False, False]
+    assert sink.estatisticas()['descartados'] == 3
+    sink.fechar()
+    assert sink.gravados == 2
+
+
+def test_lote_cheio_acorda_o_flush_antes_do_intervalo():
+    sink = SinkMemoria(lote=3, intervalo=60)
+    for i in range(3):
+        sink.registrar(_evento(i))
+
+    assert _aguardar(lambda: sink.gravados == 3)
+    sink.fechar()
+
+
+def test_falha_no_destino_vai_para_o_log(caplog):
+    sink = SinkMemoria(falhar=True, lote=10, intervalo=60)
+    sink.registrar(_evento())
+
+    with caplog.at_level(logging.INFO, logger='transpontual_auth.audit'):
+        sink.fechar()
+
+    assert sink.falhas == 1
+    assert sink.gravados == 0
+    assert any('SECURITY_EVENTS (1)' in mensagem for mensagem in caplog.messages)
+
+
+def test_arquivo_recebe_json_lines(tmp_path):
+    caminho = tmp_path / 'auditoria' / 'security_audit.log'
+    sink = ArquivoAuditSink(caminho=str(caminho), intervalo=60)
+    for i in range(3):
+        sink.registrar(_evento(i))
+
+    sink.fechar()
+
+    linhas = [json.loads(linha) for linha in caminho.read_text(encoding='utf-8').splitlines()]
+    assert [linha['usuario_id'] for linha in linhas] == [0, 1, 2]
+    assert linhas[0]['timestamp'] == '2026-01-01T12:00:00'
+
+
+def test_banco_insere_o_lote(tmp_path):
+    caminho = tmp_path / 'auditoria.db'
+    sink = BancoAuditSink(url=f'sqlite:///{caminho}', intervalo=60)
+    for i in range(4):
+        sink.registrar(_evento(i))
+
+    sink.fechar()
+
+    with sqlite3.connect(caminho) as conexao:
+        linhas = conexao.execute('SELECT usuario_id, evento FROM security_audit_log ORDER BY id').fetchall()
+    assert linhas == [(str(i), 'login') for i in range(4)]
+
+
+def test_sink_invalido_usa_o_log():
+    assert isinstance(criar_sink('kafka'), LogAuditSink)
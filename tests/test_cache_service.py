@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de resultados compartilhado: LRU, limite por entrada, versão e stale
+tests/test_cache_service.py
+"""
+
+import os
+import threading
+
+import pytest
+
+from app.services.cache_service import CacheResultados
+
+
+@pytest.fixture
+def cache(tmp_path):
+    def criar(**opcoes):
+        return CacheResultados('teste', caminho=str(tmp_path / 'privado' / 'cache.sqlite3'), **opcoes)
+    return criar
+
+
+def _aguardar_revalidacao():
+    for thread in threading.enumerate():
+        if thread.name == 'cache-teste':
+            thread.join(timeout=5)
+
+
+def test_lru_descarta_a_entrada_acessada_ha_mais_tempo(cache):
+    resultados = cache(max_entradas=2)
+    resultados.gravar('a', 1)
+    resultados.gravar('b', 2)
+    resultados.obter('a')
+    resultados.gravar('c', 3)
+
+    assert resultados.obter('b') is None
+    assert resultados.obter('a')[0] == 1
+    assert resultados.obter('c')[0] == 3
+
+
+def test_entrada_acima_do_limite_nao_e_gravada(cache):
+    resultados = cache(max_bytes_entrada=64)
+
+    assert not resultados.gravar('grande', 'x' * 1000)
+    assert resultados.obter('grande') is None
+    assert resultados.gravar('pequena', 'x')
+
+
+def test_versao_diferente_recalcula_na_hora(cache):
+    resultados = cache(ttl=300, ttl_stale=3600)
+    resultados.gravar('chave', 'antigo', versao='v1')
+
+    valor = resultados.obter_ou_calcular('chave', lambda: 'novo', versao='v2')
+
+    assert valor == 'novo'
+    assert resultados.obter('chave')[:2] == ('novo', 'v2')
+
+
+def test_ttl_vencido_na_mesma_versao_serve_stale_e_revalida(cache):
+    resultados = cache(ttl=-1, ttl_stale=3600)
+    resultados.gravar('chave', 'antigo', versao='v1')
+
+    valor = resultados.obter_ou_calcular('chave', lambda: 'novo', versao='v1')
+    _aguardar_revalidacao()
+
+    assert valor == 'antigo'
+    assert resultados.obter('chave')[0] == 'novo'
+
+
+def test_alem_do_ttl_stale_recalcula_na_hora(cache):
+    resultados = cache(ttl=-2, ttl_stale=-1)
+    resultados.gravar('chave', 'antigo', versao='v1')
+
+    assert resultados.obter_ou_calcular('chave', lambda: 'novo', versao='v1') == 'novo'
+
+
+def test_diretorio_criado_so_para_o_dono(cache, tmp_path):
+    cache().gravar('chave', 1)
+
+    assert os.stat(tmp_path / 'privado').st_mode & 0o777 == 0o700
+
+
+def test_diretorio_acessivel_a_outros_e_recusado(cache, tmp_path):
+    diretorio = tmp_path / 'privado'
+    diretorio.mkdir()
+    os.chmod(diretorio, 0o777)
+    resultados = cache()
+
+    assert not resultados.gravar('chave', 1)
+    assert resultados.obter('chave') is None
+    assert not os.path.exists(diretorio / 'cache.sqlite3')
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classes de carga de trabalho: statement_timeout por classe e orçamento de conexões
+tests/test_cargas_trabalho.py
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import cargas_trabalho
+from app.utils.cargas_trabalho import (
+    CLASSES_CARGA, ClasseCarga, carga_de_trabalho, classe_atual, classe_da_requisicao
+)
+
+
+class CursorFalso:
+    def __init__(self):
+        self.comandos = []
+
+    def execute(self, sql):
+        self.comandos.append(sql)
+
+
+def _conexao_postgres():
+    return SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), info={})
+
+
+def _timeouts(conexao, vezes=1):
+    cursor = CursorFalso()
+    for _ in range(vezes):
+        cargas_trabalho._definir_timeout(conexao, cursor)
+    return cursor.comandos
+
+
+def test_fora_de_requisicao_sem_timeout():
+    assert classe_atual() is None
+    assert _timeouts(_conexao_postgres()) == []
+
+
+def test_comando_opta_por_uma_classe():
+    with carga_de_trabalho('lote') as classe:
+        assert _timeouts(_conexao_postgres(), vezes=2) == [
+            f"SET LOCAL statement_timeout = {classe.timeout_ms}"
+        ]
+    assert classe_atual() is None
+
+
+def test_classe_invalida():
+    with pytest.raises(ValueError):
+        with carga_de_trabalho('urgente'):
+            pass
+
+
+@pytest.mark.parametrize('url,classe', [
+    ('/permissions/api/user/1/permissions', 'interativa'),
+    ('/dashboard/api/metricas', 'analitica'),
+    ('/alertas/api/alertas-ativos', 'analitica'),
+])
+def test_classe_da_requisicao(app, url, classe):
+    with app.test_request_context(url):
+        assert classe_da_requisicao() == classe
+        assert classe_atual().nome == 'interativa'  # padrão antes do before_request
+
+
+def test_orcamento_esgotado_e_devolvido():
+    classe = ClasseCarga('teste_orcamento', timeout_ms=1000, conexoes=1)
+
+    vaga = classe.reservar(espera=0)
+    assert vaga is not None
+    assert classe.reservar(espera=0) is None
+
+    classe.liberar(vaga)
+    outra = classe.reservar(espera=0)
+    assert outra is not None
+    classe.liberar(outra)
+
+
+def test_requisicao_sem_vaga_recebe_503(client):
+    interativa = CLASSES_CARGA['interativa']
+    vagas = [interativa.reservar(espera=0) for _ in range(interativa.conexoes)]
+    try:
+        resposta = client.get('/permissions/api/user/1/permissions')
+    finally:
+        for vaga in vagas:
+            interativa.liberar(vaga)
+
+    assert resposta.status_code == 503
+    assert resposta.headers['Retry-After'] == str(cargas_trabalho.CARGA_RETRY_AFTER)
+    assert resposta.get_json()['classe_carga'] == 'interativa'
+
+
+def test_revalidacao_em_background_herda_a_classe(tmp_path):
+    from app.services.cache_service import CacheResultados
+
+    cache = CacheResultados('classe_carga', caminho=str(tmp_path / 'cache.sqlite3'), ttl=-1)
+    cache.gravar('chave', 'antigo')
+    vistas = []
+
+    with carga_de_trabalho('analitica'):
+        cache.obter_ou_calcular('chave', lambda: vistas.append(classe_atual().nome) or 'novo')
+
+    for thread in threading.enumerate():
+        if thread.name == 'cache-classe_carga':
+            thread.join(timeout=5)
+    assert vistas == ['analitica']
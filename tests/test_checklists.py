@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checklists de frotas: paginação por keyset, filtros e submissão em lote
+tests/test_checklists.py
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models.frotas import Checklist, ChecklistItem, ChecklistResposta
+
+URL = '/frotas/api/checklists'
+
+
+def _paginas(client, limite, **filtros):
+    paginas, cursor = [], None
+    while True:
+        parametros = {'limite': limite, **filtros}
+        if cursor:
+            parametros['cursor'] = cursor
+        corpo = client.get(URL, query_string=parametros).get_json()
+        paginas.append(corpo)
+        cursor = corpo['proximo_cursor']
+        if cursor is None:
+            return paginas
+
+
+@pytest.mark.parametrize('limite', [1, 4, 7, 100])
+def test_keyset_percorre_tudo_sem_repetir(client, limite):
+    paginas = _paginas(client, limite)
+    ids = [c['id'] for pagina in paginas for c in pagina['checklists']]
+
+    esperado = [c.id for c in Checklist.query.order_by(Checklist.dt_inicio.desc(), Checklist.id.desc())]
+    assert ids == esperado
+    assert all(len(p['checklists']) <= limite for p in paginas)
+
+
+def test_insercao_durante_a_paginacao_nao_repete(client):
+    primeira = client.get(URL, query_string={'limite': 5}).get_json()
+    db.session.add(Checklist(veiculo_id=1, motorista_id=1, modelo_id=1, tipo='pre',
+                             dt_inicio=datetime.utcnow()))
+    db.session.commit()
+
+    segunda = client.get(URL, query_string={'limite': 5, 'cursor': primeira['proximo_cursor']}).get_json()
+    ids = [c['id'] for c in primeira['checklists'] + segunda['checklists']]
+    assert len(ids) == len(set(ids)) == 10
+
+
+def test_relacionados_deduplicados(client):
+    corpo = client.get(URL, query_string={'limite': 10}).get_json()
+
+    assert list(corpo['veiculos']) == ['1']
+    assert corpo['veiculos']['1']['placa'] == 'FRT1A23'
+    assert list(corpo['modelos']) == list(corpo['motoristas']) == ['1']
+
+
+@pytest.mark.parametrize('parametros', [
+    {'cursor': 'nao-e-um-cursor'},
+    {'veiculo_id': 'abc'},
+    {'motorista_id': '1.5'},
+])
+def test_cursor_ou_filtro_invalido_retorna_400(client, parametros):
+    resposta = client.get(URL, query_string=parametros)
+
+    assert resposta.status_code == 400
+    assert resposta.get_json()['success'] is False
+
+
+def test_filtro_por_id_aceita_inteiro_em_texto(client):
+    corpo = client.get(URL, query_string={'veiculo_id': ' 1 ', 'limite': 100}).get_json()
+    assert len(corpo['checklists']) == Checklist.query.count()
+
+
+def _submissao(**extras):
+    itens = ChecklistItem.query.order_by(ChecklistItem.ordem).all()
+    return {
+        'veiculo_id': 1, 'motorista_id': 1, 'modelo_id': 1, 'tipo': 'pre',
+        'respostas': [{'item_id': item.id, 'valor': 'ok'} for item in itens],
+        **extras,
+    }
+
+
+def test_submissao_grava_checklist_e_respostas(client):
+    resposta = client.post(URL, json=_submissao(odometro_ini='1200', dt_inicio='2026-03-10T08:00:00-03:00'))
+
+    assert resposta.status_code == 201
+    corpo = resposta.get_json()
+    assert corpo['viagem_liberada'] is True
+    checklist = db.session.get(Checklist, corpo['checklist']['id'])
+    assert checklist.odometro_ini == 1200
+    assert checklist.dt_inicio == datetime(2026, 3, 10, 11, 0)
+    assert ChecklistResposta.query.filter_by(checklist_id=checklist.id).count() == 2
+
+
+def test_item_que_bloqueia_viagem(client):
+    dados = _submissao()
+    dados['respostas'][0]['valor'] = 'nao_ok'
+
+    corpo = client.post(URL, json=dados).get_json()
+
+    assert corpo['viagem_liberada'] is False
+    assert [b['descricao'] for b in corpo['bloqueios']] == ['Freios']
+
+
+@pytest.mark.parametrize('extras,erro', [
+    ({'odometro_ini': 'muito'}, 'odometro_ini deve ser um inteiro'),
+    ({'odometro_fim': -5}, 'odometro_fim não pode ser negativo'),
+    ({'dt_inicio': 'ontem'}, 'dt_inicio inválida (ISO 8601)'),
+    ({'tipo': 'durante'}, 'tipo deve ser um de'),
+])
+def test_submissao_invalida_retorna_400_sem_gravar(client, extras, erro):
+    total = Checklist.query.count()
+    resposta = client.post(URL, json=_submissao(**extras))
+
+    assert resposta.status_code == 400
+    assert any(e.startswith(erro) for e in resposta.get_json()['erros'])
+    assert Checklist.query.count() == total
+
+
+def test_item_sem_resposta_retorna_400(client):
+    dados = _submissao()
+    dados['respostas'].pop()
+
+    resposta = client.post(URL, json=dados)
+
+    assert resposta.status_code == 400
+    assert any(e.startswith('Itens sem resposta') for e in resposta.get_json()['erros'])
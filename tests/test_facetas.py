@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de facetas em bitmaps: listagem igual ao banco, facetas e versão
+tests/test_facetas.py
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+
+from app import db
+from app.models.cte import CTE
+from app.routes.ctes import _listar_via_banco
+from app.services.indice_facetas_service import IndiceFacetas
+
+HOJE = date.today()
+
+
+@pytest.mark.parametrize('busca,status_baixa,status_processo,inicio,fim', [
+    ('', '', '', None, None),
+    ('', 'com_baixa', 'incompleto', None, None),
+    ('', 'sem_baixa', 'completo', HOJE - timedelta(days=200), HOJE - timedelta(days=20)),
+    ('cliente 1', 'com_baixa', '', None, None),
+    ('42', '', '', None, None),
+])
+def test_listagem_pelo_indice_igual_ao_banco(busca, status_baixa, status_processo, inicio, fim):
+    resultado = IndiceFacetas.atual().consultar(
+        filtros={'status_baixa': [status_baixa], 'status_processo': [status_processo]},
+        data_inicio=inicio, data_fim=fim, busca=busca, pagina=2, por_pagina=20
+    )
+    total, pagina = _listar_via_banco(busca, status_baixa, status_processo, inicio, fim, 2, 20)
+
+    assert resultado['total'] == total
+    assert resultado['ids'] == [cte.id for cte in pagina]
+
+
+def test_etapa_segue_a_precedencia_do_modelo():
+    esperado = Counter(cte.status_processo for cte in CTE.query.all())
+
+    facetas = IndiceFacetas.atual().consultar(com_facetas=True)['facetas']
+
+    assert {f['valor']: f['qtd'] for f in facetas['etapa']} == esperado
+
+
+def test_faceta_conta_sob_os_filtros_das_outras_dimensoes():
+    indice = IndiceFacetas.atual()
+    com_baixa = indice.consultar(filtros={'status_baixa': ['com_baixa']}, com_facetas=True)
+    facetas = com_baixa['facetas']
+
+    # A própria dimensão ignora o seu filtro; as demais somam o total filtrado
+    assert sum(f['qtd'] for f in facetas['status_baixa']) == indice.total
+    for dimensao in ('etapa', 'fatura', 'mes', 'cliente'):
+        assert sum(f['qtd'] for f in facetas[dimensao]) == com_baixa['total']
+    meses = [f['valor'] for f in facetas['mes']]
+    assert meses == sorted(meses)
+
+
+def test_valores_da_mesma_dimensao_combinam_com_ou():
+    indice = IndiceFacetas.atual()
+    cliente_1 = indice.consultar(filtros={'cliente': ['CLIENTE 1']})['total']
+    cliente_2 = indice.consultar(filtros={'cliente': ['CLIENTE 2']})['total']
+
+    assert indice.consultar(filtros={'cliente': ['CLIENTE 1', 'CLIENTE 2']})['total'] == cliente_1 + cliente_2
+
+
+def test_indice_reconstruido_quando_os_dados_mudam():
+    indice = IndiceFacetas.atual()
+    assert IndiceFacetas.atual() is indice
+
+    db.session.add(CTE(numero_cte=5000, destinatario_nome='CLIENTE NOVO', valor_total=10, data_emissao=HOJE))
+    db.session.commit()
+
+    novo = IndiceFacetas.atual()
+    assert novo is not indice
+    assert novo.total == indice.total + 1
+    assert novo.consultar(filtros={'cliente': ['CLIENTE NOVO']})['total'] == 1
+
+
+def test_api_facetas_aceita_valores_multiplos(client):
+    resposta = client.get('/ctes/api/facetas?fatura=com_fatura,sem_fatura&cliente=CLIENTE 3&limite=1')
+    dados = resposta.get_json()
+
+    assert resposta.status_code == 200
+    assert dados['total'] == CTE.query.filter_by(destinatario_nome='CLIENTE 3').count()
+    assert len(dados['facetas']['cliente']) == 1
+    assert dados['filters']['fatura'] == ['com_fatura', 'sem_fatura']
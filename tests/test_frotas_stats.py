@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas de frotas: agregado único, cache e invalidação após commit
+tests/test_frotas_stats.py
+"""
+
+from datetime import date, datetime
+
+from app import db
+from app.models.frotas import Checklist, Motorista, Veiculo
+from app.services.frotas_stats_service import STATUS_PENDENTE, FrotasStatsService
+from app.utils.telemetria import contar_queries
+
+URL = '/frotas/api/stats'
+
+
+def _contagens(contador):
+    return [sql for sql in contador.por_impressao if 'count(*)' in sql.lower()]
+
+
+def _adicionar_registros():
+    veiculo = Veiculo(placa='MAN0001', em_manutencao=True)
+    motorista = Motorista(nome='Motorista Inativo', ativo=False)
+    db.session.add_all([veiculo, motorista, Veiculo(placa='INA0001', ativo=False)])
+    db.session.flush()
+    modelo_id = Checklist.query.first().modelo_id
+    db.session.add(Checklist(veiculo_id=veiculo.id, motorista_id=motorista.id, modelo_id=modelo_id,
+                             tipo='pre', status=STATUS_PENDENTE, dt_inicio=datetime.now()))
+    db.session.commit()
+
+
+def test_agregado_unico_igual_as_contagens_separadas():
+    _adicionar_registros()
+    hoje = date.today()
+
+    with contar_queries() as contador:
+        stats = FrotasStatsService.calcular(hoje)
+
+    assert contador.total == 1
+    assert stats == {
+        'veiculos_total': Veiculo.query.count(),
+        'veiculos_ativos': Veiculo.query.filter_by(ativo=True).count(),
+        'veiculos_manutencao': Veiculo.query.filter_by(em_manutencao=True).count(),
+        'motoristas_total': Motorista.query.count(),
+        'motoristas_ativos': Motorista.query.filter_by(ativo=True).count(),
+        'checklists_total': Checklist.query.count(),
+        'checklists_pendentes': Checklist.query.filter_by(status=STATUS_PENDENTE).count(),
+        'checklists_hoje': Checklist.query.filter(Checklist.dt_inicio >= hoje).count(),
+    }
+
+
+def test_api_servida_do_cache(client):
+    with contar_queries() as contador:
+        primeira = client.get(URL).get_json()
+    assert len(_contagens(contador)) == 1
+
+    with contar_queries() as contador:
+        segunda = client.get(URL).get_json()
+
+    assert segunda == primeira
+    assert not _contagens(contador)
+
+
+def test_commit_de_frotas_invalida_e_rollback_nao(client):
+    antes = client.get(URL).get_json()
+
+    db.session.add(Veiculo(placa='RBK0001'))
+    db.session.flush()
+    db.session.rollback()
+    with contar_queries() as contador:
+        client.get(URL)
+    assert not _contagens(contador)
+
+    db.session.add(Veiculo(placa='NOV0001'))
+    db.session.commit()
+    depois = client.get(URL).get_json()
+
+    assert depois['veiculos_total'] == antes['veiculos_total'] + 1
+    assert depois['veiculos_ativos'] == antes['veiculos_ativos'] + 1
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Login automático por JWT: rotas públicas, segredo e cache de tokens verificados
+tests/test_jwt_integration.py
+"""
+
+import time
+
+import jwt
+import pytest
+
+from app.services import jwt_integration
+from app.utils.telemetria import contar_queries
+
+SEGREDO = 'segredo-de-teste-com-32-bytes-ou-mais'
+URL = '/dashboard/api/metricas'
+
+
+@pytest.fixture
+def decodificacoes(monkeypatch):
+    """Segredo configurado e decodificação contada"""
+    chamadas = []
+
+    def decodificar(token):
+        chamadas.append(token)
+        # Tokens legados do sistema de frotas trazem o usuário em 'sub'
+        return jwt.decode(token, SEGREDO, algorithms=['HS256'], options={'verify_sub': False})
+
+    monkeypatch.setattr(jwt_integration, 'JWT_SECRET', SEGREDO)
+    monkeypatch.setattr(jwt_integration, 'decode_jwt_token', decodificar)
+    jwt_integration.tokens_verificados.limpar()
+    yield chamadas
+    jwt_integration.tokens_verificados.limpar()
+
+
+def _token(email='admin@teste.local', username='admin') -> str:
+    payload = {'sub': {'email': email, 'username': username}, 'exp': int(time.time()) + 600}
+    return jwt.encode(payload, SEGREDO, algorithm='HS256')
+
+
+def _get(app, url, token):
+    # Cliente novo a cada chamada: sem sessão do Flask-Login, só o JWT
+    return app.test_client().get(url, headers={'Authorization': f'Bearer {token}'})
+
+
+def test_segunda_requisicao_nao_decodifica_nem_busca_usuario(app, decodificacoes):
+    token = _token()
+
+    assert _get(app, URL, token).status_code == 200
+    assert len(decodificacoes) == 1
+
+    with contar_queries() as contador:
+        resposta = _get(app, URL, token)
+
+    assert resposta.status_code == 200
+    assert len(decodificacoes) == 1
+    assert not [sql for sql in contador.por_impressao if 'users.email =' in sql]
+
+
+def test_raiz_publica_nao_e_prefixo_de_todas_as_rotas(app, decodificacoes):
+    token = _token()
+
+    _get(app, '/', token)
+    assert decodificacoes == []
+
+    _get(app, URL, token)
+    assert decodificacoes == [token]
+
+
+def test_sem_segredo_o_token_e_ignorado(app, decodificacoes, monkeypatch):
+    monkeypatch.setattr(jwt_integration, 'JWT_SECRET', jwt_integration.JWT_SECRET_PADRAO)
+
+    resposta = _get(app, URL, _token())
+
+    assert resposta.status_code != 200
+    assert decodificacoes == []
+
+
+def test_usuario_desconhecido_nao_entra_no_cache(app, decodificacoes):
+    token = _token(email='ninguem@teste.local', username='ninguem')
+
+    assert _get(app, URL, token).status_code != 200
+    assert len(jwt_integration.tokens_verificados) == 0
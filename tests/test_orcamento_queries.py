@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orçamento de queries por endpoint (ORCAMENTO_QUERIES)
+tests/test_orcamento_queries.py
+"""
+
+import pytest
+
+from app.utils.telemetria import ORCAMENTO_QUERIES, orcamento_queries
+
+URLS = {
+    'dashboard.index': '/dashboard/',
+    'dashboard.api_metricas': '/dashboard/api/metricas',
+    'dashboard.api_graficos': '/dashboard/api/graficos',
+    'ctes.api_listar': '/ctes/api/listar',
+    'ctes.api_facetas': '/ctes/api/facetas',
+    'alertas.api_alertas_ativos': '/alertas/api/alertas-ativos',
+    'alertas.api_resumo_alertas': '/alertas/api/alertas/resumo',
+    'permissions.api_user_permissions': '/permissions/api/user/1/permissions',
+}
+
+
+def test_todo_endpoint_orcado_tem_url():
+    assert set(URLS) == set(ORCAMENTO_QUERIES)
+
+
+@pytest.mark.parametrize('endpoint', sorted(ORCAMENTO_QUERIES))
+def test_endpoint_dentro_do_orcamento_com_cache_frio(client, endpoint):
+    with orcamento_queries(endpoint=endpoint):
+        resposta = client.get(URLS[endpoint])
+    assert resposta.status_code == 200
+
+
+@pytest.mark.parametrize('endpoint', sorted(ORCAMENTO_QUERIES))
+def test_endpoint_dentro_do_orcamento_com_cache_quente(client, endpoint):
+    assert client.get(URLS[endpoint]).status_code == 200
+    with orcamento_queries(endpoint=endpoint):
+        resposta = client.get(URLS[endpoint])
+    assert resposta.status_code == 200
+
+
+def test_orcamento_excedido_falha(client):
+    with pytest.raises(AssertionError):
+        with orcamento_queries(maximo=0):
+            client.get(URLS['ctes.api_listar'])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Permissões compiladas em bitmask: cache por versão e invalidação após commit
+tests/test_permissions.py
+"""
+
+import pytest
+
+from app import db
+from app.models.permissions import CachePermissoes, PermissionManager, UserPermission, permissoes_cache
+from app.models.user import User
+from app.utils.telemetria import contar_queries
+
+
+@pytest.fixture
+def operador():
+    usuario = User(username='operador', email='operador@teste.local', nome_completo='Operador',
+                   tipo_usuario='operador')
+    usuario.set_password('senha-teste')
+    db.session.add(usuario)
+    db.session.flush()
+    db.session.add_all([
+        UserPermission(usuario.id, 'frotas', ['view', 'create']),
+        UserPermission(usuario.id, 'financeiro', ['view']),
+    ])
+    db.session.commit()
+    return usuario.id
+
+
+def test_bitmask_reflete_as_acoes_por_modulo(operador):
+    assert PermissionManager.user_can(operador, 'frotas', 'create')
+    assert not PermissionManager.user_can(operador, 'frotas', 'delete')
+    assert not PermissionManager.user_can(operador, 'admin', 'view')
+    assert not PermissionManager.user_can(operador, 'frotas', 'acao_inexistente')
+    assert sorted(PermissionManager.get_user_modules(operador)) == ['financeiro', 'frotas']
+    assert PermissionManager.user_can(1, 'admin', 'delete')
+    assert len(PermissionManager.get_user_modules(1)) == len(PermissionManager.MODULES)
+
+
+def test_verificacoes_seguintes_nao_consultam_o_banco(operador):
+    PermissionManager.user_can(operador, 'frotas', 'view')
+
+    with contar_queries() as contador:
+        PermissionManager.get_modules_for_display(operador)
+        PermissionManager.user_can(operador, 'financeiro', 'edit')
+
+    assert contador.total == 0
+
+
+def test_api_de_permissoes_invalida_o_cache(client, operador):
+    assert not PermissionManager.user_can(operador, 'frotas', 'delete')
+
+    resposta = client.post(f'/permissions/api/user/{operador}/permissions',
+                           json={'permissions': {'frotas': ['view', 'delete']}})
+
+    assert resposta.status_code == 200
+    assert PermissionManager.user_can(operador, 'frotas', 'delete')
+    assert not PermissionManager.user_can(operador, 'financeiro', 'view')
+
+
+def test_troca_de_tipo_invalida_so_depois_do_commit(operador):
+    assert not PermissionManager.user_can(operador, 'admin', 'view')
+    versao = permissoes_cache.versao_atual()
+
+    db.session.get(User, operador).tipo_usuario = 'admin'
+    db.session.flush()
+    db.session.rollback()
+    assert permissoes_cache.versao_atual() == versao
+
+    db.session.get(User, operador).tipo_usuario = 'admin'
+    db.session.commit()
+    assert permissoes_cache.versao_atual() != versao
+    assert PermissionManager.user_can(operador, 'admin', 'view')
+
+
+def test_cache_limitado_descarta_o_usuario_mais_antigo(operador):
+    cache = CachePermissoes(max_entradas=1)
+    cache.obter(1)
+    cache.obter(operador)
+
+    with contar_queries() as contador:
+        cache.obter(operador)
+        cache.obter(1)
+
+    assert contador.total == 1
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Projeções em lote por série: ajuste conjunto, cache por versão e API
+tests/test_projecoes.py
+"""
+
+from datetime import date, timedelta
+
+import pytest
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func
+
+from app import db
+from app.models.cte import CTE
+from app.services import projecoes_service
+from app.services.arquivo_cte_service import ArquivoCTEService
+from app.services.projecoes_service import ProjecoesService
+from app.utils.telemetria import contar_queries
+
+URL = '/analise-financeira/api/projecao-series'
+SERIE = 'CLIENTE LINEAR'
+
+
+def _adicionar_cte(numero, emissao, valor, cliente=SERIE):
+    db.session.add(CTE(numero_cte=numero, destinatario_nome=cliente, veiculo_placa='LIN0001',
+                       valor_total=valor, data_emissao=emissao))
+
+
+@pytest.fixture
+def serie_linear():
+    """Receita mensal 1000 + 100·k nos últimos 12 meses completos"""
+    inicio = date.today().replace(day=1) - relativedelta(months=12)
+    for k in range(12):
+        _adicionar_cte(90_000 + k, inicio + relativedelta(months=k) + timedelta(days=14), 1000 + 100 * k)
+    db.session.commit()
+
+
+@pytest.fixture
+def carregamentos(monkeypatch):
+    chamadas = []
+    original = projecoes_service.carregar_ctes
+
+    def contar(*args, **kwargs):
+        chamadas.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(projecoes_service, 'carregar_ctes', contar)
+    return chamadas
+
+
+def test_serie_linear_e_extrapolada_no_lote(serie_linear):
+    lote = ProjecoesService.projecao_series('cliente')
+    serie = lote['series'][SERIE]
+
+    assert lote['meses_janela'] == 12
+    assert lote['total_series'] == 18
+    assert serie['r_squared'] == 1.0
+    assert serie['tendencia_geral'] == 'Crescimento'
+    assert [p['valor_projetado'] for p in serie['projecoes']] == pytest.approx([2300, 2400, 2500], abs=0.01)
+    assert serie['projecoes'][0]['mes'] == (date.today().replace(day=1) + relativedelta(months=1)).strftime('%Y-%m')
+
+
+def test_series_somam_o_total_observado(serie_linear):
+    clientes = ProjecoesService.projecao_series('cliente')['series']
+    total = ProjecoesService.projecao_series('total')['series']['TOTAL']
+
+    soma = sum(s['media_mensal_historica'] for s in clientes.values())
+    assert soma == pytest.approx(total['media_mensal_historica'], abs=0.1)
+
+
+def test_lote_em_cache_ate_a_versao_mudar(carregamentos):
+    ProjecoesService.projecao_series('veiculo')
+    ProjecoesService.projecao_serie('veiculo', 'ABC1')
+    assert len(carregamentos) == 1
+
+    _adicionar_cte(90_100, date.today() - relativedelta(months=2), 500)
+    db.session.commit()
+
+    assert ProjecoesService.projecao_serie('veiculo', 'LIN0001') is not None
+    assert len(carregamentos) == 2
+
+
+def test_poucos_meses_nao_projetam_recebimentos():
+    limite = date.today().replace(day=1) - relativedelta(months=2)
+    CTE.query.filter(CTE.data_emissao < limite).delete()
+    db.session.commit()
+
+    assert ProjecoesService.projecao_recebimentos_3_meses()['success'] is False
+
+
+def test_api_por_serie(client, serie_linear):
+    resposta = client.get(URL, query_string={'dimensao': 'cliente', 'nome': SERIE})
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()['success'] is True
+    assert client.get(URL, query_string={'dimensao': 'cliente', 'nome': 'NINGUEM'}).status_code == 404
+    assert client.get(URL, query_string={'dimensao': 'rota'}).status_code == 400
+
+
+# ==================== COMPARAÇÃO DE JANELAS ====================
+
+def _agregar_direto(inicio, fim):
+    filtro = (CTE.data_emissao.between(inicio, fim), CTE.valor_total.isnot(None))
+    receita = db.session.query(func.coalesce(func.sum(CTE.valor_total), 0)).filter(*filtro).scalar()
+    quantidade = CTE.query.filter(*filtro).count()
+    clientes = db.session.query(func.count(func.distinct(CTE.destinatario_nome))).filter(*filtro).scalar()
+    return round(float(receita), 2), quantidade, clientes
+
+
+def test_janelas_sobrepostas_numa_unica_consulta():
+    janelas = ProjecoesService.janelas_comparacao(60, ['wow', 'mom', 'qoq', 'yoy'])
+    ArquivoCTEService.horizonte()  # consulta do horizonte de arquivo fica em cache
+
+    with contar_queries() as contador:
+        dados = ProjecoesService.agregar_janelas(janelas)
+
+    assert contador.total == 1
+    for nome, inicio, fim in janelas:
+        esperado = _agregar_direto(inicio, fim)
+        obtido = dados[nome]
+        assert (obtido['receita_total'], obtido['quantidade_ctes'], obtido['clientes_unicos']) == esperado
+
+
+def test_comparar_janelas_inclui_personalizadas_com_variacao():
+    personalizada = ('trimestre', date.today() - timedelta(days=120), date.today() - timedelta(days=30))
+
+    resultado = ProjecoesService.comparar_janelas(30, ['mom'], [personalizada])
+
+    assert [p['janela'] for p in resultado['periodos']] == ['atual', 'mom', 'trimestre']
+    assert 'variacao' not in resultado['periodos'][0]
+    assert all('variacao' in p for p in resultado['periodos'][1:])
+
+
+def test_nomes_de_janela_repetidos_sao_recusados():
+    hoje = date.today()
+    with pytest.raises(ValueError):
+        ProjecoesService.agregar_janelas([('a', hoje, hoje), ('a', hoje - timedelta(days=9), hoje)])
+
+
+@pytest.mark.parametrize('parametros', [
+    {'comparacoes': 'mom,semestre'},
+    {'janela': 'atual:2025-01-01:2025-02-01'},
+    {'janela': 'sem-datas'},
+])
+def test_api_recusa_janelas_invalidas(client, parametros):
+    resposta = client.get('/analise-financeira/api/comparacao-periodos', query_string=parametros)
+
+    assert resposta.status_code == 400
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rollup receita_mensal_cliente: leitura, reconstrução e manutenção incremental
+tests/test_receita_mensal.py
+"""
+
+import calendar
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import receita_mensal
+from app.models.cte import CTE
+from app.models.estado_derivado import EstadoDerivado
+from app.models.receita_mensal import BASES_DATA, MEDIDAS, ReceitaMensalCliente, rollup_disponivel
+from app.services.receita_mensal_service import ReceitaMensalService
+
+INICIO = (date.today() - timedelta(days=460)).replace(day=1)
+
+
+def _fim_do_mes(dia: date) -> date:
+    return dia.replace(day=calendar.monthrange(dia.year, dia.month)[1])
+
+
+def _esperado_da_tabela(base: str):
+    """Mesmas medidas, mês a mês, agregadas direto de dashboard_baker"""
+    esperado, mes = [], INICIO
+    while mes <= date.today():
+        medidas = ReceitaMensalService._agregar_fato(base, mes, _fim_do_mes(mes), None)
+        if medidas['quantidade']:
+            esperado.append((mes, {m: float(medidas[m]) for m in MEDIDAS}))
+        mes = _fim_do_mes(mes) + timedelta(days=1)
+    return esperado
+
+
+def _lido_do_rollup(base: str):
+    linhas = ReceitaMensalService.consultar_mensal(base, INICIO, _fim_do_mes(date.today()))
+    return [(linha['mes'], {m: float(linha[m]) for m in MEDIDAS}) for linha in linhas]
+
+
+def _esquecer_estado():
+    receita_mensal._tabela_disponivel = None
+
+
+@pytest.mark.parametrize('base', sorted(BASES_DATA))
+def test_rollup_igual_a_agregacao_da_tabela(base):
+    ReceitaMensalService.reconstruir()
+    assert _lido_do_rollup(base) == _esperado_da_tabela(base)
+
+
+@pytest.mark.parametrize('base', sorted(BASES_DATA))
+def test_consulta_sem_rollup_agrega_a_tabela_sem_gravar(base):
+    assert not rollup_disponivel(db.session.connection())
+
+    assert _lido_do_rollup(base) == _esperado_da_tabela(base)
+    assert db.session.query(ReceitaMensalCliente).count() == 0
+    assert db.session.get(EstadoDerivado, ReceitaMensalCliente.__tablename__) is None
+
+
+def test_tabela_recriada_vazia_e_reconstruida():
+    ReceitaMensalService.reconstruir()
+    esperado = _lido_do_rollup('emissao')
+    ReceitaMensalCliente.__table__.drop(db.engine)
+    db.create_all()
+    _esquecer_estado()
+
+    assert not rollup_disponivel(db.session.connection())
+    assert _lido_do_rollup('emissao') == esperado
+    assert db.session.query(ReceitaMensalCliente).count() == 0
+
+    ReceitaMensalService.reconstruir()
+    assert rollup_disponivel(db.session.connection())
+    assert _lido_do_rollup('emissao') == esperado
+
+
+def test_versao_diferente_forca_reconstrucao():
+    ReceitaMensalService.reconstruir()
+    db.session.get(EstadoDerivado, ReceitaMensalCliente.__tablename__).versao = 0
+    db.session.commit()
+    _esquecer_estado()
+
+    assert not rollup_disponivel(db.session.connection())
+
+
+def test_periodo_com_bordas_parciais():
+    ReceitaMensalService.reconstruir()
+    inicio = date.today() - timedelta(days=95)
+    fim = date.today() - timedelta(days=20)
+
+    linhas = ReceitaMensalService.consultar_mensal('emissao', inicio, fim)
+    total = ReceitaMensalService.totalizar(linhas)
+    esperado = ReceitaMensalService._agregar_fato('emissao', inicio, fim, None)
+
+    assert total['quantidade'] == esperado['quantidade']
+    assert total['valor_total'] == pytest.approx(float(esperado['valor_total']))
+
+
+def test_insercao_alteracao_e_exclusao_mantem_o_rollup():
+    ReceitaMensalService.reconstruir()
+
+    db.session.add(CTE(numero_cte=9001, destinatario_nome='CLIENTE NOVO', valor_total=1234,
+                       data_emissao=date.today() - timedelta(days=3)))
+    alterado = CTE.query.filter_by(numero_cte=10).one()
+    alterado.valor_total = 777
+    alterado.data_baixa = alterado.data_emissao + timedelta(days=5)
+    alterado.destinatario_nome = 'CLIENTE RENOMEADO'
+    db.session.delete(CTE.query.filter_by(numero_cte=20).one())
+    db.session.commit()
+
+    for base in BASES_DATA:
+        assert _lido_do_rollup(base) == _esperado_da_tabela(base)
+
+
+def test_objeto_desatualizado_nao_desvia_o_rollup():
+    ReceitaMensalService.reconstruir()
+    desatualizado = CTE.query.filter_by(numero_cte=30).one()
+
+    # Outra sessão baixa o CTE depois de o objeto ter sido carregado
+    with Session(db.engine) as outra:
+        cte = outra.query(CTE).filter_by(numero_cte=30).one()
+        cte.data_baixa = cte.data_emissao + timedelta(days=7)
+        cte.valor_total = 4321
+        outra.commit()
+
+    desatualizado.destinatario_nome = 'CLIENTE CONCORRENTE'
+    db.session.commit()
+
+    for base in BASES_DATA:
+        assert _lido_do_rollup(base) == _esperado_da_tabela(base)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Roteamento de leituras para a réplica: o que conta como leitura
+tests/test_roteamento_db.py
+"""
+
+import pytest
+from sqlalchemy import delete, select, text, update
+
+from app.models.cte import CTE
+from app.utils.roteamento_db import _e_leitura
+
+
+@pytest.mark.parametrize('clausula', [
+    select(CTE.id),
+    text('SELECT 1'),
+    text('  with t as (select 1) select * from t'),
+])
+def test_leituras(clausula):
+    assert _e_leitura(clausula)
+
+
+@pytest.mark.parametrize('clausula', [
+    None,
+    select(CTE.id).with_for_update(),
+    select(CTE.id).with_for_update(read=True),
+    text('SELECT id FROM dashboard_baker FOR UPDATE SKIP LOCKED'),
+    text('select id from dashboard_baker for no key update'),
+    text('SELECT id FROM dashboard_baker FOR SHARE'),
+    update(CTE).values(observacao='x'),
+    delete(CTE),
+    text('DELETE FROM dashboard_baker'),
+    text('WITH movidos AS (DELETE FROM dashboard_baker RETURNING id) SELECT count(*) FROM movidos'),
+])
+def test_travas_e_escritas_vao_para_o_primario(clausula):
+    assert not _e_leitura(clausula)
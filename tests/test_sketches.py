@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sketches mensais: consulta somente leitura, linhas sujas e manutenção
+tests/test_sketches.py
+"""
+
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, func
+
+from app import db
+from app.models import sketch_mensal
+from app.models.cte import CTE
+from app.models.estado_derivado import EstadoDerivado
+from app.models.sketch_mensal import SketchMensal, pares_duracao, sketches_disponiveis
+from app.services.sketch_service import SketchService
+
+PERIODOS = [
+    (None, None),
+    (date.today() - timedelta(days=200), None),
+    (date.today() - timedelta(days=300), date.today() - timedelta(days=45)),
+]
+
+
+def _exato(coluna, inicio, fim) -> int:
+    query = db.session.query(func.count(func.distinct(coluna)))
+    if inicio is not None:
+        query = query.filter(CTE.data_emissao >= inicio)
+    if fim is not None:
+        query = query.filter(CTE.data_emissao <= fim)
+    return query.scalar()
+
+
+@contextmanager
+def _escritas():
+    """Coleta os comandos que alteram o banco executados no bloco"""
+    comandos = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(' ', 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP'):
+            comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        yield comandos
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+
+def _sujos() -> int:
+    return db.session.query(SketchMensal).filter(SketchMensal.sujo.is_(True)).count()
+
+
+@pytest.mark.parametrize('inicio,fim', PERIODOS)
+def test_distintos_iguais_aos_exatos(inicio, fim):
+    SketchService.manter()
+
+    assert SketchService.distintos('clientes', inicio, fim) == _exato(CTE.destinatario_nome, inicio, fim)
+    assert SketchService.distintos('veiculos', inicio, fim) == _exato(CTE.veiculo_placa, inicio, fim)
+
+
+def test_contagem_das_duracoes_igual_a_tabela():
+    SketchService.manter()
+    resumo = SketchService.resumo()
+
+    for codigo, (campo_inicio, campo_fim) in pares_duracao().items():
+        inicio, fim = getattr(CTE, campo_inicio), getattr(CTE, campo_fim)
+        validos = CTE.query.filter(inicio.isnot(None), fim.isnot(None), fim >= inicio).count()
+        assert resumo['duracoes'].get(codigo, {}).get('qtd', 0) == validos
+
+
+def test_consulta_sem_tabela_populada_nao_grava(client):
+    with _escritas() as comandos:
+        resposta = client.get('/dashboard/api/resumo-periodo')
+
+    assert resposta.status_code == 200
+    assert comandos == []
+    assert resposta.get_json()['resumo']['clientes_unicos'] == _exato(CTE.destinatario_nome, None, None)
+    assert not sketches_disponiveis(db.session.connection())
+
+
+def test_linhas_sujas_lidas_dos_ctes_sem_gravar(client):
+    SketchService.manter()
+
+    cte = CTE.query.filter_by(numero_cte=5).one()
+    cte.veiculo_placa = 'NOVA123'
+    cte.destinatario_nome = 'CLIENTE UNICO'
+    db.session.commit()
+    assert _sujos() > 0
+
+    with _escritas() as comandos:
+        resposta = client.get('/dashboard/api/resumo-periodo')
+    resumo = resposta.get_json()['resumo']
+
+    assert comandos == []
+    assert resumo['veiculos_ativos'] == _exato(CTE.veiculo_placa, None, None)
+    assert resumo['clientes_unicos'] == _exato(CTE.destinatario_nome, None, None)
+
+    sujos = _sujos()
+    assert sujos > 0
+    assert SketchService.manter() == {'reconstruido': False, 'recalculadas': sujos}
+    assert _sujos() == 0
+    assert client.get('/dashboard/api/resumo-periodo').get_json()['resumo'] == resumo
+
+
+def test_exclusao_marca_o_mes_como_sujo():
+    SketchService.manter()
+    db.session.delete(CTE.query.filter_by(numero_cte=7).one())
+    db.session.commit()
+
+    assert _sujos() > 0
+    assert SketchService.distintos('veiculos') == _exato(CTE.veiculo_placa, None, None)
+
+
+def test_manter_reconstroi_tabela_recriada_vazia():
+    SketchService.manter()
+    SketchMensal.__table__.drop(db.engine)
+    db.create_all()
+    sketch_mensal._tabela_disponivel = None
+
+    resultado = SketchService.manter()
+
+    assert resultado['reconstruido'] is True
+    assert resultado['linhas'] == db.session.query(SketchMensal).count() > 0
+    assert db.session.get(EstadoDerivado, SketchMensal.__tablename__).versao == sketch_mensal.SKETCH_VERSAO
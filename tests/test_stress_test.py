@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stress test de receita: cenários sobre o array acumulado e Monte Carlo
+tests/test_stress_test.py
+"""
+
+import pytest
+
+from app.services.stress_test_service import StressTestEngine
+
+URL = '/analise-financeira/api/stress-test'
+CLIENTES = ['A', 'B', 'C', 'D', 'E']
+RECEITAS = [100.0, 500.0, 50.0, 300.0, 50.0]  # total 1000
+
+
+@pytest.fixture
+def motor():
+    return StressTestEngine(CLIENTES, RECEITAS)
+
+
+def test_top_k_soma_os_maiores_clientes(motor):
+    resultado = motor.perda_top_k(2)
+
+    assert resultado['receita_perdida'] == 800.0
+    assert resultado['percentual_impacto'] == 80.0
+    assert resultado['clientes'] == ['B', 'D']
+    assert motor.perda_top_k(0)['receita_perdida'] == 0.0
+    assert motor.perda_top_k(50)['receita_perdida'] == 1000.0
+
+
+def test_participacao_acima_inclui_o_limite(motor):
+    resultado = motor.perda_participacao_acima(10)
+
+    assert resultado['clientes'] == ['B', 'D', 'A']
+    assert resultado['receita_perdida'] == 900.0
+    assert motor.perda_participacao_acima(60)['clientes_afetados'] == 0
+
+
+def test_clientes_nomeados_e_reducao_geral(motor):
+    nomeados = motor.perda_clientes(['C', 'A', 'X'])
+    reducao = motor.reducao_geral(25)
+
+    assert nomeados['receita_perdida'] == 150.0
+    assert nomeados['clientes_nao_encontrados'] == ['X']
+    assert reducao['receita_perdida'] == 250.0
+    assert reducao['clientes_afetados'] == len(CLIENTES)
+
+
+def test_monte_carlo_converge_para_a_perda_esperada(motor):
+    resultado = motor.monte_carlo(probabilidade_padrao=0.1, probabilidades={'B': 0.5},
+                                  simulacoes=100_000, semente=7)
+
+    esperada = 0.5 * 500 + 0.1 * 500
+    assert resultado['perda_esperada_analitica'] == esperada
+    assert resultado['perda_media_simulada'] == pytest.approx(esperada, rel=0.02)
+    assert resultado['percentis']['p50'] <= resultado['var_95'] <= resultado['expected_shortfall_95']
+    assert resultado['perda_maxima_simulada'] <= 1000.0
+
+
+def test_monte_carlo_com_a_mesma_semente_repete(motor):
+    primeira = motor.monte_carlo(simulacoes=5_000, semente=3)
+
+    assert motor.monte_carlo(simulacoes=5_000, semente=3) == primeira
+
+
+@pytest.mark.parametrize('cenario', [
+    {'probabilidade_padrao': 1.5},
+    {'probabilidade_padrao': float('nan')},
+    {'probabilidades': {'A': -0.1}},
+    {'probabilidades': {'A': True}},
+    {'probabilidades': ['A']},
+    {'simulacoes': 0},
+])
+def test_monte_carlo_rejeita_parametros_invalidos(motor, cenario):
+    with pytest.raises(ValueError):
+        motor.monte_carlo(**cenario)
+
+
+def test_api_executa_cenarios_do_json(client):
+    resposta = client.post(URL, json={'filtro_dias': 400, 'cenarios': [
+        {'tipo': 'top_k', 'k': 3, 'nome': 'Top 3'},
+        {'tipo': 'reducao_geral', 'percentual': 10},
+        {'tipo': 'monte_carlo', 'simulacoes': 1000, 'semente': 1},
+    ]})
+    dados = resposta.get_json()
+
+    assert resposta.status_code == 200
+    assert [c['tipo'] for c in dados['cenarios']] == ['top_k', 'reducao_geral', 'monte_carlo']
+    assert dados['cenarios'][0]['cenario'] == 'Top 3'
+    assert dados['cenarios'][1]['receita_perdida'] == pytest.approx(dados['receita_total'] * 0.1, abs=0.01)
+
+
+@pytest.mark.parametrize('payload', [
+    {'cenarios': []},
+    {'cenarios': [{'tipo': 'inexistente'}]},
+    {'cenarios': [{'tipo': 'monte_carlo', 'probabilidades': {'CLIENTE 1': 2}}]},
+])
+def test_api_recusa_cenarios_invalidos(client, payload):
+    resposta = client.post(URL, json={'filtro_dias': 400, **payload})
+
+    assert resposta.status_code == 400
+    assert resposta.get_json()['success'] is False
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agregação das métricas entre workers: snapshots de workers encerrados
+tests/test_telemetria.py
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from app.utils import telemetria
+
+ROTULOS = ('teste.endpoint',)
+CONTADOR = ('dashboard_db_queries_total', ROTULOS)
+HISTOGRAMA = ('dashboard_db_queries_per_request', ROTULOS)
+PID_ENCERRADO = 999999
+
+
+@pytest.fixture(autouse=True)
+def diretorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetria, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(telemetria, 'METRICS_ACUMULADO', str(tmp_path / 'acumulado.json'))
+    monkeypatch.setattr(telemetria, '_pid_ativo', lambda pid: pid == os.getpid())
+    return tmp_path
+
+
+def _snapshot_encerrado(diretorio, queries, idade, pid=PID_ENCERRADO):
+    buckets = [0] * (len(telemetria.BUCKETS_QUERIES) + 3)
+    buckets[2] = 1
+    buckets[-2], buckets[-1] = queries, 1
+    caminho = diretorio / f'metricas_{pid}.json'
+    caminho.write_text(json.dumps({
+        'pid': pid,
+        'atualizado_em': time.time() - idade,
+        'histogramas': [[HISTOGRAMA[0], list(ROTULOS), buckets]],
+        'contadores': [[CONTADOR[0], list(ROTULOS), queries]],
+        'rss_bytes': 1,
+    }))
+    return caminho
+
+
+def test_worker_encerrado_dentro_da_retencao_continua_somando(diretorio):
+    caminho = _snapshot_encerrado(diretorio, queries=7, idade=10)
+
+    agregado = telemetria.agregar()
+
+    assert agregado['contadores'][CONTADOR] == 7
+    assert os.path.exists(caminho)
+    assert ('dashboard_worker_rss_bytes', (str(PID_ENCERRADO),)) not in agregado['gauges']
+
+
+def test_worker_expirado_vai_para_o_acumulado_sem_zerar(diretorio):
+    recente = _snapshot_encerrado(diretorio, queries=7, idade=10)
+    expirado = _snapshot_encerrado(diretorio, queries=5, idade=telemetria.METRICS_RETENCAO_SEGUNDOS + 60,
+                                   pid=PID_ENCERRADO + 1)
+
+    primeira = telemetria.agregar()
+    segunda = telemetria.agregar()
+
+    assert not os.path.exists(expirado)
+    assert os.path.exists(recente)
+    for agregado in (primeira, segunda):
+        assert agregado['contadores'][CONTADOR] == 12
+        assert agregado['histogramas'][HISTOGRAMA][-1] == 2
+        assert agregado['histogramas'][HISTOGRAMA][-2] == 12
+
+
+def test_remocao_que_falhou_nao_duplica(diretorio, monkeypatch):
+    caminho = _snapshot_encerrado(diretorio, queries=5, idade=telemetria.METRICS_RETENCAO_SEGUNDOS + 60)
+
+    def falhar(caminho):
+        raise OSError('ocupado')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(telemetria.os, 'remove', falhar)
+        assert telemetria.agregar()['contadores'][CONTADOR] == 5
+    assert os.path.exists(caminho)
+
+    assert telemetria.agregar()['contadores'][CONTADOR] == 5
+    assert not os.path.exists(caminho)
+    assert telemetria.agregar()['contadores'][CONTADOR] == 5
+
+
+def test_prometheus_expoe_o_total_acumulado(diretorio):
+    _snapshot_encerrado(diretorio, queries=5, idade=telemetria.METRICS_RETENCAO_SEGUNDOS + 60)
+    telemetria.agregar()
+
+    texto = telemetria.formato_prometheus()
+
+    assert 'dashboard_db_queries_total{endpoint="teste.endpoint"} 5' in texto
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de identidade de usuários por worker: leitura, expiração e invalidação
+tests/test_usuario_cache.py
+"""
+
+import pytest
+
+from app import db
+from app.models.user import User
+from app.services.usuario_cache_service import (
+    CacheUsuarios, carregar_usuario, invalidar_usuario, usuarios_cache
+)
+from app.utils.telemetria import contar_queries
+
+URL = '/dashboard/api/metricas'
+
+
+@pytest.fixture(autouse=True)
+def cache_vazio():
+    invalidar_usuario()
+    yield
+    invalidar_usuario()
+
+
+def _consultas_a_users(contador):
+    return [sql for sql in contador.por_impressao if 'FROM users' in sql]
+
+
+def test_requisicoes_seguintes_nao_buscam_o_usuario(client):
+    assert client.get(URL).status_code == 200
+
+    with contar_queries() as contador:
+        assert client.get(URL).status_code == 200
+
+    assert _consultas_a_users(contador) == []
+
+
+def test_usuario_do_cache_e_persistente_e_sem_hash_em_memoria():
+    carregar_usuario(1)
+    db.session.remove()
+
+    assert 'password_hash' not in usuarios_cache.obter(1)
+    with contar_queries() as contador:
+        usuario = carregar_usuario('1')
+    assert contador.total == 0
+
+    assert usuario in db.session
+    assert usuario.check_password('senha-teste')
+    usuario.nome_completo = 'Admin Renomeado'
+    db.session.commit()
+    db.session.remove()
+    assert db.session.get(User, 1).nome_completo == 'Admin Renomeado'
+
+
+def test_alteracao_commitada_invalida_o_registro():
+    carregar_usuario(1)
+    db.session.get(User, 1).ativo = False
+    db.session.commit()
+    db.session.remove()
+
+    assert usuarios_cache.obter(1) is None
+    assert carregar_usuario(1).ativo is False
+
+
+def test_usuario_inexistente_nao_entra_no_cache():
+    assert carregar_usuario(999) is None
+    assert usuarios_cache.obter(999) is None
+
+
+def test_registro_expirado_e_descartado():
+    cache = CacheUsuarios(ttl=-1)
+    cache.gravar(1, {'id': 1})
+
+    assert cache.obter(1) is None
+
+
+def test_limite_de_entradas():
+    cache = CacheUsuarios(ttl=60, max_entradas=2)
+    for user_id in (1, 2, 3):
+        cache.gravar(user_id, {'id': user_id})
+
+    assert cache.obter(1) is None
+    assert cache.obter(3)['id'] == 3
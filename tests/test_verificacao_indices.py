@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+flask verificar-indices: consultas dos serviços e índices esperados
+tests/test_verificacao_indices.py
+"""
+
+from datetime import datetime
+
+from app import db
+from app.services.alertas_service import AlertasService
+from app.utils.telemetria import contar_queries, impressao_digital
+from app.utils.verificacao_indices import verificar_indices
+
+
+def test_todas_as_consultas_usam_o_indice_esperado():
+    resultados = verificar_indices(db.engine)
+
+    assert resultados
+    assert [r['origem'] for r in resultados if not r['ok']] == []
+
+
+def test_consultas_verificadas_sao_as_executadas_pelos_alertas(client):
+    with contar_queries() as contador:
+        assert client.get('/alertas/api/alertas-ativos').status_code == 200
+
+    agora = datetime.now()
+    for construir in (AlertasService.consulta_primeiro_envio_pendente,
+                      AlertasService.consulta_envio_final_pendente,
+                      AlertasService.consulta_faturas_vencidas,
+                      AlertasService.consulta_risco_financeiro):
+        sql = str(construir(agora).compile(dialect=db.engine.dialect))
+        assert impressao_digital(sql) in contador.por_impressao
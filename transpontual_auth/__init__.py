@@ -18,6 +18,8 @@ from .schemas import (
     SystemRole
 )
 
+from .audit import AuditSink, criar_sink
+
 __version__ = "1.0.0"
 __all__ = [
     "create_access_token",
@@ -28,5 +30,7 @@ __all__ = [
     "UserInfo",
     "TokenPayload",
     "PermissionClaim",
-    "SystemRole"
+    "SystemRole",
+    "AuditSink",
+    "criar_sink"
 ]
\ No newline at end of file
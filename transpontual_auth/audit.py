@@ -0,0 +1,250 @@
+"""
+Sink de auditoria de segurança em lote para sistemas Transpontual
+
+Eventos (mesmos campos de SecurityAuditLog) são enfileirados em memória sem
+bloquear a thread chamadora e gravados em lote por uma thread de fundo:
+- "log": um registro por lote no logger transpontual_auth.audit
+- "arquivo": JSON lines em arquivo rotativo (AUDIT_ARQUIVO)
+- "banco": INSERT multi-linha na tabela security_audit_log (AUDIT_DATABASE_URL)
+
+Fila limitada: cheia = evento descartado e contado (nunca bloqueia a requisição).
+Configuração por variáveis de ambiente AUDIT_*.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+AUDIT_SINK = os.getenv("AUDIT_SINK", "log")
+AUDIT_FILA_MAX = int(os.getenv("AUDIT_FILA_MAX", "10000"))
+AUDIT_LOTE = int(os.getenv("AUDIT_LOTE", "500"))
+AUDIT_FLUSH_SEGUNDOS = float(os.getenv("AUDIT_FLUSH_SEGUNDOS", "2"))
+AUDIT_ARQUIVO = os.getenv("AUDIT_ARQUIVO", os.path.join("logs", "security_audit.log"))
+AUDIT_ARQUIVO_MAX_BYTES = int(os.getenv("AUDIT_ARQUIVO_MAX_BYTES", str(20 * 1024 * 1024)))
+AUDIT_ARQUIVO_BACKUPS = int(os.getenv("AUDIT_ARQUIVO_BACKUPS", "5"))
+AUDIT_TABELA = os.getenv("AUDIT_TABELA", "security_audit_log")
+
+CAMPOS_EVENTO = (
+    "evento", "usuario_id", "email", "ip_address", "user_agent",
+    "sistema", "timestamp", "detalhes", "sucesso"
+)
+
+
+class AuditSink:
+    """
+    Buffer limitado + thread de flush por processo
+    Subclasses implementam _gravar_lote(eventos)
+    """
+
+    nome = "base"
+
+    def __init__(self, tamanho_fila: int = AUDIT_FILA_MAX, lote: int = AUDIT_LOTE,
+                 intervalo: float = AUDIT_FLUSH_SEGUNDOS):
+        self.tamanho_fila = tamanho_fila
+        self.lote = max(lote, 1)
+        self.intervalo = intervalo
+        self.enfileirados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self.falhas = 0
+        self._fila: deque = deque()
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        atexit.register(self.fechar)
+
+    # ==================== PRODUTOR ====================
+
+    def registrar(self, evento: Dict[str, Any]) -> bool:
+        """Enfileira o evento; False se a fila estiver cheia (evento descartado)"""
+        if self._pid != os.getpid():
+            self._iniciar()
+        if len(self._fila) >= self.tamanho_fila:
+            self.descartados += 1
+            return False
+        self._fila.append(evento)
+        self.enfileirados += 1
+        # Backpressure: lote cheio acorda o flush antes do intervalo
+        if len(self._fila) >= self.lote:
+            self._acordar.set()
+        return True
+
+    # ==================== FLUSH ====================
+
+    def _iniciar(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Após fork: eventos herdados do processo pai não são deste worker
+            self._fila = deque()
+            self._acordar = threading.Event()
+            self._parar = threading.Event()
+            self._thread = threading.Thread(target=self._executar, name=f"audit-{self.nome}", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _executar(self) -> None:
+        parar, acordar = self._parar, self._acordar
+        while not parar.is_set():
+            acordar.wait(self.intervalo)
+            acordar.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Grava tudo o que está na fila, em lotes de até self.lote eventos"""
+        total = 0
+        with self._lock:
+            while self._fila:
+                eventos = []
+                while self._fila and len(eventos) < self.lote:
+                    eventos.append(self._fila.popleft())
+                try:
+                    self._gravar_lote(eventos)
+                    self.gravados += len(eventos)
+                except Exception as e:
+                    self.falhas += 1
+                    logger.error(f"Falha ao gravar {len(eventos)} eventos de auditoria ({self.nome}): {e}")
+                    # Não perde o lote: registra no log como último recurso
+                    _gravar_no_log(eventos)
+                total += len(eventos)
+        return total
+
+    def fechar(self) -> None:
+        if self._pid == os.getpid():
+            self._parar.set()
+            self._acordar.set()
+            self.flush()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "sink": self.nome,
+            "fila": len(self._fila),
+            "fila_max": self.tamanho_fila,
+            "enfileirados": self.enfileirados,
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "falhas": self.falhas,
+        }
+
+    def _gravar_lote(self, eventos: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+
+class LogAuditSink(AuditSink):
+    """Um registro de log por lote"""
+
+    nome = "log"
+
+    def _gravar_lote(self, eventos: List[Dict[str, Any]]) -> None:
+        _gravar_no_log(eventos)
+
+
+class ArquivoAuditSink(AuditSink):
+    """JSON lines em arquivo rotativo (uma escrita por lote)"""
+
+    nome = "arquivo"
+
+    def __init__(self, caminho: str = AUDIT_ARQUIVO, max_bytes: int = AUDIT_ARQUIVO_MAX_BYTES,
+                 backups: int = AUDIT_ARQUIVO_BACKUPS, **kwargs):
+        super().__init__(**kwargs)
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._handler = RotatingFileHandler(caminho, maxBytes=max_bytes, backupCount=backups,
+                                            encoding="utf-8", delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def _gravar_lote(self, eventos: List[Dict[str, Any]]) -> None:
+        linhas = "\n".join(_json(evento) for evento in eventos)
+        self._handler.emit(logging.makeLogRecord({"msg": linhas, "levelno": logging.INFO}))
+
+
+class BancoAuditSink(AuditSink):
+    """INSERT multi-linha na tabela de auditoria (criada se não existir)"""
+
+    nome = "banco"
+
+    def __init__(self, url: Optional[str] = None, tabela: str = AUDIT_TABELA, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url or os.getenv("AUDIT_DATABASE_URL") or os.getenv("DATABASE_URL")
+        self.nome_tabela = tabela
+        self._engine = None
+        self._tabela = None
+
+    def _preparar(self) -> None:
+        # SQLAlchemy só é necessário para este sink
+        from sqlalchemy import (JSON, Boolean, Column, DateTime, Integer, MetaData,
+                                String, Table, create_engine)
+
+        url = self.url
+        if not url:
+            raise ValueError("AUDIT_DATABASE_URL/DATABASE_URL não definida")
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql://", 1)
+        self._engine = create_engine(url, pool_size=1, max_overflow=0, pool_pre_ping=True) \
+            if not url.startswith("sqlite") else create_engine(url)
+        metadata = MetaData()
+        self._tabela = Table(
+            self.nome_tabela, metadata,
+            Column("id", Integer, primary_key=True),
+            Column("evento", String(64), nullable=False, index=True),
+            Column("usuario_id", String(64), index=True),
+            Column("email", String(255)),
+            Column("ip_address", String(64)),
+            Column("user_agent", String(512)),
+            Column("sistema", String(32)),
+            Column("timestamp", DateTime, nullable=False, index=True),
+            Column("detalhes", JSON),
+            Column("sucesso", Boolean, nullable=False),
+        )
+        metadata.create_all(self._engine, checkfirst=True)
+
+    def _gravar_lote(self, eventos: List[Dict[str, Any]]) -> None:
+        if self._engine is None:
+            self._preparar()
+        linhas = [
+            {
+                **{campo: evento.get(campo) for campo in CAMPOS_EVENTO},
+                "usuario_id": None if evento.get("usuario_id") is None else str(evento["usuario_id"]),
+                "user_agent": (evento.get("user_agent") or "")[:512] or None,
+            }
+            for evento in eventos
+        ]
+        with self._engine.begin() as conexao:
+            conexao.execute(self._tabela.insert(), linhas)
+
+
+def _json(evento: Dict[str, Any]) -> str:
+    return json.dumps(evento, ensure_ascii=False, default=_serializar)
+
+
+def _serializar(valor: Any) -> str:
+    return valor.isoformat() if isinstance(valor, datetime) else str(valor)
+
+
+def _gravar_no_log(eventos: List[Dict[str, Any]]) -> None:
+    logger.info(f"SECURITY_EVENTS ({len(eventos)}): [{', '.join(_json(e) for e in eventos)}]")
+
+
+SINKS = {
+    "log": LogAuditSink,
+    "arquivo": ArquivoAuditSink,
+    "banco": BancoAuditSink,
+}
+
+
+def criar_sink(tipo: Optional[str] = None, **kwargs) -> AuditSink:
+    """Sink configurado por AUDIT_SINK (log, arquivo ou banco)"""
+    tipo = (tipo or AUDIT_SINK).lower()
+    if tipo not in SINKS:
+        logger.warning(f"AUDIT_SINK inválido: {tipo}; usando 'log'")
+        tipo = "log"
+    return SINKS[tipo](**kwargs)
@@ -15,9 +15,9 @@ from .schemas import (
     TokenPayload,
     PermissionClaim,
     SystemRole,
-    AccessRestrictions,
-    SecurityAuditLog
+    AccessRestrictions
 )
+from .audit import AuditSink, criar_sink
 
 logger = logging.getLogger(__name__)
 
@@ -36,8 +36,16 @@ class JWTConfig:
 class TranspontualJWTHandler:
     """Handler principal para JWT da Transpontual"""
 
-    def __init__(self, config: Optional[JWTConfig] = None):
+    def __init__(self, config: Optional[JWTConfig] = None, audit_sink: Optional[AuditSink] = None):
         self.config = config or JWTConfig()
+        self._audit_sink = audit_sink
+
+    @property
+    def audit_sink(self) -> AuditSink:
+        """Sink de auditoria (compartilhado pelos handlers sem sink próprio)"""
+        if self._audit_sink is None:
+            self._audit_sink = _sink_padrao()
+        return self._audit_sink
 
     def create_access_token(
         self,
@@ -353,20 +361,31 @@ class TranspontualJWTHandler:
         sucesso: bool = True,
         detalhes: Optional[Dict] = None
     ):
-        """Log de eventos de segurança"""
-        log_entry = SecurityAuditLog(
-            evento=evento,
-            usuario_id=user_id,
-            email=email,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            sistema=sistema,
-            timestamp=datetime.utcnow(),
-            detalhes=detalhes,
-            sucesso=sucesso
-        )
-
-        logger.info(f"SECURITY_EVENT: {log_entry.dict()}")
+        """
+        Log de eventos de segurança (campos de SecurityAuditLog)
+        Apenas enfileira; a gravação é feita em lote pelo sink de auditoria
+        """
+        self.audit_sink.registrar({
+            "evento": evento,
+            "usuario_id": user_id,
+            "email": email,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "sistema": sistema,
+            "timestamp": datetime.utcnow(),
+            "detalhes": detalhes,
+            "sucesso": sucesso,
+        })
+
+
+_audit_sink_padrao: Optional[AuditSink] = None
+
+
+def _sink_padrao() -> AuditSink:
+    global _audit_sink_padrao
+    if _audit_sink_padrao is None:
+        _audit_sink_padrao = criar_sink()
+    return _audit_sink_padrao
 
 
 # Instância global padrão